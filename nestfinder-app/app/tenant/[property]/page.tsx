@@ -4,6 +4,23 @@ import { useState, useEffect } from 'react';
 import { useParams } from 'next/navigation';
 import axios from 'axios';
 
+interface Slot {
+  time: string;
+  status?: string;
+  travel_minutes?: number;
+  agent_id?: number;
+}
+
+// Days of slots fetched in one request when the page loads
+const PREFETCH_DAYS = 14;
+
+const formatDate = (d: Date) => {
+  const year = d.getFullYear();
+  const month = String(d.getMonth() + 1).padStart(2, '0');
+  const day = String(d.getDate()).padStart(2, '0');
+  return `${year}-${month}-${day}`;
+};
+
 interface Property {
   id: number;
   title: string;
@@ -18,7 +35,8 @@ export default function TenantBookingPage() {
   const propertySlug = params.property as string;
   
   const [property, setProperty] = useState<Property | null>(null);
-  const [availableSlots, setAvailableSlots] = useState<Array<{time: string, status?: string, travel_minutes?: number}>>([]);
+  const [availableSlots, setAvailableSlots] = useState<Slot[]>([]);
+  const [slotsByDate, setSlotsByDate] = useState<Record<string, Slot[]> | null>(null);
   const [selectedSlot, setSelectedSlot] = useState<string>('');
   const [selectedDate, setSelectedDate] = useState<string>('');
   const [loading, setLoading] = useState(true);
@@ -39,13 +57,7 @@ export default function TenantBookingPage() {
   const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000';
 
   // Get today's date in YYYY-MM-DD format for min date
-  const minDate = (() => {
-    const today = new Date();
-    const year = today.getFullYear();
-    const month = String(today.getMonth() + 1).padStart(2, '0');
-    const day = String(today.getDate()).padStart(2, '0');
-    return `${year}-${month}-${day}`;
-  })();
+  const minDate = formatDate(new Date());
 
   // Initialize selectedDate to today
   useEffect(() => {
@@ -61,11 +73,18 @@ export default function TenantBookingPage() {
   }, [propertySlug]);
 
   useEffect(() => {
-    // Reload slots when date changes
-    if (property && selectedDate) {
+    // Fetch the next two weeks of slots in one request
+    if (property) {
+      prefetchSlots(property.id);
+    }
+  }, [property]);
+
+  useEffect(() => {
+    // Reload slots when date changes (once the prefetch has finished)
+    if (property && selectedDate && slotsByDate) {
       loadAvailableSlots(property.id, selectedDate);
     }
-  }, [selectedDate, property]);
+  }, [selectedDate, property, slotsByDate]);
 
   const loadProperty = async () => {
     try {
@@ -78,18 +97,42 @@ export default function TenantBookingPage() {
     }
   };
 
-  const loadAvailableSlots = async (propertyId: number, date: string) => {
+  const prefetchSlots = async (propertyId: number) => {
     setLoadingSlots(true);
+    const byDate: Record<string, Slot[]> = {};
     try {
-      const slotsResponse = await axios.get(`${API_URL}/api/properties/${propertyId}/available-slots`, {
-        params: { date }
+      const lastDay = new Date();
+      lastDay.setDate(lastDay.getDate() + PREFETCH_DAYS - 1);
+      const response = await axios.get(`${API_URL}/api/properties/${propertyId}/available-slots`, {
+        params: { from: minDate, to: formatDate(lastDay) }
       });
-      console.log('Available slots response:', slotsResponse.data);
+      for (const day of response.data.days || []) {
+        byDate[day.date] = day.slots || [];
+      }
+    } catch (error) {
+      // Fall back to fetching one date at a time
+      console.error('Failed to prefetch available slots:', error);
+    }
+    setSlotsByDate(byDate);
+  };
+
+  const loadAvailableSlots = async (propertyId: number, date: string) => {
+    setLoadingSlots(true);
+    try {
+      let slots: Slot[];
+      if (slotsByDate && slotsByDate[date]) {
+        slots = slotsByDate[date];
+      } else {
+        const slotsResponse = await axios.get(`${API_URL}/api/properties/${propertyId}/available-slots`, {
+          params: { date }
+        });
+        slots = slotsResponse.data.slots || [];
+      }
       
       // Filter out past time slots if the selected date is today
       const today = new Date();
       const todayStr = today.toISOString().split('T')[0];
-      let filteredSlots = slotsResponse.data.slots || [];
+      let filteredSlots = slots;
       
       if (date === todayStr) {
         const now = new Date();
@@ -147,6 +190,7 @@ export default function TenantBookingPage() {
         occupants: formData.occupants ? parseInt(formData.occupants) : null,
         rent_budget: formData.rentBudget ? parseFloat(formData.rentBudget) : null,
         message: formData.message || null,
+        agent_id: availableSlots.find((slot) => slot.time === selectedSlot)?.agent_id ?? null,
       });
 
       setSubmitted(true);
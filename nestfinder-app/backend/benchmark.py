@@ -0,0 +1,548 @@
+"""
+Benchmarks for the scheduler engine, travel times and the main API routes
+on synthetic portfolios.
+
+Each tier builds one agency with its properties spread over real London
+postcodes, an agent per PROPERTIES_PER_AGENT properties, viewings (about a
+third confirmed) spread over enough days to keep each agent's day
+realistic, and a few blockouts, half of them one agent's own. For each
+tier it:
+1. Times each scheduler stage on the busiest agent day: the viewing index,
+   loading the day, the free timeline, columns, travel, slot arrays, and
+   AgentDay slots (built fresh, cached, and over a range) against
+   slot_reference, the original per-slot generate_slots, and a single
+   AgentDay.feasibility check against the original per-slot check. Reports
+   how many times faster the engine is. Also times the storage calls behind
+   GET /api/viewings: a page, a keyset page deep in the list, and delta
+   sync since a recent event seq.
+2. Times the key routes through an in-process test client, with the same
+   portfolio loaded into storage.
+3. Differential check: AgentDay, built from the day's viewings or brought
+   up to date with apply(), must return exactly the slots of
+   slot_reference for sampled properties, agents and dates, slot
+   intervals, viewing lengths and agency viewing lengths.
+
+Usage:
+    python benchmark.py --tiers xs s m --output results.json
+    python benchmark.py --tiers l --compare results.json   (p50s next to an earlier run's)
+    python benchmark.py --storage sqlite   (routes against a fresh SQLite file per tier)
+    python benchmark.py --travel-model profile   (time-of-day travel instead of the default haversine)
+    python benchmark.py --tiers m --database-url postgresql://...   (schema.sql applied, empty tables)
+
+Exits 1 if the differential check finds a mismatch.
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import scheduler_engine
+import slot_reference
+import travel_time
+from indexes import ViewingColumns, ViewingIndex
+from storage import DEFAULT_AGENCY_ID, DEFAULT_AGENT_ID, MemoryRepository, default_availability
+
+# (properties, viewings) per tier
+TIERS: Dict[str, Tuple[int, int]] = {
+    "xs": (10, 100),
+    "s": (100, 1000),
+    "m": (1000, 10000),
+    "l": (10000, 100000),
+}
+PROPERTIES_PER_AGENT = 100
+VIEWINGS_PER_AGENT_DAY = 8  # spreads viewings over more days as a tier grows
+CONFIRMED_SHARE = 0.35
+BLOCKOUT_EVERY_DAYS = 5  # one agency-wide blockout per this many days
+START_DATE = date(2030, 1, 7)  # a Monday; fixed so runs are comparable
+NOW = datetime(2030, 1, 1, 9, 0)
+RANGE_DAYS = 14
+FEASIBILITY_MINUTES = 14 * 60  # start time of the single feasibility check timed
+LIST_PAGE = 100  # page size of the viewing list stages
+DIFFERENTIAL_SAMPLES = 300
+# (slot interval, new viewing's minutes, agency viewing length) the differential check samples
+DIFFERENTIAL_CASES = ((30, 20, 20), (30, 20, 20), (15, 20, 20), (10, 20, 20), (30, 45, 20), (15, 30, 45), (10, 60, 30))
+
+# Real London postcodes (stations, museums, landmarks) across the built-in districts
+LONDON_POSTCODES = sorted(set(travel_time.POSTCODE_COORDS) | {
+    "SW1A 1AA", "SW1A 2AA", "SW1A 0AA", "WC2N 5DN", "WC2E 9DD", "EC4M 8AD", "EC2V 7HH",
+    "EC3N 4AB", "NW1 2DB", "SE1 9TG", "SE11 5SS", "SW7 2RL", "SW7 5BD", "SW3 4RY",
+    "N1 9AP", "W2 1HQ", "W8 4PX", "SE10 8XJ", "KT1 1AE",
+})
+
+
+class Portfolio:
+    """One synthetic agency, as the dicts the scheduler engine takes."""
+
+    def __init__(self, properties: int, viewings: int, seed: int = 1):
+        rng = random.Random(seed)
+        self.agents = max(1, -(-properties // PROPERTIES_PER_AGENT))
+        self.days = max(RANGE_DAYS, -(-viewings // (self.agents * VIEWINGS_PER_AGENT_DAY)))
+        self.properties_db = {
+            i: {
+                "id": i,
+                "title": f"Bench property {i}",
+                "area": "London",
+                "address": f"{i} Bench Street",
+                "postcode": rng.choice(LONDON_POSTCODES),
+                "status": "active",
+                "agency_id": DEFAULT_AGENCY_ID,
+            }
+            for i in range(1, properties + 1)
+        }
+        # Agent a covers every agents-th property
+        self.agent_of = {pid: (pid - 1) % self.agents + 1 for pid in self.properties_db}
+        self.viewings_db = {}
+        for i in range(1, viewings + 1):
+            property_id = rng.randint(1, properties)
+            day = START_DATE + timedelta(days=rng.randrange(self.days))
+            requested_time = f"{rng.randint(9, 17):02d}:{rng.choice((0, 15, 30, 45)):02d}"
+            viewing = {
+                "id": i,
+                "tenant_name": f"Tenant {i}",
+                "tenant_email": f"tenant{i}@bench.invalid",
+                "tenant_phone": "0",
+                "property_id": property_id,
+                "requested_time": requested_time,
+                "requested_date": day.isoformat(),
+                "status": "pending",
+                "agent_id": self.agent_of[property_id],
+                "created_at": (NOW - timedelta(seconds=viewings - i)).isoformat(),
+            }
+            if rng.random() < CONFIRMED_SHARE:
+                viewing["status"] = "confirmed"
+                viewing["confirmed_time"] = requested_time
+            self.viewings_db[i] = viewing
+        self.blockouts = []
+        for i in range(self.days // BLOCKOUT_EVERY_DAYS):
+            start = rng.randint(9 * 60, 16 * 60)
+            self.blockouts.append({
+                "id": i + 1,
+                "date": (START_DATE + timedelta(days=rng.randrange(self.days))).isoformat(),
+                "start_time": scheduler_engine.format_time(start),
+                "end_time": scheduler_engine.format_time(start + rng.choice((30, 60, 120))),
+                "full_day": False,
+                # Every other one is an agent's own
+                "agent_id": rng.randint(1, self.agents) if i % 2 else None,
+            })
+        availability = default_availability()
+        # Saturdays open and close off the hour
+        availability[5].update(start_time="10:15", end_time="16:45")
+        self.availability_db = {DEFAULT_AGENCY_ID: availability}
+        self.blockouts_db = {DEFAULT_AGENCY_ID: self.blockouts}
+
+    def busiest_day(self) -> Tuple[int, date]:
+        """(agent_id, date) with the most confirmed viewings."""
+        counts: Dict[Tuple[int, str], int] = {}
+        for viewing in self.viewings_db.values():
+            if viewing["status"] == "confirmed":
+                key = (viewing["agent_id"], viewing["requested_date"])
+                counts[key] = counts.get(key, 0) + 1
+        agent_id, day = max(counts, key=counts.get) if counts else (1, START_DATE.isoformat())
+        return agent_id, date.fromisoformat(day)
+
+    def property_of(self, agent_id: int, rng: random.Random) -> Dict:
+        return self.properties_db[rng.randrange(agent_id, len(self.properties_db) + 1, self.agents)]
+
+    def day_inputs(self, agent_id: int, target_date: date, index: ViewingIndex) -> Tuple[Optional[Dict], List[Dict], List[Dict]]:
+        """The weekly rule, blockouts and confirmed viewings the app loads for an agent and date."""
+        se = scheduler_engine
+        date_str = target_date.isoformat()
+        return (
+            se.find_day_rule(self.availability_db[DEFAULT_AGENCY_ID], target_date.weekday()),
+            se.blockouts_for_agent([b for b in self.blockouts if b["date"] == date_str], agent_id),
+            index.get(agent_id, date_str, "confirmed"),
+        )
+
+    def agent_day(
+        self,
+        agent_id: int,
+        target_date: date,
+        index: ViewingIndex,
+        viewing_duration: int = travel_time.VIEWING_DURATION
+    ) -> scheduler_engine.AgentDay:
+        """The AgentDay the app would load for an agent and date, for an agency whose viewings last viewing_duration."""
+        return scheduler_engine.AgentDay(
+            agent_id,
+            target_date,
+            *self.day_inputs(agent_id, target_date, index),
+            self.properties_db,
+            viewing_duration=viewing_duration,
+            agency_id=DEFAULT_AGENCY_ID
+        )
+
+    def slot_args(self, property_id: int, agent_id: int, target_date: date) -> Dict:
+        return dict(
+            agency_id=DEFAULT_AGENCY_ID, property_id=property_id,
+            property_postcode=self.properties_db[property_id]["postcode"], target_date=target_date,
+            availability_db=self.availability_db, blockouts_db=self.blockouts_db,
+            viewings_db=self.viewings_db, properties_db=self.properties_db, agent_id=agent_id,
+        )
+
+
+def time_call(fn: Callable, min_time: float, max_runs: int = 1000) -> Dict:
+    """Call fn repeatedly for about min_time seconds (at least 3 runs); latency summary in ms."""
+    runs = []
+    deadline = time.perf_counter() + min_time
+    while len(runs) < 3 or (time.perf_counter() < deadline and len(runs) < max_runs):
+        started = time.perf_counter()
+        fn()
+        runs.append((time.perf_counter() - started) * 1000)
+    runs.sort()
+    return {
+        "runs": len(runs),
+        "min_ms": round(runs[0], 4),
+        "mean_ms": round(statistics.fmean(runs), 4),
+        "p50_ms": round(runs[len(runs) // 2], 4),
+        "p95_ms": round(runs[min(len(runs) - 1, int(len(runs) * 0.95))], 4),
+    }
+
+
+def bench_stages(portfolio: Portfolio, min_time: float) -> Dict[str, Dict]:
+    """Time each scheduler stage on the portfolio's busiest agent day."""
+    se = scheduler_engine
+    agent_id, day = portfolio.busiest_day()
+    prop = portfolio.property_of(agent_id, random.Random(0))
+    args = portfolio.slot_args(prop["id"], agent_id, day)
+    viewings = list(portfolio.viewings_db.values())
+    index = ViewingIndex()
+    index.rebuild(viewings)
+    rule, blockouts, confirmed = portfolio.day_inputs(agent_id, day, index)
+    window = (se.parse_time(rule["start_time"]), se.parse_time(rule["end_time"]))
+    # As the app does at startup: the agency's matrix, when it's small enough
+    travel_time.travel_service.precompute_matrix(
+        DEFAULT_AGENCY_ID, [p["postcode"] for p in portfolio.properties_db.values()]
+    )
+    calendar = se.build_day_calendar(blockouts, confirmed)
+    columns = ViewingColumns(confirmed, portfolio.properties_db, travel_time.VIEWING_DURATION)
+    travel = (
+        se._postcode_travel(columns.postcode_keys, prop["postcode"], agency_id=DEFAULT_AGENCY_ID),
+        se._postcode_travel(columns.postcode_keys, prop["postcode"], to_property=False, agency_id=DEFAULT_AGENCY_ID),
+    )
+    pending = [v for v in viewings if v["status"] == "pending" and v["requested_date"] == day.isoformat()]
+    agent_day = portfolio.agent_day(agent_id, day, index)
+    agent_day.slots(prop["postcode"], NOW)
+    range_days = [day + timedelta(days=n) for n in range(RANGE_DAYS)]
+
+    stages = {
+        "viewing_index_rebuild": lambda: ViewingIndex().rebuild(viewings),
+        "viewing_index_day": lambda: index.get(agent_id, day.isoformat(), "confirmed"),
+        "day_calendar": lambda: se.build_day_calendar(blockouts, confirmed),
+        "free_timeline": lambda: se.build_free_timeline(window[0], window[1], blockouts, confirmed),
+        "viewing_columns": lambda: ViewingColumns(confirmed, portfolio.properties_db, travel_time.VIEWING_DURATION),
+        "postcode_travel": lambda: (
+            se._postcode_travel(columns.postcode_keys, prop["postcode"], agency_id=DEFAULT_AGENCY_ID),
+            se._postcode_travel(columns.postcode_keys, prop["postcode"], to_property=False, agency_id=DEFAULT_AGENCY_ID),
+        ),
+        "travel_blocked_intervals": lambda: se._travel_blocked_intervals(columns, *travel),
+        "day_slot_arrays": lambda: se.day_slot_arrays(rule, blockouts, calendar, columns, travel, day, now=NOW),
+        "agent_day": lambda: portfolio.agent_day(agent_id, day, index),
+        # A timeline-cache miss: load the day, then its slots
+        "agent_day_slots": lambda: portfolio.agent_day(agent_id, day, index).slots(prop["postcode"], NOW),
+        # A hit: the cached day's slots for a property it has priced before
+        "agent_day_slots_cached": lambda: agent_day.slots(prop["postcode"], NOW),
+        "agent_day_range": lambda: [
+            portfolio.agent_day(agent_id, d, index).slots(prop["postcode"], NOW) for d in range_days
+        ],
+        "slot_reference": lambda: slot_reference.generate_slots(**args),
+        "agent_day_feasibility": lambda: agent_day.feasibility(prop["postcode"], FEASIBILITY_MINUTES),
+        "feasibility_reference": lambda: slot_reference.check_agent_slot_feasibility(
+            agent_id, se.format_time(FEASIBILITY_MINUTES), prop["id"], prop["postcode"],
+            confirmed, portfolio.properties_db
+        ),
+        "batch_viewing_feasibility": lambda: se.batch_viewing_feasibility(
+            pending, portfolio.properties_db, {(agent_id, day.isoformat()): agent_day}
+        ),
+        "travel_lookup": lambda: travel_time.get_base_travel_time(
+            LONDON_POSTCODES[0], LONDON_POSTCODES[-1], 8 * 60, DEFAULT_AGENCY_ID
+        ),
+    }
+    results = {name: time_call(fn, min_time) for name, fn in stages.items()}
+    results["_day"] = {"agent_id": agent_id, "date": day.isoformat(), "confirmed": len(confirmed), "pending": len(pending)}
+    return results
+
+
+# Engine stage -> the slot_reference stage it replaces
+SPEEDUP_STAGES = {
+    "agent_day_slots": "slot_reference",
+    "agent_day_slots_cached": "slot_reference",
+    "agent_day_feasibility": "feasibility_reference",
+}
+
+
+def speedups(stages: Dict[str, Dict]) -> Dict[str, float]:
+    """p50 of each reference stage over the p50 of the engine's: how many times faster the engine is."""
+    return {
+        name: round(stages[reference]["p50_ms"] / stages[name]["p50_ms"], 2)
+        for name, reference in SPEEDUP_STAGES.items()
+    }
+
+
+def bench_listing(portfolio: Portfolio, min_time: float) -> Dict[str, Dict]:
+    """Time the storage calls behind GET /api/viewings on a memory repository holding the portfolio."""
+    loop = asyncio.new_event_loop()
+    run = loop.run_until_complete
+    try:
+        repo = MemoryRepository()
+        run(repo.connect())
+        run(load_into(repo, portfolio))
+        viewings = run(repo.list_viewings(DEFAULT_AGENCY_ID))
+        # One event per viewing, oldest first, as the create route records them
+        for viewing in reversed(viewings):
+            run(repo.append_viewing_event(DEFAULT_AGENCY_ID, "viewing.created", viewing))
+        middle = viewings[len(viewings) // 2]
+        seq = run(repo.get_viewing_event_seq(DEFAULT_AGENCY_ID))
+        stages = {
+            "list_viewings_page": lambda: run(repo.list_viewings(DEFAULT_AGENCY_ID, None, LIST_PAGE)),
+            "list_viewings_keyset_page": lambda: run(repo.list_viewings(
+                DEFAULT_AGENCY_ID, (middle["created_at"], middle["id"]), LIST_PAGE
+            )),
+            "list_viewings_since": lambda: run(repo.list_viewings_since(DEFAULT_AGENCY_ID, seq - LIST_PAGE, LIST_PAGE)),
+        }
+        return {name: time_call(fn, min_time) for name, fn in stages.items()}
+    finally:
+        loop.close()
+
+
+def differential(portfolio: Portfolio, samples: int, seed: int = 2) -> Dict:
+    """Compare AgentDay's slots with slot_reference on sampled days."""
+    rng = random.Random(seed)
+    index = ViewingIndex()
+    index.rebuild(list(portfolio.viewings_db.values()))
+    mismatches = []
+    for _ in range(samples):
+        agent_id = rng.randint(1, portfolio.agents)
+        prop = portfolio.property_of(agent_id, rng)
+        day = START_DATE + timedelta(days=rng.randrange(portfolio.days))
+        interval, duration, booked = rng.choice(DIFFERENTIAL_CASES)
+        expected = slot_reference.generate_slots(
+            **portfolio.slot_args(prop["id"], agent_id, day),
+            viewing_duration=duration, slot_interval=interval, booked_duration=booked
+        )
+
+        agent_day = portfolio.agent_day(agent_id, day, index, booked)
+        # The same day as kept current in the timeline cache: loaded without
+        # its last viewing, which is then confirmed
+        applied = portfolio.agent_day(agent_id, day, index, booked)
+        if applied.confirmed:
+            last = applied.confirmed[-1]
+            applied.apply({**last, "status": "pending"}, None)
+            applied.slots(prop["postcode"], NOW, interval, duration)
+            applied.apply(last, portfolio.properties_db[last["property_id"]])
+        candidates = {
+            "agent_day": agent_day.slots(prop["postcode"], NOW, interval, duration),
+            "agent_day_applied": applied.slots(prop["postcode"], NOW, interval, duration),
+        }
+        for name, slots in candidates.items():
+            if slots != expected:
+                mismatches.append({
+                    "engine": name, "property_id": prop["id"], "agent_id": agent_id,
+                    "date": day.isoformat(), "slot_interval": interval,
+                    "viewing_duration": duration, "booked_duration": booked,
+                })
+    return {"checked": samples, "mismatches": len(mismatches), "examples": mismatches[:5]}
+
+
+async def load_into(repo, portfolio: Portfolio) -> Dict[int, int]:
+    """Create the portfolio in storage; returns synthetic property id -> stored id."""
+    ids = {}
+    for pid, prop in portfolio.properties_db.items():
+        stored = await repo.create_property({
+            **{k: v for k, v in prop.items() if k != "id"}, "slug": f"bench-{pid}", "source": "benchmark",
+        })
+        ids[pid] = stored["id"]
+    for agent in range(1, portfolio.agents + 1):
+        covered = [ids[pid] for pid, a in portfolio.agent_of.items() if a == agent]
+        if agent == 1:
+            await repo.update_agent(DEFAULT_AGENT_ID, {"property_ids": covered})
+        else:
+            await repo.create_agent(DEFAULT_AGENCY_ID, {
+                "name": f"Agent {agent}", "email": f"agent{agent}@bench.invalid", "property_ids": covered,
+            })
+    agent_ids = [DEFAULT_AGENT_ID] + [a["id"] for a in await repo.list_agents(DEFAULT_AGENCY_ID) if a["id"] != DEFAULT_AGENT_ID]
+    for viewing in portfolio.viewings_db.values():
+        await repo.create_viewing({
+            **{k: v for k, v in viewing.items() if k != "id"},
+            "property_id": ids[viewing["property_id"]],
+            "agent_id": agent_ids[viewing["agent_id"] - 1],
+        })
+    for blockout in portfolio.blockouts:
+        await repo.create_blockout(DEFAULT_AGENCY_ID, {
+            **{k: v for k, v in blockout.items() if k != "id"},
+            "agent_id": agent_ids[blockout["agent_id"] - 1] if blockout["agent_id"] else None,
+        })
+    return ids
+
+
+def bench_routes(portfolio: Portfolio, min_time: float, database_url: Optional[str]) -> Dict[str, Dict]:
+    """Time the main routes through an in-process client, on a fresh app loaded with the portfolio."""
+    from fastapi.testclient import TestClient
+
+    if database_url:
+        os.environ["DATABASE_URL"] = database_url
+    else:
+        os.environ.pop("DATABASE_URL", None)
+    api = importlib.reload(importlib.import_module("main"))  # fresh storage and caches per tier
+    travel_time.travel_service.clear()
+
+    rng = random.Random(3)
+    results = {}
+    with TestClient(api.app) as client:
+        started = time.perf_counter()
+        ids = client.portal.call(load_into, api.repo, portfolio)
+        results["_load_seconds"] = round(time.perf_counter() - started, 2)
+
+        agent_id, day = portfolio.busiest_day()
+        busy_property = ids[portfolio.property_of(agent_id, rng)["id"]]
+        page = client.get("/api/viewings", params={"limit": 50}).json()
+        viewing_ids = [v["id"] for v in page]
+
+        def get(path: str, params: Optional[Dict] = None) -> Callable:
+            def call():
+                response = client.get(path, params=params)
+                if response.status_code != 200:
+                    raise RuntimeError(f"GET {path} returned {response.status_code}")
+            return call
+
+        def cold_slots():
+            # A different property and date each call, so the slot cache misses
+            pid = ids[rng.randint(1, len(ids))]
+            target = START_DATE + timedelta(days=rng.randrange(portfolio.days))
+            get(f"/api/properties/{pid}/available-slots", {"date": target.isoformat()})()
+
+        routes = {
+            "available_slots": cold_slots,
+            "available_slots_cached": get(f"/api/properties/{busy_property}/available-slots", {"date": day.isoformat()}),
+            "available_slots_range": get(f"/api/properties/{busy_property}/available-slots", {
+                "from": day.isoformat(), "to": (day + timedelta(days=RANGE_DAYS - 1)).isoformat(),
+            }),
+            "list_viewings_page": get("/api/viewings", {"limit": 100}),
+            "list_viewings_feasibility": get("/api/viewings", {"limit": 100, "include": "feasibility"}),
+            "viewing_feasibility": get(f"/api/viewings/{viewing_ids[0]}/feasibility") if viewing_ids else None,
+            "feasibility_batch": lambda: client.post("/api/viewings/feasibility:batch", json={"viewing_ids": viewing_ids}),
+            "day_route": get("/api/schedule/route", {"date": day.isoformat(), "agent_id": DEFAULT_AGENT_ID}),
+        }
+        for name, fn in routes.items():
+            if fn is not None:
+                results[name] = time_call(fn, min_time, max_runs=200)
+    return results
+
+
+def run_tier(name: str, min_time: float, samples: int, storage: str, database_url: Optional[str], routes: bool) -> Dict:
+    properties, viewings = TIERS[name]
+    started = time.perf_counter()
+    portfolio = Portfolio(properties, viewings)
+    build_seconds = round(time.perf_counter() - started, 2)
+    stages = bench_stages(portfolio, min_time)
+    stages.update(bench_listing(portfolio, min_time))
+    result = {
+        "tier": name,
+        "properties": properties,
+        "viewings": viewings,
+        "agents": portfolio.agents,
+        "days": portfolio.days,
+        "build_seconds": build_seconds,
+        "stages": stages,
+        "speedup": speedups(stages),
+        "differential": differential(portfolio, samples),
+    }
+    if routes:
+        with tempfile.TemporaryDirectory() as tmp:
+            if storage == "sqlite":
+                database_url = f"sqlite:///{os.path.join(tmp, 'benchmark.db')}"
+            result["routes"] = bench_routes(portfolio, min_time, database_url)
+    return result
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_tier(result: Dict, baseline: Optional[Dict]) -> None:
+    print(f"\n== {result['tier']}: {result['properties']} properties, {result['viewings']} viewings, "
+          f"{result['agents']} agents over {result['days']} days")
+    for section in ("stages", "routes"):
+        for name, timing in result.get(section, {}).items():
+            if name.startswith("_"):
+                continue
+            line = f"  {section[:-1]:>5} {name:<34} p50 {timing['p50_ms']:>10.3f} ms  p95 {timing['p95_ms']:>10.3f} ms"
+            before = (baseline or {}).get(section, {}).get(name)
+            if before:
+                line += f"  (baseline p50 {before['p50_ms']:.3f} ms)"
+            print(line)
+    print("  speed-up over slot_reference (p50): " + ", ".join(
+        f"{name} {speedup:.2f}x" for name, speedup in result["speedup"].items()
+    ))
+    diff = result["differential"]
+    print(f"  differential: {diff['mismatches']} mismatches in {diff['checked']} samples")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the scheduler engine and API on synthetic portfolios")
+    parser.add_argument("--tiers", nargs="+", choices=list(TIERS), default=["xs", "s", "m"])
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds spent timing each stage or route")
+    parser.add_argument("--samples", type=int, default=DIFFERENTIAL_SAMPLES, help="differential check samples per tier")
+    parser.add_argument("--no-routes", action="store_true", help="skip the API routes")
+    parser.add_argument("--storage", choices=["memory", "sqlite"], default="memory", help="storage for the routes")
+    parser.add_argument("--database-url", default=None, help="empty database for the routes instead (one tier only)")
+    parser.add_argument("--travel-model", choices=["haversine", "profile"], default="haversine")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", help="JSON from an earlier run to compare p50s against")
+    args = parser.parse_args()
+    if args.database_url and len(args.tiers) > 1:
+        parser.error("--database-url needs an empty database, so takes a single tier")
+
+    travel_time.set_travel_model(travel_time.create_travel_model(args.travel_model))
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {tier["tier"]: tier for tier in json.load(f)["tiers"]}
+
+    results = {
+        "meta": {
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "travel_model": travel_time.travel_model.name,
+            "storage": "database_url" if args.database_url else args.storage,
+            "min_time": args.min_time,
+        },
+        "tiers": [],
+    }
+    for tier in args.tiers:
+        result = run_tier(tier, args.min_time, args.samples, args.storage, args.database_url, not args.no_routes)
+        results["tiers"].append(result)
+        print_tier(result, baseline.get(tier))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote {args.output}")
+    if any(tier["differential"]["mismatches"] for tier in results["tiers"]):
+        print("❌ optimised slots differ from slot_reference")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""
+Property geocoding off the event loop.
+
+Postcode lookups (the postcode index, then the built-in tables) are
+synchronous, and against a large index each one can wait on disk, so routes
+hand them to a small thread pool rather than running them inline.
+geocode_postcodes() resolves a batch as one pool task per GEOCODE_CHUNK
+distinct postcodes, so an import of thousands of rows pays for the thread
+hop a handful of times, not once per row.
+
+Each result is the property's latitude, longitude and geocode_status:
+    done      the postcode was found (itself, or its sector or district)
+    fallback  it wasn't; the coordinates are the agency's base postcode or central London
+Properties saved before their coordinates are known are "pending".
+"""
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+try:
+    from . import travel_time
+except ImportError:
+    import travel_time
+
+GEOCODE_WORKERS = int(os.getenv("GEOCODE_WORKERS", "4"))
+GEOCODE_CHUNK = 256  # distinct postcodes per pool task
+
+PENDING = "pending"
+DONE = "done"
+FALLBACK = "fallback"
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=GEOCODE_WORKERS, thread_name_prefix="geocode")
+    return _executor
+
+
+def geocode_postcode(postcode: str, base_postcode: Optional[str] = None) -> Dict:
+    """Property fields (latitude, longitude, geocode_status) for a postcode. Blocking."""
+    coords = travel_time.resolve_postcode_coords(travel_time.normalise_postcode(postcode)) if postcode else None
+    status = DONE
+    if coords is None:
+        coords = travel_time.geocode_property("", "", base_postcode)
+        status = FALLBACK
+    return {"latitude": coords[0], "longitude": coords[1], "geocode_status": status}
+
+
+def _geocode_chunk(postcodes: List[str], base_postcode: Optional[str]) -> List[Dict]:
+    return [geocode_postcode(postcode, base_postcode) for postcode in postcodes]
+
+
+async def geocode_postcodes(postcodes: Iterable[str], base_postcode: Optional[str] = None) -> Dict[str, Dict]:
+    """geocode_postcode() for each distinct postcode, on the worker pool. Keyed by postcode."""
+    distinct = list(dict.fromkeys(postcodes))
+    chunks = [distinct[i:i + GEOCODE_CHUNK] for i in range(0, len(distinct), GEOCODE_CHUNK)]
+    loop = asyncio.get_running_loop()
+    results = await asyncio.gather(*(
+        loop.run_in_executor(_pool(), _geocode_chunk, chunk, base_postcode) for chunk in chunks
+    ))
+    return {
+        postcode: fields
+        for chunk, chunk_fields in zip(chunks, results)
+        for postcode, fields in zip(chunk, chunk_fields)
+    }
+
+
+def shutdown() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
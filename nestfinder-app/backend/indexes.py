@@ -0,0 +1,270 @@
+"""
+In-memory indexes over viewings and agents' days, built by the scheduler
+and the memory repository.
+
+ViewingIndex buckets viewings by (agent_id, date, status) so the scheduler
+can fetch one agent's day without scanning every viewing ever booked.
+DayTimeline keeps one such day sorted as viewings come and go.
+ViewingColumns is a day's viewings reduced to int32 arrays for the
+scheduler's per-slot loops. DayCalendar is an
+agent's day as minute bitsets, for finding free starts of any length.
+"""
+
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+BucketKey = Tuple[Optional[int], Optional[str], Optional[str]]
+SortKey = Tuple[int, int]
+
+MINUTES_PER_DAY = 1440
+DAY_BITS = (1 << MINUTES_PER_DAY) - 1
+
+
+def viewing_date(viewing: Dict) -> Optional[str]:
+    """
+    Date (YYYY-MM-DD) a viewing takes place on.
+    Viewings booked without a date are treated as being for the day they were created.
+    """
+    if viewing.get("requested_date"):
+        return viewing["requested_date"]
+    created_at = viewing.get("created_at")
+    return created_at[:10] if created_at else None
+
+
+def _viewing_start(viewing: Dict) -> int:
+    """Start time in minutes since midnight (confirmed time wins over requested)."""
+    viewing_time = viewing.get("confirmed_time") or viewing.get("requested_time") or "00:00"
+    hours, minutes = viewing_time.split(':')[:2]
+    return int(hours) * 60 + int(minutes)
+
+
+class ViewingIndex:
+    """
+    Viewings keyed by (agent_id, date, status), each bucket sorted by start time.
+
+    Holds references to the viewing dicts themselves, so callers must call
+    update() after changing a viewing's agent, date, status or time.
+    """
+
+    def __init__(self):
+        # bucket key -> (sorted (start, id) keys, viewings in the same order)
+        self._buckets: Dict[BucketKey, Tuple[List[SortKey], List[Dict]]] = {}
+        # viewing id -> where it currently lives
+        self._locations: Dict[int, Tuple[BucketKey, SortKey]] = {}
+
+    @staticmethod
+    def _key(viewing: Dict) -> Tuple[BucketKey, SortKey]:
+        bucket_key = (viewing.get("agent_id"), viewing_date(viewing), viewing.get("status"))
+        return bucket_key, (_viewing_start(viewing), viewing["id"])
+
+    def add(self, viewing: Dict) -> None:
+        """Index a new viewing."""
+        bucket_key, sort_key = self._key(viewing)
+        keys, records = self._buckets.setdefault(bucket_key, ([], []))
+        pos = bisect_left(keys, sort_key)
+        keys.insert(pos, sort_key)
+        records.insert(pos, viewing)
+        self._locations[viewing["id"]] = (bucket_key, sort_key)
+
+    def remove(self, viewing_id: int) -> None:
+        """Drop a viewing from the index (no-op if it isn't indexed)."""
+        location = self._locations.pop(viewing_id, None)
+        if location is None:
+            return
+        bucket_key, sort_key = location
+        keys, records = self._buckets[bucket_key]
+        pos = bisect_left(keys, sort_key)
+        del keys[pos]
+        del records[pos]
+        if not keys:
+            del self._buckets[bucket_key]
+
+    def update(self, viewing: Dict) -> None:
+        """Re-index a viewing after its agent, date, status or time changed."""
+        self.remove(viewing["id"])
+        self.add(viewing)
+
+    def rebuild(self, viewings: List[Dict]) -> None:
+        """Replace the index contents with the given viewings."""
+        self._buckets.clear()
+        self._locations.clear()
+        for viewing in viewings:
+            self.add(viewing)
+
+    def get(self, agent_id: int, date_str: str, status: str) -> List[Dict]:
+        """Viewings for one agent, date and status, sorted by start time."""
+        bucket = self._buckets.get((agent_id, date_str, status))
+        return list(bucket[1]) if bucket else []
+
+
+class DayTimeline:
+    """
+    Timed viewings for one agent and date, sorted by start time (then id).
+
+    Insert and remove locate their position by bisection, so a day can be
+    kept current as bookings change rather than re-sorted for every check.
+    Viewings without a time are ignored. starts and viewings are parallel lists in
+    start order; treat them as read-only.
+    """
+
+    def __init__(self, viewings: Iterable[Dict] = ()):
+        self.starts: List[int] = []
+        self.viewings: List[Dict] = []
+        self._keys: List[SortKey] = []
+        self._keys_by_id: Dict[int, SortKey] = {}
+        for viewing in viewings:
+            self.insert(viewing)
+
+    def __len__(self) -> int:
+        return len(self.viewings)
+
+    def insert(self, viewing: Dict) -> None:
+        """Add a viewing, replacing any earlier version of it."""
+        self.remove(viewing["id"])
+        if not (viewing.get("confirmed_time") or viewing.get("requested_time")):
+            return
+        key = (_viewing_start(viewing), viewing["id"])
+        pos = bisect_left(self._keys, key)
+        self._keys.insert(pos, key)
+        self.starts.insert(pos, key[0])
+        self.viewings.insert(pos, viewing)
+        self._keys_by_id[viewing["id"]] = key
+
+    def remove(self, viewing_id: int) -> Optional[Dict]:
+        """Drop a viewing; returns it, or None if it wasn't here."""
+        key = self._keys_by_id.pop(viewing_id, None)
+        if key is None:
+            return None
+        pos = bisect_left(self._keys, key)
+        del self._keys[pos]
+        del self.starts[pos]
+        return self.viewings.pop(pos)
+
+
+class ViewingColumns:
+    """
+    A day's timed viewings as parallel int32 arrays sorted by start time
+    (stable, so viewings sharing a start keep their order): start minutes,
+    durations, and each viewing's index into postcode_keys, the distinct
+    postcodes of their properties (-1 where the property is missing or has
+    no postcode). group_first and group_last index the first and last
+    viewing of each run sharing a start time.
+
+    Built once per day and request so slot generation compares integers
+    instead of re-parsing times and looking properties up per slot, and
+    needs only one travel lookup per distinct postcode.
+    """
+
+    __slots__ = ("starts", "durations", "postcodes", "postcode_keys", "group_first", "group_last")
+
+    def __init__(self, viewings: Iterable[Dict], properties_db: Dict, duration: int = 20):
+        timed = sorted(
+            (v for v in viewings if v.get("confirmed_time") or v.get("requested_time")),
+            key=_viewing_start
+        )
+        self.postcode_keys: List[str] = []
+        key_index: Dict[str, int] = {}
+        postcodes = []
+        for viewing in timed:
+            prop = properties_db.get(viewing.get("property_id"))
+            postcode = prop.get("postcode") if prop else None
+            if postcode and postcode not in key_index:
+                key_index[postcode] = len(self.postcode_keys)
+                self.postcode_keys.append(postcode)
+            postcodes.append(key_index[postcode] if postcode else -1)
+        self.starts = np.array([_viewing_start(v) for v in timed], dtype=np.int32)
+        self.durations = np.full(len(timed), duration, dtype=np.int32)
+        self.postcodes = np.array(postcodes, dtype=np.int32)
+        new_group = np.ones(len(timed), dtype=bool)
+        new_group[1:] = self.starts[1:] != self.starts[:-1]
+        self.group_first = np.flatnonzero(new_group)
+        self.group_last = np.append(self.group_first[1:], len(timed)) - 1
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+
+# Day bitsets: a Python int with bit m set for minute m of the day
+
+def minute_bits(start: int, end: int) -> int:
+    """Bitset of minutes [start, end), clipped to the day."""
+    if start < 0:
+        start = 0
+    if end > MINUTES_PER_DAY:
+        end = MINUTES_PER_DAY
+    return (DAY_BITS >> (MINUTES_PER_DAY - end + start)) << start if start < end else 0
+
+
+def run_starts(free: int, length: int) -> int:
+    """
+    Bits t of free where t..t+length-1 are all set, i.e. where a run of at
+    least length free minutes starts. Doubles the run checked each step, so
+    it takes log2(length) shift-ands rather than length.
+    """
+    checked = 1
+    while checked < length:
+        step = min(checked, length - checked)
+        free &= free >> step
+        checked += step
+    return free
+
+
+def bits_at(bits: int, minutes: np.ndarray) -> np.ndarray:
+    """The given minutes (an int array) whose bit is set in a day bitset."""
+    raw = np.frombuffer(bits.to_bytes(MINUTES_PER_DAY // 8, "little"), dtype=np.uint8)
+    return minutes[np.unpackbits(raw, bitorder="little")[minutes].view(bool)]
+
+
+def bit_intervals(bits: int) -> List[Tuple[int, int]]:
+    """Runs of set minutes as sorted, non-touching half-open (start, end) intervals."""
+    intervals = []
+    while bits:
+        start = (bits & -bits).bit_length() - 1
+        run = bits >> start
+        length = (~run & (run + 1)).bit_length() - 1  # trailing ones
+        intervals.append((start, start + length))
+        bits ^= ((1 << length) - 1) << start
+    return intervals
+
+
+class DayCalendar:
+    """
+    One agent's day as two minute bitsets: blocked, the minutes blockouts
+    take plus travel_buffer before each (a viewing has to be over and the
+    agent on their way by then), and booked, each confirmed viewing with
+    travel_buffer either side. A viewing can start at minute t when none of
+    its minutes are in either, so fits(duration) finds every such start for
+    the whole day at once, for any duration and whatever grid slots are
+    then read off it.
+    """
+
+    __slots__ = ("blocked", "booked", "travel_buffer", "_fits")
+
+    def __init__(self, travel_buffer: int = 10):
+        self.blocked = 0
+        self.booked = 0
+        self.travel_buffer = travel_buffer
+        self._fits: Dict[int, int] = {}
+
+    def block(self, start: int, end: int) -> None:
+        """Take minutes [start, end) out, as for a timed blockout."""
+        self.blocked |= minute_bits(start - self.travel_buffer, end)
+        self._fits.clear()
+
+    def block_day(self) -> None:
+        self.blocked = DAY_BITS
+        self._fits.clear()
+
+    def book(self, start: int, duration: int) -> None:
+        """Add a confirmed viewing of duration minutes starting at start."""
+        self.booked |= minute_bits(start - self.travel_buffer, start + duration + self.travel_buffer)
+        self._fits.clear()
+
+    def fits(self, duration: int) -> int:
+        """Bitset of the minutes a viewing of duration minutes can start at."""
+        starts = self._fits.get(duration)
+        if starts is None:
+            starts = self._fits[duration] = run_starts(DAY_BITS & ~(self.blocked | self.booked), duration)
+        return starts
@@ -0,0 +1,190 @@
+"""
+Load test for running the API under several uvicorn workers.
+
+For each worker count, starts `uvicorn main:app --workers N` against a fresh
+database, seeds viewing requests, then:
+1. Race: every client tries to confirm one of several viewings booked for the
+   same agent, day and time at once. Exactly one confirmation must succeed.
+2. Throughput: client processes hammer available-slots and the viewings list
+   (with feasibility) for a fixed time and report requests/second.
+
+Usage:
+    python loadtest.py --workers 1 2 4 --duration 10 --clients 16
+    python loadtest.py --database-url postgresql://... (schema.sql applied, empty tables)
+
+Defaults to a new SQLite file per run (in-memory storage can't be shared by workers).
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from multiprocessing import Pool
+from typing import Dict, List, Optional, Tuple
+
+HOST = "127.0.0.1"
+SEED_VIEWINGS = 200
+RACE_VIEWINGS = 20
+SLOT_DAYS = 14
+
+
+def request(conn: http.client.HTTPConnection, method: str, path: str, body: Optional[Dict] = None) -> Tuple[int, bytes]:
+    headers = {"Content-Type": "application/json"} if body is not None else {}
+    conn.request(method, path, json.dumps(body) if body is not None else None, headers)
+    response = conn.getresponse()
+    return response.status, response.read()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers: int, port: int, database_url: str) -> subprocess.Popen:
+    env = {**os.environ, "DATABASE_URL": database_url, "WEB_CONCURRENCY": str(workers)}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", HOST, "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection(HOST, port, timeout=2)
+            if request(conn, "GET", "/api/properties")[0] == 200:
+                return server
+        except OSError:
+            pass
+        time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("server did not start")
+
+
+def new_viewing(property_id: int, day: date, requested_time: str) -> Dict:
+    return {
+        "tenant_name": "Load Test",
+        "tenant_email": "load@test.invalid",
+        "tenant_phone": "0",
+        "property_id": property_id,
+        "requested_time": requested_time,
+        "requested_date": day.isoformat(),
+    }
+
+
+def seed(port: int, property_ids: List[int]) -> None:
+    """Pending requests spread over the next fortnight, about a third of them confirmed."""
+    conn = http.client.HTTPConnection(HOST, port)
+    rng = random.Random(1)
+    for _ in range(SEED_VIEWINGS):
+        day = date.today() + timedelta(days=rng.randint(1, SLOT_DAYS))
+        slot = f"{rng.randint(9, 17):02d}:{rng.choice(['00', '30'])}"
+        status, body = request(conn, "POST", "/api/viewings", new_viewing(rng.choice(property_ids), day, slot))
+        if status == 200 and rng.random() < 0.33:
+            request(conn, "PATCH", f"/api/viewings/{json.loads(body)['id']}", {"status": "confirmed"})
+
+
+def confirm(args: Tuple[int, int]) -> int:
+    port, viewing_id = args
+    conn = http.client.HTTPConnection(HOST, port)
+    return request(conn, "PATCH", f"/api/viewings/{viewing_id}", {"status": "confirmed"})[0]
+
+
+def race(port: int, property_ids: List[int], clients: int, day: date) -> Dict[int, int]:
+    """Confirm RACE_VIEWINGS same-time requests on day concurrently; returns {status code: count}."""
+    conn = http.client.HTTPConnection(HOST, port)
+    viewing_ids = [
+        json.loads(request(conn, "POST", "/api/viewings", new_viewing(property_ids[i % len(property_ids)], day, "11:00"))[1])["id"]
+        for i in range(RACE_VIEWINGS)
+    ]
+    with Pool(min(clients, RACE_VIEWINGS)) as pool:
+        statuses = pool.map(confirm, [(port, viewing_id) for viewing_id in viewing_ids])
+    counts: Dict[int, int] = {}
+    for status in statuses:
+        counts[status] = counts.get(status, 0) + 1
+    return counts
+
+
+def client(args: Tuple[int, List[int], float, int]) -> List[float]:
+    """Issue requests until the deadline; returns per-request latencies in seconds."""
+    port, property_ids, deadline, seed_value = args
+    rng = random.Random(seed_value)
+    conn = http.client.HTTPConnection(HOST, port)
+    latencies = []
+    while time.time() < deadline:
+        if rng.random() < 0.8:
+            day = date.today() + timedelta(days=rng.randint(0, SLOT_DAYS))
+            path = f"/api/properties/{rng.choice(property_ids)}/available-slots?date={day.isoformat()}"
+        else:
+            path = "/api/viewings?include=feasibility"
+        started = time.perf_counter()
+        status, _ = request(conn, "GET", path)
+        if status != 200:
+            raise RuntimeError(f"GET {path} returned {status}")
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def run(workers: int, clients: int, duration: float, database_url: Optional[str], race_day: date) -> Dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        url = database_url or f"sqlite:///{os.path.join(tmp, 'loadtest.db')}"
+        port = free_port()
+        server = start_server(workers, port, url)
+        try:
+            conn = http.client.HTTPConnection(HOST, port)
+            property_ids = [p["id"] for p in json.loads(request(conn, "GET", "/api/properties")[1])]
+            seed(port, property_ids)
+            race_counts = race(port, property_ids, clients, race_day)
+
+            deadline = time.time() + duration
+            with Pool(clients) as pool:
+                results = pool.map(client, [(port, property_ids, deadline, i) for i in range(clients)])
+        finally:
+            server.terminate()
+            server.wait()
+
+    latencies = sorted(latency for result in results for latency in result)
+    return {
+        "workers": workers,
+        "requests": len(latencies),
+        "requests_per_second": round(len(latencies) / duration, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 2),
+        "race": race_counts,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Multi-worker load test for the NestFinder API")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=16, help="concurrent client processes")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load per worker count")
+    parser.add_argument("--database-url", default=None, help="defaults to a fresh SQLite file per run")
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'workers':>7} {'requests':>9} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8}  race (status: count)")
+    for i, workers in enumerate(args.workers):
+        # Past the seeded fortnight, and a different day per run in case the database is shared
+        race_day = date.today() + timedelta(days=SLOT_DAYS + 7 + i)
+        result = run(workers, args.clients, args.duration, args.database_url, race_day)
+        print(
+            f"{result['workers']:>7} {result['requests']:>9} {result['requests_per_second']:>8} "
+            f"{result['p50_ms']:>8} {result['p95_ms']:>8}  {result['race']}"
+        )
+        if result["race"].get(200) != 1:
+            print(f"❌ expected exactly one confirmation to win the race with {workers} workers")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
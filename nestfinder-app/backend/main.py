@@ -1,17 +1,70 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, ValidationError
 from typing import Optional, List
-from datetime import datetime, date
+from contextlib import asynccontextmanager
+from datetime import datetime, date, timedelta
+from functools import partial
+import base64
+import json
+import logging
+import os
 import re
 try:
+    from . import geocoding
+    from . import metrics
+    from . import profiling
+    from . import property_import
     from . import travel_time
     from . import scheduler_engine
+    from .slot_cache import SlotCache, TimelineCache, etag_matches
+    from .indexes import viewing_date
+    from .postcodes import parse_postcode, postcode_fields
+    from .storage import DEFAULT_AGENCY_ID, DEFAULT_AGENT_ID, ViewingConflict, create_repository
+    from .viewing_events import ViewingEventBroker, stream_viewing_events
 except ImportError:
+    import geocoding
+    import metrics
+    import profiling
+    import property_import
     import travel_time
     import scheduler_engine
+    from slot_cache import SlotCache, TimelineCache, etag_matches
+    from indexes import viewing_date
+    from postcodes import parse_postcode, postcode_fields
+    from storage import DEFAULT_AGENCY_ID, DEFAULT_AGENT_ID, ViewingConflict, create_repository
+    from viewing_events import ViewingEventBroker, stream_viewing_events
 
-app = FastAPI(title="NestFinder API", version="1.0.0")
+# Our own messages at LOG_LEVEL; other libraries' stay at warnings
+logging.basicConfig(format="%(levelname)s:     %(name)s: %(message)s")
+logger = logging.getLogger("nestfinder")
+logger.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Connect storage and seed demo properties if the database is empty; close both on shutdown."""
+    if not repo.shared and int(os.environ.get("WEB_CONCURRENCY", "1")) > 1:
+        logger.warning("In-memory storage is per-process; set DATABASE_URL to run multiple workers")
+    if os.environ.get("POSTCODE_INDEX"):
+        index = travel_time.load_postcode_index(os.environ["POSTCODE_INDEX"])
+        logger.info("Loaded postcode index with %d postcodes", len(index))
+    if os.environ.get("TRAVEL_MODEL") or os.environ.get("TRAVEL_ZONE_TABLE"):
+        model = travel_time.set_travel_model(travel_time.create_travel_model(
+            os.environ.get("TRAVEL_MODEL", "profile"), os.environ.get("TRAVEL_ZONE_TABLE")
+        ))
+        logger.info("Travel model: %s", model.name)
+    await repo.connect()
+    await seed_demo_properties()
+    await geocode_pending_properties(DEFAULT_AGENCY_ID)
+    await warm_travel_matrix(DEFAULT_AGENCY_ID)
+    try:
+        yield
+    finally:
+        await repo.close()
+        geocoding.shutdown()
+
+app = FastAPI(title="NestFinder API", version="1.0.0", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -20,43 +73,48 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Event-Seq", "X-Next-Cursor"],
 )
+# Request latency per route for GET /metrics; a pass-through unless METRICS_ENABLED is set
+app.add_middleware(metrics.MetricsMiddleware)
+# Sampling profiles of chosen requests (see profiling.py); not installed unless configured
+if profiling.enabled:
+    app.add_middleware(profiling.ProfilingMiddleware)
 
-# In-memory storage (replace with Supabase in production)
-# Using a single default agency for MVP
-DEFAULT_AGENCY_ID = 1
+# Storage backend: in-memory dicts unless DATABASE_URL points at SQLite or Postgres
+# (see storage.py). Using a single default agency for MVP, with any number of agents.
+repo = create_repository(os.environ.get("DATABASE_URL"))
 
-agencies_db = {
-    1: {
-        "id": 1,
-        "name": "My Agency",
-        "slug": "myagency",
-        "contact_email": "contact@agency.com",
-        "contact_phone": None,
-        "base_postcode": "W2 4DX",
-        "default_duration": 20,
-    }
-}
-properties_db = {}
-viewings_db = {}
-# Initialize default availability: All days enabled 09:00-18:00
-# Agents can disable days as needed in the Availability tab
-# day_of_week: 0=Monday, 1=Tuesday, ..., 6=Sunday
-availability_db = {
-    1: [
-        {"day_of_week": 0, "enabled": True, "start_time": "09:00", "end_time": "18:00"},  # Monday
-        {"day_of_week": 1, "enabled": True, "start_time": "09:00", "end_time": "18:00"},  # Tuesday
-        {"day_of_week": 2, "enabled": True, "start_time": "09:00", "end_time": "18:00"},  # Wednesday
-        {"day_of_week": 3, "enabled": True, "start_time": "09:00", "end_time": "18:00"},  # Thursday
-        {"day_of_week": 4, "enabled": True, "start_time": "09:00", "end_time": "18:00"},  # Friday
-        {"day_of_week": 5, "enabled": True, "start_time": "09:00", "end_time": "18:00"},  # Saturday
-        {"day_of_week": 6, "enabled": True, "start_time": "09:00", "end_time": "18:00"},  # Sunday
-    ]
-}
-# Blockouts: specific unavailable times/days
-# Format: {agency_id: [{"id": 1, "date": "2025-11-18", "start_time": "12:00", "end_time": "14:00", "full_day": False}, ...]}
-blockouts_db = {1: []}
-blockout_id_counter = 1
+# Longest from/to window accepted by the available-slots endpoint
+MAX_SLOT_RANGE_DAYS = 31
+# Largest page of GET /api/viewings
+MAX_VIEWINGS_PAGE = 500
+# Rows geocoded and inserted together by POST /api/properties/bulk
+BULK_IMPORT_BATCH = 500
+# Row errors listed in a bulk import's response (all are counted)
+MAX_REPORTED_IMPORT_ERRORS = 100
+
+# Generated slot lists; call invalidate_slots() on any write that can change them.
+# Versions are kept in storage so every worker sees the same invalidations.
+slot_cache = SlotCache(epoch=repo.cache_epoch)
+# Per-(agent, date) calendars the slot lists are built from, under the same versions
+timeline_cache = TimelineCache()
+# Wakes /api/viewings/events streams; call publish_viewing_event() after viewing writes
+event_broker = ViewingEventBroker(repo)
+
+
+def _lru_stats(cached) -> dict:
+    info = cached.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize}
+
+
+metrics.register_caches(lambda: {
+    "travel_times": travel_time.travel_service.stats(),
+    "slots": slot_cache.stats(),
+    "timelines": timeline_cache.stats(),
+    "postcode_coords": _lru_stats(travel_time.resolve_postcode_coords),
+    "postcode_parse": _lru_stats(parse_postcode),
+})
 
 # Pydantic models
 class AgencyUpdate(BaseModel):
@@ -66,6 +124,18 @@ class AgencyUpdate(BaseModel):
     base_postcode: str
     default_duration: int
 
+class AgentCreate(BaseModel):
+    name: str
+    email: str
+    base_postcode: Optional[str] = None  # defaults to the agency's
+    property_ids: List[int] = []  # empty: covers every property
+
+class AgentUpdate(BaseModel):
+    name: Optional[str] = None
+    email: Optional[str] = None
+    base_postcode: Optional[str] = None
+    property_ids: Optional[List[int]] = None
+
 class PropertyCreate(BaseModel):
     title: str
     area: str
@@ -95,6 +165,16 @@ class ViewingCreate(BaseModel):
     occupants: Optional[int] = None
     rent_budget: Optional[float] = None
     message: Optional[str] = None
+    agent_id: Optional[int] = None  # agent_id of the chosen slot; otherwise assigned
+
+class FeasibilityBatchRequest(BaseModel):
+    viewing_ids: Optional[List[int]] = None  # defaults to all pending viewings
+
+class AutoAssignRequest(BaseModel):
+    start_date: date
+    end_date: Optional[date] = None  # defaults to start_date
+    dry_run: bool = False  # plan only; don't confirm or suggest anything
+    agent_id: Optional[int] = None  # defaults to every agent
 
 class ViewingUpdate(BaseModel):
     status: str
@@ -114,6 +194,7 @@ class BlockoutCreate(BaseModel):
     start_time: Optional[str] = None  # HH:MM format, nullable if full_day
     end_time: Optional[str] = None    # HH:MM format, nullable if full_day
     full_day: bool = False
+    agent_id: Optional[int] = None  # only this agent; defaults to the whole agency
 
 # Helper functions
 def generate_slug(name: str) -> str:
@@ -122,18 +203,84 @@ def generate_slug(name: str) -> str:
     slug = slug.strip('-')
     return slug[:50] if len(slug) > 50 else slug
 
-def ensure_unique_slug(base_slug: str, existing_slugs: set) -> str:
-    """Ensure slug is unique by appending number if needed."""
+async def ensure_unique_slug(base_slug: str, exclude_id: Optional[int] = None) -> str:
+    """
+    Ensure slug is unique by appending number if needed. Each candidate is
+    an indexed lookup rather than a scan of every existing slug.
+    """
     slug = base_slug
     counter = 1
-    while slug in existing_slugs:
+    while await repo.property_slug_taken(slug, exclude_id):
         slug = f"{base_slug}-{counter}"
         counter += 1
     return slug
 
-def seed_demo_properties():
+def property_row(property_data: PropertyCreate, slug: str, source: str) -> dict:
+    """Columns for a new property; the postcode is stored canonical, with its outward code and sector."""
+    return {
+        "title": property_data.title,
+        "area": property_data.area,
+        "address": property_data.address,
+        **postcode_fields(property_data.postcode),
+        "rent": property_data.rent,
+        "public_link": property_data.public_link,
+        "status": property_data.status,
+        "slug": slug,
+        "agency_id": DEFAULT_AGENCY_ID,
+        "source": source,
+    }
+
+async def allocate_slugs(titles: List[str]) -> List[str]:
+    """
+    Unique slugs for a batch of new properties, numbered like
+    ensure_unique_slug's. Candidates are checked a whole batch per query;
+    a title repeated across the batch gets the next number each time.
+    """
+    bases = [generate_slug(title) for title in titles]
+    slugs: List[Optional[str]] = [None] * len(titles)
+    suffixes = {}  # base slug -> next number to try
+    waiting = list(range(len(titles)))
+    while waiting:
+        candidates = {}
+        for i in waiting:
+            suffix = suffixes.get(bases[i], 0)
+            suffixes[bases[i]] = suffix + 1
+            candidates[i] = f"{bases[i]}-{suffix}" if suffix else bases[i]
+        taken = await repo.taken_property_slugs(candidates.values())
+        for i, slug in candidates.items():
+            if slug not in taken:
+                slugs[i] = slug
+        waiting = [i for i in waiting if slugs[i] is None]
+    return slugs
+
+async def agency_base_postcode() -> Optional[str]:
+    agency = await repo.get_agency(DEFAULT_AGENCY_ID) or {}
+    return agency.get("base_postcode")
+
+async def geocoded_property_rows(properties: List[PropertyCreate], source: str) -> List[dict]:
+    """New property rows with slugs and coordinates, geocoded together on the worker pool."""
+    slugs = await allocate_slugs([p.title for p in properties])
+    rows = [property_row(p, slug, source) for p, slug in zip(properties, slugs)]
+    geocoded = await geocoding.geocode_postcodes([row["postcode"] for row in rows], await agency_base_postcode())
+    return [{**row, **geocoded[row["postcode"]]} for row in rows]
+
+async def geocode_in_background(property_id: int, postcode: str):
+    """Fill in a pending property's coordinates; runs after the response has been sent."""
+    fields = (await geocoding.geocode_postcodes([postcode], await agency_base_postcode()))[postcode]
+    await repo.set_property_geocode(property_id, postcode, fields)
+
+async def geocode_pending_properties(agency_id: int):
+    """Geocode properties left pending, e.g. by a restart before their background task ran."""
+    pending = [p for p in await repo.list_properties(agency_id) if p.get("geocode_status") == geocoding.PENDING]
+    if not pending:
+        return
+    geocoded = await geocoding.geocode_postcodes([p["postcode"] for p in pending], await agency_base_postcode())
+    for prop in pending:
+        await repo.set_property_geocode(prop["id"], prop["postcode"], geocoded[prop["postcode"]])
+
+async def seed_demo_properties():
     """Seed demo properties for presentation if database is empty."""
-    if len(properties_db) > 0:
+    if await repo.count_properties(DEFAULT_AGENCY_ID) > 0:
         return  # Don't seed if properties already exist
     
     demo_properties = [
@@ -220,54 +367,152 @@ def seed_demo_properties():
         },
     ]
     
-    agency = agencies_db.get(DEFAULT_AGENCY_ID, {})
-    base_postcode = agency.get("base_postcode", "W2 4DX")
+    rows = await geocoded_property_rows([PropertyCreate(**prop_data) for prop_data in demo_properties], "demo")
     
-    for idx, prop_data in enumerate(demo_properties, start=1):
-        # Generate unique slug
-        base_slug = generate_slug(prop_data["title"])
-        existing_slugs = {p.get("slug") for p in properties_db.values() if p.get("slug")}
-        slug = ensure_unique_slug(base_slug, existing_slugs)
-        
-        # Geocode property coordinates
-        latitude, longitude = travel_time.geocode_property(
-            prop_data["address"],
-            prop_data["postcode"],
-            base_postcode
-        )
-        
-        properties_db[idx] = {
-            "id": idx,
-            "title": prop_data["title"],
-            "area": prop_data["area"],
-            "address": prop_data["address"],
-            "postcode": prop_data["postcode"],
-            "rent": prop_data["rent"],
-            "public_link": prop_data["public_link"],
-            "status": prop_data["status"],
-            "slug": slug,
-            "latitude": latitude,
-            "longitude": longitude,
-            "agency_id": DEFAULT_AGENCY_ID,
-            "source": "demo",
-        }
+    # Workers start together; only one of them gets to seed
+    if await repo.seed_properties(DEFAULT_AGENCY_ID, rows):
+        logger.info("Seeded %d demo properties", len(demo_properties))
+
+async def invalidate_slots(agency_id: int, keys=None, update=None):
+    """
+    Make every worker's cached slots for an agency stale. When the change is
+    known to touch only some (agent_id, date) timelines, pass their keys and
+    an update(AgentDay) that applies it, so this worker patches them in
+    place instead of dropping every agent's timelines.
+    """
+    version = await repo.bump_slot_version(agency_id)
+    slot_cache.set_version(agency_id, version)
+    if update is None:
+        timeline_cache.set_version(agency_id, version)
+    else:
+        timeline_cache.patch(agency_id, version, keys, update)
+
+async def sync_slot_version(agency_id: int):
+    """Pick up invalidations made by other workers before using the slot or timeline caches."""
+    version = await repo.get_slot_version(agency_id)
+    slot_cache.set_version(agency_id, version)
+    timeline_cache.set_version(agency_id, version)
+
+async def publish_viewing_event(event_type: str, viewing: dict, property: Optional[dict] = None):
+    """
+    Record a viewing change for /api/viewings/events and wake its streams.
+    The viewing is sent as list_viewings returns it, so clients can upsert it.
+    """
+    if property is None:
+        property = await repo.get_property(viewing["property_id"]) or {}
+    agency_id = property.get("agency_id", DEFAULT_AGENCY_ID)
+    await repo.append_viewing_event(agency_id, f"viewing.{event_type}", {
+        **viewing,
+        "property_title": property.get("title", "Unknown"),
+        "property_postcode": property.get("postcode", ""),
+        "tenant_name": viewing.get("tenant_name", "Unknown"),
+    })
+    event_broker.notify(agency_id)
+
+async def warm_travel_matrix(agency_id: int):
+    """Precompute the agency's travel-time matrix from its property postcodes."""
+    properties = await repo.list_properties(agency_id)
+    travel_time.travel_service.precompute_matrix(agency_id, [p["postcode"] for p in properties])
+
+async def get_agency_property(property_id: int) -> dict:
+    """Fetch a property belonging to the current agency, or raise 404."""
+    property = await repo.get_property(property_id)
+    if not property or property.get("agency_id") != DEFAULT_AGENCY_ID:
+        raise HTTPException(status_code=404, detail="Property not found")
+    return property
+
+async def get_agency_agent(agent_id: int) -> dict:
+    """Fetch an agent belonging to the current agency, or raise 404."""
+    agent = await repo.get_agent(agent_id)
+    if not agent or agent.get("agency_id") != DEFAULT_AGENCY_ID:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    return agent
+
+async def get_agent_rules(agency_id: int, agent_id: int, template: Optional[List[dict]] = None) -> List[dict]:
+    """An agent's weekly rules: their own if they have any, otherwise the agency's."""
+    rules = await repo.get_availability(agency_id, agent_id)
+    if rules:
+        return rules
+    return template if template is not None else await repo.get_availability(agency_id)
+
+async def covering_agents(agency_id: int, property_id: int) -> List[dict]:
+    """Agents who can take viewings at a property, by id."""
+    return [
+        agent for agent in await repo.list_agents(agency_id)
+        if scheduler_engine.agent_covers_property(agent, property_id)
+    ]
+
+def agency_viewing_duration(agency: dict) -> int:
+    """Minutes every viewing of an agency lasts: its default_duration."""
+    return agency.get("default_duration") or travel_time.VIEWING_DURATION
+
+def confirm_check(agency: dict):
+    """storage's ConfirmCheck for an agency's viewings."""
+    return partial(scheduler_engine.confirmation_conflict, viewing_duration=agency_viewing_duration(agency))
+
+async def load_agent_days(agency_id: int, agents: List[dict], start_date: date, end_date: date) -> dict:
+    """
+    Each agent's scheduler_engine.AgentDay for every date in a window, keyed
+    (agent_id, date string). Served from timeline_cache where possible; an
+    agent missing any day has the whole window loaded with indexed queries
+    and cached. Call sync_slot_version first.
+    """
+    dates = [start_date + timedelta(days=n) for n in range((end_date - start_date).days + 1)]
+    agent_days = {}
+    missing = []
+    for agent in agents:
+        for day in dates:
+            agent_day = timeline_cache.get(agency_id, (agent["id"], str(day)))
+            if agent_day is None:
+                missing.append(agent)
+                break
+            agent_days[(agent["id"], str(day))] = agent_day
+    if not missing:
+        return agent_days
     
-    print(f"✅ Seeded {len(demo_properties)} demo properties")
+    start, end = str(start_date), str(end_date)
+    template = await repo.get_availability(agency_id)
+    blockouts = await repo.get_blockouts(agency_id, start, end)
+    agency = await repo.get_agency(agency_id) or {}
+    for agent in missing:
+        rules = await get_agent_rules(agency_id, agent["id"], template)
+        confirmed = await repo.get_confirmed_viewings(agent["id"], start, end)
+        properties_db = await repo.get_properties({v["property_id"] for v in confirmed})
+        confirmed_by_day = {}
+        for viewing in confirmed:
+            confirmed_by_day.setdefault(viewing_date(viewing), []).append(viewing)
+        agent_blockouts = scheduler_engine.blockouts_for_agent(blockouts, agent["id"])
+        for day in dates:
+            agent_day = scheduler_engine.AgentDay(
+                agent["id"],
+                day,
+                scheduler_engine.find_day_rule(rules, day.weekday()),
+                [b for b in agent_blockouts if b.get("date") == str(day)],
+                confirmed_by_day.get(str(day), []),
+                properties_db,
+                start_postcode=agent.get("base_postcode") or agency.get("base_postcode"),
+                viewing_duration=agency_viewing_duration(agency),
+                travel_buffer=10,
+                agency_id=agency_id
+            )
+            timeline_cache.put(agency_id, (agent["id"], str(day)), agent_day)
+            agent_days[(agent["id"], str(day))] = agent_day
+    return agent_days
 
 # Agency routes
 @app.get("/api/agency")
 async def get_agency():
-    return agencies_db.get(DEFAULT_AGENCY_ID, {
+    return await repo.get_agency(DEFAULT_AGENCY_ID) or {
         "id": 1,
         "name": "My Agency",
         "slug": "myagency",
-    })
+    }
 
 @app.put("/api/agency")
 async def update_agency(agency_data: AgencyUpdate):
     slug = generate_slug(agency_data.agency_name)
     
-    agencies_db[DEFAULT_AGENCY_ID] = {
+    agency = await repo.save_agency({
         "id": DEFAULT_AGENCY_ID,
         "name": agency_data.agency_name,
         "slug": slug,
@@ -275,260 +520,517 @@ async def update_agency(agency_data: AgencyUpdate):
         "contact_phone": agency_data.contact_phone,
         "base_postcode": agency_data.base_postcode,
         "default_duration": agency_data.default_duration,
-    }
+    })
+    # Agents' days are built with the agency's viewing length and base postcode
+    await invalidate_slots(DEFAULT_AGENCY_ID)
+    return agency
+
+# Agents routes
+@app.get("/api/agents")
+async def list_agents():
+    """Agents in the current agency, with the property_ids each covers (empty means all)."""
+    return await repo.list_agents(DEFAULT_AGENCY_ID)
+
+async def check_agency_properties(property_ids: List[int]):
+    properties = await repo.get_properties(property_ids)
+    for property_id in property_ids:
+        if properties.get(property_id, {}).get("agency_id") != DEFAULT_AGENCY_ID:
+            raise HTTPException(status_code=400, detail=f"Property {property_id} not found")
+
+@app.post("/api/agents")
+async def create_agent(agent_data: AgentCreate):
+    """Add an agent. They follow the agency's weekly availability until given their own."""
+    await check_agency_properties(agent_data.property_ids)
+    try:
+        # Pydantic v2
+        data = agent_data.model_dump()
+    except AttributeError:
+        # Pydantic v1 fallback
+        data = agent_data.dict()
+    agent = await repo.create_agent(DEFAULT_AGENCY_ID, data)
+    await invalidate_slots(DEFAULT_AGENCY_ID)
+    return agent
+
+@app.put("/api/agents/{agent_id}")
+async def update_agent(agent_id: int, agent_data: AgentUpdate):
+    """Update an agent's details, base postcode or the properties they cover."""
+    await get_agency_agent(agent_id)
+    fields = {}
+    if agent_data.name is not None:
+        fields["name"] = agent_data.name
+    if agent_data.email is not None:
+        fields["email"] = agent_data.email
+    if agent_data.base_postcode is not None:
+        fields["base_postcode"] = agent_data.base_postcode
+    if agent_data.property_ids is not None:
+        await check_agency_properties(agent_data.property_ids)
+        fields["property_ids"] = agent_data.property_ids
     
-    return agencies_db[DEFAULT_AGENCY_ID]
+    agent = await repo.update_agent(agent_id, fields)
+    if "base_postcode" in fields or "property_ids" in fields:
+        # Changes who gets which slots and where their day starts
+        await invalidate_slots(DEFAULT_AGENCY_ID)
+    return agent
 
 # Properties routes
 @app.get("/api/properties")
 async def list_properties():
-    agency_properties = [
-        prop for prop in properties_db.values()
-        if prop["agency_id"] == DEFAULT_AGENCY_ID
-    ]
-    return agency_properties
+    return await repo.list_properties(DEFAULT_AGENCY_ID)
 
 @app.post("/api/properties")
-async def create_property(property_data: PropertyCreate):
-    property_id = len(properties_db) + 1
-    
+async def create_property(property_data: PropertyCreate, background_tasks: BackgroundTasks):
+    """
+    Create a property. It is returned straight away with geocode_status
+    "pending" and no coordinates; they are filled in in the background.
+    """
     # Generate unique slug
     base_slug = generate_slug(property_data.title)
-    existing_slugs = {p.get("slug") for p in properties_db.values() if p.get("slug")}
-    slug = ensure_unique_slug(base_slug, existing_slugs)
-    
-    # Geocode property coordinates
-    agency = agencies_db.get(DEFAULT_AGENCY_ID, {})
-    base_postcode = agency.get("base_postcode")
-    latitude, longitude = travel_time.geocode_property(
-        property_data.address,
-        property_data.postcode,
-        base_postcode
-    )
+    slug = await ensure_unique_slug(base_slug)
     
-    properties_db[property_id] = {
-        "id": property_id,
-        "title": property_data.title,
-        "area": property_data.area,
-        "address": property_data.address,
-        "postcode": property_data.postcode,
-        "rent": property_data.rent,
-        "public_link": property_data.public_link,
-        "status": property_data.status,
-        "slug": slug,
-        "latitude": latitude,
-        "longitude": longitude,
-        "agency_id": DEFAULT_AGENCY_ID,
-        "source": "manual",
+    property = await repo.create_property({
+        **property_row(property_data, slug, "manual"),
+        "latitude": None,
+        "longitude": None,
+        "geocode_status": geocoding.PENDING,
+    })
+    travel_time.travel_service.precompute_matrix(DEFAULT_AGENCY_ID, [property["postcode"]])
+    background_tasks.add_task(geocode_in_background, property["id"], property["postcode"])
+    
+    return property
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in error.errors())
+
+def _parse_property(record: dict) -> PropertyCreate:
+    """PropertyCreate from one uploaded record; raises ValidationError."""
+    try:
+        # Pydantic v2
+        return PropertyCreate.model_validate(record)
+    except AttributeError:
+        # Pydantic v1 fallback
+        return PropertyCreate.parse_obj(record)
+
+@app.post("/api/properties/bulk")
+async def bulk_import_properties(request: Request):
+    """
+    Import many properties from a CSV body (Content-Type: text/csv, a header
+    row of PropertyCreate fields) or NDJSON (application/x-ndjson, one
+    object per line), read as it streams in. Rows with the postcode and
+    address of an existing property or an earlier row are skipped as
+    duplicates; the rest are geocoded on the worker pool and inserted
+    BULK_IMPORT_BATCH at a time. Invalid rows are skipped and reported by
+    row number.
+    """
+    upload = property_import.upload_format(request.headers.get("content-type", ""))
+    if upload is None:
+        raise HTTPException(status_code=415, detail="Send text/csv or application/x-ndjson")
+    
+    seen = {
+        property_import.dedupe_key(p["address"], p["postcode"])
+        for p in await repo.list_properties(DEFAULT_AGENCY_ID)
     }
+    created = []
+    duplicates = 0
+    errors = []
+    batch: List[PropertyCreate] = []
+    
+    async def insert_batch():
+        rows = await geocoded_property_rows(batch, "import")
+        created.extend(await repo.create_properties(rows))
+        travel_time.travel_service.precompute_matrix(DEFAULT_AGENCY_ID, [row["postcode"] for row in rows])
+        batch.clear()
     
-    return properties_db[property_id]
+    try:
+        async for row_number, record in property_import.read_records(request.stream(), upload):
+            if isinstance(record, str):
+                errors.append({"row": row_number, "detail": record})
+                continue
+            try:
+                property_data = _parse_property(record)
+            except ValidationError as e:
+                errors.append({"row": row_number, "detail": _validation_message(e)})
+                continue
+            key = property_import.dedupe_key(property_data.address, property_data.postcode)
+            if key in seen:
+                duplicates += 1
+                continue
+            seen.add(key)
+            batch.append(property_data)
+            if len(batch) >= BULK_IMPORT_BATCH:
+                await insert_batch()
+    except property_import.MalformedUpload as e:
+        raise HTTPException(
+            status_code=400, detail=f"{e}; {len(created)} properties were imported before it"
+        )
+    if batch:
+        await insert_batch()
+    
+    return {
+        "created": len(created),
+        "duplicates": duplicates,
+        "invalid": len(errors),
+        "errors": errors[:MAX_REPORTED_IMPORT_ERRORS],
+        "property_ids": [p["id"] for p in created],
+        "fallback_geocoded": sum(p.get("geocode_status") == geocoding.FALLBACK for p in created),
+    }
 
 @app.get("/api/properties/by-id/{property_id}")
 async def get_property_by_id(property_id: int):
     """Get property by ID for editing."""
-    property = properties_db.get(property_id)
-    if not property or property.get("agency_id") != DEFAULT_AGENCY_ID:
-        raise HTTPException(status_code=404, detail="Property not found")
-    return property
+    return await get_agency_property(property_id)
 
 @app.get("/api/properties/{slug}")
 async def get_property_by_slug(slug: str):
     """Get property by slug for tenant booking form."""
-    for prop in properties_db.values():
-        if prop.get("slug") == slug and prop.get("agency_id") == DEFAULT_AGENCY_ID:
-            return prop
-    raise HTTPException(status_code=404, detail="Property not found")
+    prop = await repo.get_property_by_slug(DEFAULT_AGENCY_ID, slug)
+    if not prop:
+        raise HTTPException(status_code=404, detail="Property not found")
+    return prop
 
 @app.put("/api/properties/{property_id}")
-async def update_property(property_id: int, property_data: PropertyUpdate):
-    """Update a property."""
-    property = properties_db.get(property_id)
-    if not property or property.get("agency_id") != DEFAULT_AGENCY_ID:
-        raise HTTPException(status_code=404, detail="Property not found")
+async def update_property(property_id: int, property_data: PropertyUpdate, background_tasks: BackgroundTasks):
+    """Update a property. A new postcode is geocoded in the background, as on create."""
+    property = await get_agency_property(property_id)
     
     # Update fields if provided
+    fields = {}
     if property_data.title is not None:
-        property["title"] = property_data.title
+        fields["title"] = property_data.title
         # Regenerate slug if title changed
         base_slug = generate_slug(property_data.title)
-        existing_slugs = {p.get("slug") for p in properties_db.values() if p.get("slug") and p.get("id") != property_id}
-        property["slug"] = ensure_unique_slug(base_slug, existing_slugs)
+        fields["slug"] = await ensure_unique_slug(base_slug, exclude_id=property_id)
     
     if property_data.area is not None:
-        property["area"] = property_data.area
+        fields["area"] = property_data.area
     if property_data.address is not None:
-        property["address"] = property_data.address
+        fields["address"] = property_data.address
     if property_data.postcode is not None:
-        property["postcode"] = property_data.postcode
-        # Re-geocode if postcode changed
-        agency = agencies_db.get(DEFAULT_AGENCY_ID, {})
-        base_postcode = agency.get("base_postcode")
-        latitude, longitude = travel_time.geocode_property(
-            property.get("address", ""),
-            property_data.postcode,
-            base_postcode
-        )
-        property["latitude"] = latitude
-        property["longitude"] = longitude
+        fields.update(postcode_fields(property_data.postcode))
+        # Re-geocode in the background; pending until then
+        fields["latitude"] = None
+        fields["longitude"] = None
+        fields["geocode_status"] = geocoding.PENDING
     if property_data.rent is not None:
-        property["rent"] = property_data.rent
+        fields["rent"] = property_data.rent
     if property_data.public_link is not None:
-        property["public_link"] = property_data.public_link
+        fields["public_link"] = property_data.public_link
     if property_data.status is not None:
-        property["status"] = property_data.status
+        fields["status"] = property_data.status
+    
+    property = await repo.update_property(property_id, fields)
+    if property_data.postcode is not None:
+        background_tasks.add_task(geocode_in_background, property_id, property["postcode"])
+        travel_time.travel_service.precompute_matrix(DEFAULT_AGENCY_ID, [property["postcode"]])
+        # Travel times to and from this property change with its postcode
+        await invalidate_slots(DEFAULT_AGENCY_ID)
     
     return property
 
+def parse_date_param(value: str) -> date:
+    """Parse a YYYY-MM-DD query parameter, raising 400 if it is malformed."""
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+
 @app.get("/api/properties/{property_id}/available-slots")
-async def get_available_slots(property_id: int, date: Optional[str] = None):
+async def get_available_slots(
+    request: Request,
+    property_id: int,
+    date: Optional[str] = None,
+    from_date: Optional[str] = Query(None, alias="from"),
+    to_date: Optional[str] = Query(None, alias="to"),
+    interval: int = Query(scheduler_engine.SLOT_INTERVAL, ge=5, le=240),
+    duration: Optional[int] = Query(None, ge=5, le=240)
+):
     """
     Get available time slots for a property with all constraints applied.
+    Slots are the union over every agent covering the property, each one
+    assigned to the agent it adds least travel for. Results are cached until
+    the agency's slots change and carry an ETag; a matching If-None-Match
+    gets a 304.
     
     Query params:
     - date: Optional date string (YYYY-MM-DD). Defaults to today.
+    - from, to: Optional date range (YYYY-MM-DD, inclusive, up to
+      MAX_SLOT_RANGE_DAYS days) instead of a single date.
+    - interval: Minutes between slot starts (default 30), on the clock
+      (every :00, :15, ... for 15).
+    - duration: Length of the viewing in minutes (default the agency's
+      default_duration, which confirmed viewings are booked for).
     
-    Returns slots with status (ok/tight) and travel_minutes:
+    Returns slots with status (ok/tight), travel_minutes and agent_id:
     {
         "slots": [
-            {"time": "14:00", "status": "ok"},
-            {"time": "15:00", "status": "tight", "travel_minutes": 22}
+            {"time": "14:00", "status": "ok", "agent_id": 1},
+            {"time": "15:00", "status": "tight", "travel_minutes": 22, "agent_id": 2}
         ]
     }
+    or, for a range, NDJSON (application/x-ndjson) with a line per day,
+    each sent as soon as it is worked out:
+    {"date": "2025-11-18", "slots": [...]}
+    {"date": "2025-11-19", "slots": [...]}
     """
-    property = properties_db.get(property_id)
-    if not property or property.get("agency_id") != DEFAULT_AGENCY_ID:
-        raise HTTPException(status_code=404, detail="Property not found")
+    property = await get_agency_property(property_id)
     
-    # Parse date (default to today)
-    if date:
-        try:
-            target_date = datetime.strptime(date, "%Y-%m-%d").date()
-        except ValueError:
-            raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
-    else:
-        target_date = datetime.now().date()
-    
-    agent_id = 1  # Default agent for MVP
     property_postcode = property.get("postcode")
+    await sync_slot_version(DEFAULT_AGENCY_ID)
     
-    # Use scheduler engine to generate slots with all constraints
-    slots = scheduler_engine.generate_slots(
-        agency_id=DEFAULT_AGENCY_ID,
-        property_id=property_id,
-        property_postcode=property_postcode,
-        target_date=target_date,
-        availability_db=availability_db,
-        blockouts_db=blockouts_db,
-        viewings_db=viewings_db,
-        properties_db=properties_db,
-        agent_id=agent_id,
-        viewing_duration=20,  # Default viewing duration
-        travel_buffer=10       # Travel buffer in minutes
-    )
-    
-    return {"slots": slots}
-
-@app.get("/api/viewings/{viewing_id}/feasibility")
-async def get_viewing_feasibility(viewing_id: int):
-    """Get feasibility status for a viewing request."""
-    viewing = viewings_db.get(viewing_id)
-    if not viewing:
-        raise HTTPException(status_code=404, detail="Viewing not found")
+    if from_date or to_date:
+        if not (from_date and to_date):
+            raise HTTPException(status_code=400, detail="Both from and to are required for a date range")
+        start_date = parse_date_param(from_date)
+        end_date = parse_date_param(to_date)
+        if end_date < start_date:
+            raise HTTPException(status_code=400, detail="to must not be before from")
+        if (end_date - start_date).days + 1 > MAX_SLOT_RANGE_DAYS:
+            raise HTTPException(status_code=400, detail=f"Date range is limited to {MAX_SLOT_RANGE_DAYS} days")
+        
+        now = datetime.now()
+        cache_key = ("range", property_id, start_date, end_date, interval, duration,
+                     scheduler_engine.slot_cutoff_key(now.date(), now, interval) if start_date <= now.date() <= end_date else None)
+        etag = slot_cache.etag(DEFAULT_AGENCY_ID, cache_key)
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        
+        # Days already in the single-date cache are served from it; only the
+        # rest are computed, and cached for single-date requests too
+        days = [start_date + timedelta(days=n) for n in range((end_date - start_date).days + 1)]
+        day_keys = {
+            day: (property_id, day, interval, duration, scheduler_engine.slot_cutoff_key(day, now, interval))
+            for day in days
+        }
+        cached = {day: slot_cache.get(DEFAULT_AGENCY_ID, day_keys[day]) for day in days}
+        missing = [day for day in days if cached[day] is None]
+        agent_ids, agent_days = [], {}
+        if missing:
+            agents = await covering_agents(DEFAULT_AGENCY_ID, property_id)
+            agent_ids = [agent["id"] for agent in agents]
+            agent_days = await load_agent_days(DEFAULT_AGENCY_ID, agents, missing[0], missing[-1])
+        computed = scheduler_engine.generate_slots_range(
+            agent_days, agent_ids, missing, property_postcode, now, interval, duration
+        )
+        
+        async def day_lines():
+            for day in days:
+                slots = cached[day]
+                if slots is None:
+                    _, slots = next(computed)
+                    slot_cache.put(DEFAULT_AGENCY_ID, day_keys[day], slots)
+                yield json.dumps({"date": str(day), "slots": slots}, separators=(",", ":")) + "\n"
+        
+        return StreamingResponse(day_lines(), media_type="application/x-ndjson", headers={"ETag": etag})
     
-    property = properties_db.get(viewing.get("property_id"))
-    if not property:
-        raise HTTPException(status_code=404, detail="Property not found")
+    # Parse date (default to today)
+    now = datetime.now()
+    target_date = parse_date_param(date) if date else now.date()
     
-    agent_id = viewing.get("agent_id", 1)
-    property_postcode = property.get("postcode")
-    requested_time = viewing.get("requested_time")
+    cache_key = (property_id, target_date, interval, duration, scheduler_engine.slot_cutoff_key(target_date, now, interval))
+    etag = slot_cache.etag(DEFAULT_AGENCY_ID, cache_key)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
     
-    # Get confirmed viewings
-    confirmed_viewings = [
-        v for v in viewings_db.values()
-        if v.get("status") == "confirmed" and v.get("agent_id") == agent_id
-    ]
+    slots = slot_cache.get(DEFAULT_AGENCY_ID, cache_key)
+    if slots is not None:
+        return JSONResponse({"slots": slots}, headers={"ETag": etag})
     
-    # Check feasibility
-    feasibility = travel_time.check_agent_slot_feasibility(
-        agent_id=agent_id,
-        time=requested_time,
-        property_id=property.get("id"),
-        property_postcode=property_postcode,
-        confirmed_viewings=confirmed_viewings,
-        properties_db=properties_db
+    # Union of every covering agent's slots, each with all constraints applied
+    agents = await covering_agents(DEFAULT_AGENCY_ID, property_id)
+    agent_days = await load_agent_days(DEFAULT_AGENCY_ID, agents, target_date, target_date)
+    slots = scheduler_engine.generate_agent_slots(
+        [agent_days[(agent["id"], str(target_date))] for agent in agents], property_postcode, now,
+        interval, duration
     )
+    slot_cache.put(DEFAULT_AGENCY_ID, cache_key, slots)
     
-    if not feasibility.get("feasible"):
+    return JSONResponse({"slots": slots}, headers={"ETag": etag})
+
+def feasibility_response(result: dict) -> dict:
+    """Add display label and colour to a scheduler_engine feasibility result."""
+    if result["status"] == "conflict":
         return {
             "status": "conflict",
             "label": "Conflict",
             "color": "#f44336",
-            "reason": feasibility.get("reason", "Not feasible")
+            "reason": result.get("reason", "Not feasible")
+        }
+    if result["status"] == "tight":
+        return {
+            "status": "tight",
+            "label": "Tight",
+            "color": "#ff9800",
+            "travel_time": result["travel_minutes"]
         }
-    
-    # Check if it's tight (calculate travel time)
-    # Find previous viewing
-    prev_viewing = None
-    for v in sorted(confirmed_viewings, key=lambda x: x.get("confirmed_time", x.get("requested_time", ""))):
-        if (v.get("confirmed_time") or v.get("requested_time", "")) < requested_time:
-            prev_viewing = v
-    
-    if prev_viewing:
-        prev_property = properties_db.get(prev_viewing.get("property_id"))
-        if prev_property:
-            travel_time_min = travel_time.get_base_travel_time(
-                prev_property.get("postcode"),
-                property_postcode
-            )
-            # If travel time > 20 minutes, it's "tight"
-            if travel_time_min > 20:
-                return {
-                    "status": "tight",
-                    "label": "Tight",
-                    "color": "#ff9800",
-                    "travel_time": travel_time_min
-                }
-    
     return {
         "status": "ok",
         "label": "OK",
         "color": "#4caf50"
     }
 
+async def compute_feasibility(viewings: List[dict]) -> dict:
+    """
+    Feasibility for viewing requests against each agent's day, the same
+    AgentDays (from timeline_cache) slots are generated from, loading each
+    (agent, date) once. Returns {viewing_id: feasibility_response}.
+    """
+    await sync_slot_version(DEFAULT_AGENCY_ID)
+    agents = {agent["id"]: agent for agent in await repo.list_agents(DEFAULT_AGENCY_ID)}
+    agent_days = {}
+    for agent_id, day in {scheduler_engine.feasibility_day_key(v) for v in viewings}:
+        if day:
+            target_date = datetime.strptime(day, "%Y-%m-%d").date()
+            agent_days.update(await load_agent_days(
+                DEFAULT_AGENCY_ID, [agents.get(agent_id, {"id": agent_id})], target_date, target_date
+            ))
+    
+    properties_db = await repo.get_properties({v["property_id"] for v in viewings})
+    results = scheduler_engine.batch_viewing_feasibility(viewings, properties_db, agent_days)
+    return {viewing_id: feasibility_response(result) for viewing_id, result in results.items()}
+
+@app.get("/api/viewings/{viewing_id}/feasibility")
+async def get_viewing_feasibility(viewing_id: int):
+    """Get feasibility status for a viewing request."""
+    viewing = await repo.get_viewing(viewing_id)
+    if not viewing:
+        raise HTTPException(status_code=404, detail="Viewing not found")
+    
+    results = await compute_feasibility([viewing])
+    if viewing_id not in results:
+        raise HTTPException(status_code=404, detail="Property not found")
+    return results[viewing_id]
+
+@app.post("/api/viewings/feasibility:batch")
+async def batch_viewing_feasibility(data: FeasibilityBatchRequest):
+    """
+    Get feasibility statuses for many viewing requests in one call.
+    Defaults to every pending viewing for the agency.
+    
+    Returns {viewing_id: {"status", "label", "color", ...}}
+    """
+    if data.viewing_ids is None:
+        viewings = await repo.list_pending_viewings(DEFAULT_AGENCY_ID)
+    else:
+        viewings = await repo.get_viewings(data.viewing_ids)
+    
+    return await compute_feasibility(viewings)
+
+def encode_viewing_cursor(viewing: dict) -> str:
+    """Opaque keyset cursor for the page after viewing (its created_at and id)."""
+    raw = json.dumps([viewing["created_at"], viewing["id"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_viewing_cursor(cursor: str) -> tuple:
+    try:
+        created_at, viewing_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        datetime.fromisoformat(created_at)
+        return created_at, int(viewing_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 # Viewings routes
 @app.get("/api/viewings")
-async def list_viewings():
-    """Get all viewings for the agency, sorted by newest first."""
-    agency_properties = [
-        prop["id"] for prop in properties_db.values()
-        if prop["agency_id"] == DEFAULT_AGENCY_ID
-    ]
+async def list_viewings(
+    response: Response,
+    include: Optional[str] = None,
+    since: Optional[int] = Query(None, ge=0),
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_VIEWINGS_PAGE)
+):
+    """
+    Get the agency's viewings, newest first. The X-Event-Seq header is the
+    event seq the result is at least as new as: follow
+    /api/viewings/events?after=<it>, or pass it back as since=, to keep
+    the list current.
     
-    viewings = [
-        {
-            **viewing,
-            "property_title": properties_db.get(viewing["property_id"], {}).get("title", "Unknown"),
-            "property_postcode": properties_db.get(viewing["property_id"], {}).get("postcode", ""),
-            "tenant_name": viewing.get("tenant_name", "Unknown"),
-        }
-        for viewing in viewings_db.values()
-        if viewing["property_id"] in agency_properties
-    ]
+    Query params:
+    - include: "feasibility" to attach a feasibility status to each pending viewing
+    - limit: page size; when more remain, X-Next-Cursor is the cursor for the next page
+    - cursor: X-Next-Cursor from the previous page
+    - since: only viewings created or changed after this event seq, oldest change first
+    """
+    if since is not None and cursor is not None:
+        raise HTTPException(status_code=400, detail="Use either since or cursor, not both")
+    
+    # Read first, so no change made while listing falls before the cursor
+    seq = await repo.get_viewing_event_seq(DEFAULT_AGENCY_ID)
+    if since is not None:
+        viewings = await repo.list_viewings_since(DEFAULT_AGENCY_ID, since, limit)
+        if limit is not None and len(viewings) == limit:
+            # More changes remain: continue from the last one returned
+            seq = viewings[-1]["event_seq"]
+    else:
+        before = decode_viewing_cursor(cursor) if cursor is not None else None
+        viewings = await repo.list_viewings(DEFAULT_AGENCY_ID, before, limit)
+        if limit is not None and len(viewings) == limit:
+            response.headers["X-Next-Cursor"] = encode_viewing_cursor(viewings[-1])
+    response.headers["X-Event-Seq"] = str(seq)
     
-    # Sort by newest first (created_at descending)
-    viewings.sort(key=lambda v: v.get("created_at", ""), reverse=True)
+    if include == "feasibility":
+        pending = [v for v in viewings if v.get("status") == "pending"]
+        results = await compute_feasibility(pending)
+        for viewing in pending:
+            if viewing["id"] in results:
+                viewing["feasibility"] = results[viewing["id"]]
     
     return viewings
 
+@app.get("/api/viewings/events")
+async def viewing_events(request: Request, after: Optional[int] = None):
+    """
+    Server-sent events for the agency's viewing changes: viewing.created,
+    viewing.updated and viewing.confirmed, each with the viewing as
+    list_viewings returns it and its seq as the event id. Starts after
+    the Last-Event-ID header (sent by EventSource on reconnect), else
+    ?after= (X-Event-Seq from GET /api/viewings), else from now. A "reset"
+    event means changes were missed: reload the list.
+    """
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id:
+        try:
+            after = int(last_event_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Last-Event-ID must be an event seq")
+    if after is not None and after < 0:
+        raise HTTPException(status_code=400, detail="after must not be negative")
+    
+    return StreamingResponse(
+        stream_viewing_events(repo, event_broker, DEFAULT_AGENCY_ID, after, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def assign_agent(property: dict, viewing_data: ViewingCreate) -> int:
+    """Agent a new request goes to (see create_viewing); 400 if nobody covers the property."""
+    agents = await covering_agents(DEFAULT_AGENCY_ID, property["id"])
+    if viewing_data.agent_id is not None:
+        if not any(agent["id"] == viewing_data.agent_id for agent in agents):
+            raise HTTPException(status_code=400, detail="Agent does not cover this property")
+        return viewing_data.agent_id
+    if not agents:
+        raise HTTPException(status_code=400, detail="No agent covers this property")
+    try:
+        minutes = scheduler_engine.parse_time(viewing_data.requested_time)
+    except (ValueError, IndexError):
+        minutes = None
+    if len(agents) == 1 or minutes is None:
+        return agents[0]["id"]
+    
+    day = viewing_data.requested_date or datetime.now().date()
+    await sync_slot_version(DEFAULT_AGENCY_ID)
+    agent_days = await load_agent_days(DEFAULT_AGENCY_ID, agents, day, day)
+    return scheduler_engine.choose_agent(
+        [agent_days[(agent["id"], str(day))] for agent in agents], property.get("postcode"), minutes
+    )
+
 @app.post("/api/viewings")
 async def create_viewing(viewing_data: ViewingCreate):
-    """Create a new viewing request with Smart Profile data."""
+    """
+    Create a new viewing request with Smart Profile data. Goes to the agent
+    given (the chosen slot's agent_id) or, failing that, to whichever
+    covering agent is free at the requested time and it adds least travel for.
+    """
     # Verify property exists
-    property = properties_db.get(viewing_data.property_id)
-    if not property or property.get("agency_id") != DEFAULT_AGENCY_ID:
-        raise HTTPException(status_code=404, detail="Property not found")
+    property = await get_agency_property(viewing_data.property_id)
     
     # Validate that the requested date/time is not in the past
     if viewing_data.requested_date:
@@ -565,9 +1067,9 @@ async def create_viewing(viewing_data: ViewingCreate):
                     detail="Invalid time format. Use HH:MM format."
                 )
     
-    viewing_id = len(viewings_db) + 1
-    viewings_db[viewing_id] = {
-        "id": viewing_id,
+    agent_id = await assign_agent(property, viewing_data)
+    
+    viewing = await repo.create_viewing({
         "tenant_name": viewing_data.tenant_name,
         "tenant_email": viewing_data.tenant_email,
         "tenant_phone": viewing_data.tenant_phone,
@@ -579,11 +1081,11 @@ async def create_viewing(viewing_data: ViewingCreate):
         "rent_budget": viewing_data.rent_budget,
         "message": viewing_data.message,
         "status": "pending",
-        "agent_id": 1,  # Default agent
+        "agent_id": agent_id,
         "created_at": datetime.now().isoformat(),
-    }
-    
-    return viewings_db[viewing_id]
+    })
+    await publish_viewing_event("created", viewing, property)
+    return viewing
 
 @app.patch("/api/viewings/{viewing_id}")
 async def update_viewing(
@@ -591,28 +1093,54 @@ async def update_viewing(
     update_data: ViewingUpdate
 ):
     """Update viewing status (confirmed/declined/pending) and optional suggested_time."""
-    viewing = viewings_db.get(viewing_id)
+    viewing = await repo.get_viewing(viewing_id)
     if not viewing:
         raise HTTPException(status_code=404, detail="Viewing not found")
     
     if update_data.status not in ["confirmed", "declined", "pending"]:
         raise HTTPException(status_code=400, detail="Invalid status. Must be confirmed, declined, or pending")
     
-    viewing["status"] = update_data.status
+    fields = {"status": update_data.status}
     if update_data.suggested_time:
-        viewing["suggested_time"] = update_data.suggested_time
+        fields["suggested_time"] = update_data.suggested_time
     
     # If confirming, set confirmed_time to requested_time (or suggested_time if provided)
     if update_data.status == "confirmed":
-        viewing["confirmed_time"] = update_data.suggested_time or viewing.get("requested_time")
+        fields["confirmed_time"] = update_data.suggested_time or viewing.get("requested_time")
+        # Re-checked against the agent's day atomically, so two confirmations
+        # racing for overlapping slots (even on different workers) can't both win
+        agency = await repo.get_agency(DEFAULT_AGENCY_ID) or {}
+        try:
+            viewing = await repo.confirm_viewing(viewing_id, fields, confirm_check(agency))
+        except ViewingConflict as e:
+            raise HTTPException(status_code=409, detail=f"Cannot confirm viewing: {e.reason}")
+    else:
+        viewing = await repo.update_viewing(viewing_id, fields)
+    if not viewing:
+        raise HTTPException(status_code=404, detail="Viewing not found")
+    
+    property = await repo.get_property(viewing["property_id"]) or {}
+    await invalidate_slots(
+        property.get("agency_id", DEFAULT_AGENCY_ID),
+        [(viewing["agent_id"], viewing_date(viewing))],
+        lambda agent_day: agent_day.apply(viewing, property)
+    )
+    await publish_viewing_event("confirmed" if viewing["status"] == "confirmed" else "updated", viewing, property)
     
     return viewing
 
 # Availability routes
 @app.get("/api/availability")
-async def get_availability():
-    """Get availability rules for the current agency."""
-    rules = availability_db.get(DEFAULT_AGENCY_ID, [])
+async def get_availability(agent_id: Optional[int] = None):
+    """
+    Get availability rules for the current agency, or with agent_id the
+    rules that agent works to (their own, else the agency's).
+    """
+    if agent_id is not None:
+        await get_agency_agent(agent_id)
+        return await get_agent_rules(DEFAULT_AGENCY_ID, agent_id)
+    
+    rules = list(await repo.get_availability(DEFAULT_AGENCY_ID))
     # Ensure all 7 days are present
     if len(rules) < 7:
         # Initialize missing days
@@ -626,18 +1154,23 @@ async def get_availability():
                     "end_time": "18:00"
                 })
         rules.sort(key=lambda x: x.get("day_of_week", 0))
-        availability_db[DEFAULT_AGENCY_ID] = rules
+        await repo.set_availability(DEFAULT_AGENCY_ID, rules)
+        await invalidate_slots(DEFAULT_AGENCY_ID)
     return rules
 
 @app.put("/api/availability")
-async def update_availability(data: AvailabilityUpdate):
-    """Update availability rules for the current agency."""
+async def update_availability(data: AvailabilityUpdate, agent_id: Optional[int] = None):
+    """
+    Update availability rules for the current agency, or with agent_id give
+    that agent their own (an empty list puts them back on the agency's).
+    """
+    if agent_id is not None:
+        await get_agency_agent(agent_id)
     # Validate day_of_week values (0-6)
     for rule in data.availability:
         if rule.day_of_week < 0 or rule.day_of_week > 6:
             raise HTTPException(status_code=400, detail=f"Invalid day_of_week: {rule.day_of_week}. Must be 0-6.")
         # Validate time format
-        import re
         if not re.match(r'^([0-1][0-9]|2[0-3]):[0-5][0-9]$', rule.start_time):
             raise HTTPException(status_code=400, detail=f"Invalid start_time format: {rule.start_time}. Must be HH:MM.")
         if not re.match(r'^([0-1][0-9]|2[0-3]):[0-5][0-9]$', rule.end_time):
@@ -646,23 +1179,33 @@ async def update_availability(data: AvailabilityUpdate):
     # Convert Pydantic models to dicts
     try:
         # Pydantic v2
-        availability_db[DEFAULT_AGENCY_ID] = [rule.model_dump() for rule in data.availability]
+        rules = [rule.model_dump() for rule in data.availability]
     except AttributeError:
         # Pydantic v1 fallback
-        availability_db[DEFAULT_AGENCY_ID] = [rule.dict() for rule in data.availability]
-    return {"status": "updated", "availability": availability_db[DEFAULT_AGENCY_ID]}
+        rules = [rule.dict() for rule in data.availability]
+    rules = await repo.set_availability(DEFAULT_AGENCY_ID, rules, agent_id)
+    await invalidate_slots(DEFAULT_AGENCY_ID)
+    return {"status": "updated", "availability": rules}
 
 # Blockouts routes
+async def invalidate_blockout_slots(blockout: dict, update):
+    """invalidate_slots for a blockout change, patching the timelines of the agents it applies to that day."""
+    if blockout.get("agent_id") is not None:
+        agent_ids = [blockout["agent_id"]]
+    else:
+        agent_ids = [agent["id"] for agent in await repo.list_agents(DEFAULT_AGENCY_ID)]
+    await invalidate_slots(DEFAULT_AGENCY_ID, [(agent_id, blockout["date"]) for agent_id in agent_ids], update)
+
 @app.get("/api/blockouts")
 async def get_blockouts():
     """Get all blockouts for the current agency."""
-    return blockouts_db.get(DEFAULT_AGENCY_ID, [])
+    return await repo.list_blockouts(DEFAULT_AGENCY_ID)
 
 @app.post("/api/blockouts")
 async def create_blockout(blockout_data: BlockoutCreate):
-    """Create a new blockout."""
-    global blockout_id_counter
-    
+    """Create a new blockout, for the whole agency or (with agent_id) one agent."""
+    if blockout_data.agent_id is not None:
+        await get_agency_agent(blockout_data.agent_id)
     # Validate: if full_day, start_time and end_time should be None
     if blockout_data.full_day:
         if blockout_data.start_time or blockout_data.end_time:
@@ -671,41 +1214,175 @@ async def create_blockout(blockout_data: BlockoutCreate):
         # Validate time format if not full_day
         if not blockout_data.start_time or not blockout_data.end_time:
             raise HTTPException(status_code=400, detail="start_time and end_time are required for time-range blockouts")
-        import re
         if not re.match(r'^([0-1][0-9]|2[0-3]):[0-5][0-9]$', blockout_data.start_time):
             raise HTTPException(status_code=400, detail=f"Invalid start_time format: {blockout_data.start_time}. Must be HH:MM.")
         if not re.match(r'^([0-1][0-9]|2[0-3]):[0-5][0-9]$', blockout_data.end_time):
             raise HTTPException(status_code=400, detail=f"Invalid end_time format: {blockout_data.end_time}. Must be HH:MM.")
     
-    blockout = {
-        "id": blockout_id_counter,
+    blockout = await repo.create_blockout(DEFAULT_AGENCY_ID, {
         "date": str(blockout_data.date),
         "start_time": blockout_data.start_time,
         "end_time": blockout_data.end_time,
         "full_day": blockout_data.full_day,
-    }
-    
-    if DEFAULT_AGENCY_ID not in blockouts_db:
-        blockouts_db[DEFAULT_AGENCY_ID] = []
-    blockouts_db[DEFAULT_AGENCY_ID].append(blockout)
-    blockout_id_counter += 1
+        "agent_id": blockout_data.agent_id,
+    })
+    await invalidate_blockout_slots(blockout, lambda agent_day: agent_day.add_blockout(blockout))
     
     return blockout
 
 @app.delete("/api/blockouts/{blockout_id}")
 async def delete_blockout(blockout_id: int):
     """Delete a blockout by ID."""
-    if DEFAULT_AGENCY_ID not in blockouts_db:
+    blockout = await repo.delete_blockout(DEFAULT_AGENCY_ID, blockout_id)
+    if not blockout:
         raise HTTPException(status_code=404, detail="Blockout not found")
+    await invalidate_blockout_slots(blockout, lambda agent_day: agent_day.remove_blockout(blockout_id))
     
-    blockouts = blockouts_db[DEFAULT_AGENCY_ID]
-    original_length = len(blockouts)
-    blockouts_db[DEFAULT_AGENCY_ID] = [b for b in blockouts if b.get("id") != blockout_id]
+    return {"status": "deleted"}
+
+# Schedule routes
+@app.get("/api/schedule/route")
+async def get_day_route(date: Optional[str] = None, agent_id: int = DEFAULT_AGENT_ID):
+    """
+    Propose the most travel-efficient order and start times for an agent's
+    confirmed and pending viewings on a date (default today), starting from
+    their base postcode (or the agency's). Confirmed viewings keep their times; pending
+    ones may move by up to an hour, within the agent's working hours and
+    clear of their blockouts (AgentDay.route_free), and not into the next
+    half hour today.
     
-    if len(blockouts_db[DEFAULT_AGENCY_ID]) == original_length:
-        raise HTTPException(status_code=404, detail="Blockout not found")
+    Returns {"date", "agent_id", "stops": [...], "total_travel_minutes",
+    "baseline_travel_minutes", "unscheduled": [...], "feasible"} (see
+    scheduler_engine.plan_day_route).
+    """
+    target_date = parse_date_param(date) if date else datetime.now().date()
+    agent = await get_agency_agent(agent_id)
+    await sync_slot_version(DEFAULT_AGENCY_ID)
+    agent_day = (await load_agent_days(DEFAULT_AGENCY_ID, [agent], target_date, target_date))[(agent_id, str(target_date))]
+    if agent_day.window is None:
+        raise HTTPException(status_code=400, detail="Agent is not available on this date")
+    now = datetime.now()
+    not_before = now.hour * 60 + now.minute + 31 if target_date == now.date() else None
     
-    return {"status": "deleted"}
+    viewings = await repo.get_day_viewings(agent_id, str(target_date))
+    properties_db = await repo.get_properties({v["property_id"] for v in viewings})
+    
+    route = scheduler_engine.plan_day_route(
+        viewings,
+        properties_db,
+        day_start=agent_day.window[0],
+        day_end=agent_day.window[1],
+        start_postcode=agent_day.start_postcode,
+        viewing_duration=agent_day.viewing_duration,
+        travel_buffer=agent_day.travel_buffer,
+        free=agent_day.route_free(not_before)
+    )
+    return {"date": str(target_date), "agent_id": agent_id, **route}
+
+@app.post("/api/schedule/auto-assign")
+async def auto_assign(data: AutoAssignRequest):
+    """
+    Schedule every pending viewing in a date range in one optimisation pass
+    (scheduler_engine.auto_assign_day per agent and day). Maximises accepted
+    viewings within each agent's availability, blockouts, travel and
+    duration, then minimises travel. Requests that fit at their requested
+    time are confirmed; ones that fit up to an hour away get a suggested_time
+    and stay pending. Requests stay with the agent they were assigned to.
+    
+    Returns {"confirmed": [{"viewing_id", "agent_id", "date", "time"}], "suggested": [...],
+    "unassigned": [{"viewing_id", "agent_id", "date", "reason"}], "travel_minutes", "dry_run"}
+    """
+    start_date = data.start_date
+    end_date = data.end_date or start_date
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+    if (end_date - start_date).days + 1 > MAX_SLOT_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range is limited to {MAX_SLOT_RANGE_DAYS} days")
+    
+    if data.agent_id is not None:
+        agents = [await get_agency_agent(data.agent_id)]
+    else:
+        agents = await repo.list_agents(DEFAULT_AGENCY_ID)
+    
+    start, end = str(start_date), str(end_date)
+    template = await repo.get_availability(DEFAULT_AGENCY_ID)
+    blockouts = await repo.get_blockouts(DEFAULT_AGENCY_ID, start, end)
+    agency = await repo.get_agency(DEFAULT_AGENCY_ID) or {}
+    
+    now = datetime.now()
+    confirmations, suggestions, unassigned = [], [], []
+    travel_minutes = 0
+    for agent in agents:
+        rules = await get_agent_rules(DEFAULT_AGENCY_ID, agent["id"], template)
+        agent_blockouts = scheduler_engine.blockouts_for_agent(blockouts, agent["id"])
+        confirmed = await repo.get_confirmed_viewings(agent["id"], start, end)
+        pending = await repo.get_agent_viewings(agent["id"], start, end, "pending")
+        if not pending:
+            continue
+        properties_db = await repo.get_properties({v["property_id"] for v in confirmed + pending})
+        
+        by_day = {}
+        for viewing in confirmed + pending:
+            by_day.setdefault(viewing_date(viewing), {"confirmed": [], "pending": []})[viewing["status"]].append(viewing)
+        
+        for day, day_viewings in sorted(by_day.items()):
+            if not day_viewings["pending"]:
+                continue
+            target_date = datetime.strptime(day, "%Y-%m-%d").date()
+            result = scheduler_engine.auto_assign_day(
+                day_viewings["pending"],
+                day_viewings["confirmed"],
+                properties_db,
+                scheduler_engine.find_day_rule(rules, target_date.weekday()),
+                [b for b in agent_blockouts if b.get("date") == day],
+                target_date,
+                start_postcode=agent.get("base_postcode") or agency.get("base_postcode"),
+                viewing_duration=agency_viewing_duration(agency),
+                travel_buffer=10,
+                now=now
+            )
+            context = {"agent_id": agent["id"], "date": day}
+            confirmations.extend({**context, **item} for item in result["confirm"])
+            suggestions.extend({**context, **item} for item in result["suggest"])
+            unassigned.extend({**context, **item} for item in result["unassigned"])
+            travel_minutes += result["travel_minutes"]
+    
+    if not data.dry_run:
+        applied = []
+        changed = []
+        for item in confirmations:
+            # Still goes through the atomic check: a viewing confirmed elsewhere meanwhile wins
+            try:
+                viewing = await repo.confirm_viewing(
+                    item["viewing_id"],
+                    {"status": "confirmed", "confirmed_time": item["time"]},
+                    confirm_check(agency)
+                )
+                applied.append(item)
+                changed.append(("confirmed", viewing))
+            except ViewingConflict as e:
+                unassigned.append({
+                    "viewing_id": item["viewing_id"], "agent_id": item["agent_id"],
+                    "date": item["date"], "reason": e.reason,
+                })
+        confirmations = applied
+        for item in suggestions:
+            viewing = await repo.update_viewing(item["viewing_id"], {"suggested_time": item["time"]})
+            changed.append(("updated", viewing))
+        if confirmations:
+            await invalidate_slots(DEFAULT_AGENCY_ID)
+        properties_db = await repo.get_properties({viewing["property_id"] for _, viewing in changed if viewing})
+        for event_type, viewing in changed:
+            if viewing:
+                await publish_viewing_event(event_type, viewing, properties_db.get(viewing["property_id"]))
+    
+    return {
+        "confirmed": confirmations,
+        "suggested": suggestions,
+        "unassigned": unassigned,
+        "travel_minutes": travel_minutes,
+        "dry_run": data.dry_run,
+    }
 
 # Email ingestion stub
 @app.post("/api/inbound-email")
@@ -714,62 +1391,51 @@ async def inbound_email(payload: dict):
     Placeholder for email ingestion from listings@nestfinder.uk
     Expected keys: sender, subject, body
     """
-    print(f"Email received from {payload.get('sender')}: {payload.get('subject')}")
-    print(f"Body: {payload.get('body')}")
+    logger.info("Email received from %s: %s", payload.get("sender"), payload.get("subject"))
+    logger.info("Body: %s", payload.get("body"))
     return {"status": "received", "message": "Email logged (processing not implemented)"}
 
 @app.get("/api/agencies/{agency_slug}")
 async def get_agency_by_slug(agency_slug: str):
     """Get agency by slug."""
-    for agency in agencies_db.values():
-        if agency.get("slug") == agency_slug:
-            return agency
-    raise HTTPException(status_code=404, detail="Agency not found")
+    agency = await repo.get_agency_by_slug(agency_slug)
+    if not agency:
+        raise HTTPException(status_code=404, detail="Agency not found")
+    return agency
 
 @app.get("/api/agencies/{agency_slug}/properties")
 async def get_agency_properties(agency_slug: str):
     """Get all active properties for an agency by slug."""
-    agency = None
-    for a in agencies_db.values():
-        if a.get("slug") == agency_slug:
-            agency = a
-            break
-    
+    agency = await repo.get_agency_by_slug(agency_slug)
     if not agency:
         raise HTTPException(status_code=404, detail="Agency not found")
     
-    agency_id = agency.get("id")
-    active_properties = [
-        prop for prop in properties_db.values()
-        if prop.get("agency_id") == agency_id and prop.get("status") == "active"
-    ]
-    
-    return active_properties
+    return await repo.list_active_properties(agency.get("id"))
 
 @app.get("/api/agencies/{agency_slug}/properties/{property_slug}")
 async def get_public_property(agency_slug: str, property_slug: str):
     """Public endpoint for tenant booking link."""
-    agency = agencies_db.get(DEFAULT_AGENCY_ID)
+    agency = await repo.get_agency(DEFAULT_AGENCY_ID)
     if not agency or agency.get("slug") != agency_slug:
         raise HTTPException(status_code=404, detail="Agency not found")
     
-    for prop in properties_db.values():
-        if prop.get("slug") == property_slug and prop.get("agency_id") == DEFAULT_AGENCY_ID:
-            return prop
-    
-    raise HTTPException(status_code=404, detail="Property not found")
+    prop = await repo.get_property_by_slug(DEFAULT_AGENCY_ID, property_slug)
+    if not prop:
+        raise HTTPException(status_code=404, detail="Property not found")
+    return prop
 
 @app.get("/")
 async def root():
     return {"message": "NestFinder API", "version": "1.0.0"}
 
-@app.on_event("startup")
-async def startup_event():
-    """Seed demo properties on startup if database is empty."""
-    seed_demo_properties()
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus scrape endpoint; 404 unless METRICS_ENABLED is set."""
+    if not metrics.enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 if __name__ == "__main__":
-    # Seed demo properties before starting server
-    seed_demo_properties()
+    # Demo properties are seeded by the lifespan handler
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,227 @@
+"""
+Prometheus metrics for the API, served at GET /metrics when the
+METRICS_ENABLED environment variable is set:
+
+    nestfinder_http_request_duration_seconds   per route template, method and status
+    nestfinder_slot_step_duration_seconds      per numbered STEP of slot generation
+    nestfinder_slot_step_pruned_total          template slots each STEP ruled out
+    nestfinder_cache_*                         hits, misses and entries per cache
+
+There is no client library: series are plain lists keyed by label values
+and render() writes the text exposition format. With metrics off, nothing
+is recorded, /metrics is a 404 and instrumented code pays one check of
+metrics.enabled. Values are per process, so with several workers each one
+reports its own.
+"""
+
+import os
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+enabled = os.getenv("METRICS_ENABLED", "").lower() in ("1", "true", "yes")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STEP_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1)
+
+_registry: List["_Metric"] = []
+_cache_collectors: List[Callable[[], Dict[str, Dict[str, int]]]] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._series: Dict[Tuple[str, ...], list] = {}
+        _registry.append(self)
+
+    @abstractmethod
+    def samples(self) -> Iterator[str]:
+        """The metric's sample lines, one per series (and bucket)."""
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        yield from self.samples()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0]
+        series[0] += amount
+
+    def samples(self) -> Iterator[str]:
+        for labels, (value,) in sorted(self._series.items()):
+            yield f"{self.name}{_labels(self.labels, labels)} {_number(value)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = REQUEST_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+
+    def observe(self, value: float, *labels: str) -> None:
+        # One count per bucket (the last is +Inf), then the sum; cumulated on render
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def samples(self) -> Iterator[str]:
+        for labels, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                yield f"{self.name}_bucket{_labels(self.labels, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labels, labels)} {_number(series[-1])}"
+            yield f"{self.name}_count{_labels(self.labels, labels)} {cumulative}"
+
+
+REQUEST_SECONDS = Histogram(
+    "nestfinder_http_request_duration_seconds",
+    "Time to handle an HTTP request, by route template, method and status code.",
+    ("route", "method", "status"),
+)
+SLOT_STEP_SECONDS = Histogram(
+    "nestfinder_slot_step_duration_seconds",
+    "Time spent in each numbered STEP of generating one agent's slots for one day.",
+    ("step",), STEP_BUCKETS,
+)
+SLOT_STEP_PRUNED = Counter(
+    "nestfinder_slot_step_pruned_total",
+    "Template slot starts ruled out, counted against the first STEP that rules each out.",
+    ("step",),
+)
+
+
+class StepTimer:
+    """Times consecutive STEPs of one slot generation into SLOT_STEP_SECONDS."""
+
+    __slots__ = ("last",)
+
+    def __init__(self):
+        self.last = time.perf_counter()
+
+    def lap(self, step: str) -> None:
+        now = time.perf_counter()
+        SLOT_STEP_SECONDS.observe(now - self.last, step)
+        self.last = now
+
+    def restart(self) -> None:
+        """Leave the time since the last lap out of the next one (e.g. time spent counting)."""
+        self.last = time.perf_counter()
+
+
+def record_pruned(pruned: Dict[str, int]) -> None:
+    for step, count in pruned.items():
+        if count:
+            SLOT_STEP_PRUNED.inc(step, amount=count)
+
+
+def register_caches(collector: Callable[[], Dict[str, Dict[str, int]]]) -> None:
+    """
+    Add a callable returning {cache name: stats} read at each scrape; stats
+    need "hits" and "misses" and may have "size" (current entries).
+    """
+    _cache_collectors.append(collector)
+
+
+def _cache_lines() -> Iterator[str]:
+    caches: Dict[str, Dict[str, int]] = {}
+    for collector in _cache_collectors:
+        caches.update(collector())
+    families = (
+        ("nestfinder_cache_hits_total", "counter", "Cache lookups answered from the cache.", "hits"),
+        ("nestfinder_cache_misses_total", "counter", "Cache lookups that had to compute the value.", "misses"),
+        ("nestfinder_cache_entries", "gauge", "Entries currently held by the cache.", "size"),
+    )
+    for name, kind, help, key in families:
+        yield f"# HELP {name} {help}"
+        yield f"# TYPE {name} {kind}"
+        for cache, stats in sorted(caches.items()):
+            if key in stats:
+                yield f'{name}{{cache="{_escape(cache)}"}} {stats[key]}'
+    yield "# HELP nestfinder_cache_hit_ratio Hits over lookups since the process started."
+    yield "# TYPE nestfinder_cache_hit_ratio gauge"
+    for cache, stats in sorted(caches.items()):
+        lookups = stats["hits"] + stats["misses"]
+        if lookups:
+            yield f'nestfinder_cache_hit_ratio{{cache="{_escape(cache)}"}} {stats["hits"] / lookups!r}'
+
+
+def render() -> str:
+    """Every metric in the Prometheus text exposition format."""
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    lines.extend(_cache_lines())
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing each HTTP request into REQUEST_SECONDS, labelled
+    with the matched route's path template so ids don't multiply series.
+    Event streams are left out: they are open for as long as a client
+    listens. Passes requests straight through while metrics are off.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status: Optional[int] = None
+        streaming = False
+
+        async def send_timed(message):
+            nonlocal status, streaming
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                streaming = any(
+                    name == b"content-type" and value.startswith(b"text/event-stream")
+                    for name, value in message.get("headers", ())
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            if not streaming:
+                # The router stores the matched route in the scope it shares with us
+                route = getattr(scope.get("route"), "path", None) or "unmatched"
+                REQUEST_SECONDS.observe(
+                    time.perf_counter() - started, route, scope["method"], str(status or 500)
+                )
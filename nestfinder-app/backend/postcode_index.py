@@ -0,0 +1,206 @@
+"""
+Offline postcode geocoding from an ONS-style postcode CSV (ONSPD, NSPL or
+any file with postcode/latitude/longitude columns, ~2.6M rows for the UK).
+
+The CSV is converted once into a compact binary index:
+
+    python postcode_index.py build ONSPD.csv postcodes.idx
+
+and the API opens it with POSTCODE_INDEX=postcodes.idx. The file holds three
+sorted tables, full postcodes, sectors ("SW1A 1") and districts ("SW1A"),
+each packed records of a fixed-width key and int32 coordinates in
+millionths of a degree, followed by every FENCE_STRIDE-th key; sectors and
+districts sit at the mean of their postcodes. Opening it memory-maps the
+records and reads only the fences, so startup is immediate. A lookup
+bisects the fences in memory, then one block of records in the map (one or
+two pages), and the pages are shared by every worker through the OS page
+cache.
+"""
+
+import argparse
+import csv
+import sys
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+try:
+    from .postcodes import parse_postcode
+except ImportError:
+    from postcodes import parse_postcode
+
+MAGIC = b"NFPCIDX1"
+FENCE_STRIDE = 256  # keys per block found through the in-memory fences
+# key width per level, in bytes
+LEVELS = (("unit", 7), ("sector", 5), ("district", 4))
+HEADER = np.dtype([("magic", "S8"), ("counts", "<u8", (len(LEVELS),))])
+COORD_SCALE = 1_000_000
+
+POSTCODE_COLUMNS = ("pcds", "pcd", "pcd2", "postcode")
+LATITUDE_COLUMNS = ("lat", "latitude")
+LONGITUDE_COLUMNS = ("long", "lon", "longitude")
+NO_LATITUDE = 99.999999  # ONSPD's marker for postcodes without a grid reference
+
+
+def postcode_keys(postcode: str) -> Optional[Tuple[Optional[str], Optional[str], str]]:
+    """
+    (unit, sector, district) keys for a postcode, without spaces, e.g.
+    "SW1A 1AA" -> ("SW1A1AA", "SW1A1", "SW1A"). Partial postcodes have None
+    for the parts they lack; None if it isn't a postcode at all.
+    """
+    parsed = parse_postcode(postcode)
+    if parsed is None:
+        return None
+    return tuple(key.replace(" ", "") if key else None for key in (parsed.unit, parsed.sector, parsed.outward))
+
+
+def _column(header: list, names: Tuple[str, ...]) -> int:
+    lowered = [name.strip().lower() for name in header]
+    for name in names:
+        if name in lowered:
+            return lowered.index(name)
+    raise ValueError(f"CSV has none of the columns {', '.join(names)}")
+
+
+def read_postcode_csv(path: str) -> Iterator[Tuple[str, float, float]]:
+    """(postcode, latitude, longitude) rows of a postcode CSV, skipping ones without coordinates."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        pc, lat, lon = (_column(header, names) for names in (POSTCODE_COLUMNS, LATITUDE_COLUMNS, LONGITUDE_COLUMNS))
+        for row in reader:
+            try:
+                latitude, longitude = float(row[lat]), float(row[lon])
+            except (ValueError, IndexError):
+                continue
+            if latitude != NO_LATITUDE:
+                yield row[pc], latitude, longitude
+
+
+def record_dtype(width: int) -> np.dtype:
+    return np.dtype([("key", f"S{width}"), ("lat", "<i4"), ("lon", "<i4")])
+
+
+def build_index(csv_path: str, index_path: str) -> Dict[str, int]:
+    """Write the binary index for a postcode CSV. Returns the number of keys per level."""
+    units, lats, lons = [], [], []
+    for postcode, latitude, longitude in read_postcode_csv(csv_path):
+        keys = postcode_keys(postcode)
+        if keys and keys[0]:
+            units.append(keys[0])
+            lats.append(latitude)
+            lons.append(longitude)
+
+    unit_keys = np.array(units, dtype="S7")
+    coords = np.column_stack([lats, lons]) if units else np.zeros((0, 2))
+    unit_keys, first = np.unique(unit_keys, return_index=True)  # sorted; first row wins for duplicates
+    tables = [(unit_keys, coords[first])]
+
+    for _, width in LEVELS[1:]:
+        # Parents are the unit key minus the last 2 (sector) or 3 (district) characters
+        trim = 7 - width
+        parents = np.array([key[:len(key) - trim] for key in unit_keys.tolist()], dtype=f"S{width}")
+        parent_keys, inverse = np.unique(parents, return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(parent_keys))[:, None]
+        sums = np.column_stack([np.bincount(inverse, tables[0][1][:, i], len(parent_keys)) for i in range(2)])
+        tables.append((parent_keys, sums / np.maximum(counts, 1)))
+
+    header = np.zeros(1, dtype=HEADER)
+    header["magic"] = MAGIC
+    header["counts"] = [len(keys) for keys, _ in tables]
+    with open(index_path, "wb") as f:
+        header.tofile(f)
+        for (_, width), (keys, table_coords) in zip(LEVELS, tables):
+            records = np.zeros(len(keys), dtype=record_dtype(width))
+            records["key"] = keys
+            records["lat"], records["lon"] = np.round(table_coords * COORD_SCALE).astype("<i4").T
+            records.tofile(f)
+            keys[::FENCE_STRIDE].tofile(f)
+    return {name: len(keys) for (name, _), (keys, _) in zip(LEVELS, tables)}
+
+
+class PostcodeIndex:
+    """Read-only, memory-mapped view of a file written by build_index()."""
+
+    def __init__(self, path: str):
+        self.path = path
+        header = np.fromfile(path, dtype=HEADER, count=1)
+        if len(header) != 1 or header["magic"][0] != MAGIC:
+            raise ValueError(f"{path} is not a postcode index")
+        offset = HEADER.itemsize
+        # level -> (records, fences); plain ndarray views of the map index faster than np.memmap
+        self._tables: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for (name, width), count in zip(LEVELS, header["counts"][0].tolist()):
+            dtype = record_dtype(width)
+            fence_count = -(-count // FENCE_STRIDE)
+            if count:
+                records = np.asarray(np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(count,)))
+            else:
+                records = np.zeros(0, dtype=dtype)
+            offset += count * dtype.itemsize
+            fences = np.fromfile(path, dtype=f"S{width}", count=fence_count, offset=offset) if count else np.zeros(0, f"S{width}")
+            offset += fence_count * width
+            self._tables[name] = (records, fences)
+
+    def __len__(self) -> int:
+        return len(self._tables["unit"][0])
+
+    def _find(self, level: str, key: str) -> Optional[Tuple[float, float]]:
+        records, fences = self._tables[level]
+        raw = key.encode("ascii", "replace")
+        start = (int(np.searchsorted(fences, raw, side="right")) - 1) * FENCE_STRIDE
+        if start < 0:
+            return None
+        block = records[start:start + FENCE_STRIDE]
+        i = int(np.searchsorted(block["key"], raw))
+        if i < len(block) and block[i]["key"] == raw:
+            return (int(block[i]["lat"]) / COORD_SCALE, int(block[i]["lon"]) / COORD_SCALE)
+        return None
+
+    def lookup(self, postcode: str) -> Optional[Tuple[float, float]]:
+        """
+        Coordinates for a postcode: the postcode itself, else its sector,
+        else its district. Partial postcodes ("SW1A 1", "SW1A") start at
+        the most specific level they have.
+        """
+        for (level, _), key in zip(LEVELS, postcode_keys(postcode) or ()):
+            coords = self._find(level, key) if key else None
+            if coords:
+                return coords
+        return None
+
+    def districts(self) -> Dict[str, Tuple[float, float]]:
+        """Every district (outward code) in the index with its centroid."""
+        records = self._tables["district"][0]
+        return {
+            key.decode("ascii"): (lat / COORD_SCALE, lon / COORD_SCALE)
+            for key, lat, lon in zip(records["key"].tolist(), records["lat"].tolist(), records["lon"].tolist())
+        }
+
+    def stats(self) -> Dict[str, int]:
+        return {name: len(table[0]) for name, table in self._tables.items()}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Build the offline postcode index from an ONS postcode CSV")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="convert a CSV into an index file")
+    build.add_argument("csv_path")
+    build.add_argument("index_path")
+    lookup = subparsers.add_parser("lookup", help="look postcodes up in an index file")
+    lookup.add_argument("index_path")
+    lookup.add_argument("postcodes", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        counts = build_index(args.csv_path, args.index_path)
+        print(f"Wrote {args.index_path}: " + ", ".join(f"{n} {level}s" for level, n in counts.items()))
+    else:
+        index = PostcodeIndex(args.index_path)
+        for postcode in args.postcodes:
+            print(postcode, index.lookup(postcode))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
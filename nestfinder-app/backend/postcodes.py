@@ -0,0 +1,88 @@
+"""
+UK postcode parsing.
+
+parse_postcode() splits a postcode, spaced or not, in any case, into its
+canonical parts:
+
+    "sw1a1aa" -> area "SW", outward "SW1A", sector "SW1A 1", unit "SW1A 1AA"
+
+Partial postcodes parse too ("SW1A 1" has no unit, "SW1A" only an outward
+code). Results are memoised, and properties store theirs when created
+(postcode_outward, postcode_sector) so request paths don't parse again.
+"""
+
+import re
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+POSTCODE_CACHE_SIZE = 16384  # distinct inputs kept by parse_postcode
+
+_OUTWARD = r"[A-Z]{1,2}[0-9][A-Z0-9]?"
+FULL_RE = re.compile(rf"({_OUTWARD})([0-9][A-Z]{{2}})")
+OUTWARD_RE = re.compile(_OUTWARD)
+SECTOR_RE = re.compile(rf"({_OUTWARD}) ([0-9])")
+GIRO = "GIR0AA"  # the one postcode outside the usual pattern
+
+
+class ParsedPostcode(NamedTuple):
+    area: str  # "SW"
+    outward: str  # "SW1A"
+    sector: Optional[str]  # "SW1A 1"
+    unit: Optional[str]  # "SW1A 1AA"
+
+    @property
+    def canonical(self) -> str:
+        """The most specific part given: unit, else sector, else outward code."""
+        return self.unit or self.sector or self.outward
+
+    @property
+    def district(self) -> str:
+        """Outward code without a sub-district letter ("SW1A" -> "SW1")."""
+        if len(self.outward) > 2 and self.outward[-1].isalpha() and self.outward[-2].isdigit():
+            return self.outward[:-1]
+        return self.outward
+
+
+@lru_cache(maxsize=POSTCODE_CACHE_SIZE)
+def parse_postcode(postcode: str) -> Optional[ParsedPostcode]:
+    """Canonical parts of a full or partial UK postcode, or None if it isn't one."""
+    spaced = " ".join(postcode.split()).upper()
+    compact = spaced.replace(" ", "")
+    if compact == GIRO:
+        return ParsedPostcode("GIR", "GIR", "GIR 0", "GIR 0AA")
+
+    # The inward code is always digit-letter-letter, so a full postcode
+    # splits three characters from the end whether or not it has a space
+    match = FULL_RE.fullmatch(compact)
+    if match and (" " not in spaced or spaced.index(" ") == len(match.group(1))):
+        outward, inward = match.groups()
+        return ParsedPostcode(_area(outward), outward, f"{outward} {inward[0]}", f"{outward} {inward}")
+
+    match = SECTOR_RE.fullmatch(spaced)
+    if match:
+        outward = match.group(1)
+        return ParsedPostcode(_area(outward), outward, f"{outward} {match.group(2)}", None)
+
+    if OUTWARD_RE.fullmatch(spaced):
+        return ParsedPostcode(_area(spaced), spaced, None, None)
+    return None
+
+
+def _area(outward: str) -> str:
+    return outward[:2] if outward[1].isalpha() else outward[:1]
+
+
+def canonical_postcode(postcode: str) -> str:
+    """Canonical form of a postcode; input that doesn't parse is only trimmed and upper-cased."""
+    parsed = parse_postcode(postcode)
+    return parsed.canonical if parsed else " ".join(postcode.split()).upper()
+
+
+def postcode_fields(postcode: str) -> dict:
+    """Property columns for a postcode: canonical postcode plus its outward code and sector."""
+    parsed = parse_postcode(postcode)
+    return {
+        "postcode": canonical_postcode(postcode),
+        "postcode_outward": parsed.outward if parsed else None,
+        "postcode_sector": parsed.sector if parsed else None,
+    }
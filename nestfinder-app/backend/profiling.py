@@ -0,0 +1,160 @@
+"""
+On-demand sampling profiles of slow endpoints from the real workload.
+
+A request to one of PROFILED_ROUTES is profiled when it carries
+X-Profile: <PROFILE_TOKEN>, or at random for a PROFILE_SAMPLE_RATE
+fraction of them. While it runs, a background thread samples the event
+loop thread's Python stack every PROFILE_INTERVAL_MS and the counts are
+written to PROFILE_DIR as collapsed stacks, one "frame;frame;... count"
+line per distinct stack, which flamegraph.pl, speedscope and inferno read
+directly:
+
+    flamegraph.pl profiles/20260101T093000-get_available_slots-1a2b3c.folded > slots.svg
+
+Samples are of the whole loop thread, so other requests in flight at the
+same time show up too. At most PROFILE_MAX_CONCURRENT requests are
+profiled at once; others run as usual. With neither PROFILE_TOKEN nor
+PROFILE_SAMPLE_RATE set, main doesn't install the middleware at all.
+"""
+
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Dict, Optional
+
+from starlette.routing import Match
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_CONCURRENT = int(os.getenv("PROFILE_MAX_CONCURRENT", "2"))
+
+PROFILE_HEADER = b"x-profile"
+PROFILED_ROUTES = frozenset({
+    "get_available_slots",
+    "get_viewing_feasibility",
+    "batch_viewing_feasibility",
+    "list_viewings",
+})
+
+enabled = bool(PROFILE_TOKEN) or PROFILE_SAMPLE_RATE > 0
+
+_active = 0
+_active_lock = threading.Lock()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+class StackSampler(threading.Thread):
+    """Counts the stacks of one thread, sampled every interval seconds until stop()."""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if self._stop_event.is_set():
+                break  # the request is over; the thread is in stop()
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            if labels:
+                self.stacks[";".join(reversed(labels))] += 1
+
+    def stop(self) -> Counter:
+        self._stop_event.set()
+        self.join()
+        return self.stacks
+
+
+def write_folded(stacks: Dict[str, int], path: str) -> None:
+    """Write stack counts in the collapsed format flame graph tools read."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        for stack, count in sorted(stacks.items()):
+            f.write(f"{stack} {count}\n")
+
+
+def _acquire() -> bool:
+    global _active
+    with _active_lock:
+        if _active >= PROFILE_MAX_CONCURRENT:
+            return False
+        _active += 1
+        return True
+
+
+def _release() -> None:
+    global _active
+    with _active_lock:
+        _active -= 1
+
+
+def _requested(scope) -> bool:
+    if PROFILE_TOKEN:
+        for name, value in scope.get("headers", ()):
+            if name == PROFILE_HEADER and hmac.compare_digest(value, PROFILE_TOKEN.encode()):
+                return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def _route_name(scope) -> Optional[str]:
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "name", None)
+    return None
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware running requests to PROFILED_ROUTES under a StackSampler
+    when asked to (see the module docstring). The profile's file name is
+    returned in an X-Profile-File header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _requested(scope):
+            await self.app(scope, receive, send)
+            return
+        route = _route_name(scope)
+        if route not in PROFILED_ROUTES or not _acquire():
+            await self.app(scope, receive, send)
+            return
+
+        stamp = time.strftime("%Y%m%dT%H%M%S")
+        filename = f"{stamp}-{route}-{uuid.uuid4().hex[:6]}.folded"
+
+        async def send_named(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", ()), (b"x-profile-file", filename.encode())]}
+            await send(message)
+
+        sampler = StackSampler(threading.get_ident(), PROFILE_INTERVAL_MS / 1000)
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_named)
+        finally:
+            stacks = sampler.stop()
+            try:
+                write_folded(stacks, os.path.join(PROFILE_DIR, filename))
+            finally:
+                _release()
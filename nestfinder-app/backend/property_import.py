@@ -0,0 +1,116 @@
+"""
+Streaming reader for bulk property uploads (POST /api/properties/bulk).
+
+The body is CSV with a header row (Content-Type: text/csv) or NDJSON, one
+JSON object per line (application/x-ndjson). It is read as it arrives, so
+an upload of any size holds one line at a time, and each record comes out
+as (row number, dict of fields); a row that can't be parsed comes out with
+an error message instead of the dict. Rows are numbered from 1, not
+counting the CSV header.
+"""
+
+import codecs
+import csv
+import json
+import re
+from typing import AsyncIterator, Dict, Optional, Tuple, Union
+
+try:
+    from .postcodes import canonical_postcode
+except ImportError:
+    from postcodes import canonical_postcode
+
+MAX_LINE_CHARS = 64 * 1024  # longest line (or quoted CSV record) accepted
+
+CSV_TYPES = ("text/csv", "application/csv")
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/x-jsonlines")
+
+Record = Tuple[int, Union[Dict, str]]
+
+
+class MalformedUpload(ValueError):
+    """The upload can't be read any further (bad encoding, runaway line)."""
+
+
+def upload_format(content_type: str) -> Optional[str]:
+    """"csv" or "ndjson" for a request Content-Type, None for anything else."""
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    if media_type in CSV_TYPES:
+        return "csv"
+    if media_type in NDJSON_TYPES:
+        return "ndjson"
+    return None
+
+
+def dedupe_key(address: str, postcode: str) -> Tuple[str, str]:
+    """Properties with the same key are the same property: canonical postcode, address words."""
+    return (canonical_postcode(postcode), " ".join(re.findall(r"[a-z0-9]+", address.lower())))
+
+
+async def text_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Decode UTF-8 (with or without a BOM) and split into lines as chunks arrive."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    try:
+        async for chunk in chunks:
+            *lines, pending = (pending + decoder.decode(chunk)).split("\n")
+            for line in lines:
+                yield line.rstrip("\r")
+            if len(pending) > MAX_LINE_CHARS:
+                raise MalformedUpload(f"Line longer than {MAX_LINE_CHARS} characters")
+        pending += decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        raise MalformedUpload("Upload is not valid UTF-8")
+    if pending.strip():
+        yield pending.rstrip("\r")
+
+
+async def csv_records(lines: AsyncIterator[str]) -> AsyncIterator[Record]:
+    header = None
+    row_number = 0
+    record = []
+    quotes = 0
+    async for line in lines:
+        # A quoted field may span lines; the record ends where the quotes balance
+        record.append(line)
+        quotes += line.count('"')
+        if quotes % 2:
+            if sum(map(len, record)) > MAX_LINE_CHARS:
+                raise MalformedUpload(f"CSV record longer than {MAX_LINE_CHARS} characters (unbalanced quotes?)")
+            continue
+        text = "\n".join(record)
+        record, quotes = [], 0
+        if not text.strip():
+            continue
+        values = next(csv.reader([text]))
+        if header is None:
+            header = [name.strip().lower() for name in values]
+            continue
+        row_number += 1
+        if len(values) > len(header):
+            yield row_number, f"{len(values)} values for {len(header)} columns"
+            continue
+        # Empty cells are missing fields, so optional ones take their defaults
+        yield row_number, {name: value.strip() for name, value in zip(header, values) if value.strip()}
+    if record:
+        yield row_number + 1, "Unterminated quoted field"
+
+
+async def ndjson_records(lines: AsyncIterator[str]) -> AsyncIterator[Record]:
+    row_number = 0
+    async for line in lines:
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            value = json.loads(line)
+        except ValueError as e:
+            yield row_number, f"Invalid JSON: {e}"
+            continue
+        yield row_number, value if isinstance(value, dict) else "Expected a JSON object"
+
+
+def read_records(chunks: AsyncIterator[bytes], upload: str) -> AsyncIterator[Record]:
+    """Records of a "csv" or "ndjson" (see upload_format) body streamed as chunks."""
+    lines = text_lines(chunks)
+    return csv_records(lines) if upload == "csv" else ndjson_records(lines)
@@ -6,14 +6,35 @@ Constraint Application Order:
 2. Blockouts (specific unavailable times/days)
 3. Conflicts with confirmed viewings (duration + travel buffer)
 4. Travel-time feasibility (travel optimization)
+
+The rules have changed since the original per-slot generate_slots, which
+slot_reference.py keeps for the benchmark's differential check; its
+docstring lists each change.
 """
 
-from typing import List, Dict, Optional
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from time import perf_counter
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 from datetime import datetime, date
+
+import numpy as np
+
 try:
-    from . import travel_time
+    from . import metrics, travel_time
+    from .indexes import (
+        DAY_BITS, MINUTES_PER_DAY, DayCalendar, DayTimeline, ViewingColumns,
+        bit_intervals, bits_at, minute_bits, run_starts, viewing_date
+    )
 except ImportError:
+    import metrics
     import travel_time
+    from indexes import (
+        DAY_BITS, MINUTES_PER_DAY, DayCalendar, DayTimeline, ViewingColumns,
+        bit_intervals, bits_at, minute_bits, run_starts, viewing_date
+    )
+
+SLOT_INTERVAL = 30  # default minutes between slot starts
 
 
 def parse_time(time_str: str) -> int:
@@ -29,269 +50,1140 @@ def format_time(minutes: int) -> str:
     return f"{hours:02d}:{mins:02d}"
 
 
-def get_time_slots(start_hour: int = 9, end_hour: int = 18) -> List[str]:
-    """Generate time slots between start and end hours (30-minute intervals)."""
-    slots = []
-    for hour in range(start_hour, end_hour):
-        slots.append(format_time(hour * 60))
-        slots.append(format_time(hour * 60 + 30))
-    return slots
+def slot_grid(window_start: int, window_end: int, slot_interval: int = SLOT_INTERVAL) -> range:
+    """
+    Slot start minutes in [window_start, window_end): the multiples of
+    slot_interval, so every agent's slots line up on the same clock times.
+    """
+    return range(-(-window_start // slot_interval) * slot_interval, window_end, slot_interval)
 
 
-def get_weekly_template(agency_id: int, availability_db: Dict) -> List[Dict]:
-    """Get weekly availability template for agency."""
-    return availability_db.get(agency_id, [])
+@lru_cache(maxsize=256)
+def _slot_grid(window_start: int, window_end: int, slot_interval: int) -> Tuple[int, np.ndarray]:
+    """slot_grid as a day bitset and a read-only int32 array."""
+    minutes = np.array(slot_grid(window_start, window_end, slot_interval), dtype=np.int32)
+    minutes.flags.writeable = False
+    return sum(1 << m for m in minutes.tolist()), minutes
 
 
-def get_blockouts_for_date(agency_id: int, target_date: date, blockouts_db: Dict) -> List[Dict]:
-    """Get all blockouts for a specific date."""
-    date_str = str(target_date)
-    blockouts = blockouts_db.get(agency_id, [])
-    return [b for b in blockouts if b.get("date") == date_str]
+def _in_intervals(points: np.ndarray, intervals: List[Tuple[int, int]]) -> np.ndarray:
+    """Mask of the sorted points inside any of the sorted, non-overlapping half-open intervals."""
+    if not intervals:
+        return np.zeros(len(points), dtype=bool)
+    bounds = np.array(intervals, dtype=np.int32)
+    # The first interval ending after each point
+    pos = np.searchsorted(bounds[:, 1], points, side="right")
+    inside = pos < len(bounds)
+    inside[inside] = points[inside] >= bounds[pos[inside], 0]
+    return inside
 
 
-def get_confirmed_viewings_for_date(agency_id: int, target_date: date, viewings_db: Dict, properties_db: Dict) -> List[Dict]:
-    """Get confirmed viewings for a specific date."""
-    # For MVP, we'll use confirmed viewings and assume they're for today if no date field exists
-    # In production, this would filter by actual viewing date
-    confirmed = [
-        v for v in viewings_db.values()
-        if v.get("status") == "confirmed"
-    ]
-    
-    # Enrich with property info
-    enriched = []
-    for viewing in confirmed:
-        property_id = viewing.get("property_id")
-        if property_id and property_id in properties_db:
-            property_data = properties_db[property_id]
-            enriched.append({
-                **viewing,
-                "property": property_data,
-                "property_postcode": property_data.get("postcode", "")
-            })
-    return enriched
+def get_viewing_start(viewing: Dict) -> Optional[int]:
+    """Start of a viewing in minutes since midnight (confirmed time wins over requested)."""
+    viewing_time = viewing.get("confirmed_time") or viewing.get("requested_time")
+    if not viewing_time:
+        return None
+    return parse_time(viewing_time)
+
+
+def merge_intervals(intervals: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Sort half-open [start, end) intervals and merge any that overlap or touch."""
+    merged: List[List[int]] = []
+    for start, end in sorted(intervals):
+        if start >= end:
+            continue
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
 
 
-def is_time_within_blockout(time_str: str, blockouts: List[Dict]) -> bool:
-    """Check if a time slot falls within any blockout."""
-    time_minutes = parse_time(time_str)
-    
+def _block_blockouts(calendar: DayCalendar, blockouts: List[Dict]) -> None:
     for blockout in blockouts:
         if blockout.get("full_day"):
-            return True  # Full day blockout
-        
+            calendar.block_day()
+            return
         start_time = blockout.get("start_time")
         end_time = blockout.get("end_time")
-        
         if start_time and end_time:
-            start_minutes = parse_time(start_time)
-            end_minutes = parse_time(end_time)
-            
-            # Check if time falls within the blockout range
-            # For a 30-min slot starting at time_str, check if it overlaps
-            if time_minutes >= start_minutes and time_minutes < end_minutes:
-                return True
-            # Also check if slot overlaps (slot is 30 min, so check if slot end is within blockout)
-            if time_minutes + 30 > start_minutes and time_minutes < end_minutes:
-                return True
-    
-    return False
-
-
-def is_time_conflicting_with_viewing(
-    time_str: str,
+            calendar.block(parse_time(start_time), parse_time(end_time))
+
+
+def _book_viewings(calendar: DayCalendar, confirmed_viewings: List[Dict], viewing_duration: int) -> None:
+    for viewing in confirmed_viewings:
+        viewing_start = get_viewing_start(viewing)
+        if viewing_start is not None:
+            calendar.book(viewing_start, viewing_duration)
+
+
+def build_day_calendar(
+    blockouts: List[Dict],
     confirmed_viewings: List[Dict],
     viewing_duration: int = 20,
     travel_buffer: int = 10
-) -> bool:
-    """Check if a time slot conflicts with confirmed viewings."""
-    time_minutes = parse_time(time_str)
-    slot_end = time_minutes + viewing_duration
-    
-    for viewing in confirmed_viewings:
-        viewing_time = viewing.get("confirmed_time") or viewing.get("requested_time")
-        if not viewing_time:
+) -> DayCalendar:
+    """
+    DayCalendar for one agent and date: its blockouts and its confirmed
+    viewings, each viewing_duration long. A new viewing fits where it
+    overlaps neither a blockout nor a viewing, travel_buffer included.
+    """
+    calendar = DayCalendar(travel_buffer)
+    _block_blockouts(calendar, blockouts)
+    _book_viewings(calendar, confirmed_viewings, viewing_duration)
+    return calendar
+
+
+def build_free_timeline(
+    window_start: int,
+    window_end: int,
+    blockouts: List[Dict],
+    confirmed_viewings: List[Dict],
+    viewing_duration: int = 20,
+    travel_buffer: int = 10,
+    not_before: Optional[int] = None
+) -> List[Tuple[int, int]]:
+    """
+    Build the sorted free-interval timeline for one agent and date.
+
+    Intervals are expressed as ranges of allowed slot *start* minutes, so a
+    slot starting at t is bookable when t falls inside one of them: the
+    starts from not_before on whose viewing ends within the window, where
+    the day's build_day_calendar fits it.
+    """
+    calendar = build_day_calendar(blockouts, confirmed_viewings, viewing_duration, travel_buffer)
+    starts = minute_bits(max(window_start, not_before or 0), window_end - viewing_duration + 1)
+    return bit_intervals(calendar.fits(viewing_duration) & starts)
+
+
+def _postcode_travel(
+    postcodes: List[str],
+    property_postcode: str,
+    to_property: bool = True,
+    agency_id: Optional[int] = None
+) -> np.ndarray:
+    """
+    Travel minutes from each of postcodes to property_postcode (or from the
+    property to each when to_property is False) in each time-of-day band of
+    the travel model, shape (len(postcodes) + 1, bands), with a row of -1
+    appended so that indexing with a missing postcode (-1) reads -1.
+    """
+    if to_property:
+        minutes = travel_time.batch_travel_times_by_band(postcodes, [property_postcode], agency_id)[:, 0]
+    else:
+        minutes = travel_time.batch_travel_times_by_band([property_postcode], postcodes, agency_id)[0]
+    return np.vstack((minutes, np.full((1, minutes.shape[1]), -1))).astype(np.int32)
+
+
+def _travel_blocked_intervals(
+    columns: ViewingColumns,
+    to_property: np.ndarray,
+    from_property: np.ndarray,
+    duration: int = travel_time.VIEWING_DURATION
+) -> List[Tuple[int, int]]:
+    """
+    Slot starts ruled out by travel to/from the agent's neighbouring viewings.
+
+    to_property and from_property are _postcode_travel for the viewings'
+    postcode_keys; duration is the new viewing's. As in slot_reference, only
+    the viewing immediately before and after a slot constrain it, so each
+    window is clipped to the gap between neighbouring viewing start times.
+    Travel from a viewing is priced at its end, travel to one at its start.
+    """
+    if not len(columns):
+        return []
+    buffer = travel_time.TRAVEL_BUFFER
+    starts = columns.starts
+
+    # Of viewings sharing a start time, the last one is the "previous"
+    # viewing for later slots and the first one the "next" for earlier slots
+    first, last = columns.group_first, columns.group_last
+    group_starts = starts[first]
+    band = travel_time.travel_model.band
+    travel_from_prev = to_property[columns.postcodes[last], band(group_starts + columns.durations[last])]
+    travel_to_next = from_property[columns.postcodes[first], band(group_starts)]
+
+    # Travel from the previous viewing, clipped to the next one's start
+    ends = group_starts + columns.durations[last] + buffer + travel_from_prev
+    ends[:-1] = np.minimum(ends[:-1], group_starts[1:])
+    after = travel_from_prev >= 0
+    # Travel on to the next viewing, clipped to the previous one's start
+    begins = group_starts - duration - buffer - travel_to_next + 1
+    begins[1:] = np.maximum(begins[1:], group_starts[:-1] + 1)
+    before = travel_to_next >= 0
+
+    # Plus the direct overlap with each viewing itself
+    lows = np.concatenate((starts - duration + 1, group_starts[after] + 1, begins[before]))
+    highs = np.concatenate((starts + columns.durations, ends[after], group_starts[before]))
+    return merge_intervals(zip(lows.tolist(), highs.tolist()))
+
+
+def find_day_rule(weekly_template: List[Dict], day_of_week: int) -> Optional[Dict]:
+    """First enabled weekly-template rule for a day of week (0=Monday), or None."""
+    for rule in weekly_template:
+        if rule.get("day_of_week") == day_of_week and rule.get("enabled"):
+            return rule
+    return None
+
+
+def _slot_result(minutes: int, travel_minutes: int) -> Dict:
+    """Slot dict for a start time and the travel from the previous viewing (-1 if none)."""
+    slot_result = {
+        "time": format_time(minutes),
+        "status": "tight" if travel_minutes > travel_time.TIGHT_TRAVEL_MINUTES else "ok",
+    }
+    if travel_minutes > 0:
+        slot_result["travel_minutes"] = travel_minutes
+    return slot_result
+
+
+def day_slot_arrays(
+    today_rule: Optional[Dict],
+    blockouts: List[Dict],
+    calendar: DayCalendar,
+    columns: ViewingColumns,
+    property_travel: Tuple[np.ndarray, np.ndarray],
+    target_date: date,
+    viewing_duration: int = 20,
+    now: Optional[datetime] = None,
+    slot_interval: int = SLOT_INTERVAL
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Slots for a viewing_duration viewing on one agent's day, every
+    slot_interval minutes, as two int32 arrays: the start minute of each
+    slot and the travel minutes from the agent's previous viewing to the
+    property (-1 if there is none).
+
+    calendar is the day's build_day_calendar of its blockouts and confirmed
+    viewings, columns those viewings as ViewingColumns and property_travel
+    their _postcode_travel to and from the property (see AgentDay, which
+    keeps all three between requests).
+    """
+    no_slots = (np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32))
+    timer = metrics.StepTimer() if metrics.enabled else None
+
+    # STEP 1: Apply weekly template, to the minute, and the slot grid within it
+    if not today_rule:
+        return no_slots
+
+    window_start = parse_time(today_rule.get("start_time", "09:00"))
+    window_end = parse_time(today_rule.get("end_time", "18:00"))
+    grid, grid_minutes = _slot_grid(window_start, window_end, slot_interval)
+    if timer:
+        timer.lap("1_template")
+
+    # STEP 2: Blockouts
+    if any(b.get("full_day") for b in blockouts):
+        if timer:
+            metrics.record_pruned({"2_blockouts": grid.bit_count()})
+        return no_slots
+    if timer:
+        timer.lap("2_blockouts")
+
+    # STEP 3: This agent's confirmed viewings are already in the calendar
+    # and columns, built once for the day
+    if timer:
+        timer.lap("3_viewings")
+
+    # STEP 4: Every start the viewing fits at, ending within the window and,
+    # if target_date is today, not in the past
+    now = now or datetime.now()
+    not_before = window_start
+    if target_date == now.date():
+        not_before = max(not_before, now.hour * 60 + now.minute + 31)
+    starts = calendar.fits(viewing_duration) & minute_bits(not_before, window_end - viewing_duration + 1)
+    if timer:
+        timer.lap("4_past_times")
+
+    # STEP 5: Slot starts on the grid still free, less the travel windows
+    # around the agent's viewings (one lookup per distinct postcode)
+    to_property, from_property = property_travel
+    slot_starts = bits_at(starts, grid_minutes)
+    travel_blocked = _in_intervals(
+        slot_starts, _travel_blocked_intervals(columns, to_property, from_property, viewing_duration)
+    )
+    slot_starts = slot_starts[~travel_blocked]
+    if timer:
+        timer.lap("5_travel")
+        metrics.record_pruned(_pruned_by_step(
+            grid, calendar, viewing_duration, not_before, int(np.count_nonzero(travel_blocked))
+        ))
+        timer.restart()
+    if not len(slot_starts):
+        return no_slots
+
+    # STEP 6: Travel from the last viewing starting before each slot, for "tight"
+    prev = np.searchsorted(columns.starts, slot_starts, side="left") - 1
+    leaving = travel_time.travel_model.band(columns.starts + columns.durations)
+    travel = np.append(to_property[columns.postcodes, leaving], -1)[prev]
+    if timer:
+        timer.lap("6_slots")
+    return slot_starts, travel.astype(np.int32)
+
+
+def _pruned_by_step(
+    grid: int,
+    calendar: DayCalendar,
+    viewing_duration: int,
+    not_before: int,
+    travel_pruned: int
+) -> Dict[str, int]:
+    """
+    How many of the template's slot starts STEPs 2-5 each rule out, counting
+    a slot against the first step that blocks it (for metrics).
+    """
+    left = [grid, grid & run_starts(DAY_BITS & ~calendar.blocked, viewing_duration)]
+    left.append(left[-1] & calendar.fits(viewing_duration))
+    left.append(left[-1] & minute_bits(not_before, MINUTES_PER_DAY))
+    steps = ("2_blockouts", "3_viewings", "4_past_times")
+    pruned = {step: before.bit_count() - after.bit_count() for step, before, after in zip(steps, left, left[1:])}
+    pruned["5_travel"] = travel_pruned
+    return pruned
+
+
+def slot_cutoff_key(target_date: date, now: Optional[datetime] = None, slot_interval: int = SLOT_INTERVAL) -> Optional[int]:
+    """
+    Identifies how far today's past-time filter has advanced, for cache keys.
+    None for any other date; for today, the index of the first slot start
+    that is still bookable, which only changes every slot_interval minutes.
+    """
+    now = now or datetime.now()
+    if target_date != now.date():
+        return None
+    not_before = now.hour * 60 + now.minute + 31
+    return -(-not_before // slot_interval)
+
+
+def blockouts_for_agent(blockouts: List[Dict], agent_id: int) -> List[Dict]:
+    """Blockouts that apply to an agent: agency-wide ones (no agent_id) and their own."""
+    return [b for b in blockouts if b.get("agent_id") in (None, agent_id)]
+
+
+def agent_covers_property(agent: Dict, property_id: int) -> bool:
+    """Agents with no property_ids cover every property in their agency."""
+    return not agent.get("property_ids") or property_id in agent["property_ids"]
+
+
+class AgentDay:
+    """
+    One agent's calendar for one date, ready for slot generation: their
+    weekly-template rule, the blockouts that apply to them, their confirmed
+    viewings (a DayTimeline) and the DayCalendar of both. Trips are priced
+    from agency_id's precomputed travel matrix where it has one.
+    viewing_duration is how long the agency's viewings last: confirmed ones
+    are booked for it everywhere (calendar, columns, feasibility), and new
+    ones are offered at it unless slots are asked for another length.
+
+    Built once per (agent, date) and cached between requests, then kept
+    current in place: apply() for a viewing changing status and
+    add_blockout()/remove_blockout(). Adding sets the new minutes in the
+    calendar's bitsets; removing rebuilds the calendar, a handful of bitwise
+    ors, so a booking doesn't mean reloading the day. The viewings'
+    ViewingColumns are built lazily and kept until the next viewing change.
+    """
+
+    def __init__(
+        self,
+        agent_id: int,
+        target_date: date,
+        rule: Optional[Dict],
+        blockouts: List[Dict],
+        confirmed_viewings: List[Dict],
+        properties_db: Dict,
+        start_postcode: Optional[str] = None,
+        viewing_duration: int = 20,
+        travel_buffer: int = 10,
+        agency_id: Optional[int] = None
+    ):
+        self.agent_id = agent_id
+        self.agency_id = agency_id
+        self.date = target_date
+        self.rule = rule
+        self.blockouts = list(blockouts)
+        self.start_postcode = start_postcode
+        self.viewing_duration = viewing_duration
+        self.travel_buffer = travel_buffer
+        self.timeline = DayTimeline(v for v in confirmed_viewings if v.get("property_id") in properties_db)
+        self.properties = {v["property_id"]: properties_db[v["property_id"]] for v in self.timeline.viewings}
+        self._columns: Optional[ViewingColumns] = None
+        self._gaps: Optional[Tuple[np.ndarray, ...]] = None
+        self._travel: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        if rule:
+            # Same window as day_slot_arrays
+            self.window = (
+                parse_time(rule.get("start_time", "09:00")),
+                parse_time(rule.get("end_time", "18:00")),
+            )
+        else:
+            self.window = None
+        self._rebuild()
+
+    @property
+    def confirmed(self) -> List[Dict]:
+        return self.timeline.viewings
+
+    @property
+    def starts(self) -> List[int]:
+        return self.timeline.starts
+
+    @property
+    def columns(self) -> ViewingColumns:
+        if self._columns is None:
+            self._columns = ViewingColumns(self.confirmed, self.properties, self.viewing_duration)
+            self._gaps = None
+            self._travel = {}
+        return self._columns
+
+    def _postcodes(self) -> List[str]:
+        """The columns' postcode_keys, then start_postcode if there is one."""
+        postcodes = self.columns.postcode_keys
+        return postcodes + [self.start_postcode] if self.start_postcode else postcodes
+
+    def property_travel(self, property_postcode: str) -> Tuple[np.ndarray, np.ndarray]:
+        """_postcode_travel to and from a property for _postcodes(), kept until the viewings change."""
+        travel = self._travel.get(property_postcode)
+        if travel is None:
+            postcodes = self._postcodes()
+            travel = self._travel[property_postcode] = (
+                _postcode_travel(postcodes, property_postcode, agency_id=self.agency_id),
+                _postcode_travel(postcodes, property_postcode, to_property=False, agency_id=self.agency_id),
+            )
+        return travel
+
+    def _closed(self) -> bool:
+        return self.window is None or any(b.get("full_day") for b in self.blockouts)
+
+    def _rebuild(self) -> None:
+        self.calendar = build_day_calendar(self.blockouts, self.confirmed, self.viewing_duration, self.travel_buffer)
+
+    def apply(self, viewing: Dict, property: Optional[Dict]) -> None:
+        """Bring the day in line with a viewing of this agent's after its status or time changed."""
+        previous = self.timeline.remove(viewing["id"])
+        self._columns = None
+        start = get_viewing_start(viewing)
+        if viewing.get("status") == "confirmed" and property and start is not None:
+            self.properties[property["id"]] = property
+            self.timeline.insert(viewing)
+            if previous is None:
+                self.calendar.book(start, self.viewing_duration)
+        if previous is not None:
+            self._rebuild()
+
+    def add_blockout(self, blockout: Dict) -> None:
+        self.blockouts.append(blockout)
+        _block_blockouts(self.calendar, [blockout])
+
+    def remove_blockout(self, blockout_id: int) -> None:
+        if any(b.get("id") == blockout_id for b in self.blockouts):
+            self.blockouts = [b for b in self.blockouts if b.get("id") != blockout_id]
+            self._rebuild()
+
+    def slots(
+        self,
+        property_postcode: str,
+        now: Optional[datetime] = None,
+        slot_interval: int = SLOT_INTERVAL,
+        viewing_duration: Optional[int] = None
+    ) -> List[Dict]:
+        """Slots at a property on this agent's day: {"time", "status", "travel_minutes" if any}."""
+        slot_starts, travel = self.slot_arrays(property_postcode, now, slot_interval, viewing_duration)
+        return [_slot_result(minutes, travel_minutes) for minutes, travel_minutes in zip(slot_starts.tolist(), travel.tolist())]
+
+    def slot_arrays(
+        self,
+        property_postcode: str,
+        now: Optional[datetime] = None,
+        slot_interval: int = SLOT_INTERVAL,
+        viewing_duration: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        day_slot_arrays for a property on this agent's day, for viewings of
+        viewing_duration minutes (default the day's own viewing_duration).
+        """
+        return day_slot_arrays(
+            self.rule, self.blockouts, self.calendar, self.columns, self.property_travel(property_postcode),
+            self.date, viewing_duration or self.viewing_duration, now, slot_interval
+        )
+
+    def added_travel_by_gap(self, property_postcode: str) -> np.ndarray:
+        """
+        Extra travel for the agent if a viewing at property_postcode is slotted
+        into each gap between their confirmed viewings: index i is just before
+        the i-th viewing (coming from start_postcode before the first), the
+        last index after the last viewing. A start time's gap is
+        bisect_left(starts, minutes).
+        """
+        columns = self.columns
+        if self._gaps is None:
+            # Postcode indexes either side of each gap, and the travel between them,
+            # leaving the viewing before (home at the start of the day) and
+            # arriving at the one after
+            home = len(columns.postcode_keys) if self.start_postcode else -1
+            before = np.concatenate(([home], columns.postcodes)).astype(np.int32)
+            after = np.append(columns.postcodes, -1).astype(np.int32)
+            day_start = self.window[0] if self.window else travel_time.travel_model.default_minute
+            leave = np.concatenate(([day_start], columns.starts + columns.durations)).astype(np.int32)
+            arrive = np.append(columns.starts, day_start).astype(np.int32)
+            postcodes = self._postcodes()
+            between = np.array([
+                travel_time.get_base_travel_time(postcodes[b], postcodes[a], at, self.agency_id) if b >= 0 and a >= 0 else 0
+                for b, a, at in zip(before.tolist(), after.tolist(), leave.tolist())
+            ], dtype=np.int32)
+            band = travel_time.travel_model.band
+            self._gaps = (before, after, between, band(leave), band(arrive))
+        before, after, between, leave, arrive = self._gaps
+        to_property, from_property = self.property_travel(property_postcode)
+        return np.maximum(to_property[before, leave], 0) + np.maximum(from_property[after, arrive], 0) - between
+
+    def added_travel(self, property_postcode: str, minutes: int) -> int:
+        """Extra travel for the agent if a viewing at property_postcode starts at minutes (see added_travel_by_gap)."""
+        return int(self.added_travel_by_gap(property_postcode)[bisect_left(self.starts, minutes)])
+
+    def feasibility(self, property_postcode: str, minutes: int, viewing_duration: Optional[int] = None) -> Dict:
+        """
+        Whether a viewing at property_postcode starting at minutes, for
+        viewing_duration (default the day's), fits around the agent's
+        confirmed viewings, by the travel rules slots are offered by; the
+        availability window and blockouts aren't checked. Returns
+        {"status": "conflict", "reason": str}, {"status": "tight",
+        "travel_minutes": int} or {"status": "ok"}.
+        """
+        duration = viewing_duration or self.viewing_duration
+        booked = self.viewing_duration
+        # A single check is a handful of comparisons: bisect the timeline's
+        # list of starts rather than paying for numpy calls on tiny arrays
+        starts = self.starts
+        first_after = bisect_right(starts, minutes - booked)
+        if first_after < len(starts) and starts[first_after] < minutes + duration:
+            return {"status": "conflict", "reason": "Agent has viewing at this time"}
+
+        columns = self.columns
+        to_property, from_property = self.property_travel(property_postcode)
+        band = travel_time.travel_model.band
+        buffer = travel_time.TRAVEL_BUFFER
+        # The last viewing starting before minutes and the first starting after
+        prev = bisect_left(starts, minutes) - 1
+        following = bisect_right(starts, minutes)
+        prev_travel = -1
+        if prev >= 0:
+            prev_end = starts[prev] + booked
+            prev_travel = int(to_property[columns.postcodes[prev], band(prev_end)])
+            if prev_travel >= 0 and minutes < prev_end + buffer + prev_travel:
+                prev_postcode = columns.postcode_keys[columns.postcodes[prev]]
+                return {"status": "conflict", "reason": f"Insufficient travel time from {prev_postcode}"}
+        if following < len(starts):
+            next_start = starts[following]
+            travel_to_next = int(from_property[columns.postcodes[following], band(next_start)])
+            if travel_to_next >= 0 and minutes + duration + buffer + travel_to_next > next_start:
+                return {"status": "conflict", "reason": "Insufficient time before next viewing"}
+
+        if prev_travel > travel_time.TIGHT_TRAVEL_MINUTES:
+            return {"status": "tight", "travel_minutes": prev_travel}
+        return {"status": "ok"}
+
+    def is_free(self, property_postcode: str, minutes: int) -> bool:
+        """True if the agent could take a viewing at property_postcode starting at minutes."""
+        if self._closed() or not self.window[0] <= minutes <= self.window[1] - self.viewing_duration:
+            return False
+        if not self.calendar.fits(self.viewing_duration) >> minutes & 1:
+            return False
+        return self.feasibility(property_postcode, minutes)["status"] != "conflict"
+
+    def route_free(self, not_before: Optional[int] = None) -> List[Tuple[int, int]]:
+        """
+        plan_day_route's free start ranges for the day: the working window
+        less the blockouts, from not_before on. Confirmed viewings are left
+        in, being stops on the route themselves.
+        """
+        if self._closed():
+            return []
+        return build_free_timeline(
+            self.window[0], self.window[1], self.blockouts, [], self.viewing_duration, self.travel_buffer, not_before
+        )
+
+
+def generate_agent_slots(
+    agent_days: List[AgentDay],
+    property_postcode: str,
+    now: Optional[datetime] = None,
+    slot_interval: int = SLOT_INTERVAL,
+    viewing_duration: Optional[int] = None
+) -> List[Dict]:
+    """
+    Union of the slots the given agents (AgentDays for the same date) can
+    offer at a property, every slot_interval minutes for viewings of
+    viewing_duration. A time more than one agent can cover goes to the
+    one it adds least travel for (earliest in agent_days on a tie), and
+    every slot carries the agent_id it was assigned to.
+    """
+    best: Dict[int, Tuple[int, int, int]] = {}
+    for day in agent_days:
+        slot_starts, travel = day.slot_arrays(property_postcode, now, slot_interval, viewing_duration)
+        if not len(slot_starts):
             continue
-        
-        viewing_start = parse_time(viewing_time)
-        viewing_end = viewing_start + viewing_duration
-        
-        # Check for overlap (with travel buffer)
-        # New slot conflicts if it starts within travel_buffer of existing viewing end
-        # or if existing viewing starts within travel_buffer of new slot end
-        if (time_minutes < viewing_end + travel_buffer and slot_end + travel_buffer > viewing_start):
-            return True
-    
-    return False
-
-
-def calculate_travel_feasibility(
-    time_str: str,
-    property_id: int,
+        added = day.added_travel_by_gap(property_postcode)[
+            np.searchsorted(day.columns.starts, slot_starts, side="left")
+        ]
+        for minutes, travel_minutes, extra in zip(slot_starts.tolist(), travel.tolist(), added.tolist()):
+            current = best.get(minutes)
+            if current is None or extra < current[0]:
+                best[minutes] = (extra, travel_minutes, day.agent_id)
+    return [
+        {**_slot_result(minutes, best[minutes][1]), "agent_id": best[minutes][2]}
+        for minutes in sorted(best)
+    ]
+
+
+def generate_slots_range(
+    agent_days: Dict[Tuple[int, str], AgentDay],
+    agent_ids: List[int],
+    dates: Iterable[date],
     property_postcode: str,
-    confirmed_viewings: List[Dict],
+    now: Optional[datetime] = None,
+    slot_interval: int = SLOT_INTERVAL,
+    viewing_duration: Optional[int] = None
+) -> Iterator[Tuple[date, List[Dict]]]:
+    """
+    (date, generate_agent_slots for the agents on that date) for each date
+    in turn, from agent_days keyed (agent_id, date string) as
+    main.load_agent_days returns them. Each day is worked out only when
+    it's asked for, so a caller can send it on before the next.
+    """
+    for day in dates:
+        yield day, generate_agent_slots(
+            [agent_days[(agent_id, str(day))] for agent_id in agent_ids], property_postcode, now,
+            slot_interval, viewing_duration
+        )
+
+
+def choose_agent(agent_days: List[AgentDay], property_postcode: str, minutes: int) -> Optional[int]:
+    """
+    Agent to take a new request at property_postcode starting at minutes:
+    of those free then, the one it adds least travel for; if nobody is free,
+    the least added travel overall (the request still needs a new time).
+    None if agent_days is empty.
+    """
+    ranked = sorted(
+        agent_days,
+        key=lambda day: (not day.is_free(property_postcode, minutes), day.added_travel(property_postcode, minutes))
+    )
+    return ranked[0].agent_id if ranked else None
+
+
+def feasibility_day_key(viewing: Dict) -> Tuple[int, Optional[str]]:
+    """(agent_id, date) whose confirmed viewings a request is checked against."""
+    return viewing["agent_id"], viewing_date(viewing)
+
+
+def batch_viewing_feasibility(
+    viewings: List[Dict],
     properties_db: Dict,
-    agent_id: int = 1
+    agent_days: Dict[Tuple[int, Optional[str]], AgentDay]
+) -> Dict[int, Dict]:
+    """
+    Feasibility for many viewing requests in one pass, each checked with
+    AgentDay.feasibility on the day its feasibility_day_key names in
+    agent_days (a request with no such day has nothing to clash with).
+    Viewings whose property no longer exists are skipped.
+    Returns {viewing_id: result}.
+    """
+    results = {}
+    for viewing in viewings:
+        if viewing.get("property_id") not in properties_db or not viewing.get("requested_time"):
+            continue
+        agent_day = agent_days.get(feasibility_day_key(viewing))
+        results[viewing["id"]] = agent_day.feasibility(
+            properties_db[viewing["property_id"]].get("postcode"), parse_time(viewing["requested_time"])
+        ) if agent_day else {"status": "ok"}
+    return results
+
+
+def confirmation_conflict(
+    viewing: Dict,
+    other_confirmed: List[Dict],
+    properties_db: Dict,
+    viewing_duration: int = travel_time.VIEWING_DURATION
+) -> Optional[str]:
+    """
+    Reason a viewing can't be confirmed at its confirmed_time, or None if it fits
+    the agent's other confirmed viewings that day (tight travel is allowed),
+    all viewing_duration long. Used (with the agency's duration bound) as the
+    check for storage's atomic confirm_viewing.
+    """
+    prop = properties_db.get(viewing.get("property_id"))
+    start = get_viewing_start(viewing)
+    if not prop or start is None:
+        return None
+    day = viewing_date(viewing)
+    agent_day = AgentDay(
+        viewing.get("agent_id"), date.fromisoformat(day) if day else None, None, [], other_confirmed,
+        properties_db, viewing_duration=viewing_duration
+    )
+    result = agent_day.feasibility(prop.get("postcode"), start)
+    return result.get("reason") if result["status"] == "conflict" else None
+
+
+# Day-route planning
+#
+# Orders an agent's viewings for one day to minimise travel: a time-windowed
+# travelling-salesman problem over the travel-time matrix. Confirmed viewings
+# are fixed at their confirmed time; pending requests keep their requested
+# time when the agent can make it, otherwise move up to ROUTE_PENDING_FLEX
+# minutes, at a cost of ROUTE_MOVE_PENALTY travel minutes each. Cheapest
+# insertion builds a route, then relocate / swap / segment-reversal moves
+# improve it until nothing improves or the time budget runs out.
+
+ROUTE_PENDING_FLEX = 60  # minutes a pending request may move from its requested time
+ROUTE_START_GRANULARITY = 5  # proposed start times for pending requests are rounded up to this
+ROUTE_MOVE_PENALTY = 30  # travel minutes a moved request is worth avoiding
+ROUTE_TIME_LIMIT_MS = 50  # local-search budget; construction is not limited
+
+
+class _RouteProblem:
+    """Windows and travel minutes for one day; stops are 0..n-1 and row n is the depot."""
+
+    def __init__(
+        self,
+        earliest: List[int],
+        latest: List[int],
+        preferred: List[int],
+        fixed: List[bool],
+        travel: List[List[int]],
+        service: int,
+        day_start: int,
+        granularity: int,
+        free: Optional[List[Tuple[int, int]]] = None
+    ):
+        self.earliest = earliest
+        self.latest = latest
+        self.preferred = preferred
+        self.fixed = fixed
+        self.travel = travel
+        self.service = service  # viewing duration + buffer before travelling on
+        self.depot = len(earliest)
+        self.day_start = day_start
+        self.granularity = granularity
+        # Allowed start ranges for pending stops (e.g. outside blockouts), sorted half-open
+        self.free_starts = [start for start, _ in free] if free is not None else None
+        self.free_ends = [end for _, end in free] if free is not None else None
+
+    def _next_free_start(self, start: int) -> Optional[int]:
+        """First allowed start at or after start on the granularity grid, or None."""
+        granularity = self.granularity
+        if start % granularity:
+            start += granularity - start % granularity
+        if self.free_starts is None:
+            return start
+        idx = bisect_right(self.free_ends, start)
+        while idx < len(self.free_ends):
+            candidate = max(start, self.free_starts[idx])
+            if candidate % granularity:
+                candidate += granularity - candidate % granularity
+            if candidate < self.free_ends[idx]:
+                return candidate
+            idx += 1
+        return None
+
+    def _prev_free_start(self, start: int) -> Optional[int]:
+        """Last allowed start at or before start on the granularity grid, or None."""
+        granularity = self.granularity
+        start -= start % granularity
+        if self.free_starts is None:
+            return start
+        idx = bisect_right(self.free_starts, start) - 1
+        while idx >= 0:
+            candidate = min(start, self.free_ends[idx] - 1)
+            candidate -= candidate % granularity
+            if candidate >= self.free_starts[idx]:
+                return candidate
+            idx -= 1
+        return None
+
+    def latest_starts(self, route: List[int]) -> Optional[List[int]]:
+        """
+        Backward pass: for each position, the latest start that still lets
+        every later stop be reached within its window. None if even starting
+        as late as allowed leaves some stop unreachable.
+        """
+        travel = self.travel
+        fixed = self.fixed
+        service = self.service
+        latest = [0] * len(route)
+        next_stop = None
+        for pos in range(len(route) - 1, -1, -1):
+            stop = route[pos]
+            if fixed[stop]:
+                limit = self.earliest[stop]
+            else:
+                limit = self.latest[stop]
+                if next_stop is not None:
+                    limit = min(limit, latest[pos + 1] - service - travel[stop][next_stop])
+                limit = self._prev_free_start(limit)
+                if limit is None or limit < self.earliest[stop]:
+                    return None
+            latest[pos] = limit
+            next_stop = stop
+        return latest
+
+    def schedule(self, route: List[int], bound: Optional[int] = None) -> Optional[Tuple[int, List[int]]]:
+        """
+        Start times visiting stops in order, as (cost, starts), where cost is
+        travel minutes plus ROUTE_MOVE_PENALTY per pending stop not at its
+        preferred time. None if a window is missed or cost reaches bound.
+
+        Pending stops start at their preferred time if the agent can be there,
+        it's free and it leaves time for the rest of the route (latest_starts);
+        otherwise as early as possible. Fixed stops keep their time even when the agent can't get there from
+        the depot or another fixed stop (an existing clash isn't ours to
+        fix); a pending stop that makes one late is rejected.
+        """
+        travel = self.travel
+        fixed = self.fixed
+        latest = self.latest_starts(route)
+        if latest is None:
+            return None
+        total = 0
+        prev = self.depot
+        ready = self.day_start
+        starts = []
+        for pos, stop in enumerate(route):
+            leg = travel[prev][stop]
+            total += leg
+            if bound is not None and total >= bound:
+                return None
+            if fixed[stop]:
+                start = self.earliest[stop]
+                if ready + leg > start and prev != self.depot and not fixed[prev]:
+                    return None
+            else:
+                preferred = self.preferred[stop]
+                if ready + leg <= preferred <= latest[pos] and self._next_free_start(preferred) == preferred:
+                    start = preferred
+                else:
+                    start = self._next_free_start(max(ready + leg, self.earliest[stop]))
+                    if start is None or start > latest[pos]:
+                        return None
+                    total += ROUTE_MOVE_PENALTY
+                    if bound is not None and total >= bound:
+                        return None
+            starts.append(start)
+            ready = start + self.service
+            prev = stop
+        return total, starts
+
+    def cheapest_insertion(self, route: List[int], stop: int) -> Optional[Tuple[List[int], int]]:
+        """Best feasible position for stop in route, as (new route, cost), or None."""
+        best = None
+        for pos in range(len(route) + 1):
+            candidate = route[:pos] + [stop] + route[pos:]
+            result = self.schedule(candidate, best[1] if best else None)
+            if result is not None:
+                best = (candidate, result[0])
+        return best
+
+    def neighbours(self, route: List[int]) -> Iterator[List[int]]:
+        """Relocate and swap pending stops, and reverse runs of pending stops."""
+        fixed = self.fixed
+        n = len(route)
+        for i in range(n):
+            if fixed[route[i]]:
+                continue
+            rest = route[:i] + route[i + 1:]
+            for pos in range(n):
+                if pos != i:
+                    yield rest[:pos] + [route[i]] + rest[pos:]
+        for i in range(n - 1):
+            if fixed[route[i]]:
+                continue
+            for j in range(i + 1, n):
+                if fixed[route[j]]:
+                    break  # a reversal can't cross a fixed stop; swaps across one are relocates
+                swapped = list(route)
+                swapped[i], swapped[j] = swapped[j], swapped[i]
+                yield swapped
+                if j > i + 1:
+                    yield route[:i] + route[i:j + 1][::-1] + route[j + 1:]
+
+
+def _eject_and_insert(
+    problem: _RouteProblem,
+    route: List[int],
+    left_out: List[int],
+    deadline: float
+) -> Optional[Tuple[List[int], int, int]]:
+    """
+    Repair move: take a pending stop out of the route, insert a left-out
+    stop, then put the removed one back elsewhere. Returns (route, cost,
+    inserted stop) if both fit, growing the route by one.
+    """
+    for stop in left_out:
+        for i, removed in enumerate(route):
+            if problem.fixed[removed]:
+                continue
+            if perf_counter() >= deadline:
+                return None
+            inserted = problem.cheapest_insertion(route[:i] + route[i + 1:], stop)
+            if inserted is None:
+                continue
+            reinserted = problem.cheapest_insertion(inserted[0], removed)
+            if reinserted is not None:
+                return reinserted[0], reinserted[1], stop
+    return None
+
+
+def plan_day_route(
+    viewings: List[Dict],
+    properties_db: Dict,
+    day_start: int,
+    day_end: int,
+    start_postcode: Optional[str] = None,
+    viewing_duration: int = travel_time.VIEWING_DURATION,
+    travel_buffer: int = travel_time.TRAVEL_BUFFER,
+    pending_flex: int = ROUTE_PENDING_FLEX,
+    time_limit_ms: float = ROUTE_TIME_LIMIT_MS,
+    free: Optional[List[Tuple[int, int]]] = None
 ) -> Dict:
     """
-    Calculate travel feasibility for a slot.
-    Returns: {"status": "ok"|"tight"|"conflict", "travel_minutes": int}
-    """
-    # Use existing travel_time logic
-    feasibility = travel_time.check_agent_slot_feasibility(
-        agent_id=agent_id,
-        time=time_str,
-        property_id=property_id,
-        property_postcode=property_postcode,
-        confirmed_viewings=confirmed_viewings,
-        properties_db=properties_db
+    Propose an order and start times for one agent's confirmed and pending
+    viewings on a day, minimising travel minutes.
+
+    day_start/day_end bound the working day in minutes since midnight.
+    start_postcode, if given, is where the agent sets off from (e.g. the
+    agency's base postcode). free, if given, limits pending viewings to
+    those start ranges (see build_free_timeline). Pending requests that
+    can't be fitted in are returned as unscheduled; maximising the number
+    scheduled comes before minimising travel plus moved-request penalties.
+    Confirmed viewings are always kept.
+
+    Returns:
+    {
+        "stops": [{"viewing_id", "property_id", "postcode", "status", "start": "HH:MM",
+                   "travel_minutes": minutes from the previous stop}, ...],
+        "total_travel_minutes": int,
+        "baseline_travel_minutes": travel visiting stops in requested-time order,
+        "unscheduled": [{"viewing_id", "reason"}, ...],
+        "feasible": False if the confirmed viewings alone can't be visited in
+                    order; stops then lists just those, unoptimised
+    }
+    """
+    stops: List[Dict] = []
+    earliest: List[int] = []
+    latest: List[int] = []
+    preferred: List[int] = []
+    fixed: List[bool] = []
+    unscheduled = []
+    for viewing in viewings:
+        prop = properties_db.get(viewing.get("property_id"))
+        start = get_viewing_start(viewing)
+        if not prop or start is None:
+            unscheduled.append({"viewing_id": viewing["id"], "reason": "Property or time missing"})
+            continue
+        is_fixed = viewing.get("status") == "confirmed"
+        stops.append({"viewing": viewing, "postcode": prop.get("postcode"), "requested": start})
+        fixed.append(is_fixed)
+        preferred.append(start)
+        if is_fixed:
+            earliest.append(start)
+            latest.append(start)
+        else:
+            earliest.append(max(day_start, start - pending_flex))
+            latest.append(min(day_end - viewing_duration, start + pending_flex))
+
+    postcodes = [stop["postcode"] for stop in stops]
+    if stops:
+        travel = travel_time.batch_travel_times(postcodes, postcodes).tolist()
+        if start_postcode:
+            travel.append(travel_time.batch_travel_times([start_postcode], postcodes)[0].tolist())
+        else:
+            travel.append([0] * len(stops))
+    else:
+        travel = [[]]
+    problem = _RouteProblem(
+        earliest, latest, preferred, fixed, travel, viewing_duration + travel_buffer, day_start,
+        ROUTE_START_GRANULARITY, free
     )
-    
-    if not feasibility.get("feasible"):
+
+    # Construction: confirmed stops in time order, then pending with the tightest windows first
+    route = sorted((i for i in range(len(stops)) if fixed[i]), key=lambda i: earliest[i])
+    scheduled = problem.schedule(route)
+    if scheduled is None:
+        # The confirmed viewings alone can't be visited in order; report them
+        # as booked and leave every pending request out
+        for stop in range(len(stops)):
+            if not fixed[stop]:
+                unscheduled.append({
+                    "viewing_id": stops[stop]["viewing"]["id"],
+                    "reason": "Confirmed viewings leave no feasible route",
+                })
         return {
-            "status": "conflict",
-            "travel_minutes": None
+            "stops": _route_stops(stops, route, [earliest[stop] for stop in route], travel, problem.depot),
+            "total_travel_minutes": sum(travel[a][b] for a, b in zip([problem.depot] + route, route)),
+            "baseline_travel_minutes": _baseline_travel(stops, travel, problem.depot),
+            "unscheduled": unscheduled,
+            "feasible": False,
         }
-    
-    # Check if it's "tight" (travel time > 20 minutes)
-    # Find previous viewing
-    prev_viewing = None
-    for v in sorted(confirmed_viewings, key=lambda x: parse_time(x.get("confirmed_time") or x.get("requested_time", "00:00"))):
-        viewing_time = v.get("confirmed_time") or v.get("requested_time", "00:00")
-        if parse_time(viewing_time) < parse_time(time_str):
-            prev_viewing = v
-    
-    if prev_viewing:
-        prev_property = prev_viewing.get("property") or properties_db.get(prev_viewing.get("property_id"))
-        if prev_property:
-            travel_minutes = travel_time.get_base_travel_time(
-                prev_property.get("postcode"),
-                property_postcode
-            )
-            if travel_minutes > 20:
-                return {
-                    "status": "tight",
-                    "travel_minutes": travel_minutes
-                }
-            return {
-                "status": "ok",
-                "travel_minutes": travel_minutes
-            }
-    
+    cost = scheduled[0]
+    order = sorted((i for i in range(len(stops)) if not fixed[i]), key=lambda i: (latest[i] - earliest[i], earliest[i]))
+    pending_out: List[int] = []
+    for stop in order:
+        inserted = problem.cheapest_insertion(route, stop)
+        if inserted is None:
+            pending_out.append(stop)
+        else:
+            route, cost = inserted
+
+    # Local search, first improvement, within the time budget
+    deadline = perf_counter() + time_limit_ms / 1000
+    improved = True
+    while improved and perf_counter() < deadline:
+        improved = False
+        for stop in list(pending_out):
+            inserted = problem.cheapest_insertion(route, stop)
+            if inserted is not None:
+                route, cost = inserted
+                pending_out.remove(stop)
+                improved = True
+        if not improved and pending_out:
+            ejected = _eject_and_insert(problem, route, pending_out, deadline)
+            if ejected is not None:
+                route, cost, stop = ejected
+                pending_out.remove(stop)
+                improved = True
+                continue
+        for candidate in problem.neighbours(route):
+            result = problem.schedule(candidate, cost)
+            if result is not None:
+                route, cost = candidate, result[0]
+                improved = True
+                break
+            if perf_counter() >= deadline:
+                break
+
+    for stop in pending_out:
+        unscheduled.append({
+            "viewing_id": stops[stop]["viewing"]["id"],
+            "reason": "No time for travel within the request's window",
+        })
+
+    _, starts = problem.schedule(route)
+    planned = _route_stops(stops, route, starts, travel, problem.depot)
     return {
-        "status": "ok",
-        "travel_minutes": None
+        "stops": planned,
+        "total_travel_minutes": sum(stop["travel_minutes"] for stop in planned),
+        "baseline_travel_minutes": _baseline_travel(stops, travel, problem.depot),
+        "unscheduled": unscheduled,
+        "feasible": True,
     }
 
 
-def generate_slots(
-    agency_id: int,
-    property_id: int,
-    property_postcode: str,
-    target_date: date,
-    availability_db: Dict,
-    blockouts_db: Dict,
-    viewings_db: Dict,
+def _route_stops(stops: List[Dict], route: List[int], starts: List[int], travel: List[List[int]], depot: int) -> List[Dict]:
+    planned = []
+    prev = depot
+    for stop, start in zip(route, starts):
+        viewing = stops[stop]["viewing"]
+        planned.append({
+            "viewing_id": viewing["id"],
+            "property_id": viewing["property_id"],
+            "postcode": stops[stop]["postcode"],
+            "status": viewing.get("status"),
+            "start": format_time(start),
+            "travel_minutes": travel[prev][stop],
+        })
+        prev = stop
+    return planned
+
+
+def _baseline_travel(stops: List[Dict], travel: List[List[int]], depot: int) -> int:
+    """Travel visiting the stops in requested-time order."""
+    baseline = sorted(range(len(stops)), key=lambda i: stops[i]["requested"])
+    return sum(travel[a][b] for a, b in zip([depot] + baseline, baseline))
+
+
+AUTO_ASSIGN_DAY_TIME_LIMIT_MS = 100  # local-search budget per day
+
+
+def auto_assign_day(
+    pending: List[Dict],
+    confirmed: List[Dict],
     properties_db: Dict,
-    agent_id: int = 1,
+    today_rule: Optional[Dict],
+    blockouts: List[Dict],
+    target_date: date,
+    start_postcode: Optional[str] = None,
     viewing_duration: int = 20,
-    travel_buffer: int = 10
-) -> List[Dict]:
+    travel_buffer: int = 10,
+    pending_flex: int = ROUTE_PENDING_FLEX,
+    now: Optional[datetime] = None,
+    time_limit_ms: float = AUTO_ASSIGN_DAY_TIME_LIMIT_MS
+) -> Dict:
     """
-    Generate available slots with all constraints applied in correct order.
-    
-    Returns list of slots with status:
-    [
-        {"time": "14:00", "status": "ok"},
-        {"time": "15:00", "status": "tight", "travel_minutes": 22}
-    ]
+    Fit as many of a day's pending requests as possible around the agent's
+    confirmed viewings, respecting the weekly template, blockouts, travel and
+    duration, then minimise travel (plan_day_route).
+
+    Requests planned at their requested time become confirmations; ones
+    that had to move become suggested times.
+
+    Returns {"confirm": [{"viewing_id", "time"}], "suggest": [{"viewing_id", "time"}],
+    "unassigned": [{"viewing_id", "reason"}], "travel_minutes": int}
     """
-    # STEP 1: Apply weekly template
-    weekly_template = get_weekly_template(agency_id, availability_db)
-    day_of_week = target_date.weekday()  # 0=Monday, 6=Sunday
-    
-    # Find rule for this day
-    today_rule = None
-    for rule in weekly_template:
-        if rule.get("day_of_week") == day_of_week and rule.get("enabled"):
-            today_rule = rule
-            break
-    
-    # If day is disabled, return empty
+    result = {"confirm": [], "suggest": [], "unassigned": [], "travel_minutes": 0}
+
+    def leave_all(reason: str) -> Dict:
+        result["unassigned"] = [{"viewing_id": v["id"], "reason": reason} for v in pending]
+        return result
+
+    now = now or datetime.now()
+    if target_date < now.date():
+        return leave_all("Requested date has passed")
     if not today_rule:
-        return []
-    
-    # Generate baseline slots from weekly template
-    start_time = today_rule.get("start_time", "09:00")
-    end_time = today_rule.get("end_time", "18:00")
-    start_hour = parse_time(start_time) // 60
-    end_hour = parse_time(end_time) // 60
-    
-    baseline_slots = get_time_slots(start_hour, end_hour)
-    
-    # STEP 2: Remove blockouts
-    blockouts = get_blockouts_for_date(agency_id, target_date, blockouts_db)
-    
-    # If full-day blockout exists, return empty
+        return leave_all("Agent is not available on this day")
     if any(b.get("full_day") for b in blockouts):
-        return []
-    
-    # Filter out slots within blockouts
-    slots_after_blockouts = [
-        slot for slot in baseline_slots
-        if not is_time_within_blockout(slot, blockouts)
-    ]
-    
-    # STEP 3: Remove conflicts with confirmed viewings
-    confirmed_viewings = get_confirmed_viewings_for_date(
-        agency_id, target_date, viewings_db, properties_db
+        return leave_all("Day is blocked out")
+
+    window_start = parse_time(today_rule.get("start_time", "09:00"))
+    window_end = parse_time(today_rule.get("end_time", "18:00"))
+    not_before = now.hour * 60 + now.minute + 31 if target_date == now.date() else None
+    free = build_free_timeline(
+        window_start, window_end, blockouts, [], viewing_duration, travel_buffer, not_before
     )
-    
-    slots_after_conflicts = [
-        slot for slot in slots_after_blockouts
-        if not is_time_conflicting_with_viewing(
-            slot, confirmed_viewings, viewing_duration, travel_buffer
-        )
-    ]
-    
-    # STEP 4: Filter out past times if target_date is today
-    from datetime import datetime
-    today = datetime.now().date()
-    now = datetime.now()
-    current_time_minutes = now.hour * 60 + now.minute
-    
-    slots_after_time_filter = slots_after_conflicts
-    if target_date == today:
-        # Filter out slots that are in the past (with 30 min buffer)
-        slots_after_time_filter = [
-            slot for slot in slots_after_conflicts
-            if parse_time(slot) > current_time_minutes + 30
-        ]
-    
-    # STEP 5: Apply travel-time feasibility
-    # Filter out conflicts, keep ok and tight
-    final_slots = []
-    for slot in slots_after_time_filter:
-        feasibility = calculate_travel_feasibility(
-            slot,
-            property_id,
-            property_postcode,
-            confirmed_viewings,
-            properties_db,
-            agent_id
-        )
-        
-        # Only include ok and tight slots (exclude conflicts)
-        if feasibility["status"] != "conflict":
-            slot_result = {
-                "time": slot,
-                "status": feasibility["status"]
-            }
-            if feasibility.get("travel_minutes"):
-                slot_result["travel_minutes"] = feasibility["travel_minutes"]
-            final_slots.append(slot_result)
-    
-    # STEP 6: Return only feasible + tight slots
-    return final_slots
 
+    # Requests with no free start anywhere in their window can't be placed at all
+    candidates = []
+    for viewing in pending:
+        start = get_viewing_start(viewing)
+        if start is None:
+            result["unassigned"].append({"viewing_id": viewing["id"], "reason": "No requested time"})
+            continue
+        lo, hi = start - pending_flex, start + pending_flex
+        if any(free_start <= hi and free_end > lo for free_start, free_end in free):
+            candidates.append(viewing)
+        else:
+            result["unassigned"].append({
+                "viewing_id": viewing["id"],
+                "reason": f"No free time within {pending_flex} minutes of the requested time",
+            })
+
+    route = plan_day_route(
+        confirmed + candidates,
+        properties_db,
+        window_start,
+        window_end,
+        start_postcode=start_postcode,
+        viewing_duration=viewing_duration,
+        travel_buffer=travel_buffer,
+        pending_flex=pending_flex,
+        time_limit_ms=time_limit_ms,
+        free=free
+    )
+
+    requested = {v["id"]: get_viewing_start(v) for v in candidates}
+    for stop in route["stops"]:
+        if stop["status"] == "confirmed":
+            continue
+        action = "confirm" if parse_time(stop["start"]) == requested[stop["viewing_id"]] else "suggest"
+        result[action].append({"viewing_id": stop["viewing_id"], "time": stop["start"]})
+    result["unassigned"].extend(route["unscheduled"])
+    result["travel_minutes"] = route["total_travel_minutes"]
+    return result
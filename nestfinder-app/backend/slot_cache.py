@@ -0,0 +1,173 @@
+"""
+Versioned cache of generated slot lists.
+
+Entries are keyed by (property_id, date, interval, duration, cutoff) and
+tagged with the agency's version counter at the time they were computed. Any write that
+can change an agency's slots (confirming a viewing, blockout or availability
+changes, a property's postcode changing) bumps the counter, which makes all
+of the agency's older entries stale without having to find them.
+
+Under several workers the counters live in storage instead: callers pass the
+shared value in with set_version() so every worker agrees on what is stale.
+
+TimelineCache keeps the per-(agent, date) calendars slot lists are built
+from under the same counters, so only the agents a change touches need
+rebuilding.
+"""
+
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+SLOT_CACHE_SIZE = 10000  # slot lists kept before least-recently-used eviction
+TIMELINE_CACHE_SIZE = 5000  # agent-day timelines kept per agency
+
+
+class SlotCache:
+    """Bounded LRU of slot lists validated against per-agency version counters."""
+
+    def __init__(self, max_entries: int = SLOT_CACHE_SIZE, epoch: Optional[str] = None):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, Tuple[int, List[Dict]]]" = OrderedDict()
+        self._versions: Dict[int, int] = {}
+        # Defaults to changing on every restart so ETags from a previous process
+        # never match; pass a fixed epoch when versions come from shared storage
+        self.epoch = epoch or uuid.uuid4().hex[:8]
+        self.hits = 0
+        self.misses = 0
+
+    def version(self, agency_id: int) -> int:
+        return self._versions.get(agency_id, 0)
+
+    def bump(self, agency_id: int) -> None:
+        """Invalidate every cached slot list for an agency."""
+        self._versions[agency_id] = self.version(agency_id) + 1
+
+    def set_version(self, agency_id: int, version: int) -> None:
+        """Adopt a version counter kept outside this process."""
+        self._versions[agency_id] = version
+
+    def etag(self, agency_id: int, key: Tuple[Hashable, ...]) -> str:
+        """ETag for a cache key at the agency's current version."""
+        parts = "-".join(str(part) for part in key)
+        return f'W/"{self.epoch}-{agency_id}-{self.version(agency_id)}-{parts}"'
+
+    def get(self, agency_id: int, key: Tuple[Hashable, ...]) -> Optional[List[Dict]]:
+        """Cached slots for key, or None if missing or computed at an older version."""
+        entry = self._entries.get((agency_id, key))
+        if entry is None or entry[0] != self.version(agency_id):
+            self.misses += 1
+            return None
+        self._entries.move_to_end((agency_id, key))
+        self.hits += 1
+        return entry[1]
+
+    def put(self, agency_id: int, key: Tuple[Hashable, ...], slots: List[Dict]) -> None:
+        self._entries[(agency_id, key)] = (self.version(agency_id), slots)
+        self._entries.move_to_end((agency_id, key))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "max_size": self.max_entries,
+        }
+
+
+class TimelineCache:
+    """
+    Bounded LRU of per-(agent, date) timelines for each agency, valid for one
+    version of the agency's slot counter.
+
+    A version change normally drops the agency's timelines. When this process
+    made the change itself and knows which agent-days it touches (a viewing
+    confirmed or released, a blockout added or removed), patch() updates
+    those timelines in place and carries the rest over to the new version.
+    """
+
+    def __init__(self, max_entries: int = TIMELINE_CACHE_SIZE):
+        self.max_entries = max_entries
+        # agency id -> [version, OrderedDict of key -> timeline]
+        self._agencies: Dict[int, List] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _bucket(self, agency_id: int, version: int) -> "OrderedDict[Hashable, Any]":
+        bucket = self._agencies.get(agency_id)
+        if bucket is None or bucket[0] != version:
+            bucket = self._agencies[agency_id] = [version, OrderedDict()]
+        return bucket[1]
+
+    def set_version(self, agency_id: int, version: int) -> None:
+        """Adopt the agency's current version, dropping its timelines if it moved."""
+        self._bucket(agency_id, version)
+
+    def get(self, agency_id: int, key: Hashable) -> Optional[Any]:
+        bucket = self._agencies.get(agency_id)
+        entry = bucket[1].get(key) if bucket else None
+        if entry is None:
+            self.misses += 1
+            return None
+        bucket[1].move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, agency_id: int, key: Hashable, timeline: Any) -> None:
+        bucket = self._agencies.get(agency_id)
+        if bucket is None:
+            return  # no version adopted yet
+        entries = bucket[1]
+        entries[key] = timeline
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def patch(
+        self, agency_id: int, version: int, keys: Iterable[Hashable], update: Callable[[Any], None]
+    ) -> None:
+        """
+        Move to version after a change this process made to the timelines at
+        keys: update(timeline) is applied to those that are cached and the
+        rest carry over. If anything else bumped the version in between, the
+        agency's timelines are dropped instead.
+        """
+        bucket = self._agencies.get(agency_id)
+        if bucket is None or bucket[0] != version - 1:
+            self.set_version(agency_id, version)
+            return
+        bucket[0] = version
+        for key in keys:
+            timeline = bucket[1].get(key)
+            if timeline is not None:
+                update(timeline)
+
+    def clear(self) -> None:
+        self._agencies.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": sum(len(bucket[1]) for bucket in self._agencies.values()),
+            "max_size": self.max_entries,
+        }
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """True if an If-None-Match header value matches etag (weak comparison)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+
+    def opaque(tag: str) -> str:
+        tag = tag.strip()
+        return tag[2:] if tag.startswith("W/") else tag
+
+    return any(opaque(tag) == opaque(etag) for tag in if_none_match.split(","))
@@ -0,0 +1,441 @@
+"""
+Reference slot generator: the original scheduler_engine.generate_slots,
+kept so the scheduler engine can be checked against it (benchmark.py) and
+its timings show what the engine saves over the per-slot scan.
+
+The code below is that version as it was, with the helpers it used from
+scheduler_engine and travel_time (check_agent_slot_feasibility,
+add_minutes) copied alongside it; calls into travel_time's copy of the
+check are the only edit. Travel times still come from the travel model.
+Don't optimise it. When the slot rules themselves change, change it in a
+commit of its own and list the change here.
+
+Slot rules changed since:
+- Only confirmed viewings on the target date count (the original took
+  every confirmed viewing, whatever its date).
+- Only the agent's own viewings and blockouts count, with the agency-wide
+  blockouts (the original took every agent's).
+- Travel is priced at the time it happens: leaving the previous viewing
+  when it ends, and arriving for the next one when it starts (the
+  original's travel model ignored the time of day).
+- Slots start on the multiples of slot_interval (any interval) inside the
+  day's window, and must end by the end of the window (the original
+  offered every half hour from the window's first whole hour to its last,
+  whatever the minutes).
+- A new viewing lasts viewing_duration and confirmed ones booked_duration
+  (the agency's length) throughout; a blockout rules out a slot when it
+  overlaps the viewing plus travel_buffer (the original assumed 20-minute
+  viewings everywhere but the viewing-conflict step, and 30-minute slots
+  against blockouts).
+"""
+
+from typing import List, Dict, Optional
+from datetime import datetime, date
+try:
+    from . import travel_time
+    from .travel_time import TRAVEL_BUFFER, VIEWING_DURATION, get_base_travel_time
+except ImportError:
+    import travel_time
+    from travel_time import TRAVEL_BUFFER, VIEWING_DURATION, get_base_travel_time
+
+
+def parse_time(time_str: str) -> int:
+    """Parse time string (HH:MM) to minutes since midnight."""
+    parts = time_str.split(':')
+    return int(parts[0]) * 60 + int(parts[1])
+
+
+def format_time(minutes: int) -> str:
+    """Format minutes since midnight to HH:MM string."""
+    hours = minutes // 60
+    mins = minutes % 60
+    return f"{hours:02d}:{mins:02d}"
+
+
+def get_time_slots(start_minutes: int, end_minutes: int, slot_interval: int, viewing_duration: int) -> List[str]:
+    """Slots at multiples of slot_interval from start to end, for viewings that end by end."""
+    first = -(-start_minutes // slot_interval) * slot_interval
+    return [
+        format_time(t) for t in range(first, end_minutes, slot_interval)
+        if t + viewing_duration <= end_minutes
+    ]
+
+
+def add_minutes(time_minutes: int, minutes: int) -> int:
+    """Add minutes to a time in minutes."""
+    return time_minutes + minutes
+
+
+def check_agent_slot_feasibility(
+    agent_id: int,
+    time: str,
+    property_id: int,
+    property_postcode: str,
+    confirmed_viewings: List[dict],
+    properties_db: dict,
+    duration: int = VIEWING_DURATION,
+    booked_duration: int = VIEWING_DURATION,
+    travel_buffer: int = TRAVEL_BUFFER
+) -> dict:
+    """
+    Check if a time slot is feasible for an agent given their confirmed viewings
+    (each booked_duration minutes long), for a new viewing of duration minutes.
+    
+    Returns:
+        dict with 'feasible' (bool) and optional 'reason' (str)
+    """
+    time_minutes = parse_time(time)
+    viewing_end = add_minutes(time_minutes, duration)
+    
+    # Sort confirmed viewings by time
+    sorted_viewings = sorted(
+        [v for v in confirmed_viewings if v.get("status") == "confirmed" and v.get("agent_id") == agent_id],
+        key=lambda v: parse_time(v.get("confirmed_time", v.get("requested_time", "00:00")))
+    )
+    
+    # Check for direct time overlap
+    for viewing in sorted_viewings:
+        viewing_time = viewing.get("confirmed_time") or viewing.get("requested_time")
+        if not viewing_time:
+            continue
+            
+        viewing_start = parse_time(viewing_time)
+        viewing_end_time = add_minutes(viewing_start, booked_duration)
+        
+        # Check for overlap
+        if ((time_minutes >= viewing_start and time_minutes < viewing_end_time) or
+            (viewing_start >= time_minutes and viewing_start < viewing_end)):
+            return {"feasible": False, "reason": "Agent has viewing at this time"}
+    
+    # Find previous and next viewings
+    prev_viewing = None
+    next_viewing = None
+    
+    for viewing in sorted_viewings:
+        viewing_time = viewing.get("confirmed_time") or viewing.get("requested_time")
+        if not viewing_time:
+            continue
+            
+        viewing_start = parse_time(viewing_time)
+        if viewing_start < time_minutes:
+            prev_viewing = viewing
+        elif viewing_start > time_minutes and not next_viewing:
+            next_viewing = viewing
+            break
+    
+    # Check travel time from previous viewing
+    if prev_viewing:
+        prev_property_id = prev_viewing.get("property_id")
+        prev_property = properties_db.get(prev_property_id)
+        
+        if prev_property:
+            prev_postcode = prev_property.get("postcode")
+            if prev_postcode:
+                prev_viewing_time = prev_viewing.get("confirmed_time") or prev_viewing.get("requested_time")
+                prev_viewing_end = add_minutes(parse_time(prev_viewing_time), booked_duration)
+                travel_time = get_base_travel_time(prev_postcode, property_postcode, prev_viewing_end)
+                min_next_time = add_minutes(prev_viewing_end, travel_buffer + travel_time)
+                
+                if time_minutes < min_next_time:
+                    return {
+                        "feasible": False,
+                        "reason": f"Insufficient travel time from {prev_postcode}"
+                    }
+    
+    # Check travel time to next viewing
+    if next_viewing:
+        next_property_id = next_viewing.get("property_id")
+        next_property = properties_db.get(next_property_id)
+        
+        if next_property:
+            next_postcode = next_property.get("postcode")
+            if next_postcode:
+                next_viewing_time = next_viewing.get("confirmed_time") or next_viewing.get("requested_time")
+                next_start = parse_time(next_viewing_time)
+                travel_to_next = get_base_travel_time(property_postcode, next_postcode, next_start)
+                this_viewing_end = add_minutes(time_minutes, duration)
+                min_next_start = add_minutes(this_viewing_end, travel_buffer + travel_to_next)
+                
+                if min_next_start > next_start:
+                    return {
+                        "feasible": False,
+                        "reason": "Insufficient time before next viewing"
+                    }
+    
+    return {"feasible": True}
+
+
+def get_weekly_template(agency_id: int, availability_db: Dict) -> List[Dict]:
+    """Get weekly availability template for agency."""
+    return availability_db.get(agency_id, [])
+
+
+def get_blockouts_for_date(agency_id: int, target_date: date, blockouts_db: Dict) -> List[Dict]:
+    """Get all blockouts for a specific date."""
+    date_str = str(target_date)
+    blockouts = blockouts_db.get(agency_id, [])
+    return [b for b in blockouts if b.get("date") == date_str]
+
+
+def get_confirmed_viewings_for_date(agency_id: int, target_date: date, viewings_db: Dict, properties_db: Dict) -> List[Dict]:
+    """Get confirmed viewings for a specific date."""
+    # A viewing booked without a date is for the day it was created
+    date_str = str(target_date)
+    confirmed = [
+        v for v in viewings_db.values()
+        if v.get("status") == "confirmed"
+        and (v.get("requested_date") or (v.get("created_at") or "")[:10]) == date_str
+    ]
+    
+    # Enrich with property info
+    enriched = []
+    for viewing in confirmed:
+        property_id = viewing.get("property_id")
+        if property_id and property_id in properties_db:
+            property_data = properties_db[property_id]
+            enriched.append({
+                **viewing,
+                "property": property_data,
+                "property_postcode": property_data.get("postcode", "")
+            })
+    return enriched
+
+
+def is_time_within_blockout(time_str: str, blockouts: List[Dict], slot_length: int = 30) -> bool:
+    """Check if a time slot (slot_length minutes, travel buffer included) overlaps any blockout."""
+    time_minutes = parse_time(time_str)
+    
+    for blockout in blockouts:
+        if blockout.get("full_day"):
+            return True  # Full day blockout
+        
+        start_time = blockout.get("start_time")
+        end_time = blockout.get("end_time")
+        
+        if start_time and end_time:
+            start_minutes = parse_time(start_time)
+            end_minutes = parse_time(end_time)
+            
+            # Check if time falls within the blockout range
+            if time_minutes >= start_minutes and time_minutes < end_minutes:
+                return True
+            # Also check if slot overlaps (check if slot end is within blockout)
+            if time_minutes + slot_length > start_minutes and time_minutes < end_minutes:
+                return True
+    
+    return False
+
+
+def is_time_conflicting_with_viewing(
+    time_str: str,
+    confirmed_viewings: List[Dict],
+    viewing_duration: int = 20,
+    travel_buffer: int = 10,
+    booked_duration: int = 20
+) -> bool:
+    """Check if a time slot conflicts with confirmed viewings (each booked_duration long)."""
+    time_minutes = parse_time(time_str)
+    slot_end = time_minutes + viewing_duration
+    
+    for viewing in confirmed_viewings:
+        viewing_time = viewing.get("confirmed_time") or viewing.get("requested_time")
+        if not viewing_time:
+            continue
+        
+        viewing_start = parse_time(viewing_time)
+        viewing_end = viewing_start + booked_duration
+        
+        # Check for overlap (with travel buffer)
+        # New slot conflicts if it starts within travel_buffer of existing viewing end
+        # or if existing viewing starts within travel_buffer of new slot end
+        if (time_minutes < viewing_end + travel_buffer and slot_end + travel_buffer > viewing_start):
+            return True
+    
+    return False
+
+
+def calculate_travel_feasibility(
+    time_str: str,
+    property_id: int,
+    property_postcode: str,
+    confirmed_viewings: List[Dict],
+    properties_db: Dict,
+    agent_id: int = 1,
+    viewing_duration: int = 20,
+    travel_buffer: int = 10,
+    booked_duration: int = 20
+) -> Dict:
+    """
+    Calculate travel feasibility for a slot.
+    Returns: {"status": "ok"|"tight"|"conflict", "travel_minutes": int}
+    """
+    # Use existing travel_time logic
+    feasibility = check_agent_slot_feasibility(
+        agent_id=agent_id,
+        time=time_str,
+        property_id=property_id,
+        property_postcode=property_postcode,
+        confirmed_viewings=confirmed_viewings,
+        properties_db=properties_db,
+        duration=viewing_duration,
+        booked_duration=booked_duration,
+        travel_buffer=travel_buffer
+    )
+    
+    if not feasibility.get("feasible"):
+        return {
+            "status": "conflict",
+            "travel_minutes": None
+        }
+    
+    # Check if it's "tight" (travel time > 20 minutes)
+    # Find previous viewing
+    prev_viewing = None
+    for v in sorted(confirmed_viewings, key=lambda x: parse_time(x.get("confirmed_time") or x.get("requested_time", "00:00"))):
+        viewing_time = v.get("confirmed_time") or v.get("requested_time", "00:00")
+        if parse_time(viewing_time) < parse_time(time_str):
+            prev_viewing = v
+    
+    if prev_viewing:
+        prev_property = prev_viewing.get("property") or properties_db.get(prev_viewing.get("property_id"))
+        if prev_property:
+            prev_viewing_time = prev_viewing.get("confirmed_time") or prev_viewing.get("requested_time")
+            travel_minutes = travel_time.get_base_travel_time(
+                prev_property.get("postcode"),
+                property_postcode,
+                parse_time(prev_viewing_time) + booked_duration
+            )
+            if travel_minutes > 20:
+                return {
+                    "status": "tight",
+                    "travel_minutes": travel_minutes
+                }
+            return {
+                "status": "ok",
+                "travel_minutes": travel_minutes
+            }
+    
+    return {
+        "status": "ok",
+        "travel_minutes": None
+    }
+
+
+def generate_slots(
+    agency_id: int,
+    property_id: int,
+    property_postcode: str,
+    target_date: date,
+    availability_db: Dict,
+    blockouts_db: Dict,
+    viewings_db: Dict,
+    properties_db: Dict,
+    agent_id: int = 1,
+    viewing_duration: int = 20,
+    travel_buffer: int = 10,
+    slot_interval: int = 30,
+    booked_duration: int = 20
+) -> List[Dict]:
+    """
+    Generate available slots with all constraints applied in correct order,
+    every slot_interval minutes, for a new viewing of viewing_duration
+    minutes when confirmed ones last booked_duration.
+    
+    Returns list of slots with status:
+    [
+        {"time": "14:00", "status": "ok"},
+        {"time": "15:00", "status": "tight", "travel_minutes": 22}
+    ]
+    """
+    # STEP 1: Apply weekly template
+    weekly_template = get_weekly_template(agency_id, availability_db)
+    day_of_week = target_date.weekday()  # 0=Monday, 6=Sunday
+    
+    # Find rule for this day
+    today_rule = None
+    for rule in weekly_template:
+        if rule.get("day_of_week") == day_of_week and rule.get("enabled"):
+            today_rule = rule
+            break
+    
+    # If day is disabled, return empty
+    if not today_rule:
+        return []
+    
+    # Generate baseline slots from weekly template
+    start_time = today_rule.get("start_time", "09:00")
+    end_time = today_rule.get("end_time", "18:00")
+    baseline_slots = get_time_slots(parse_time(start_time), parse_time(end_time), slot_interval, viewing_duration)
+    
+    # STEP 2: Remove blockouts (agency-wide ones and the agent's own)
+    blockouts = [
+        b for b in get_blockouts_for_date(agency_id, target_date, blockouts_db)
+        if b.get("agent_id") in (None, agent_id)
+    ]
+    
+    # If full-day blockout exists, return empty
+    if any(b.get("full_day") for b in blockouts):
+        return []
+    
+    # Filter out slots within blockouts
+    slots_after_blockouts = [
+        slot for slot in baseline_slots
+        if not is_time_within_blockout(slot, blockouts, viewing_duration + travel_buffer)
+    ]
+    
+    # STEP 3: Remove conflicts with the agent's confirmed viewings
+    confirmed_viewings = [
+        v for v in get_confirmed_viewings_for_date(agency_id, target_date, viewings_db, properties_db)
+        if v.get("agent_id") == agent_id
+    ]
+    
+    slots_after_conflicts = [
+        slot for slot in slots_after_blockouts
+        if not is_time_conflicting_with_viewing(
+            slot, confirmed_viewings, viewing_duration, travel_buffer, booked_duration
+        )
+    ]
+    
+    # STEP 4: Filter out past times if target_date is today
+    from datetime import datetime
+    today = datetime.now().date()
+    now = datetime.now()
+    current_time_minutes = now.hour * 60 + now.minute
+    
+    slots_after_time_filter = slots_after_conflicts
+    if target_date == today:
+        # Filter out slots that are in the past (with 30 min buffer)
+        slots_after_time_filter = [
+            slot for slot in slots_after_conflicts
+            if parse_time(slot) > current_time_minutes + 30
+        ]
+    
+    # STEP 5: Apply travel-time feasibility
+    # Filter out conflicts, keep ok and tight
+    final_slots = []
+    for slot in slots_after_time_filter:
+        feasibility = calculate_travel_feasibility(
+            slot,
+            property_id,
+            property_postcode,
+            confirmed_viewings,
+            properties_db,
+            agent_id,
+            viewing_duration,
+            travel_buffer,
+            booked_duration
+        )
+        
+        # Only include ok and tight slots (exclude conflicts)
+        if feasibility["status"] != "conflict":
+            slot_result = {
+                "time": slot,
+                "status": feasibility["status"]
+            }
+            if feasibility.get("travel_minutes"):
+                slot_result["travel_minutes"] = feasibility["travel_minutes"]
+            final_slots.append(slot_result)
+    
+    # STEP 6: Return only feasible + tight slots
+    return final_slots
+
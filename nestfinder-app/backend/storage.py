@@ -0,0 +1,1407 @@
+"""
+Storage layer for the API.
+
+Routes talk to a Repository instead of module-level dicts:
+- MemoryRepository: in-process dicts, the MVP default (data resets on restart)
+- SQLiteRepository: embedded SQLite via aiosqlite, for local testing
+- PostgresRepository: pooled asyncpg connections against database/schema.sql
+
+create_repository() picks one from a DATABASE_URL:
+    (unset) / memory://          -> MemoryRepository
+    sqlite:///path/to/file.db    -> SQLiteRepository (sqlite:///:memory: for a throwaway DB)
+    postgresql://user:pw@host/db -> PostgresRepository
+
+All dates and timestamps cross this boundary as ISO strings, matching the
+dicts the routes have always returned.
+
+Running under several uvicorn workers needs a SQL backend: IDs come from the
+database, slot-cache versions and viewing-event sequence numbers live in the
+agencies table, and confirm_viewing() re-checks feasibility under a
+per-(agent, day) lock.
+"""
+
+import asyncio
+import json
+import sqlite3
+from abc import ABC, abstractmethod
+from bisect import bisect_left, insort
+import uuid
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+from itertools import count, islice
+from typing import Any, AsyncContextManager, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+try:
+    from .indexes import ViewingIndex, viewing_date
+except ImportError:
+    from indexes import ViewingIndex, viewing_date
+
+# Using a single default agency for MVP; DEFAULT_AGENT_ID is its first agent
+DEFAULT_AGENCY_ID = 1
+DEFAULT_AGENT_ID = 1
+
+DEFAULT_POOL_SIZE = 5  # connections per worker
+
+VIEWING_EVENT_RETENTION = 10000  # latest viewing events kept per agency for resuming streams
+VIEWING_EVENT_TRIM_EVERY = 100  # SQL backends delete older events once per this many
+INSERT_BATCH_SIZE = 500  # rows per multi-row INSERT (or IN list) in bulk writes
+
+# check(viewing, other confirmed viewings that day, properties by id) -> conflict reason or None
+ConfirmCheck = Callable[[Dict, List[Dict], Dict[int, Dict]], Optional[str]]
+
+
+class ViewingConflict(Exception):
+    """A viewing could not be confirmed because it clashes with the agent's day."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def default_agency() -> Dict:
+    return {
+        "id": DEFAULT_AGENCY_ID,
+        "name": "My Agency",
+        "slug": "myagency",
+        "contact_email": "contact@agency.com",
+        "contact_phone": None,
+        "base_postcode": "W2 4DX",
+        "default_duration": 20,
+    }
+
+
+def default_agent() -> Dict:
+    """The agency's first agent; covers every property (empty property_ids)."""
+    return {
+        "id": DEFAULT_AGENT_ID,
+        "name": "Agent",
+        "email": "agent@nestfinder.uk",
+        "base_postcode": None,
+        "agency_id": DEFAULT_AGENCY_ID,
+        "property_ids": [],
+    }
+
+
+def default_availability() -> List[Dict]:
+    """All days enabled 09:00-18:00 (day_of_week: 0=Monday, ..., 6=Sunday)."""
+    return [
+        {"day_of_week": day, "enabled": True, "start_time": "09:00", "end_time": "18:00"}
+        for day in range(7)
+    ]
+
+
+def _sort_by_start(viewings: List[Dict]) -> List[Dict]:
+    """Sort viewings by date, then start time in minutes (not string order)."""
+    def key(viewing: Dict):
+        viewing_time = viewing.get("confirmed_time") or viewing.get("requested_time") or "00:00"
+        hours, minutes = viewing_time.split(':')[:2]
+        return (viewing_date(viewing) or "", int(hours) * 60 + int(minutes), viewing["id"])
+    return sorted(viewings, key=key)
+
+
+class Repository(ABC):
+    """Async storage interface used by the API routes."""
+
+    # Set to False by backends whose state is private to one process
+    shared = True
+    # Part of slot-cache ETags; must change whenever version counters could restart
+    cache_epoch = "db"
+
+    async def connect(self) -> None:
+        """Open connections and make sure the default agency exists."""
+
+    async def close(self) -> None:
+        """Release connections."""
+
+    # Agencies
+    @abstractmethod
+    async def get_agency(self, agency_id: int) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    async def get_agency_by_slug(self, slug: str) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    async def save_agency(self, agency: Dict) -> Dict:
+        """Insert or replace an agency by id."""
+
+    # Agents
+    @abstractmethod
+    async def list_agents(self, agency_id: int) -> List[Dict]:
+        """
+        An agency's agents by id, each with the property_ids they cover
+        (empty means every property in the agency).
+        """
+
+    @abstractmethod
+    async def get_agent(self, agent_id: int) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    async def create_agent(self, agency_id: int, data: Dict) -> Dict:
+        ...
+
+    @abstractmethod
+    async def update_agent(self, agent_id: int, fields: Dict) -> Optional[Dict]:
+        """Update an agent; a property_ids field replaces the properties they cover."""
+
+    # Properties
+    @abstractmethod
+    async def list_properties(self, agency_id: int) -> List[Dict]:
+        ...
+
+    @abstractmethod
+    async def list_active_properties(self, agency_id: int) -> List[Dict]:
+        ...
+
+    @abstractmethod
+    async def count_properties(self, agency_id: int) -> int:
+        ...
+
+    @abstractmethod
+    async def get_property(self, property_id: int) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    async def get_property_by_slug(self, agency_id: int, slug: str) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    async def get_properties(self, property_ids: Iterable[int]) -> Dict[int, Dict]:
+        """Properties by id, for postcode lookups in the scheduler."""
+
+    @abstractmethod
+    async def property_slug_taken(self, slug: str, exclude_id: Optional[int] = None) -> bool:
+        """True if another property (any agency; slugs are globally unique) uses slug."""
+
+    @abstractmethod
+    async def taken_property_slugs(self, slugs: Iterable[str]) -> Set[str]:
+        """The given slugs that some property (any agency) already uses."""
+
+    @abstractmethod
+    async def create_property(self, data: Dict) -> Dict:
+        """Insert a property and return it with its new id."""
+
+    @abstractmethod
+    async def create_properties(self, rows: List[Dict]) -> List[Dict]:
+        """Insert properties in one transaction; returns them with their ids, in order."""
+
+    @abstractmethod
+    async def update_property(self, property_id: int, fields: Dict) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    async def set_property_geocode(self, property_id: int, postcode: str, fields: Dict) -> Optional[Dict]:
+        """
+        Store geocoding results (coordinates, geocode_status) for a property,
+        unless its postcode has changed from the one geocoded since. Returns
+        the updated property, or None if nothing was written.
+        """
+
+    @abstractmethod
+    async def seed_properties(self, agency_id: int, rows: List[Dict]) -> bool:
+        """Insert rows only if the agency has no properties yet (atomically). True if inserted."""
+
+    # Viewings
+    @abstractmethod
+    async def list_viewings(
+        self, agency_id: int, before: Optional[Tuple[str, int]] = None, limit: Optional[int] = None
+    ) -> List[Dict]:
+        """
+        Agency viewings with property_title/property_postcode and event_seq,
+        newest first (by created_at, then id). before=(created_at, id) of the
+        last viewing of the previous page continues from there.
+        """
+
+    @abstractmethod
+    async def list_viewings_since(self, agency_id: int, since: int, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Agency viewings changed after viewing event seq `since`, as
+        list_viewings returns them, in event_seq order.
+        """
+
+    @abstractmethod
+    async def list_pending_viewings(self, agency_id: int) -> List[Dict]:
+        ...
+
+    @abstractmethod
+    async def get_viewing(self, viewing_id: int) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    async def get_viewings(self, viewing_ids: Iterable[int]) -> List[Dict]:
+        ...
+
+    @abstractmethod
+    async def create_viewing(self, data: Dict) -> Dict:
+        """Insert a viewing and return it with its new id."""
+
+    @abstractmethod
+    async def update_viewing(self, viewing_id: int, fields: Dict) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    async def get_agent_viewings(self, agent_id: int, start_date: str, end_date: str, status: str) -> List[Dict]:
+        """An agent's viewings with a status between two dates (inclusive), sorted by date and start."""
+
+    async def get_confirmed_viewings(self, agent_id: int, start_date: str, end_date: str) -> List[Dict]:
+        return await self.get_agent_viewings(agent_id, start_date, end_date, "confirmed")
+
+    @abstractmethod
+    async def get_day_viewings(self, agent_id: int, day: str) -> List[Dict]:
+        """An agent's confirmed and pending viewings on one date, sorted by start."""
+
+    @abstractmethod
+    async def confirm_viewing(self, viewing_id: int, fields: Dict, check: ConfirmCheck) -> Optional[Dict]:
+        """
+        Apply fields (status "confirmed", confirmed_time, ...) only if check
+        finds no conflict with the agent's other confirmed viewings that day.
+        The check and the write happen atomically with respect to other
+        confirmations for the same agent and day, in any worker.
+
+        Returns the updated viewing, None if it doesn't exist, or raises
+        ViewingConflict with the check's reason.
+        """
+
+    # Slot cache versions
+    @abstractmethod
+    async def get_slot_version(self, agency_id: int) -> int:
+        ...
+
+    @abstractmethod
+    async def bump_slot_version(self, agency_id: int) -> int:
+        """Increment and return the agency's slot version (invalidates cached slots in every worker)."""
+
+    # Viewing events
+    @abstractmethod
+    async def append_viewing_event(self, agency_id: int, event_type: str, viewing: Dict) -> Dict:
+        """
+        Record a change to one of the agency's viewings. Events are numbered
+        1, 2, ... per agency and become visible to readers in that order, and
+        the viewing's event_seq is set to the new seq in the same step.
+        Returns {"seq", "type", "viewing"}.
+        """
+
+    @abstractmethod
+    async def get_viewing_events(self, agency_id: int, after: int, limit: int = 100) -> List[Dict]:
+        """
+        Up to limit events with seq > after, oldest first. Only the latest
+        VIEWING_EVENT_RETENTION are kept, so a gap before the first one means
+        the caller has missed events.
+        """
+
+    @abstractmethod
+    async def get_viewing_event_seq(self, agency_id: int) -> int:
+        """seq of the agency's latest viewing event (0 if there are none)."""
+
+    # Availability
+    @abstractmethod
+    async def get_availability(self, agency_id: int, agent_id: Optional[int] = None) -> List[Dict]:
+        """
+        The agency's weekly template, or with agent_id that agent's own rules
+        (empty if they follow the agency's).
+        """
+
+    @abstractmethod
+    async def set_availability(self, agency_id: int, rules: List[Dict], agent_id: Optional[int] = None) -> List[Dict]:
+        ...
+
+    # Blockouts
+    @abstractmethod
+    async def list_blockouts(self, agency_id: int) -> List[Dict]:
+        ...
+
+    @abstractmethod
+    async def get_blockouts(self, agency_id: int, start_date: str, end_date: str) -> List[Dict]:
+        """
+        Blockouts between two dates (inclusive), for every agent: ones with an
+        agent_id only apply to that agent.
+        """
+
+    @abstractmethod
+    async def create_blockout(self, agency_id: int, data: Dict) -> Dict:
+        ...
+
+    @abstractmethod
+    async def delete_blockout(self, agency_id: int, blockout_id: int) -> Optional[Dict]:
+        """Delete a blockout; returns it, or None if it didn't exist."""
+
+
+class MemoryRepository(Repository):
+    """
+    In-process dicts (single worker only; data resets on restart).
+
+    Public booking links are the busiest path, so slug lookups and the active
+    listings go through indexes kept up to date on every write instead of
+    scanning all properties:
+    - agency slug -> agency id
+    - per agency: property slug -> property id, and sorted ids of active properties
+    - per agency: sorted (created_at, id) of its viewings, and viewing ids in
+      the order of their latest event, for paged and since-cursor listings
+    """
+
+    shared = False
+
+    def __init__(self):
+        # Versions restart with the process, so ETags must not outlive it
+        self.cache_epoch = uuid.uuid4().hex[:8]
+        self.agencies_db: Dict[int, Dict] = {}
+        self.properties_db: Dict[int, Dict] = {}
+        self.viewings_db: Dict[int, Dict] = {}
+        # Viewings by (agent_id, date, status), sorted by start time
+        self.viewing_index = ViewingIndex()
+        self.agents_db: Dict[int, Dict] = {DEFAULT_AGENT_ID: default_agent()}
+        self.availability_db: Dict[int, List[Dict]] = {DEFAULT_AGENCY_ID: default_availability()}
+        # Agents with their own weekly rules: {agent_id: [rule, ...]}
+        self.agent_availability_db: Dict[int, List[Dict]] = {}
+        # Format: {agency_id: [{"id": 1, "date": "2025-11-18", "start_time": "12:00", "end_time": "14:00", "full_day": False}, ...]}
+        self.blockouts_db: Dict[int, List[Dict]] = {DEFAULT_AGENCY_ID: []}
+        self.slot_versions: Dict[int, int] = {}
+        self.viewing_events: Dict[int, deque] = {}
+        self.event_seqs: Dict[int, int] = {}
+        self._viewing_keys: Dict[int, List[Tuple[str, int]]] = {}
+        # agency id -> {viewing id: event_seq}, least recently changed first
+        self._viewing_seqs: Dict[int, "OrderedDict[int, int]"] = {}
+        self._agency_ids_by_slug: Dict[str, int] = {}
+        self._property_ids_by_slug: Dict[int, Dict[str, int]] = {}
+        self._active_property_ids: Dict[int, List[int]] = {}
+        self._agent_ids = count(DEFAULT_AGENT_ID + 1)
+        self._property_ids = count(1)
+        self._viewing_ids = count(1)
+        self._blockout_ids = count(1)
+        self._index_agency(default_agency())
+
+    def _index_agency(self, agency: Dict) -> None:
+        previous = self.agencies_db.get(agency["id"])
+        if previous and self._agency_ids_by_slug.get(previous.get("slug")) == agency["id"]:
+            del self._agency_ids_by_slug[previous["slug"]]
+        self.agencies_db[agency["id"]] = agency
+        if agency.get("slug"):
+            self._agency_ids_by_slug[agency["slug"]] = agency["id"]
+
+    def _index_property(self, prop: Dict) -> None:
+        agency_id = prop.get("agency_id")
+        if prop.get("slug"):
+            self._property_ids_by_slug.setdefault(agency_id, {})[prop["slug"]] = prop["id"]
+        if prop.get("status") == "active":
+            insort(self._active_property_ids.setdefault(agency_id, []), prop["id"])
+
+    def _unindex_property(self, prop: Dict) -> None:
+        agency_id = prop.get("agency_id")
+        slugs = self._property_ids_by_slug.get(agency_id, {})
+        if slugs.get(prop.get("slug")) == prop["id"]:
+            del slugs[prop["slug"]]
+        active = self._active_property_ids.get(agency_id, [])
+        pos = bisect_left(active, prop["id"])
+        if pos < len(active) and active[pos] == prop["id"]:
+            del active[pos]
+
+    async def get_agency(self, agency_id):
+        return self.agencies_db.get(agency_id)
+
+    async def get_agency_by_slug(self, slug):
+        agency_id = self._agency_ids_by_slug.get(slug)
+        return self.agencies_db.get(agency_id) if agency_id is not None else None
+
+    async def save_agency(self, agency):
+        self._index_agency(agency)
+        return agency
+
+    async def list_agents(self, agency_id):
+        return [a for a in self.agents_db.values() if a["agency_id"] == agency_id]
+
+    async def get_agent(self, agent_id):
+        return self.agents_db.get(agent_id)
+
+    async def create_agent(self, agency_id, data):
+        agent_id = next(self._agent_ids)
+        self.agents_db[agent_id] = {
+            "id": agent_id, "base_postcode": None, **data,
+            "agency_id": agency_id, "property_ids": sorted(set(data.get("property_ids") or [])),
+        }
+        return self.agents_db[agent_id]
+
+    async def update_agent(self, agent_id, fields):
+        agent = self.agents_db.get(agent_id)
+        if agent is None:
+            return None
+        agent.update(fields)
+        agent["property_ids"] = sorted(set(agent.get("property_ids") or []))
+        return agent
+
+    async def list_properties(self, agency_id):
+        return [p for p in self.properties_db.values() if p["agency_id"] == agency_id]
+
+    async def list_active_properties(self, agency_id):
+        return [self.properties_db[pid] for pid in self._active_property_ids.get(agency_id, [])]
+
+    async def count_properties(self, agency_id):
+        return len(await self.list_properties(agency_id))
+
+    async def get_property(self, property_id):
+        return self.properties_db.get(property_id)
+
+    async def get_property_by_slug(self, agency_id, slug):
+        property_id = self._property_ids_by_slug.get(agency_id, {}).get(slug)
+        return self.properties_db.get(property_id) if property_id is not None else None
+
+    async def get_properties(self, property_ids):
+        return {pid: self.properties_db[pid] for pid in property_ids if pid in self.properties_db}
+
+    async def property_slug_taken(self, slug, exclude_id=None):
+        # One lookup per agency; the number of agencies doesn't grow with portfolio size
+        for slugs in self._property_ids_by_slug.values():
+            property_id = slugs.get(slug)
+            if property_id is not None and property_id != exclude_id:
+                return True
+        return False
+
+    async def taken_property_slugs(self, slugs):
+        return {slug for slug in slugs if any(slug in ids for ids in self._property_ids_by_slug.values())}
+
+    async def create_property(self, data):
+        property_id = next(self._property_ids)
+        self.properties_db[property_id] = {"id": property_id, **data}
+        self._index_property(self.properties_db[property_id])
+        return self.properties_db[property_id]
+
+    async def create_properties(self, rows):
+        return [await self.create_property(row) for row in rows]
+
+    async def update_property(self, property_id, fields):
+        prop = self.properties_db.get(property_id)
+        if prop is None:
+            return None
+        self._unindex_property(prop)
+        prop.update(fields)
+        self._index_property(prop)
+        return prop
+
+    async def set_property_geocode(self, property_id, postcode, fields):
+        prop = self.properties_db.get(property_id)
+        if prop is None or prop["postcode"] != postcode:
+            return None
+        prop.update(fields)
+        return prop
+
+    async def seed_properties(self, agency_id, rows):
+        if await self.count_properties(agency_id):
+            return False
+        for row in rows:
+            await self.create_property(row)
+        return True
+
+    def _listed_viewing(self, agency_id: int, viewing_id: int) -> Dict:
+        viewing = self.viewings_db[viewing_id]
+        prop = self.properties_db.get(viewing["property_id"], {})
+        return {
+            **viewing,
+            "property_title": prop.get("title", "Unknown"),
+            "property_postcode": prop.get("postcode", ""),
+            "tenant_name": viewing.get("tenant_name", "Unknown"),
+            "event_seq": self._viewing_seqs.get(agency_id, {}).get(viewing_id, 0),
+        }
+
+    async def list_viewings(self, agency_id, before=None, limit=None):
+        keys = self._viewing_keys.get(agency_id, [])
+        end = bisect_left(keys, tuple(before)) if before is not None else len(keys)
+        start = max(0, end - limit) if limit is not None else 0
+        return [self._listed_viewing(agency_id, viewing_id) for _, viewing_id in reversed(keys[start:end])]
+
+    async def list_viewings_since(self, agency_id, since, limit=None):
+        changed = []
+        for viewing_id, seq in reversed(self._viewing_seqs.get(agency_id, {}).items()):
+            if seq <= since:
+                break
+            changed.append(viewing_id)
+        changed.reverse()
+        return [self._listed_viewing(agency_id, viewing_id) for viewing_id in changed[:limit]]
+
+    async def list_pending_viewings(self, agency_id):
+        return [
+            v for v in self.viewings_db.values()
+            if v.get("status") == "pending"
+            and self.properties_db.get(v["property_id"], {}).get("agency_id") == agency_id
+        ]
+
+    async def get_viewing(self, viewing_id):
+        return self.viewings_db.get(viewing_id)
+
+    async def get_viewings(self, viewing_ids):
+        return [self.viewings_db[vid] for vid in viewing_ids if vid in self.viewings_db]
+
+    async def create_viewing(self, data):
+        viewing_id = next(self._viewing_ids)
+        self.viewings_db[viewing_id] = {"id": viewing_id, **data}
+        self.viewing_index.add(self.viewings_db[viewing_id])
+        agency_id = self.properties_db.get(data["property_id"], {}).get("agency_id")
+        insort(self._viewing_keys.setdefault(agency_id, []), (data.get("created_at", ""), viewing_id))
+        return self.viewings_db[viewing_id]
+
+    async def update_viewing(self, viewing_id, fields):
+        viewing = self.viewings_db.get(viewing_id)
+        if viewing is None:
+            return None
+        viewing.update(fields)
+        self.viewing_index.update(viewing)
+        return viewing
+
+    async def get_agent_viewings(self, agent_id, start_date, end_date, status):
+        viewings = []
+        current = date.fromisoformat(start_date)
+        last = date.fromisoformat(end_date)
+        while current <= last:
+            viewings.extend(self.viewing_index.get(agent_id, current.isoformat(), status))
+            current = date.fromordinal(current.toordinal() + 1)
+        return viewings
+
+    async def get_day_viewings(self, agent_id, day):
+        return _sort_by_start(
+            self.viewing_index.get(agent_id, day, "confirmed") + self.viewing_index.get(agent_id, day, "pending")
+        )
+
+    async def confirm_viewing(self, viewing_id, fields, check):
+        # No awaits between the check and the write, so this is atomic within the process
+        viewing = self.viewings_db.get(viewing_id)
+        if viewing is None:
+            return None
+        updated = {**viewing, **fields}
+        confirmed = [
+            v for v in self.viewing_index.get(updated.get("agent_id"), viewing_date(updated), "confirmed")
+            if v["id"] != viewing_id
+        ]
+        reason = check(updated, confirmed, self.properties_db)
+        if reason:
+            raise ViewingConflict(reason)
+        viewing.update(fields)
+        self.viewing_index.update(viewing)
+        return viewing
+
+    async def get_slot_version(self, agency_id):
+        return self.slot_versions.get(agency_id, 0)
+
+    async def bump_slot_version(self, agency_id):
+        self.slot_versions[agency_id] = self.slot_versions.get(agency_id, 0) + 1
+        return self.slot_versions[agency_id]
+
+    async def append_viewing_event(self, agency_id, event_type, viewing):
+        seq = self.event_seqs[agency_id] = self.event_seqs.get(agency_id, 0) + 1
+        event = {"seq": seq, "type": event_type, "viewing": dict(viewing)}
+        events = self.viewing_events.setdefault(agency_id, deque(maxlen=VIEWING_EVENT_RETENTION))
+        events.append(event)
+        seqs = self._viewing_seqs.setdefault(agency_id, OrderedDict())
+        seqs[viewing["id"]] = seq
+        seqs.move_to_end(viewing["id"])
+        return event
+
+    async def get_viewing_events(self, agency_id, after, limit=100):
+        events = self.viewing_events.get(agency_id)
+        if not events:
+            return []
+        # seqs are consecutive, so the first one after the cursor is at a known offset
+        start = max(0, after - events[0]["seq"] + 1)
+        return list(islice(events, start, start + limit))
+
+    async def get_viewing_event_seq(self, agency_id):
+        return self.event_seqs.get(agency_id, 0)
+
+    async def get_availability(self, agency_id, agent_id=None):
+        if agent_id is not None:
+            return self.agent_availability_db.get(agent_id, [])
+        return self.availability_db.get(agency_id, [])
+
+    async def set_availability(self, agency_id, rules, agent_id=None):
+        if agent_id is not None:
+            self.agent_availability_db[agent_id] = rules
+        else:
+            self.availability_db[agency_id] = rules
+        return rules
+
+    async def list_blockouts(self, agency_id):
+        return self.blockouts_db.get(agency_id, [])
+
+    async def get_blockouts(self, agency_id, start_date, end_date):
+        return [
+            b for b in self.blockouts_db.get(agency_id, [])
+            if start_date <= b.get("date") <= end_date
+        ]
+
+    async def create_blockout(self, agency_id, data):
+        blockout = {"id": next(self._blockout_ids), "agent_id": None, **data}
+        self.blockouts_db.setdefault(agency_id, []).append(blockout)
+        return blockout
+
+    async def delete_blockout(self, agency_id, blockout_id):
+        blockouts = self.blockouts_db.get(agency_id, [])
+        deleted = [b for b in blockouts if b.get("id") == blockout_id]
+        if not deleted:
+            return None
+        self.blockouts_db[agency_id] = [b for b in blockouts if b.get("id") != blockout_id]
+        return deleted[0]
+
+
+# Columns returned for each table, so every backend produces the same dict shapes
+AGENCY_COLUMNS = "id, name, slug, contact_email, contact_phone, base_postcode, default_duration"
+AGENT_COLUMNS = "id, name, email, base_postcode, agency_id"
+PROPERTY_COLUMNS = (
+    "id, title, area, address, postcode, postcode_outward, postcode_sector, rent, "
+    "public_link, status, slug, latitude, longitude, geocode_status, agency_id, source"
+)
+VIEWING_COLUMNS = (
+    "id, tenant_name, tenant_email, tenant_phone, property_id, requested_time, "
+    "requested_date, move_in_date, occupants, rent_budget, message, status, "
+    "agent_id, created_at, suggested_time, confirmed_time"
+)
+# agency_viewings is viewings joined to their property once, in the schema
+LISTED_VIEWING_COLUMNS = f"{VIEWING_COLUMNS}, event_seq, property_title, property_postcode"
+AVAILABILITY_COLUMNS = "day_of_week, enabled, start_time, end_time"
+BLOCKOUT_COLUMNS = "id, date, start_time, end_time, full_day, agent_id"
+
+DATE_COLUMNS = {"requested_date", "move_in_date", "viewing_date", "date"}
+TIMESTAMP_COLUMNS = {"created_at", "updated_at"}
+BOOLEAN_COLUMNS = {"enabled", "full_day"}
+
+# Schema for the embedded SQLite backend: database/schema.sql (which Postgres
+# uses) in SQLite's types, less the updated_at triggers, which would break
+# files created before the timestamp columns. tests/test_schema.py checks
+# the two still have the same tables, columns, indexes and view.
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS agencies (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    slug TEXT UNIQUE NOT NULL,
+    contact_email TEXT NOT NULL,
+    contact_phone TEXT,
+    base_postcode TEXT NOT NULL,
+    default_duration INTEGER DEFAULT 20,
+    slot_version INTEGER NOT NULL DEFAULT 0,
+    event_seq INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS agents (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT,
+    email TEXT UNIQUE NOT NULL,
+    password_hash TEXT NOT NULL,
+    base_postcode TEXT,
+    agency_id INTEGER REFERENCES agencies(id) ON DELETE SET NULL,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS properties (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL,
+    area TEXT NOT NULL,
+    address TEXT NOT NULL,
+    postcode TEXT NOT NULL,
+    postcode_outward TEXT,
+    postcode_sector TEXT,
+    rent REAL,
+    status TEXT DEFAULT 'active',
+    slug TEXT UNIQUE,
+    public_link TEXT,
+    latitude REAL,
+    longitude REAL,
+    geocode_status TEXT DEFAULT 'done',
+    agency_id INTEGER NOT NULL REFERENCES agencies(id) ON DELETE CASCADE,
+    source TEXT DEFAULT 'manual',
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS agent_properties (
+    agent_id INTEGER NOT NULL REFERENCES agents(id) ON DELETE CASCADE,
+    property_id INTEGER NOT NULL REFERENCES properties(id) ON DELETE CASCADE,
+    PRIMARY KEY (agent_id, property_id)
+);
+CREATE TABLE IF NOT EXISTS viewings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tenant_name TEXT NOT NULL,
+    tenant_email TEXT,
+    tenant_phone TEXT,
+    property_id INTEGER NOT NULL REFERENCES properties(id) ON DELETE CASCADE,
+    requested_time TEXT NOT NULL,
+    requested_date TEXT,
+    viewing_date TEXT NOT NULL,
+    status TEXT DEFAULT 'pending',
+    suggested_time TEXT,
+    confirmed_time TEXT,
+    move_in_date TEXT,
+    occupants INTEGER,
+    rent_budget REAL,
+    message TEXT,
+    agent_id INTEGER NOT NULL REFERENCES agents(id) ON DELETE CASCADE,
+    agency_id INTEGER NOT NULL REFERENCES agencies(id) ON DELETE CASCADE,
+    event_seq INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS availability (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    agency_id INTEGER NOT NULL REFERENCES agencies(id) ON DELETE CASCADE,
+    agent_id INTEGER REFERENCES agents(id) ON DELETE CASCADE,
+    day_of_week INTEGER NOT NULL,
+    enabled INTEGER NOT NULL DEFAULT 1,
+    start_time TEXT NOT NULL,
+    end_time TEXT NOT NULL,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(agency_id, agent_id, day_of_week)
+);
+CREATE TABLE IF NOT EXISTS blockouts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    agency_id INTEGER NOT NULL REFERENCES agencies(id) ON DELETE CASCADE,
+    agent_id INTEGER REFERENCES agents(id) ON DELETE CASCADE,
+    date TEXT NOT NULL,
+    start_time TEXT,
+    end_time TEXT,
+    full_day INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS viewing_events (
+    agency_id INTEGER NOT NULL REFERENCES agencies(id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (agency_id, seq)
+);
+CREATE INDEX IF NOT EXISTS idx_agents_email ON agents(email);
+CREATE INDEX IF NOT EXISTS idx_agents_agency_id ON agents(agency_id);
+CREATE INDEX IF NOT EXISTS idx_properties_agency_id ON properties(agency_id);
+CREATE INDEX IF NOT EXISTS idx_properties_slug ON properties(slug);
+CREATE INDEX IF NOT EXISTS idx_properties_agency_status ON properties(agency_id, status);
+CREATE INDEX IF NOT EXISTS idx_viewings_property_id ON viewings(property_id);
+CREATE INDEX IF NOT EXISTS idx_viewings_agent_id ON viewings(agent_id);
+CREATE INDEX IF NOT EXISTS idx_viewings_status ON viewings(status);
+CREATE INDEX IF NOT EXISTS idx_availability_agency_id ON availability(agency_id);
+CREATE INDEX IF NOT EXISTS idx_viewings_agent_date_status ON viewings(agent_id, viewing_date, status);
+CREATE INDEX IF NOT EXISTS idx_viewings_agency_created ON viewings(agency_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_viewings_agency_event_seq ON viewings(agency_id, event_seq);
+CREATE INDEX IF NOT EXISTS idx_blockouts_agency_date ON blockouts(agency_id, date);
+CREATE VIEW IF NOT EXISTS agency_viewings AS
+    SELECT v.*, p.title AS property_title, p.postcode AS property_postcode
+    FROM viewings v JOIN properties p ON p.id = v.property_id;
+"""
+
+
+def _from_db(row: Dict) -> Dict:
+    """Convert a database row to the plain JSON-friendly dict the routes return."""
+    result = {}
+    for key, value in row.items():
+        if isinstance(value, (date, datetime)):
+            value = value.isoformat()
+        elif isinstance(value, Decimal):
+            value = float(value)
+        elif key in BOOLEAN_COLUMNS and value is not None:
+            value = bool(value)
+        result[key] = value
+    return result
+
+
+class SQLRepository(Repository):
+    """
+    Shared SQL for the SQLite and Postgres backends.
+
+    Queries use ? placeholders; subclasses provide _acquire() and
+    _transaction(), yielding an executor with fetch/fetchrow/execute.
+    """
+
+    def _param(self, column: str, value: Any) -> Any:
+        """Convert an ISO string to whatever the driver expects for a date/timestamp column."""
+        return value
+
+    async def connect(self) -> None:
+        await self._ensure_defaults()
+
+    @abstractmethod
+    def _acquire(self) -> AsyncContextManager[Any]:
+        """Async context manager yielding a connection (an executor) for one query."""
+
+    @abstractmethod
+    def _transaction(self) -> AsyncContextManager[Any]:
+        """Async context manager yielding an executor whose statements commit together."""
+
+    async def _fetch(self, sql: str, *args) -> List[Dict]:
+        async with self._acquire() as db:
+            return [_from_db(row) for row in await db.fetch(sql, *args)]
+
+    async def _fetchrow(self, sql: str, *args) -> Optional[Dict]:
+        async with self._acquire() as db:
+            row = await db.fetchrow(sql, *args)
+        return _from_db(row) if row is not None else None
+
+    async def _insert(self, db, table: str, values: Dict, returning: str) -> Dict:
+        columns = list(values)
+        sql = (
+            f"INSERT INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' for _ in columns)}) RETURNING {returning}"
+        )
+        row = await db.fetchrow(sql, *(self._param(c, values[c]) for c in columns))
+        return _from_db(row)
+
+    async def _insert_many(self, db, table: str, rows: List[Dict], returning: str) -> List[Dict]:
+        """
+        Insert rows with the first row's columns in one statement. returning
+        must include id; rows come back in insertion order.
+        """
+        if not rows:
+            return []
+        columns = list(rows[0])
+        placeholders = "(" + ", ".join("?" for _ in columns) + ")"
+        sql = (
+            f"INSERT INTO {table} ({', '.join(columns)}) "
+            f"VALUES {', '.join(placeholders for _ in rows)} RETURNING {returning}"
+        )
+        args = [self._param(c, row.get(c)) for row in rows for c in columns]
+        # RETURNING rows aren't promised in VALUES order, but the ids handed out are
+        return sorted((_from_db(row) for row in await db.fetch(sql, *args)), key=lambda row: row["id"])
+
+    async def _update(self, db, table: str, row_id: int, fields: Dict, returning: str) -> Optional[Dict]:
+        if not fields:
+            row = await db.fetchrow(f"SELECT {returning} FROM {table} WHERE id = ?", row_id)
+        else:
+            assignments = ", ".join(f"{column} = ?" for column in fields)
+            args = [self._param(c, v) for c, v in fields.items()]
+            row = await db.fetchrow(
+                f"UPDATE {table} SET {assignments} WHERE id = ? RETURNING {returning}", *args, row_id
+            )
+        return _from_db(row) if row is not None else None
+
+    async def _lock_agency(self, db, agency_id: int) -> None:
+        """Serialise agency-wide setup (defaults, seeding) until the transaction ends."""
+
+    async def _lock_agent_day(self, db, agent_id: int, day: str) -> None:
+        """Serialise confirmations for one agent and day until the transaction ends."""
+
+    async def _ensure_defaults(self) -> None:
+        """Create the default agency, agent and weekly availability in an empty database."""
+        agency = default_agency()
+        async with self._transaction() as db:
+            # Workers connect at the same time; only the first creates the defaults
+            await self._lock_agency(db, DEFAULT_AGENCY_ID)
+            if await db.fetchrow("SELECT id FROM agencies WHERE id = ?", DEFAULT_AGENCY_ID) is None:
+                await db.execute(
+                    "INSERT INTO agencies (name, slug, contact_email, contact_phone, base_postcode, default_duration) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    agency["name"], agency["slug"], agency["contact_email"],
+                    agency["contact_phone"], agency["base_postcode"], agency["default_duration"]
+                )
+            if await db.fetchrow("SELECT id FROM agents WHERE id = ?", DEFAULT_AGENT_ID) is None:
+                agent = default_agent()
+                await db.execute(
+                    "INSERT INTO agents (name, email, password_hash, agency_id) VALUES (?, ?, ?, ?)",
+                    agent["name"], agent["email"], "", DEFAULT_AGENCY_ID
+                )
+            if await db.fetchrow(
+                "SELECT id FROM availability WHERE agency_id = ? AND agent_id IS NULL", DEFAULT_AGENCY_ID
+            ) is None:
+                for rule in default_availability():
+                    await db.execute(
+                        "INSERT INTO availability (agency_id, day_of_week, enabled, start_time, end_time) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        DEFAULT_AGENCY_ID, rule["day_of_week"], rule["enabled"],
+                        rule["start_time"], rule["end_time"]
+                    )
+
+    # Agencies
+    async def get_agency(self, agency_id):
+        return await self._fetchrow(f"SELECT {AGENCY_COLUMNS} FROM agencies WHERE id = ?", agency_id)
+
+    async def get_agency_by_slug(self, slug):
+        return await self._fetchrow(f"SELECT {AGENCY_COLUMNS} FROM agencies WHERE slug = ?", slug)
+
+    async def save_agency(self, agency):
+        fields = {k: v for k, v in agency.items() if k != "id"}
+        async with self._acquire() as db:
+            updated = await self._update(db, "agencies", agency["id"], fields, AGENCY_COLUMNS)
+            if updated is not None:
+                return updated
+            return await self._insert(db, "agencies", agency, AGENCY_COLUMNS)
+
+    # Agents
+    async def _agent_property_ids(self, db, agent_ids: List[int]) -> Dict[int, List[int]]:
+        property_ids: Dict[int, List[int]] = {agent_id: [] for agent_id in agent_ids}
+        if agent_ids:
+            rows = await db.fetch(
+                "SELECT agent_id, property_id FROM agent_properties "
+                f"WHERE agent_id IN ({', '.join('?' for _ in agent_ids)}) ORDER BY property_id",
+                *agent_ids
+            )
+            for row in rows:
+                property_ids[row["agent_id"]].append(row["property_id"])
+        return property_ids
+
+    async def _set_agent_property_ids(self, db, agent_id: int, property_ids: Iterable[int]) -> None:
+        await db.execute("DELETE FROM agent_properties WHERE agent_id = ?", agent_id)
+        for property_id in sorted(set(property_ids)):
+            await db.execute(
+                "INSERT INTO agent_properties (agent_id, property_id) VALUES (?, ?)", agent_id, property_id
+            )
+
+    async def list_agents(self, agency_id):
+        async with self._acquire() as db:
+            agents = [
+                _from_db(row) for row in await db.fetch(
+                    f"SELECT {AGENT_COLUMNS} FROM agents WHERE agency_id = ? ORDER BY id", agency_id
+                )
+            ]
+            property_ids = await self._agent_property_ids(db, [a["id"] for a in agents])
+        return [{**agent, "property_ids": property_ids[agent["id"]]} for agent in agents]
+
+    async def get_agent(self, agent_id):
+        async with self._acquire() as db:
+            row = await db.fetchrow(f"SELECT {AGENT_COLUMNS} FROM agents WHERE id = ?", agent_id)
+            if row is None:
+                return None
+            property_ids = await self._agent_property_ids(db, [agent_id])
+        return {**_from_db(row), "property_ids": property_ids[agent_id]}
+
+    async def create_agent(self, agency_id, data):
+        fields = {k: v for k, v in data.items() if k != "property_ids"}
+        async with self._transaction() as db:
+            agent = await self._insert(
+                db, "agents", {**fields, "password_hash": "", "agency_id": agency_id}, AGENT_COLUMNS
+            )
+            await self._set_agent_property_ids(db, agent["id"], data.get("property_ids") or [])
+        return {**agent, "property_ids": sorted(set(data.get("property_ids") or []))}
+
+    async def update_agent(self, agent_id, fields):
+        columns = {k: v for k, v in fields.items() if k != "property_ids"}
+        async with self._transaction() as db:
+            agent = await self._update(db, "agents", agent_id, columns, AGENT_COLUMNS)
+            if agent is None:
+                return None
+            if "property_ids" in fields:
+                await self._set_agent_property_ids(db, agent_id, fields["property_ids"] or [])
+            property_ids = await self._agent_property_ids(db, [agent_id])
+        return {**agent, "property_ids": property_ids[agent_id]}
+
+    # Properties
+    async def list_properties(self, agency_id):
+        return await self._fetch(
+            f"SELECT {PROPERTY_COLUMNS} FROM properties WHERE agency_id = ? ORDER BY id", agency_id
+        )
+
+    async def list_active_properties(self, agency_id):
+        # Served by idx_properties_agency_status
+        return await self._fetch(
+            f"SELECT {PROPERTY_COLUMNS} FROM properties WHERE agency_id = ? AND status = 'active' ORDER BY id",
+            agency_id
+        )
+
+    async def count_properties(self, agency_id):
+        row = await self._fetchrow("SELECT COUNT(*) AS n FROM properties WHERE agency_id = ?", agency_id)
+        return row["n"]
+
+    async def get_property(self, property_id):
+        return await self._fetchrow(f"SELECT {PROPERTY_COLUMNS} FROM properties WHERE id = ?", property_id)
+
+    async def get_property_by_slug(self, agency_id, slug):
+        return await self._fetchrow(
+            f"SELECT {PROPERTY_COLUMNS} FROM properties WHERE slug = ? AND agency_id = ?", slug, agency_id
+        )
+
+    async def get_properties(self, property_ids):
+        ids = sorted(set(property_ids))
+        if not ids:
+            return {}
+        rows = await self._fetch(
+            f"SELECT {PROPERTY_COLUMNS} FROM properties WHERE id IN ({', '.join('?' for _ in ids)})", *ids
+        )
+        return {row["id"]: row for row in rows}
+
+    async def property_slug_taken(self, slug, exclude_id=None):
+        row = await self._fetchrow(
+            "SELECT id FROM properties WHERE slug = ? AND id != ?",
+            slug, exclude_id if exclude_id is not None else -1
+        )
+        return row is not None
+
+    async def taken_property_slugs(self, slugs):
+        slugs = sorted(set(slugs))
+        taken = set()
+        for start in range(0, len(slugs), INSERT_BATCH_SIZE):
+            chunk = slugs[start:start + INSERT_BATCH_SIZE]
+            rows = await self._fetch(
+                f"SELECT slug FROM properties WHERE slug IN ({', '.join('?' for _ in chunk)})", *chunk
+            )
+            taken.update(row["slug"] for row in rows)
+        return taken
+
+    async def create_property(self, data):
+        async with self._acquire() as db:
+            return await self._insert(db, "properties", data, PROPERTY_COLUMNS)
+
+    async def create_properties(self, rows):
+        created = []
+        async with self._transaction() as db:
+            for start in range(0, len(rows), INSERT_BATCH_SIZE):
+                created += await self._insert_many(db, "properties", rows[start:start + INSERT_BATCH_SIZE], PROPERTY_COLUMNS)
+        return created
+
+    async def update_property(self, property_id, fields):
+        async with self._acquire() as db:
+            return await self._update(db, "properties", property_id, fields, PROPERTY_COLUMNS)
+
+    async def set_property_geocode(self, property_id, postcode, fields):
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        return await self._fetchrow(
+            f"UPDATE properties SET {assignments} WHERE id = ? AND postcode = ? RETURNING {PROPERTY_COLUMNS}",
+            *fields.values(), property_id, postcode
+        )
+
+    async def seed_properties(self, agency_id, rows):
+        async with self._transaction() as db:
+            await self._lock_agency(db, agency_id)
+            if await db.fetchrow("SELECT id FROM properties WHERE agency_id = ? LIMIT 1", agency_id):
+                return False
+            for row in rows:
+                await self._insert(db, "properties", row, "id")
+        return True
+
+    # Viewings
+    async def list_viewings(self, agency_id, before=None, limit=None):
+        where, args = "agency_id = ?", [agency_id]
+        if before is not None:
+            # Keyset: seeks straight to the page on the (created_at, id) index
+            where += " AND (created_at, id) < (?, ?)"
+            args += [self._param("created_at", before[0]), before[1]]
+        sql = f"SELECT {LISTED_VIEWING_COLUMNS} FROM agency_viewings WHERE {where} ORDER BY created_at DESC, id DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(limit)
+        return await self._fetch(sql, *args)
+
+    async def list_viewings_since(self, agency_id, since, limit=None):
+        sql = f"SELECT {LISTED_VIEWING_COLUMNS} FROM agency_viewings WHERE agency_id = ? AND event_seq > ? ORDER BY event_seq"
+        args = [agency_id, since]
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(limit)
+        return await self._fetch(sql, *args)
+
+    async def list_pending_viewings(self, agency_id):
+        columns = ", ".join(f"v.{c.strip()}" for c in VIEWING_COLUMNS.split(","))
+        return await self._fetch(
+            f"SELECT {columns} FROM viewings v JOIN properties p ON p.id = v.property_id "
+            "WHERE p.agency_id = ? AND v.status = 'pending'",
+            agency_id
+        )
+
+    async def get_viewing(self, viewing_id):
+        return await self._fetchrow(f"SELECT {VIEWING_COLUMNS} FROM viewings WHERE id = ?", viewing_id)
+
+    async def get_viewings(self, viewing_ids):
+        ids = sorted(set(viewing_ids))
+        if not ids:
+            return []
+        return await self._fetch(
+            f"SELECT {VIEWING_COLUMNS} FROM viewings WHERE id IN ({', '.join('?' for _ in ids)})", *ids
+        )
+
+    async def create_viewing(self, data):
+        values = {**data, "viewing_date": viewing_date(data)}
+        async with self._acquire() as db:
+            prop = await db.fetchrow("SELECT agency_id FROM properties WHERE id = ?", data["property_id"])
+            values["agency_id"] = prop["agency_id"] if prop else DEFAULT_AGENCY_ID
+            return await self._insert(db, "viewings", values, VIEWING_COLUMNS)
+
+    async def update_viewing(self, viewing_id, fields):
+        async with self._acquire() as db:
+            return await self._update(db, "viewings", viewing_id, fields, VIEWING_COLUMNS)
+
+    async def get_agent_viewings(self, agent_id, start_date, end_date, status):
+        # Served by idx_viewings_agent_date_status
+        rows = await self._fetch(
+            f"SELECT {VIEWING_COLUMNS} FROM viewings "
+            "WHERE agent_id = ? AND viewing_date BETWEEN ? AND ? AND status = ?",
+            agent_id, self._param("viewing_date", start_date), self._param("viewing_date", end_date), status
+        )
+        return _sort_by_start(rows)
+
+    async def get_day_viewings(self, agent_id, day):
+        # Served by idx_viewings_agent_date_status
+        rows = await self._fetch(
+            f"SELECT {VIEWING_COLUMNS} FROM viewings "
+            "WHERE agent_id = ? AND viewing_date = ? AND status IN ('confirmed', 'pending')",
+            agent_id, self._param("viewing_date", day)
+        )
+        return _sort_by_start(rows)
+
+    async def confirm_viewing(self, viewing_id, fields, check):
+        async with self._transaction() as db:
+            row = await db.fetchrow(f"SELECT {VIEWING_COLUMNS} FROM viewings WHERE id = ?", viewing_id)
+            if row is None:
+                return None
+            updated = {**_from_db(row), **fields}
+            day = viewing_date(updated)
+            await self._lock_agent_day(db, updated["agent_id"], day)
+            rows = await db.fetch(
+                f"SELECT {VIEWING_COLUMNS} FROM viewings "
+                "WHERE agent_id = ? AND viewing_date = ? AND status = 'confirmed' AND id != ?",
+                updated["agent_id"], self._param("viewing_date", day), viewing_id
+            )
+            confirmed = _sort_by_start([_from_db(r) for r in rows])
+            ids = sorted({v["property_id"] for v in confirmed} | {updated["property_id"]})
+            rows = await db.fetch(
+                f"SELECT {PROPERTY_COLUMNS} FROM properties WHERE id IN ({', '.join('?' for _ in ids)})", *ids
+            )
+            properties = {row["id"]: _from_db(row) for row in rows}
+            reason = check(updated, confirmed, properties)
+            if reason:
+                raise ViewingConflict(reason)
+            return await self._update(db, "viewings", viewing_id, fields, VIEWING_COLUMNS)
+
+    # Slot cache versions
+    async def get_slot_version(self, agency_id):
+        row = await self._fetchrow("SELECT slot_version FROM agencies WHERE id = ?", agency_id)
+        return row["slot_version"] if row else 0
+
+    async def bump_slot_version(self, agency_id):
+        row = await self._fetchrow(
+            "UPDATE agencies SET slot_version = slot_version + 1 WHERE id = ? RETURNING slot_version", agency_id
+        )
+        return row["slot_version"] if row else 0
+
+    # Viewing events
+    async def append_viewing_event(self, agency_id, event_type, viewing):
+        async with self._transaction() as db:
+            # The row lock on the agency's counter is held until commit, so
+            # events become visible in seq order
+            row = await db.fetchrow(
+                "UPDATE agencies SET event_seq = event_seq + 1 WHERE id = ? RETURNING event_seq", agency_id
+            )
+            seq = row["event_seq"]
+            await db.execute(
+                "INSERT INTO viewing_events (agency_id, seq, type, payload) VALUES (?, ?, ?, ?)",
+                agency_id, seq, event_type, json.dumps(viewing, default=str)
+            )
+            await db.execute("UPDATE viewings SET event_seq = ? WHERE id = ?", seq, viewing["id"])
+            if seq % VIEWING_EVENT_TRIM_EVERY == 0:
+                await db.execute(
+                    "DELETE FROM viewing_events WHERE agency_id = ? AND seq <= ?",
+                    agency_id, seq - VIEWING_EVENT_RETENTION
+                )
+        return {"seq": seq, "type": event_type, "viewing": viewing}
+
+    async def get_viewing_events(self, agency_id, after, limit=100):
+        rows = await self._fetch(
+            "SELECT seq, type, payload FROM viewing_events WHERE agency_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+            agency_id, after, limit
+        )
+        return [{"seq": row["seq"], "type": row["type"], "viewing": json.loads(row["payload"])} for row in rows]
+
+    async def get_viewing_event_seq(self, agency_id):
+        row = await self._fetchrow("SELECT event_seq FROM agencies WHERE id = ?", agency_id)
+        return row["event_seq"] if row else 0
+
+    # Availability
+    @staticmethod
+    def _availability_filter(agency_id: int, agent_id: Optional[int]):
+        if agent_id is None:
+            return "agency_id = ? AND agent_id IS NULL", (agency_id,)
+        return "agency_id = ? AND agent_id = ?", (agency_id, agent_id)
+
+    async def get_availability(self, agency_id, agent_id=None):
+        where, args = self._availability_filter(agency_id, agent_id)
+        return await self._fetch(
+            f"SELECT {AVAILABILITY_COLUMNS} FROM availability WHERE {where} ORDER BY day_of_week", *args
+        )
+
+    async def set_availability(self, agency_id, rules, agent_id=None):
+        where, args = self._availability_filter(agency_id, agent_id)
+        async with self._transaction() as db:
+            await db.execute(f"DELETE FROM availability WHERE {where}", *args)
+            for rule in rules:
+                await db.execute(
+                    "INSERT INTO availability (agency_id, agent_id, day_of_week, enabled, start_time, end_time) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    agency_id, agent_id, rule["day_of_week"], rule["enabled"], rule["start_time"], rule["end_time"]
+                )
+        return rules
+
+    # Blockouts
+    async def list_blockouts(self, agency_id):
+        return await self._fetch(
+            f"SELECT {BLOCKOUT_COLUMNS} FROM blockouts WHERE agency_id = ? ORDER BY id", agency_id
+        )
+
+    async def get_blockouts(self, agency_id, start_date, end_date):
+        # Served by idx_blockouts_agency_date
+        return await self._fetch(
+            f"SELECT {BLOCKOUT_COLUMNS} FROM blockouts "
+            "WHERE agency_id = ? AND date BETWEEN ? AND ? ORDER BY id",
+            agency_id, self._param("date", start_date), self._param("date", end_date)
+        )
+
+    async def create_blockout(self, agency_id, data):
+        async with self._acquire() as db:
+            return await self._insert(db, "blockouts", {**data, "agency_id": agency_id}, BLOCKOUT_COLUMNS)
+
+    async def delete_blockout(self, agency_id, blockout_id):
+        return await self._fetchrow(
+            f"DELETE FROM blockouts WHERE id = ? AND agency_id = ? RETURNING {BLOCKOUT_COLUMNS}",
+            blockout_id, agency_id
+        )
+
+
+class _SQLiteExecutor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def fetch(self, sql: str, *args) -> List[Dict]:
+        async with self.conn.execute(sql, args) as cursor:
+            return [dict(row) for row in await cursor.fetchall()]
+
+    async def fetchrow(self, sql: str, *args) -> Optional[Dict]:
+        async with self.conn.execute(sql, args) as cursor:
+            row = await cursor.fetchone()
+        return dict(row) if row is not None else None
+
+    async def execute(self, sql: str, *args) -> int:
+        """Run a statement and return the number of rows it changed."""
+        async with self.conn.execute(sql, args) as cursor:
+            return cursor.rowcount
+
+
+class SQLiteRepository(SQLRepository):
+    """
+    Embedded SQLite (aiosqlite) with a small pool of WAL-mode connections.
+    Transactions start with BEGIN IMMEDIATE, which already serialises writers
+    across processes, so _lock_agent_day has nothing extra to do.
+    """
+
+    def __init__(self, path: str, pool_size: int = DEFAULT_POOL_SIZE):
+        self.path = path
+        # Every connection to :memory: would be a separate database
+        self.pool_size = 1 if path == ":memory:" else pool_size
+        self._pool: Optional[asyncio.Queue] = None
+
+    async def connect(self) -> None:
+        import aiosqlite
+
+        self._pool = asyncio.Queue()
+        for _ in range(self.pool_size):
+            # isolation_level=None: autocommit, with explicit BEGIN for transactions
+            conn = await aiosqlite.connect(self.path, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            await conn.execute("PRAGMA journal_mode=WAL")
+            await conn.execute("PRAGMA busy_timeout=5000")
+            await conn.executescript(SQLITE_SCHEMA)
+            self._pool.put_nowait(conn)
+        await super().connect()
+
+    async def close(self) -> None:
+        if self._pool is None:
+            return
+        while not self._pool.empty():
+            await self._pool.get_nowait().close()
+        self._pool = None
+
+    @asynccontextmanager
+    async def _acquire(self):
+        conn = await self._pool.get()
+        try:
+            yield _SQLiteExecutor(conn)
+        finally:
+            self._pool.put_nowait(conn)
+
+    @asynccontextmanager
+    async def _transaction(self):
+        async with self._acquire() as db:
+            await db.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except BaseException:
+                await db.conn.execute("ROLLBACK")
+                raise
+            await db.conn.execute("COMMIT")
+
+
+@lru_cache(maxsize=256)
+def _postgres_sql(sql: str) -> str:
+    """Rewrite ? placeholders as $1, $2, ... for asyncpg."""
+    parts = sql.split("?")
+    return "".join(
+        part + (f"${i + 1}" if i < len(parts) - 1 else "") for i, part in enumerate(parts)
+    )
+
+
+class _PostgresExecutor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def fetch(self, sql: str, *args) -> List[Dict]:
+        return [dict(row) for row in await self.conn.fetch(_postgres_sql(sql), *args)]
+
+    async def fetchrow(self, sql: str, *args) -> Optional[Dict]:
+        row = await self.conn.fetchrow(_postgres_sql(sql), *args)
+        return dict(row) if row is not None else None
+
+    async def execute(self, sql: str, *args) -> int:
+        """Run a statement and return the number of rows it changed."""
+        status = await self.conn.execute(_postgres_sql(sql), *args)
+        last = status.rsplit(" ", 1)[-1]
+        return int(last) if last.isdigit() else 0
+
+
+class PostgresRepository(SQLRepository):
+    """Postgres (e.g. Supabase) through an asyncpg connection pool. Expects database/schema.sql."""
+
+    def __init__(self, dsn: str, pool_size: int = DEFAULT_POOL_SIZE):
+        self.dsn = dsn
+        self.pool_size = pool_size
+        self._pool = None
+
+    def _param(self, column, value):
+        if isinstance(value, str):
+            if column in DATE_COLUMNS:
+                return date.fromisoformat(value)
+            if column in TIMESTAMP_COLUMNS:
+                return datetime.fromisoformat(value)
+        return value
+
+    async def connect(self) -> None:
+        import asyncpg
+
+        self._pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=self.pool_size)
+        await super().connect()
+
+    async def close(self) -> None:
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    async def _lock_agency(self, db, agency_id):
+        # Single-key advisory locks don't overlap the two-key ones below
+        await db.execute("SELECT pg_advisory_xact_lock(?)", agency_id)
+
+    async def _lock_agent_day(self, db, agent_id, day):
+        await db.execute("SELECT pg_advisory_xact_lock(?, ?)", agent_id, date.fromisoformat(day).toordinal())
+
+    @asynccontextmanager
+    async def _acquire(self):
+        async with self._pool.acquire() as conn:
+            yield _PostgresExecutor(conn)
+
+    @asynccontextmanager
+    async def _transaction(self):
+        async with self._pool.acquire() as conn:
+            async with conn.transaction():
+                yield _PostgresExecutor(conn)
+
+
+def create_repository(url: Optional[str] = None, pool_size: int = DEFAULT_POOL_SIZE) -> Repository:
+    """Build the repository for a DATABASE_URL (see module docstring)."""
+    if not url or url.startswith("memory:"):
+        return MemoryRepository()
+    if url.startswith("sqlite://"):
+        return SQLiteRepository(url[len("sqlite:///"):], pool_size)
+    if url.startswith(("postgres://", "postgresql://")):
+        return PostgresRepository(url, pool_size)
+    raise ValueError(f"Unsupported DATABASE_URL: {url}")
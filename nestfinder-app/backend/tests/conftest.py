@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+# The backend is a flat set of modules run from its own directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def client(request, tmp_path, monkeypatch):
+    """The app (demo properties seeded) on a fresh repository of each kind."""
+    from fastapi.testclient import TestClient
+
+    import main
+    import storage
+    from slot_cache import SlotCache, TimelineCache
+    from viewing_events import ViewingEventBroker
+
+    if request.param == "memory":
+        repo = storage.MemoryRepository()
+    else:
+        repo = storage.SQLiteRepository(str(tmp_path / "app.db"))
+    monkeypatch.setattr(main, "repo", repo)
+    monkeypatch.setattr(main, "slot_cache", SlotCache(epoch=repo.cache_epoch))
+    monkeypatch.setattr(main, "timeline_cache", TimelineCache())
+    monkeypatch.setattr(main, "event_broker", ViewingEventBroker(repo))
+    with TestClient(main.app) as client:
+        yield client
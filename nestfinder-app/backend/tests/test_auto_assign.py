@@ -0,0 +1,123 @@
+"""scheduler_engine.auto_assign_day and POST /api/schedule/auto-assign."""
+
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import main
+from scheduler_engine import auto_assign_day, parse_time
+
+DAY = date(2030, 6, 3)  # a Monday
+NOW = datetime(2030, 6, 1, 12, 0)
+RULE = {"day_of_week": 0, "enabled": True, "start_time": "09:00", "end_time": "18:00"}
+PROPERTIES = {
+    1: {"id": 1, "postcode": "W2 4DX"},
+    2: {"id": 2, "postcode": "W2 2PF"},
+    3: {"id": 3, "postcode": "E1 6AN"},
+}
+
+
+def viewing(viewing_id, property_id, time, status="pending"):
+    return {"id": viewing_id, "property_id": property_id, "status": status, "requested_time": time}
+
+
+def assign(pending, confirmed=(), blockouts=(), rule=RULE, target_date=DAY, now=NOW):
+    return auto_assign_day(list(pending), list(confirmed), PROPERTIES, rule, list(blockouts), target_date, now=now)
+
+
+def test_free_request_is_confirmed_at_its_time():
+    result = assign([viewing(1, 1, "10:00"), viewing(2, 3, "15:00")])
+    assert result["confirm"] == [{"viewing_id": 1, "time": "10:00"}, {"viewing_id": 2, "time": "15:00"}]
+    assert result["suggest"] == [] and result["unassigned"] == []
+    assert result["travel_minutes"] == 20
+
+
+def test_clashing_request_gets_a_suggested_time():
+    result = assign([viewing(2, 2, "10:00")], confirmed=[viewing(1, 1, "10:00", "confirmed")])
+    assert result["confirm"] == [] and result["unassigned"] == []
+    [suggestion] = result["suggest"]
+    assert suggestion["viewing_id"] == 2
+    moved = parse_time(suggestion["time"])
+    assert abs(moved - parse_time("10:00")) <= 60
+    # Clear of the confirmed viewing, its buffer and the travel between them
+    assert moved >= parse_time("10:35") or moved + 35 <= parse_time("10:00")
+
+
+def test_blockout_moves_or_leaves_out_requests():
+    blockouts = [{"date": str(DAY), "start_time": "09:00", "end_time": "12:00"}]
+    result = assign([viewing(1, 1, "11:30"), viewing(2, 3, "10:00")], blockouts=blockouts)
+    assert [s["viewing_id"] for s in result["suggest"]] == [1]
+    assert parse_time(result["suggest"][0]["time"]) >= parse_time("12:00")
+    assert [(u["viewing_id"], u["reason"]) for u in result["unassigned"]] == [
+        (2, "No free time within 60 minutes of the requested time")
+    ]
+
+
+@pytest.mark.parametrize("kwargs, reason", [
+    ({"rule": None}, "Agent is not available on this day"),
+    ({"blockouts": [{"date": str(DAY), "full_day": True}]}, "Day is blocked out"),
+    ({"now": datetime(2030, 6, 4, 9, 0)}, "Requested date has passed"),
+])
+def test_day_not_open(kwargs, reason):
+    result = assign([viewing(1, 1, "10:00"), viewing(2, 3, "14:00")], **kwargs)
+    assert result["confirm"] == [] and result["suggest"] == []
+    assert result["unassigned"] == [{"viewing_id": 1, "reason": reason}, {"viewing_id": 2, "reason": reason}]
+
+
+def test_more_requests_than_the_day_holds():
+    # Twenty viewings wanting 10:00 in the same street: only the hour
+    # either side of it can be used, 30 minutes a viewing
+    result = assign([viewing(n, 1 + n % 2, "10:00") for n in range(20)])
+    placed = sorted(parse_time(item["time"]) for item in result["confirm"] + result["suggest"])
+    assert 4 <= len(placed) <= 5
+    assert len(placed) + len(result["unassigned"]) == 20
+    assert all(b - a >= 30 for a, b in zip(placed, placed[1:]))
+    assert placed[0] >= parse_time("09:00") and placed[-1] <= parse_time("11:00")
+
+
+def create_viewing(client, property_id, day, time):
+    response = client.post("/api/viewings", json={
+        "tenant_name": "Tenant", "tenant_email": "tenant@example.com", "tenant_phone": "07700 900000",
+        "property_id": property_id, "requested_date": day.isoformat(), "requested_time": time,
+        "agent_id": main.DEFAULT_AGENT_ID,
+    })
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def viewings_by_id(client):
+    return {v["id"]: v for v in client.get("/api/viewings").json()}
+
+
+def test_auto_assign_endpoint(client):
+    day = date.today() + timedelta(days=7)
+    property_id = client.get("/api/properties").json()[0]["id"]
+    first = create_viewing(client, property_id, day, "10:00")
+    second = create_viewing(client, property_id, day, "10:00")
+    body = {"start_date": day.isoformat(), "agent_id": main.DEFAULT_AGENT_ID}
+
+    planned = client.post("/api/schedule/auto-assign", json={**body, "dry_run": True}).json()
+    assert planned["dry_run"] is True
+    # Both want 10:00: one gets it, the other a time nearby
+    [confirmed], [suggested] = planned["confirmed"], planned["suggested"]
+    assert {confirmed["viewing_id"], suggested["viewing_id"]} == {first, second}
+    assert confirmed["time"] == "10:00" and suggested["time"] != "10:00"
+    assert all(v["status"] == "pending" for v in viewings_by_id(client).values())
+
+    applied = client.post("/api/schedule/auto-assign", json=body).json()
+    assert applied["confirmed"] == planned["confirmed"] and applied["suggested"] == planned["suggested"]
+    viewings = viewings_by_id(client)
+    assert viewings[confirmed["viewing_id"]]["status"] == "confirmed"
+    assert viewings[suggested["viewing_id"]]["status"] == "pending"
+    assert viewings[suggested["viewing_id"]]["suggested_time"] == suggested["time"]
+    # The 10:00 slot is gone
+    slots = client.get(f"/api/properties/{property_id}/available-slots", params={"date": day.isoformat()}).json()["slots"]
+    assert "10:00" not in {slot["time"] for slot in slots}
+
+
+def test_auto_assign_range_limit(client):
+    start = date.today()
+    response = client.post("/api/schedule/auto-assign", json={
+        "start_date": start.isoformat(), "end_date": (start - timedelta(days=1)).isoformat(),
+    })
+    assert response.status_code == 400
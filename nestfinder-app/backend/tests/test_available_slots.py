@@ -0,0 +1,108 @@
+"""GET /api/properties/{id}/available-slots: single dates and streamed ranges."""
+
+import json
+from datetime import date, timedelta
+
+import scheduler_engine
+
+FIRST = date.today() + timedelta(days=7)
+LAST = FIRST + timedelta(days=4)
+
+
+def first_property(client):
+    return client.get("/api/properties").json()[0]["id"]
+
+
+def confirm_viewing(client, property_id, day, time):
+    response = client.post("/api/viewings", json={
+        "tenant_name": "Tenant", "tenant_email": "tenant@example.com", "tenant_phone": "07700 900000",
+        "property_id": property_id, "requested_date": day.isoformat(), "requested_time": time,
+    })
+    assert response.status_code == 200, response.text
+    response = client.patch(f"/api/viewings/{response.json()['id']}", json={"status": "confirmed"})
+    assert response.status_code == 200, response.text
+
+
+def slots_on(client, property_id, day, **params):
+    response = client.get(f"/api/properties/{property_id}/available-slots", params={"date": day.isoformat(), **params})
+    assert response.status_code == 200, response.text
+    return response.json()["slots"]
+
+
+def range_lines(client, property_id, **params):
+    response = client.get(f"/api/properties/{property_id}/available-slots", params={
+        "from": FIRST.isoformat(), "to": LAST.isoformat(), **params,
+    })
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    return response, [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_range_streams_a_line_per_day(client):
+    property_id = first_property(client)
+    confirm_viewing(client, property_id, FIRST + timedelta(days=1), "11:00")
+    _, lines = range_lines(client, property_id)
+    days = [FIRST + timedelta(days=n) for n in range(5)]
+    assert [line["date"] for line in lines] == [day.isoformat() for day in days]
+    for line, day in zip(lines, days):
+        assert line["slots"] == slots_on(client, property_id, day)
+    booked = {slot["time"] for slot in lines[1]["slots"]}
+    assert "11:00" not in booked and "10:00" in booked
+
+
+def test_range_computes_only_days_not_cached(client, monkeypatch):
+    property_id = first_property(client)
+    computed = []
+    generate_agent_slots = scheduler_engine.generate_agent_slots
+
+    def counting(agent_days, *args):
+        computed.append(agent_days[0].date)
+        return generate_agent_slots(agent_days, *args)
+    monkeypatch.setattr(scheduler_engine, "generate_agent_slots", counting)
+
+    before = slots_on(client, property_id, FIRST + timedelta(days=2), interval=15)
+    computed.clear()
+    _, lines = range_lines(client, property_id, interval=15)
+    assert lines[2]["slots"] == before
+    assert computed == [FIRST, FIRST + timedelta(days=1), FIRST + timedelta(days=3), LAST]
+    assert all(slot["time"][3:] in ("00", "15", "30", "45") for slot in lines[0]["slots"])
+    # The range's days are cached for single dates too
+    computed.clear()
+    assert slots_on(client, property_id, LAST, interval=15) == lines[4]["slots"]
+    assert computed == []
+
+
+def test_generate_slots_range_works_out_days_as_asked(monkeypatch):
+    calls = []
+    monkeypatch.setattr(scheduler_engine, "generate_agent_slots", lambda agent_days, *args: calls.append(agent_days) or [])
+    days = [FIRST, LAST]
+    agent_days = {(agent_id, str(day)): (agent_id, day) for agent_id in (1, 2) for day in days}
+    results = scheduler_engine.generate_slots_range(agent_days, [1, 2], days, "W2 4DX")
+    assert calls == []
+    assert next(results) == (FIRST, [])
+    assert calls == [[(1, FIRST), (2, FIRST)]]
+    assert list(results) == [(LAST, [])]
+    assert len(calls) == 2
+
+
+def test_range_etag(client):
+    property_id = first_property(client)
+    response, _ = range_lines(client, property_id)
+    etag = response.headers["ETag"]
+    unchanged = client.get(f"/api/properties/{property_id}/available-slots", params={
+        "from": FIRST.isoformat(), "to": LAST.isoformat(),
+    }, headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304
+    confirm_viewing(client, property_id, FIRST, "14:00")
+    response, lines = range_lines(client, property_id)
+    assert response.headers["ETag"] != etag
+    assert "14:00" not in {slot["time"] for slot in lines[0]["slots"]}
+
+
+def test_range_limits(client):
+    property_id = first_property(client)
+    path = f"/api/properties/{property_id}/available-slots"
+    assert client.get(path, params={"from": FIRST.isoformat()}).status_code == 400
+    assert client.get(path, params={"from": LAST.isoformat(), "to": FIRST.isoformat()}).status_code == 400
+    too_long = FIRST + timedelta(days=31)
+    assert client.get(path, params={"from": FIRST.isoformat(), "to": too_long.isoformat()}).status_code == 400
@@ -0,0 +1,123 @@
+"""Repository.confirm_viewing: confirmations racing for one agent's day can't both win."""
+
+import asyncio
+from datetime import date, timedelta
+from functools import partial
+
+import pytest
+
+import scheduler_engine
+import storage
+from storage import DEFAULT_AGENCY_ID, DEFAULT_AGENT_ID, ViewingConflict
+
+DAY = (date.today() + timedelta(days=7)).isoformat()
+CHECK = partial(scheduler_engine.confirmation_conflict, viewing_duration=20)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return lambda: storage.MemoryRepository()
+    return lambda: storage.SQLiteRepository(str(tmp_path / "confirm.db"))
+
+
+def run(scenario, *factories):
+    """Run scenario(*repos) with a connected repository from each factory."""
+    async def main():
+        repos = [factory() for factory in factories]
+        for repo in repos:
+            await repo.connect()
+        try:
+            return await scenario(*repos)
+        finally:
+            for repo in repos:
+                await repo.close()
+    return asyncio.run(main())
+
+
+async def pending_viewings(repo, times, postcode="W2 4DX"):
+    prop = await repo.create_property({
+        "title": "Flat", "area": "Bayswater", "address": "1 Queensway", "postcode": postcode,
+        "rent": 1500.0, "status": "active", "agency_id": DEFAULT_AGENCY_ID,
+    })
+    return [
+        await repo.create_viewing({
+            "tenant_name": f"Tenant {i}", "tenant_email": f"tenant{i}@example.com", "tenant_phone": "07700 900000",
+            "property_id": prop["id"], "requested_date": DAY, "requested_time": requested_time,
+            "status": "pending", "agent_id": DEFAULT_AGENT_ID, "created_at": f"2030-01-01T09:00:{i:02d}",
+        })
+        for i, requested_time in enumerate(times)
+    ]
+
+
+async def confirm_all(repos, viewings):
+    """Confirm every viewing at its requested time at once, alternating repos. Result or exception each."""
+    return await asyncio.gather(*(
+        repos[i % len(repos)].confirm_viewing(
+            viewing["id"], {"status": "confirmed", "confirmed_time": viewing["requested_time"]}, CHECK
+        )
+        for i, viewing in enumerate(viewings)
+    ), return_exceptions=True)
+
+
+async def statuses(repo, viewings):
+    return [(await repo.get_viewing(viewing["id"]))["status"] for viewing in viewings]
+
+
+def test_one_of_several_racing_for_a_slot_wins(backend):
+    async def scenario(repo):
+        viewings = await pending_viewings(repo, ["10:00"] * 6)
+        return await confirm_all([repo], viewings), await statuses(repo, viewings)
+    results, saved = run(scenario, backend)
+    winners = [r for r in results if not isinstance(r, Exception)]
+    assert len(winners) == 1 and winners[0]["status"] == "confirmed"
+    assert all(isinstance(r, ViewingConflict) for r in results if r is not winners[0])
+    assert sorted(saved) == ["confirmed"] + ["pending"] * 5
+
+
+def test_overlapping_times_race_like_one_slot(backend):
+    async def scenario(repo):
+        viewings = await pending_viewings(repo, ["10:00", "10:10", "10:15", "09:50"])
+        return await confirm_all([repo], viewings), await statuses(repo, viewings)
+    results, saved = run(scenario, backend)
+    assert sum(not isinstance(r, Exception) for r in results) == 1
+    assert saved.count("confirmed") == 1
+
+
+def test_separate_slots_all_confirm(backend):
+    async def scenario(repo):
+        viewings = await pending_viewings(repo, ["10:00", "11:00", "12:00", "13:00"])
+        return await confirm_all([repo], viewings), await statuses(repo, viewings)
+    results, saved = run(scenario, backend)
+    assert not any(isinstance(r, Exception) for r in results)
+    assert saved == ["confirmed"] * 4
+
+
+def test_conflict_reason(backend):
+    async def scenario(repo):
+        first, second = await pending_viewings(repo, ["10:00", "10:00"])
+        await confirm_all([repo], [first])
+        with pytest.raises(ViewingConflict) as conflict:
+            await repo.confirm_viewing(second["id"], {"status": "confirmed", "confirmed_time": "10:00"}, CHECK)
+        return conflict.value.reason
+    assert run(scenario, backend)
+
+
+def test_missing_viewing(backend):
+    async def scenario(repo):
+        return await repo.confirm_viewing(999, {"status": "confirmed", "confirmed_time": "10:00"}, CHECK)
+    assert run(scenario, backend) is None
+
+
+def test_workers_sharing_a_database_race_for_a_slot(tmp_path):
+    # Two repositories on one file, as two worker processes would have
+    path = str(tmp_path / "shared.db")
+    workers = [lambda: storage.SQLiteRepository(path)] * 2
+
+    async def scenario(first, second):
+        viewings = await pending_viewings(first, ["14:00"] * 8)
+        return await confirm_all([first, second], viewings), await statuses(second, viewings)
+    results, saved = run(scenario, *workers)
+    assert sum(not isinstance(r, Exception) for r in results) == 1
+    assert all(isinstance(r, ViewingConflict) for r in results if isinstance(r, Exception))
+    assert saved.count("confirmed") == 1
@@ -0,0 +1,122 @@
+"""Day bitsets in indexes: minute_bits, run_starts, bit_intervals, bits_at and DayCalendar."""
+
+import random
+
+import numpy as np
+import pytest
+
+from indexes import DAY_BITS, MINUTES_PER_DAY, DayCalendar, bit_intervals, bits_at, minute_bits, run_starts
+
+
+def minutes_of(bits):
+    return [m for m in range(MINUTES_PER_DAY) if bits >> m & 1]
+
+
+def random_bits(rng, runs=12):
+    bits = 0
+    for _ in range(runs):
+        start = rng.randrange(MINUTES_PER_DAY)
+        bits |= minute_bits(start, start + rng.randint(1, 120))
+    return bits
+
+
+@pytest.mark.parametrize("start, end, expected", [
+    (540, 545, [540, 541, 542, 543, 544]),
+    (540, 540, []),
+    (545, 540, []),
+    (-5, 2, [0, 1]),
+    (1438, 1500, [1438, 1439]),
+])
+def test_minute_bits(start, end, expected):
+    assert minutes_of(minute_bits(start, end)) == expected
+
+
+def test_minute_bits_whole_day():
+    assert minute_bits(0, MINUTES_PER_DAY) == DAY_BITS
+
+
+@pytest.mark.parametrize("length", [1, 2, 3, 7, 20, 31, 64, 95])
+def test_run_starts_matches_brute_force(length):
+    rng = random.Random(length)
+    for _ in range(20):
+        free = random_bits(rng)
+        expected = [t for t in range(MINUTES_PER_DAY - length + 1) if all(free >> m & 1 for m in range(t, t + length))]
+        assert minutes_of(run_starts(free, length)) == expected
+
+
+def test_run_starts_needs_the_whole_run():
+    free = minute_bits(600, 620)
+    assert minutes_of(run_starts(free, 20)) == [600]
+    assert run_starts(free, 21) == 0
+
+
+def test_bit_intervals():
+    assert bit_intervals(0) == []
+    assert bit_intervals(minute_bits(0, 10) | minute_bits(20, 25) | minute_bits(1430, 1440)) == [
+        (0, 10), (20, 25), (1430, 1440)
+    ]
+    assert bit_intervals(DAY_BITS) == [(0, MINUTES_PER_DAY)]
+
+
+def test_bit_intervals_round_trip():
+    rng = random.Random(3)
+    for _ in range(50):
+        bits = random_bits(rng)
+        intervals = bit_intervals(bits)
+        assert all(end < next_start for (_, end), (next_start, _) in zip(intervals, intervals[1:]))
+        rebuilt = 0
+        for start, end in intervals:
+            rebuilt |= minute_bits(start, end)
+        assert rebuilt == bits
+
+
+def test_bits_at():
+    bits = minute_bits(600, 630) | minute_bits(705, 706)
+    minutes = np.arange(540, 1080, 15, dtype=np.int32)
+    assert bits_at(bits, minutes).tolist() == [600, 615, 705]
+    assert bits_at(0, minutes).tolist() == []
+
+
+def test_booked_viewing_keeps_travel_buffer_either_side():
+    calendar = DayCalendar(travel_buffer=10)
+    calendar.book(600, 20)
+    fits = calendar.fits(20)
+    # A 20-minute viewing must end 10 minutes before 10:00 or start 10 after 10:20
+    assert fits >> 570 & 1 and not fits >> 571 & 1
+    assert fits >> 630 & 1 and not fits >> 629 & 1
+
+
+def test_blockout_needs_travel_buffer_before_only():
+    calendar = DayCalendar(travel_buffer=10)
+    calendar.block(720, 780)
+    fits = calendar.fits(30)
+    assert fits >> 680 & 1 and not fits >> 681 & 1
+    assert fits >> 780 & 1 and not fits >> 779 & 1
+
+
+def test_fits_matches_brute_force():
+    rng = random.Random(7)
+    for _ in range(20):
+        calendar = DayCalendar(travel_buffer=10)
+        booked = [(rng.randrange(480, 1080), rng.choice((20, 30, 45))) for _ in range(rng.randint(0, 8))]
+        blocked = [(start, start + rng.choice((30, 60))) for start in (rng.randrange(480, 1080) for _ in range(2))]
+        for start, duration in booked:
+            calendar.book(start, duration)
+        for start, end in blocked:
+            calendar.block(start, end)
+        duration = rng.choice((20, 45))
+        expected = [
+            t for t in range(MINUTES_PER_DAY - duration + 1)
+            if all(t + duration + 10 <= s or t >= s + d + 10 for s, d in booked)
+            and all(t + duration + 10 <= start or t >= end for start, end in blocked)
+        ]
+        assert minutes_of(calendar.fits(duration)) == expected
+
+
+def test_fits_is_recomputed_after_changes():
+    calendar = DayCalendar(travel_buffer=10)
+    assert calendar.fits(20) >> 600 & 1
+    calendar.book(600, 20)
+    assert not calendar.fits(20) >> 600 & 1
+    calendar.block_day()
+    assert calendar.fits(20) == 0
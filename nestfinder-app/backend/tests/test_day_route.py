@@ -0,0 +1,138 @@
+"""scheduler_engine.plan_day_route and GET /api/schedule/route."""
+
+import random
+from datetime import date, timedelta
+from time import perf_counter
+
+import pytest
+
+import main
+import travel_time
+from scheduler_engine import format_time, parse_time, plan_day_route
+
+DAY_START, DAY_END = parse_time("09:00"), parse_time("18:00")
+DURATION, BUFFER = 20, 10
+WEST = ["W2 4DX", "W2 2PF", "W11 2BQ"]
+EAST = ["E1 6AN", "EC2A 3AR", "E1 7AA"]
+
+
+def viewing(viewing_id, postcode, time, status="pending"):
+    return {"id": viewing_id, "property_id": postcode, "status": status, "requested_time": time}
+
+
+def properties(viewings):
+    return {v["property_id"]: {"id": v["property_id"], "postcode": v["property_id"]} for v in viewings}
+
+
+def assert_route_keeps_windows(route, viewings, free=None):
+    """Each stop within its window and reachable from the one before, travel and buffer included."""
+    by_id = {v["id"]: v for v in viewings}
+    ready = DAY_START
+    for stop in route["stops"]:
+        start = parse_time(stop["start"])
+        requested = parse_time(by_id[stop["viewing_id"]]["requested_time"])
+        if stop["status"] == "confirmed":
+            assert start == requested
+        else:
+            assert abs(start - requested) <= 60
+            assert DAY_START <= start <= DAY_END - DURATION
+            if free is not None:
+                assert any(lo <= start < hi for lo, hi in free)
+        assert start >= ready + stop["travel_minutes"]
+        ready = start + DURATION + BUFFER
+
+
+def test_route_groups_stops_by_area():
+    # All asking for 10:30, alternately east and west London
+    viewings = [viewing(n, (WEST if n % 2 else EAST)[n // 2], "10:30") for n in range(4)]
+    route = plan_day_route(viewings, properties(viewings), DAY_START, DAY_END, viewing_duration=DURATION, travel_buffer=BUFFER)
+    assert route["feasible"] and route["unscheduled"] == []
+    assert len(route["stops"]) == 4
+    assert route["total_travel_minutes"] < route["baseline_travel_minutes"]
+    areas = [stop["postcode"] in WEST for stop in route["stops"]]
+    assert sum(a != b for a, b in zip(areas, areas[1:])) == 1
+    assert_route_keeps_windows(route, viewings)
+
+
+def test_route_keeps_confirmed_times_and_free_ranges():
+    viewings = [
+        viewing(1, "W2 4DX", "10:00", "confirmed"),
+        viewing(2, "E1 6AN", "11:00"),
+        viewing(3, "W11 2BQ", "12:30"),
+        viewing(4, "E1 7AA", "14:00", "confirmed"),
+    ]
+    # Blocked out 10:45-12:00
+    free = [(DAY_START, parse_time("10:45")), (parse_time("12:00"), DAY_END - DURATION + 1)]
+    route = plan_day_route(
+        viewings, properties(viewings), DAY_START, DAY_END, viewing_duration=DURATION, travel_buffer=BUFFER, free=free
+    )
+    assert route["feasible"] and route["unscheduled"] == []
+    starts = {stop["viewing_id"]: stop["start"] for stop in route["stops"]}
+    assert starts[1] == "10:00" and starts[4] == "14:00"
+    assert parse_time(starts[2]) >= parse_time("12:00")
+    assert_route_keeps_windows(route, viewings, free)
+
+
+def test_route_leaves_out_what_does_not_fit():
+    viewings = [
+        viewing(1, "W2 4DX", "10:00", "confirmed"),
+        viewing(2, "E1 6AN", "10:00"),
+        viewing(3, "W2 2PF", "10:30", "confirmed"),
+    ]
+    route = plan_day_route(
+        viewings, properties(viewings), DAY_START, DAY_END, viewing_duration=DURATION, travel_buffer=BUFFER,
+        free=[(parse_time("10:00"), parse_time("10:35"))]
+    )
+    assert [stop["viewing_id"] for stop in route["stops"]] == [1, 3]
+    assert [item["viewing_id"] for item in route["unscheduled"]] == [2]
+
+
+def test_thirty_stops_within_budget():
+    rng = random.Random(30)
+    postcodes = list(travel_time.POSTCODE_COORDS)
+    viewings = [
+        viewing(n, rng.choice(postcodes), format_time(rng.randrange(DAY_START, DAY_END - DURATION, 5)),
+                "confirmed" if n % 6 == 0 else "pending")
+        for n in range(30)
+    ]
+    props = properties(viewings)
+    plan_day_route(viewings, props, DAY_START, DAY_END)  # warm the travel caches
+    started = perf_counter()
+    route = plan_day_route(viewings, props, DAY_START, DAY_END, viewing_duration=DURATION, travel_buffer=BUFFER)
+    assert perf_counter() - started < 0.1
+    assert len(route["stops"]) + len(route["unscheduled"]) == 30
+    if route["feasible"]:
+        assert_route_keeps_windows(route, viewings)
+
+
+def next_monday():
+    today = date.today()
+    return today + timedelta(days=7 - today.weekday())
+
+
+@pytest.mark.parametrize("full_day", [False, True])
+def test_route_endpoint_keeps_pending_out_of_blockouts(client, full_day):
+    day = next_monday()
+    property_id = client.get("/api/properties").json()[0]["id"]
+    response = client.post("/api/viewings", json={
+        "tenant_name": "Tenant", "tenant_email": "tenant@example.com", "tenant_phone": "07700 900000",
+        "property_id": property_id, "requested_date": day.isoformat(), "requested_time": "11:00",
+        "agent_id": main.DEFAULT_AGENT_ID,
+    })
+    assert response.status_code == 200, response.text
+    viewing_id = response.json()["id"]
+    params = {"date": day.isoformat(), "agent_id": main.DEFAULT_AGENT_ID}
+    assert client.get("/api/schedule/route", params=params).json()["stops"][0]["start"] == "11:00"
+
+    blockout = {"date": day.isoformat(), "agent_id": main.DEFAULT_AGENT_ID, "full_day": full_day}
+    if not full_day:
+        blockout.update(start_time="10:30", end_time="11:30")
+    assert client.post("/api/blockouts", json=blockout).status_code == 200
+    route = client.get("/api/schedule/route", params=params).json()
+    if full_day:
+        assert route["stops"] == []
+        assert [item["viewing_id"] for item in route["unscheduled"]] == [viewing_id]
+    else:
+        # Clear of the blockout, with the buffer before it
+        start = parse_time(route["stops"][0]["start"])
+        assert start + DURATION + BUFFER <= parse_time("10:30") or start >= parse_time("11:30")
@@ -0,0 +1,74 @@
+"""POST /api/viewings/feasibility:batch and GET /api/viewings/{id}/feasibility."""
+
+from datetime import date, timedelta
+
+import main
+
+DAY = date.today() + timedelta(days=7)
+
+
+def create_viewing(client, postcode, time, day=DAY):
+    property_id = next(p["id"] for p in client.get("/api/properties").json() if p["postcode"] == postcode)
+    response = client.post("/api/viewings", json={
+        "tenant_name": "Tenant", "tenant_email": "tenant@example.com", "tenant_phone": "07700 900000",
+        "property_id": property_id, "requested_date": day.isoformat(), "requested_time": time,
+        "agent_id": main.DEFAULT_AGENT_ID,
+    })
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def confirm(client, viewing_id):
+    response = client.patch(f"/api/viewings/{viewing_id}", json={"status": "confirmed"})
+    assert response.status_code == 200, response.text
+
+
+def batch(client, viewing_ids=None):
+    body = {} if viewing_ids is None else {"viewing_ids": viewing_ids}
+    response = client.post("/api/viewings/feasibility:batch", json=body)
+    assert response.status_code == 200, response.text
+    return {int(viewing_id): result for viewing_id, result in response.json().items()}
+
+
+def test_batch_statuses_around_a_confirmed_viewing(client):
+    confirm(client, create_viewing(client, "W2 4DX", "10:00"))
+    same_time = create_viewing(client, "W2 4DX", "10:00")
+    too_far = create_viewing(client, "E14 5AB", "10:40")
+    long_trip = create_viewing(client, "KT1 1AE", "11:30")
+    nearby = create_viewing(client, "W11 2BQ", "15:00")
+    other_day = create_viewing(client, "W2 4DX", "10:00", DAY + timedelta(days=1))
+
+    results = batch(client)
+    assert set(results) == {same_time, too_far, long_trip, nearby, other_day}
+    assert results[same_time]["status"] == "conflict"
+    assert results[too_far] == {
+        "status": "conflict", "label": "Conflict", "color": "#f44336",
+        "reason": "Insufficient travel time from W2 4DX",
+    }
+    assert results[long_trip] == {"status": "tight", "label": "Tight", "color": "#ff9800", "travel_time": 35}
+    assert results[nearby]["status"] == "ok"
+    assert results[other_day]["status"] == "ok"
+    for viewing_id, result in results.items():
+        assert client.get(f"/api/viewings/{viewing_id}/feasibility").json() == result
+
+
+def test_batch_of_given_viewings(client):
+    first = create_viewing(client, "W2 4DX", "10:00")
+    second = create_viewing(client, "W2 4DX", "10:00")
+    create_viewing(client, "E1 6AN", "12:00")
+    assert set(batch(client, [first, second])) == {first, second}
+    assert batch(client, []) == {}
+
+
+def test_batch_follows_confirmations(client):
+    first = create_viewing(client, "W2 4DX", "10:00")
+    second = create_viewing(client, "W2 4DX", "10:00")
+    assert batch(client)[second]["status"] == "ok"
+    confirm(client, first)
+    # Confirmed viewings drop out of the default; the other now clashes
+    assert batch(client) == {second: batch(client, [second])[second]}
+    assert batch(client)[second]["status"] == "conflict"
+
+
+def test_unknown_viewing_feasibility(client):
+    assert client.get("/api/viewings/999999/feasibility").status_code == 404
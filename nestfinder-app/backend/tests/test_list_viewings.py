@@ -0,0 +1,129 @@
+"""GET /api/viewings: keyset pages (limit, cursor) and changes since an event seq."""
+
+from datetime import date, timedelta
+
+import pytest
+
+import main
+import storage
+
+DAY = (date.today() + timedelta(days=7)).isoformat()
+
+
+def create_viewings(client, count):
+    property_id = client.get("/api/properties").json()[0]["id"]
+    ids = []
+    for i in range(count):
+        response = client.post("/api/viewings", json={
+            "tenant_name": f"Tenant {i}",
+            "tenant_email": f"tenant{i}@example.com",
+            "tenant_phone": "07700 900000",
+            "property_id": property_id,
+            "requested_date": DAY,
+            "requested_time": f"{10 + i // 2:02d}:{i % 2 * 30:02d}",
+        })
+        assert response.status_code == 200, response.text
+        ids.append(response.json()["id"])
+    return ids
+
+
+def pages(client, limit):
+    """Every page of the list at limit, following X-Next-Cursor."""
+    result = []
+    params = {"limit": limit}
+    while True:
+        response = client.get("/api/viewings", params=params)
+        assert response.status_code == 200, response.text
+        result.append([v["id"] for v in response.json()])
+        if "X-Next-Cursor" not in response.headers:
+            return result
+        params = {"limit": limit, "cursor": response.headers["X-Next-Cursor"]}
+
+
+def test_unpaged_list_is_newest_first(client):
+    ids = create_viewings(client, 4)
+    response = client.get("/api/viewings")
+    assert [v["id"] for v in response.json()] == ids[::-1]
+    assert "X-Next-Cursor" not in response.headers
+
+
+def test_pages_cover_the_list_once(client):
+    ids = create_viewings(client, 7)
+    assert pages(client, 3) == [ids[6:3:-1], ids[3:0:-1], ids[:1]]
+
+
+def test_full_last_page_is_followed_by_an_empty_one(client):
+    ids = create_viewings(client, 4)
+    assert pages(client, 2) == [ids[:1:-1], ids[1::-1], []]
+
+
+def test_pages_stay_put_when_viewings_are_added(client):
+    ids = create_viewings(client, 5)
+    first = client.get("/api/viewings", params={"limit": 2})
+    create_viewings(client, 2)
+    rest = client.get("/api/viewings", params={"limit": 10, "cursor": first.headers["X-Next-Cursor"]})
+    assert [v["id"] for v in first.json()] + [v["id"] for v in rest.json()] == ids[::-1]
+
+
+def test_viewings_created_together_are_ordered_by_id(client):
+    property_id = client.get("/api/properties").json()[0]["id"]
+    created_at = "2030-01-01T09:00:00"
+    ids = [
+        client.portal.call(main.repo.create_viewing, {
+            "tenant_name": "Tenant", "tenant_email": "t@example.com", "tenant_phone": "07700 900000",
+            "property_id": property_id, "requested_date": DAY, "requested_time": "10:00",
+            "status": "pending", "agent_id": storage.DEFAULT_AGENT_ID, "created_at": created_at,
+        })["id"]
+        for _ in range(5)
+    ]
+    assert pages(client, 2) == [ids[:2:-1], ids[2:0:-1], ids[:1]]
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "WyJub3QgYSBkYXRlIiwgMV0", "WzFd"])
+def test_invalid_cursor(client, cursor):
+    response = client.get("/api/viewings", params={"cursor": cursor})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+def test_since_and_cursor_together_are_rejected(client):
+    response = client.get("/api/viewings", params={"since": 0, "cursor": "x"})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("params", [{"limit": 0}, {"limit": main.MAX_VIEWINGS_PAGE + 1}, {"since": -1}])
+def test_out_of_range_params(client, params):
+    assert client.get("/api/viewings", params=params).status_code == 422
+
+
+def test_event_seq_header(client):
+    assert client.get("/api/viewings").headers["X-Event-Seq"] == "0"
+    create_viewings(client, 3)
+    assert client.get("/api/viewings").headers["X-Event-Seq"] == "3"
+
+
+def test_since_lists_changes_oldest_first(client):
+    ids = create_viewings(client, 3)
+    seq = client.get("/api/viewings").headers["X-Event-Seq"]
+    assert client.patch(f"/api/viewings/{ids[0]}", json={"status": "declined"}).status_code == 200
+
+    response = client.get("/api/viewings", params={"since": seq})
+    assert [(v["id"], v["status"], v["event_seq"]) for v in response.json()] == [(ids[0], "declined", 4)]
+    assert response.headers["X-Event-Seq"] == "4"
+    # A viewing changed twice is listed once, at its latest change
+    assert [v["id"] for v in client.get("/api/viewings", params={"since": 0}).json()] == [ids[1], ids[2], ids[0]]
+    assert client.get("/api/viewings", params={"since": 4}).json() == []
+
+
+def test_since_pages_continue_from_the_last_change(client):
+    ids = create_viewings(client, 5)
+    seen = []
+    since = 0
+    while True:
+        response = client.get("/api/viewings", params={"since": since, "limit": 2})
+        seen.append([v["id"] for v in response.json()])
+        if len(seen[-1]) < 2:
+            break
+        since = int(response.headers["X-Event-Seq"])
+    assert seen == [ids[:2], ids[2:4], ids[4:]]
+    assert response.headers["X-Event-Seq"] == "5"
@@ -0,0 +1,99 @@
+"""metrics: the exposition format and GET /metrics."""
+
+import re
+from datetime import date, timedelta
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """An empty metric registry and no cache collectors, for metrics made in a test."""
+    monkeypatch.setattr(metrics, "_registry", [])
+    monkeypatch.setattr(metrics, "_cache_collectors", [])
+    return metrics._registry
+
+
+def test_counter(registry):
+    counter = metrics.Counter("test_total", "A test counter.", ("kind",))
+    counter.inc("b")
+    counter.inc("a", amount=2.5)
+    counter.inc("b")
+    assert metrics.render().splitlines()[:4] == [
+        "# HELP test_total A test counter.",
+        "# TYPE test_total counter",
+        'test_total{kind="a"} 2.5',
+        'test_total{kind="b"} 2',
+    ]
+
+
+def test_histogram_buckets_are_cumulative(registry):
+    histogram = metrics.Histogram("test_seconds", "A test histogram.", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, '/a"b')
+    assert metrics.render().splitlines()[2:7] == [
+        'test_seconds_bucket{route="/a\\"b",le="0.1"} 2',
+        'test_seconds_bucket{route="/a\\"b",le="1.0"} 3',
+        'test_seconds_bucket{route="/a\\"b",le="+Inf"} 4',
+        'test_seconds_sum{route="/a\\"b"} 3.65',
+        'test_seconds_count{route="/a\\"b"} 4',
+    ]
+
+
+def test_cache_lines(registry):
+    metrics.register_caches(lambda: {"slots": {"hits": 3, "misses": 1, "size": 2}, "cold": {"hits": 0, "misses": 0}})
+    lines = metrics.render().splitlines()
+    assert 'nestfinder_cache_hits_total{cache="slots"} 3' in lines
+    assert 'nestfinder_cache_misses_total{cache="slots"} 1' in lines
+    assert 'nestfinder_cache_entries{cache="slots"} 2' in lines
+    assert 'nestfinder_cache_entries{cache="cold"}' not in "\n".join(lines)
+    assert 'nestfinder_cache_hit_ratio{cache="slots"} 0.75' in lines
+    assert not any(line.startswith('nestfinder_cache_hit_ratio{cache="cold"}') for line in lines)
+
+
+def test_metric_types_must_have_samples(registry):
+    class Gauge(metrics._Metric):
+        kind = "gauge"
+
+    with pytest.raises(TypeError):
+        Gauge("test_gauge", "No samples.")
+    assert registry == []
+
+
+def test_metrics_off_is_404(client, monkeypatch):
+    monkeypatch.setattr(metrics, "enabled", False)
+    assert client.get("/metrics").status_code == 404
+
+
+def sample(text, name, **labels):
+    """Value of the sample with exactly these labels, or None."""
+    wanted = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    match = re.search(rf"^{re.escape(name)}\{{{re.escape(wanted)}\}} (\S+)$", text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+def test_metrics_endpoint(client, monkeypatch):
+    monkeypatch.setattr(metrics, "enabled", True)
+    property_id = client.get("/api/properties").json()[0]["id"]
+    day = (date.today() + timedelta(days=7)).isoformat()
+    path = f"/api/properties/{property_id}/available-slots"
+    before = client.get("/metrics")
+    assert before.status_code == 200
+    assert before.headers["content-type"] == metrics.CONTENT_TYPE
+    route = "/api/properties/{property_id}/available-slots"
+    count = sample(before.text, "nestfinder_http_request_duration_seconds_count", route=route, method="GET", status="200") or 0
+    hits = sample(before.text, "nestfinder_cache_hits_total", cache="slots")
+
+    client.get(path, params={"date": day})
+    client.get(path, params={"date": day})
+    text = client.get("/metrics").text
+
+    # Labelled by the route template, not the property id
+    assert sample(text, "nestfinder_http_request_duration_seconds_count", route=route, method="GET", status="200") == count + 2
+    assert str(property_id) + "/available-slots" not in text
+    assert sample(text, "nestfinder_cache_hits_total", cache="slots") == hits + 1
+    assert sample(text, "nestfinder_slot_step_duration_seconds_count", step="5_travel") >= 1
+    for cache in ("travel_times", "timelines", "postcode_coords", "postcode_parse"):
+        assert sample(text, "nestfinder_cache_misses_total", cache=cache) is not None
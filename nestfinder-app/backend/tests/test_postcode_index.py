@@ -0,0 +1,125 @@
+"""postcode_index: building the binary index from a CSV and looking postcodes up in it."""
+
+import pytest
+
+import travel_time
+from postcode_index import FENCE_STRIDE, NO_LATITUDE, PostcodeIndex, build_index, postcode_keys
+
+
+def write_csv(path, header, rows, bom=False):
+    with open(path, "w", encoding="utf-8-sig" if bom else "utf-8") as f:
+        f.write(",".join(header) + "\n")
+        for row in rows:
+            f.write(",".join(str(value) for value in row) + "\n")
+
+
+def synthetic_rows():
+    """Enough unit postcodes in one area for several fence blocks, each at a distinct point."""
+    rows = []
+    for district in range(1, 4):
+        for sector in range(9):
+            for n, unit in enumerate(("AA", "AB", "BD", "BE", "DX", "ZZ", "HP", "QR", "TT", "WY")):
+                rows.append((f"ZX{district} {sector}{unit}", 51 + district / 10 + sector / 100 + n / 1000, -0.1 - n / 1000))
+    return rows
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    csv_path = tmp_path / "onspd.csv"
+    rows = synthetic_rows()
+    write_csv(csv_path, ["pcd", "pcds", "lat", "long"], [
+        (postcode.replace(" ", ""), postcode, lat, lon) for postcode, lat, lon in rows
+    ] + [
+        ("BT11AA", "BT1 1AA", NO_LATITUDE, 0.0),  # no grid reference
+        ("XX", "not a postcode", 51.0, 0.0),
+        ("ZX11AA", "ZX1 1AA", "", ""),  # a duplicate without coordinates
+    ], bom=True)
+    path = str(tmp_path / "postcodes.idx")
+    assert build_index(str(csv_path), path) == {"unit": 270, "sector": 27, "district": 3}
+    return path
+
+
+def test_postcode_keys():
+    assert postcode_keys("sw1a 1aa") == ("SW1A1AA", "SW1A1", "SW1A")
+    assert postcode_keys("SW1A 1") == (None, "SW1A1", "SW1A")
+    assert postcode_keys("SW1A") == (None, None, "SW1A")
+    assert postcode_keys("nonsense") is None
+
+
+def test_unit_lookups_across_blocks(index_path):
+    index = PostcodeIndex(index_path)
+    assert len(index) == 270 > FENCE_STRIDE
+    for postcode, lat, lon in synthetic_rows():
+        assert index.lookup(postcode) == pytest.approx((lat, lon), abs=1e-6)
+    assert index.lookup("zx2 5dx") == index.lookup("ZX25DX")
+
+
+def test_fallback_to_sector_and_district(index_path):
+    index = PostcodeIndex(index_path)
+    rows = synthetic_rows()
+    sector = [row for row in rows if row[0].startswith("ZX2 3")]
+    district = [row for row in rows if row[0].startswith("ZX2 ")]
+
+    def mean(rows):
+        return (sum(r[1] for r in rows) / len(rows), sum(r[2] for r in rows) / len(rows))
+
+    # Unknown unit in a known sector, unknown sector in a known district
+    assert index.lookup("ZX2 3NN") == pytest.approx(mean(sector), abs=1e-6)
+    assert index.lookup("ZX2 3") == pytest.approx(mean(sector), abs=1e-6)
+    assert index.lookup("ZX2 9NN") == pytest.approx(mean(district), abs=1e-6)
+    assert index.lookup("ZX2") == pytest.approx(mean(district), abs=1e-6)
+    assert index.lookup("ZX9 1AA") is None
+    assert index.lookup("AA1 1AA") is None
+    assert index.lookup("BT1 1AA") is None
+    assert index.lookup("not a postcode") is None
+
+
+def test_districts_and_stats(index_path):
+    index = PostcodeIndex(index_path)
+    assert sorted(index.districts()) == ["ZX1", "ZX2", "ZX3"]
+    assert index.districts()["ZX1"] == pytest.approx(index.lookup("ZX1"), abs=1e-6)
+    assert index.stats() == {"unit": 270, "sector": 27, "district": 3}
+    zones = travel_time.zone_coords_from_index(index)
+    assert sorted(zones) == ["ZX1", "ZX2", "ZX3"]
+    assert travel_time.zone_coords_from_index(index, ["SW"]) == {}
+
+
+def test_plain_csv_columns(tmp_path):
+    csv_path = tmp_path / "plain.csv"
+    write_csv(csv_path, ["Postcode", "Latitude", "Longitude"], [("W2 4DX", 51.5, -0.18)])
+    path = str(tmp_path / "plain.idx")
+    build_index(str(csv_path), path)
+    assert PostcodeIndex(path).lookup("W2 4DX") == (51.5, -0.18)
+
+    write_csv(csv_path, ["code", "x", "y"], [("W2 4DX", 51.5, -0.18)])
+    with pytest.raises(ValueError):
+        build_index(str(csv_path), path)
+
+
+def test_empty_index(tmp_path):
+    csv_path = tmp_path / "empty.csv"
+    write_csv(csv_path, ["pcds", "lat", "long"], [])
+    path = str(tmp_path / "empty.idx")
+    assert build_index(str(csv_path), path) == {"unit": 0, "sector": 0, "district": 0}
+    index = PostcodeIndex(path)
+    assert len(index) == 0 and index.lookup("W2 4DX") is None
+
+
+def test_not_an_index(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"\0" * 64)
+    with pytest.raises(ValueError):
+        PostcodeIndex(str(path))
+
+
+def test_travel_geocodes_from_a_loaded_index(index_path, monkeypatch):
+    monkeypatch.setattr(travel_time, "postcode_index", None)
+    travel_time.resolve_postcode_coords.cache_clear()
+    try:
+        assert travel_time.resolve_postcode_coords("ZX1 1AA") is None
+        travel_time.load_postcode_index(index_path)
+        assert travel_time.resolve_postcode_coords("ZX1 1AA") == pytest.approx((51.11, -0.1), abs=1e-6)
+        # Built-in tables still answer what the index lacks
+        assert travel_time.resolve_postcode_coords("W2 4DX") == travel_time.POSTCODE_COORDS["W2 4DX"]
+    finally:
+        travel_time.resolve_postcode_coords.cache_clear()
@@ -0,0 +1,76 @@
+"""parse_postcode and the helpers built on it."""
+
+import pytest
+
+from postcodes import ParsedPostcode, canonical_postcode, parse_postcode, postcode_fields
+
+
+@pytest.mark.parametrize("postcode, expected", [
+    ("SW1A 1AA", ("SW", "SW1A", "SW1A 1", "SW1A 1AA")),
+    ("sw1a1aa", ("SW", "SW1A", "SW1A 1", "SW1A 1AA")),
+    ("  Sw1A   1aA ", ("SW", "SW1A", "SW1A 1", "SW1A 1AA")),
+    ("M1 1AE", ("M", "M1", "M1 1", "M1 1AE")),
+    ("B338TH", ("B", "B33", "B33 8", "B33 8TH")),
+    ("CR2 6XH", ("CR", "CR2", "CR2 6", "CR2 6XH")),
+    ("DN55 1PT", ("DN", "DN55", "DN55 1", "DN55 1PT")),
+    ("W1A 0AX", ("W", "W1A", "W1A 0", "W1A 0AX")),
+    ("EC1A1BB", ("EC", "EC1A", "EC1A 1", "EC1A 1BB")),
+    ("gir 0aa", ("GIR", "GIR", "GIR 0", "GIR 0AA")),
+    ("GIR0AA", ("GIR", "GIR", "GIR 0", "GIR 0AA")),
+])
+def test_full_postcodes(postcode, expected):
+    assert parse_postcode(postcode) == ParsedPostcode(*expected)
+
+
+@pytest.mark.parametrize("postcode, expected", [
+    ("SW1A 1", ("SW", "SW1A", "SW1A 1", None)),
+    ("e14 5", ("E", "E14", "E14 5", None)),
+    ("SW1A", ("SW", "SW1A", None, None)),
+    ("w2", ("W", "W2", None, None)),
+    (" N1C ", ("N", "N1C", None, None)),
+])
+def test_partial_postcodes(postcode, expected):
+    assert parse_postcode(postcode) == ParsedPostcode(*expected)
+
+
+@pytest.mark.parametrize("postcode", [
+    "", "   ", "12345", "SW", "SWW1 1AA", "SW1A 1A", "SW1A1AAA", "SW1A 1AA X",
+    # A space anywhere but before the inward code
+    "S W1A 1AA", "SW1 A1AA", "SW1A1 AA",
+    "SW1A 11", "1SW 1AA",
+])
+def test_not_postcodes(postcode):
+    assert parse_postcode(postcode) is None
+
+
+@pytest.mark.parametrize("postcode, canonical, district", [
+    ("sw1a1aa", "SW1A 1AA", "SW1"),
+    ("E14 5", "E14 5", "E14"),
+    ("ec2a", "EC2A", "EC2"),
+    ("W1", "W1", "W1"),
+    ("N1C 4AB", "N1C 4AB", "N1"),
+    ("GIR 0AA", "GIR 0AA", "GIR"),
+])
+def test_canonical_and_district(postcode, canonical, district):
+    parsed = parse_postcode(postcode)
+    assert parsed.canonical == canonical
+    assert parsed.district == district
+
+
+def test_canonical_postcode_leaves_unparsed_input_trimmed():
+    assert canonical_postcode("  not  a postcode ") == "NOT A POSTCODE"
+    assert canonical_postcode("sw1a1aa") == "SW1A 1AA"
+
+
+def test_postcode_fields():
+    assert postcode_fields("sw1a1aa") == {
+        "postcode": "SW1A 1AA", "postcode_outward": "SW1A", "postcode_sector": "SW1A 1",
+    }
+    assert postcode_fields("W2") == {"postcode": "W2", "postcode_outward": "W2", "postcode_sector": None}
+    assert postcode_fields("nowhere") == {"postcode": "NOWHERE", "postcode_outward": None, "postcode_sector": None}
+
+
+def test_results_are_memoised():
+    parse_postcode.cache_clear()
+    assert parse_postcode("SE1 9TG") is parse_postcode("SE1 9TG")
+    assert parse_postcode.cache_info().hits == 1
@@ -0,0 +1,111 @@
+"""profiling: StackSampler, write_folded and ProfilingMiddleware."""
+
+import threading
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import profiling
+
+TOKEN = "s3cret"
+
+
+def spin(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def test_stack_sampler_counts_a_threads_stacks():
+    ready = threading.Event()
+
+    def busy_worker():
+        ready.set()
+        spin(0.1)
+
+    worker = threading.Thread(target=busy_worker)
+    worker.start()
+    ready.wait()
+    sampler = profiling.StackSampler(worker.ident, 0.002)
+    sampler.start()
+    worker.join()
+    stacks = sampler.stop()
+    assert sum(stacks.values()) >= 5
+    busiest = stacks.most_common(1)[0][0].split(";")
+    assert busiest[-1].startswith("spin (test_profiling.py:")
+    assert busiest[-2].startswith("busy_worker (test_profiling.py:")
+
+
+def test_write_folded(tmp_path):
+    path = tmp_path / "nested" / "profile.folded"
+    profiling.write_folded({"main;b": 2, "main;a": 5}, str(path))
+    assert path.read_text() == "main;a 5\nmain;b 2\n"
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", TOKEN)
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE_RATE", 0)
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "PROFILE_INTERVAL_MS", 1)
+    app = FastAPI()
+    app.add_middleware(profiling.ProfilingMiddleware)
+
+    @app.get("/slots")
+    async def get_available_slots():
+        spin(0.05)
+        return {"ok": True}
+
+    @app.get("/other")
+    async def other_route():
+        return {"ok": True}
+
+    return app
+
+
+def profile_files(tmp_path):
+    return sorted(path.name for path in tmp_path.iterdir())
+
+
+def test_requested_profile_is_written(app, tmp_path):
+    with TestClient(app) as client:
+        response = client.get("/slots", headers={"X-Profile": TOKEN})
+    assert response.json() == {"ok": True}
+    filename = response.headers["X-Profile-File"]
+    assert filename.endswith(".folded") and "-get_available_slots-" in filename
+    assert profile_files(tmp_path) == [filename]
+    lines = (tmp_path / filename).read_text().splitlines()
+    assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert any("get_available_slots (test_profiling.py:" in line for line in lines)
+    assert profiling._active == 0
+
+
+@pytest.mark.parametrize("path, headers", [
+    ("/slots", {}),
+    ("/slots", {"X-Profile": "wrong"}),
+    ("/other", {"X-Profile": TOKEN}),
+])
+def test_other_requests_run_unprofiled(app, tmp_path, path, headers):
+    with TestClient(app) as client:
+        response = client.get(path, headers=headers)
+    assert response.status_code == 200
+    assert "X-Profile-File" not in response.headers
+    assert profile_files(tmp_path) == []
+
+
+def test_sample_rate(app, tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", "")
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE_RATE", 1.0)
+    with TestClient(app) as client:
+        assert "X-Profile-File" in client.get("/slots").headers
+    assert len(profile_files(tmp_path)) == 1
+
+
+def test_concurrent_profiles_are_capped(app, tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "_active", profiling.PROFILE_MAX_CONCURRENT)
+    with TestClient(app) as client:
+        response = client.get("/slots", headers={"X-Profile": TOKEN})
+    assert response.status_code == 200 and "X-Profile-File" not in response.headers
+    assert profile_files(tmp_path) == []
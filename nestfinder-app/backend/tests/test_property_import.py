@@ -0,0 +1,101 @@
+"""The streaming CSV / NDJSON reader behind POST /api/properties/bulk."""
+
+import asyncio
+
+import pytest
+
+from property_import import MAX_LINE_CHARS, MalformedUpload, dedupe_key, read_records, text_lines, upload_format
+
+
+async def _chunks(data, size):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+def records(data: bytes, upload: str, chunk_size: int = 7):
+    async def collect():
+        return [record async for record in read_records(_chunks(data, chunk_size), upload)]
+    return asyncio.run(collect())
+
+
+def lines(data: bytes, chunk_size: int = 3):
+    async def collect():
+        return [line async for line in text_lines(_chunks(data, chunk_size))]
+    return asyncio.run(collect())
+
+
+@pytest.mark.parametrize("content_type, expected", [
+    ("text/csv", "csv"),
+    ("text/csv; charset=utf-8", "csv"),
+    ("Application/CSV", "csv"),
+    ("application/x-ndjson", "ndjson"),
+    ("application/jsonl", "ndjson"),
+    ("application/json", None),
+    ("", None),
+])
+def test_upload_format(content_type, expected):
+    assert upload_format(content_type) == expected
+
+
+def test_dedupe_key():
+    assert dedupe_key("12, High Street", "sw1a1aa") == dedupe_key("12 high  street", "SW1A 1AA")
+    assert dedupe_key("12 High Street", "SW1A 1AA") != dedupe_key("14 High Street", "SW1A 1AA")
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 5, 64])
+def test_text_lines_in_any_chunking(chunk_size):
+    data = "a,b\r\nc£,d\n\nlast".encode()
+    assert lines(data, chunk_size) == ["a,b", "c£,d", "", "last"]
+
+
+def test_text_lines_strips_bom_and_trailing_newline():
+    assert lines("\ufeffone\ntwo\n".encode()) == ["one", "two"]
+
+
+def test_text_lines_rejects_bad_utf8():
+    with pytest.raises(MalformedUpload):
+        lines(b"ok\n\xff\xfe\n")
+
+
+def test_text_lines_rejects_runaway_line():
+    with pytest.raises(MalformedUpload):
+        lines(b"x" * (MAX_LINE_CHARS + 10), chunk_size=4096)
+
+
+def test_csv_records():
+    data = (
+        "Title,Area,Address,Postcode,Rent\n"
+        "Flat 1,Soho,\"1 Dean St, London\",W1D 3RB,2000\n"
+        "\n"
+        "Flat 2,Soho,2 Dean St,W1D 3RB,\n"
+    ).encode()
+    assert records(data, "csv") == [
+        (1, {"title": "Flat 1", "area": "Soho", "address": "1 Dean St, London", "postcode": "W1D 3RB", "rent": "2000"}),
+        (2, {"title": "Flat 2", "area": "Soho", "address": "2 Dean St", "postcode": "W1D 3RB"}),
+    ]
+
+
+def test_csv_quoted_field_across_lines():
+    data = 'title,address\n"Flat ""A""","1 Dean St\nLondon"\nFlat B,2 Dean St\n'.encode()
+    assert records(data, "csv") == [
+        (1, {"title": 'Flat "A"', "address": "1 Dean St\nLondon"}),
+        (2, {"title": "Flat B", "address": "2 Dean St"}),
+    ]
+
+
+def test_csv_too_many_values_is_a_row_error():
+    data = b"title,area\nA,B,C\nD,E\n"
+    assert records(data, "csv") == [(1, "3 values for 2 columns"), (2, {"title": "D", "area": "E"})]
+
+
+def test_csv_unterminated_quote():
+    assert records(b'title\nA\n"B\n', "csv") == [(1, {"title": "A"}), (2, "Unterminated quoted field")]
+
+
+def test_ndjson_records():
+    data = b'{"title": "A"}\n\nnot json\n[1, 2]\n{"title": "B"}'
+    result = records(data, "ndjson")
+    assert result[0] == (1, {"title": "A"})
+    assert result[1][0] == 2 and result[1][1].startswith("Invalid JSON")
+    assert result[2] == (3, "Expected a JSON object")
+    assert result[3] == (4, {"title": "B"})
@@ -0,0 +1,87 @@
+"""
+storage.SQLITE_SCHEMA against database/schema.sql, which Postgres uses: the
+same tables, columns (by type class), foreign keys, indexes and view. The
+Postgres-only updated_at triggers aren't compared.
+"""
+
+import re
+import sqlite3
+from pathlib import Path
+
+from storage import SQLITE_SCHEMA
+
+SCHEMA_SQL = Path(__file__).resolve().parents[2] / "database" / "schema.sql"
+
+# Postgres and SQLite column types, by what the backends store in them
+TYPE_CLASSES = {
+    "SERIAL": "integer", "INTEGER": "integer", "BOOLEAN": "integer",
+    "VARCHAR": "text", "TEXT": "text", "DATE": "text", "TIMESTAMP": "text", "JSONB": "text",
+    "DECIMAL": "real", "REAL": "real",
+}
+INDEX = re.compile(r"CREATE INDEX (?:IF NOT EXISTS )?(\w+) ON (\w+)\(([^)]*)\)")
+REFERENCE = re.compile(r"REFERENCES (\w+)\((\w+)\)(?: ON DELETE (SET NULL|CASCADE|RESTRICT))?")
+VIEW = re.compile(r"CREATE (?:OR REPLACE )?VIEW (?:IF NOT EXISTS )?(\w+) AS\s+(.*?);", re.S)
+
+
+def _words(text):
+    return " ".join(text.split())
+
+
+def postgres_schema():
+    sql = SCHEMA_SQL.read_text()
+    tables = {}
+    for name, body in re.findall(r"CREATE TABLE IF NOT EXISTS (\w+) \((.*?)\n\);", sql, re.S):
+        columns = {}
+        for line in body.splitlines():
+            line = line.split("--")[0].strip().rstrip(",")
+            match = re.match(r"(\w+) (\w+)", line)
+            if not match or match.group(1) in ("PRIMARY", "UNIQUE"):
+                continue
+            reference = REFERENCE.search(line)
+            columns[match.group(1)] = (
+                TYPE_CLASSES[match.group(2).upper()],
+                (reference.group(1), reference.group(2), reference.group(3) or "NO ACTION") if reference else None,
+            )
+        tables[name] = columns
+    indexes = {name: (table, _words(columns)) for name, table, columns in INDEX.findall(sql)}
+    views = {name: _words(body) for name, body in VIEW.findall(sql)}
+    return tables, indexes, views
+
+
+def sqlite_schema():
+    db = sqlite3.connect(":memory:")
+    db.executescript(SQLITE_SCHEMA)
+    tables = {}
+    for (name,) in db.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name != 'sqlite_sequence'"):
+        references = {
+            row[3]: (row[2], row[4], row[6]) for row in db.execute(f"PRAGMA foreign_key_list({name})")
+        }
+        tables[name] = {
+            row[1]: (TYPE_CLASSES[row[2].upper()], references.get(row[1]))
+            for row in db.execute(f"PRAGMA table_info({name})")
+        }
+    indexes = {}
+    for (sql,) in db.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"):
+        name, table, columns = INDEX.match(sql).groups()
+        indexes[name] = (table, _words(columns))
+    views = {}
+    for (sql,) in db.execute("SELECT sql FROM sqlite_master WHERE type = 'view'"):
+        name, body = VIEW.match(sql + ";").groups()
+        views[name] = _words(body)
+    return tables, indexes, views
+
+
+def test_same_tables_and_columns():
+    postgres, _, _ = postgres_schema()
+    sqlite, _, _ = sqlite_schema()
+    assert sorted(sqlite) == sorted(postgres)
+    for table, columns in postgres.items():
+        assert sqlite[table] == columns, table
+
+
+def test_same_indexes():
+    assert sqlite_schema()[1] == postgres_schema()[1]
+
+
+def test_same_view():
+    assert sqlite_schema()[2] == postgres_schema()[2]
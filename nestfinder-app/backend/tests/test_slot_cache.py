@@ -0,0 +1,127 @@
+"""SlotCache, TimelineCache, etag_matches and the available-slots ETags they back."""
+
+from datetime import date, timedelta
+
+import pytest
+
+import main
+import scheduler_engine
+from slot_cache import SlotCache, TimelineCache, etag_matches
+
+KEY = (1, date(2030, 6, 3), 30, None, None)
+SLOTS = [{"time": "10:00", "status": "available"}]
+
+
+def test_slot_cache_entries_go_stale_with_the_version():
+    cache = SlotCache()
+    assert cache.get(1, KEY) is None
+    cache.put(1, KEY, SLOTS)
+    assert cache.get(1, KEY) == SLOTS
+    cache.bump(2)
+    assert cache.get(1, KEY) == SLOTS
+    cache.bump(1)
+    assert cache.get(1, KEY) is None
+    cache.put(1, KEY, [])
+    cache.set_version(1, 7)
+    assert cache.get(1, KEY) is None
+    assert cache.stats() == {"hits": 2, "misses": 3, "size": 1, "max_size": cache.max_entries}
+
+
+def test_slot_cache_evicts_least_recently_used():
+    cache = SlotCache(max_entries=2)
+    cache.put(1, ("a",), SLOTS)
+    cache.put(1, ("b",), SLOTS)
+    cache.get(1, ("a",))
+    cache.put(1, ("c",), SLOTS)
+    assert cache.get(1, ("b",)) is None
+    assert cache.get(1, ("a",)) == SLOTS and cache.get(1, ("c",)) == SLOTS
+
+
+def test_etags_change_with_version_key_and_epoch():
+    cache = SlotCache(epoch="e1")
+    etag = cache.etag(1, KEY)
+    assert etag.startswith('W/"e1-1-0-')
+    assert cache.etag(1, KEY) == etag
+    assert cache.etag(1, KEY[:2] + (15,) + KEY[3:]) != etag
+    assert SlotCache(epoch="e2").etag(1, KEY) != etag
+    assert SlotCache().etag(1, KEY) != SlotCache().etag(1, KEY)
+    cache.bump(1)
+    assert cache.etag(1, KEY) != etag
+
+
+@pytest.mark.parametrize("header, matches", [
+    (None, False),
+    ("", False),
+    ("*", True),
+    ('W/"abc"', True),
+    ('"abc"', True),
+    ('"xyz", W/"abc"', True),
+    ('"abcd"', False),
+])
+def test_etag_matches(header, matches):
+    assert etag_matches(header, 'W/"abc"') is matches
+
+
+def test_timeline_cache_patch_keeps_untouched_days():
+    cache = TimelineCache()
+    cache.put(1, "a", ["a"])  # no version adopted yet: not kept
+    assert cache.get(1, "a") is None
+    cache.set_version(1, 1)
+    cache.put(1, "a", ["a"])
+    cache.put(1, "b", ["b"])
+    cache.patch(1, 2, ["a", "missing"], lambda timeline: timeline.append("patched"))
+    assert cache.get(1, "a") == ["a", "patched"] and cache.get(1, "b") == ["b"]
+    # Another worker's change in between drops everything
+    cache.patch(1, 4, ["a"], lambda timeline: timeline.append("patched"))
+    assert cache.get(1, "a") is None and cache.get(1, "b") is None
+
+
+DAY = date.today() + timedelta(days=7)
+
+
+def get_slots(client, property_id, **headers):
+    return client.get(f"/api/properties/{property_id}/available-slots", params={"date": DAY.isoformat()}, headers=headers)
+
+
+def test_slots_etag_and_304(client, monkeypatch):
+    property_id = client.get("/api/properties").json()[0]["id"]
+    calls = []
+    generate_agent_slots = scheduler_engine.generate_agent_slots
+    monkeypatch.setattr(scheduler_engine, "generate_agent_slots", lambda *args: calls.append(1) or generate_agent_slots(*args))
+
+    first = get_slots(client, property_id)
+    etag = first.headers["ETag"]
+    again = get_slots(client, property_id)
+    assert again.json() == first.json() and again.headers["ETag"] == etag
+    assert len(calls) == 1
+    unchanged = get_slots(client, property_id, **{"If-None-Match": etag})
+    assert unchanged.status_code == 304 and unchanged.headers["ETag"] == etag
+    assert get_slots(client, property_id, **{"If-None-Match": 'W/"other"'}).status_code == 200
+
+
+@pytest.mark.parametrize("change", ["blockout", "availability", "confirm"])
+def test_changes_invalidate_cached_slots(client, change):
+    property_id = client.get("/api/properties").json()[0]["id"]
+    before = get_slots(client, property_id)
+    assert "10:00" in {slot["time"] for slot in before.json()["slots"]}
+
+    if change == "blockout":
+        response = client.post("/api/blockouts", json={"date": DAY.isoformat(), "start_time": "09:30", "end_time": "10:30"})
+    elif change == "availability":
+        response = client.put("/api/availability", json={"availability": [
+            {"day_of_week": day, "enabled": True, "start_time": "11:00", "end_time": "18:00"} for day in range(7)
+        ]})
+    else:
+        response = client.post("/api/viewings", json={
+            "tenant_name": "Tenant", "tenant_email": "tenant@example.com", "tenant_phone": "07700 900000",
+            "property_id": property_id, "requested_date": DAY.isoformat(), "requested_time": "10:00",
+            "agent_id": main.DEFAULT_AGENT_ID,
+        })
+        assert response.status_code == 200, response.text
+        response = client.patch(f"/api/viewings/{response.json()['id']}", json={"status": "confirmed"})
+    assert response.status_code == 200, response.text
+
+    assert get_slots(client, property_id, **{"If-None-Match": before.headers["ETag"]}).status_code == 200
+    after = get_slots(client, property_id)
+    assert after.headers["ETag"] != before.headers["ETag"]
+    assert "10:00" not in {slot["time"] for slot in after.json()["slots"]}
@@ -0,0 +1,137 @@
+"""travel_time: travel models, zone tables and TravelTimeService lookups and counters."""
+
+import numpy as np
+import pytest
+
+import travel_time
+from travel_time import (
+    DEFAULT_TRAVEL_MINUTES, HaversineModel, TravelTimeService, ZoneProfileModel, create_travel_model, profile_minutes
+)
+
+POSTCODES = ["W2 4DX", "E1 6AN", "SW4 0LG"]
+
+
+@pytest.fixture
+def service(monkeypatch):
+    service = TravelTimeService(cache_size=2)
+    monkeypatch.setattr(travel_time, "travel_service", service)
+    return service
+
+
+def test_pair_lookups_go_through_the_lru(service):
+    minutes = travel_time.get_base_travel_time("w2 4dx", "E1 6AN")
+    assert minutes == travel_time.batch_travel_times(["W2 4DX"], ["E1 6AN"])[0, 0]
+    assert travel_time.get_base_travel_time("W24DX", "e1 6an") == minutes
+    assert (service.hits, service.misses) == (1, 1)
+    travel_time.get_base_travel_time("W2 4DX", "SW4 0LG")
+    travel_time.get_base_travel_time("E1 6AN", "SW4 0LG")
+    assert service.stats()["size"] == 2
+    travel_time.get_base_travel_time("W2 4DX", "E1 6AN")  # evicted
+    assert (service.hits, service.misses) == (1, 4)
+
+
+def test_batch_lookups_count_each_pair(service):
+    minutes = travel_time.batch_travel_times_by_band(POSTCODES, POSTCODES[:2], agency_id=1)
+    assert minutes.shape == (3, 2, 1)
+    assert (service.hits, service.misses) == (0, 6)
+
+    service.precompute_matrix(1, POSTCODES)
+    from_matrix = travel_time.batch_travel_times_by_band(POSTCODES, POSTCODES[:2], agency_id=1)
+    assert (from_matrix == minutes).all()
+    assert (service.hits, service.misses) == (6, 6)
+    # Another agency, or a postcode the matrix lacks, goes to the model
+    travel_time.batch_travel_times_by_band(POSTCODES, ["N1 9GU"], agency_id=1)
+    travel_time.batch_travel_times_by_band(POSTCODES, POSTCODES, agency_id=2)
+    assert (service.hits, service.misses) == (6, 18)
+    assert service.stats()["size"] == 0
+
+
+@pytest.fixture
+def profile():
+    return create_travel_model("profile")
+
+
+def test_haversine_model_ignores_the_time_of_day():
+    model = HaversineModel()
+    assert model.bands == 1 and model.band(8 * 60) == model.band(None) == 0
+    minutes = model.matrix(POSTCODES, POSTCODES + ["ZZ1 1ZZ"])
+    assert minutes.shape == (3, 4, 1)
+    assert (minutes[:, :3, 0].diagonal() == 0).all()
+    assert (minutes[:, 3, 0] == DEFAULT_TRAVEL_MINUTES).all()
+    for i, a in enumerate(POSTCODES):
+        for j, b in enumerate(POSTCODES):
+            assert model.minutes(a, b) == minutes[i, j, 0]
+
+
+def test_profile_model_bands(profile):
+    assert profile.bands == 24
+    assert profile.band(8 * 60 + 59) == 8
+    assert profile.band(None) == 12
+    assert profile.band(-5) == 0 and profile.band(24 * 60) == 23
+    assert profile.band(np.array([0, 61, 1439])).tolist() == [0, 1, 23]
+
+
+def test_profile_model_prices_rush_hour_and_central_zones(profile):
+    rush, night = profile.minutes("W2 4DX", "E1 6AN", 8), profile.minutes("W2 4DX", "E1 6AN", 3)
+    assert rush > night
+    assert profile.minutes("W2 4DX", "W2 4DX", 8) == 0
+    # Same zone, different postcodes: the intra-zone distance
+    assert 0 < profile.minutes("W2 4DX", "W2 2PF", 8) < rush
+    central, outer = profile_minutes(np.array([5.0, 5.0]), np.array([True, False]))
+    assert (central >= outer).all() and central[8] > outer[8]
+    assert profile_minutes(np.array([np.nan]), np.array([False]))[0].tolist() == [DEFAULT_TRAVEL_MINUTES] * 24
+
+
+def test_profile_model_matrix_matches_minutes(profile):
+    postcodes = POSTCODES + ["KT1 1AE", "M1 1AE"]
+    minutes = profile.matrix(postcodes, postcodes)
+    assert minutes.shape == (5, 5, 24)
+    for i, a in enumerate(postcodes):
+        for j, b in enumerate(postcodes):
+            for band in (3, 8, 17):
+                assert profile.minutes(a, b, band) == minutes[i, j, band]
+    # Outside the zone table and without coordinates
+    assert minutes[4, 0, 8] == DEFAULT_TRAVEL_MINUTES
+
+
+def test_zone_table_round_trip(profile, tmp_path):
+    path = str(tmp_path / "zones.npz")
+    profile.save(path)
+    loaded = create_travel_model("profile", zone_table=path)
+    assert isinstance(loaded, ZoneProfileModel)
+    assert loaded.zones == profile.zones
+    assert (loaded.table == profile.table).all()
+    assert loaded.minutes("SW4 0LG", "N1 9GU", 17) == profile.minutes("SW4 0LG", "N1 9GU", 17)
+
+
+def test_zone_table_from_coords():
+    model = ZoneProfileModel.from_zone_coords({"W2": (51.515, -0.183), "E1": (51.524, -0.081)})
+    assert model.zones == ["E1", "W2"]
+    assert model.table.shape == (2, 2, 24)
+    assert model.zone("W2 4DX") == 1 and model.zone("SW4 0LG") == -1 and model.zone("nonsense") == -1
+    # Diagonal: INTRA_ZONE_KM, not 0, between two postcodes in a zone
+    assert (model.table[0, 0] > 0).all()
+    assert (model.table[0, 1] == model.table[1, 0]).all()
+
+
+def test_unknown_travel_model():
+    with pytest.raises(ValueError):
+        create_travel_model("teleport")
+
+
+def test_set_travel_model_drops_cached_times(service, profile):
+    previous = travel_time.travel_model
+    try:
+        travel_time.get_base_travel_time("W2 4DX", "E1 6AN")
+        service.precompute_matrix(1, POSTCODES)
+        travel_time.set_travel_model(profile)
+        assert service.stats()["size"] == 0 and service.get_matrix(1) is None
+        # Time-of-day models have no agency matrix; the zone table answers directly
+        service.precompute_matrix(1, POSTCODES)
+        assert service.get_matrix(1) is None
+        assert travel_time.get_base_travel_time("W2 4DX", "E1 6AN", at_minute=8 * 60) == profile.minutes("W2 4DX", "E1 6AN", 8)
+        assert travel_time.batch_travel_times(["W2 4DX"], ["E1 6AN"], at_minute=3 * 60)[0, 0] == profile.minutes(
+            "W2 4DX", "E1 6AN", 3
+        )
+    finally:
+        travel_time.set_travel_model(previous)
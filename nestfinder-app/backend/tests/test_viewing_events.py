@@ -0,0 +1,141 @@
+"""The viewing event stream: resuming from a cursor, resets, and waking on new events."""
+
+import asyncio
+
+import pytest
+
+import storage
+import viewing_events
+from viewing_events import ViewingEventBroker, format_event, format_reset, stream_viewing_events
+
+AGENCY = storage.DEFAULT_AGENCY_ID
+RETRY = f"retry: {viewing_events.EVENT_RETRY_MS}\n\n"
+KEEP_ALIVE = ": keep-alive\n\n"
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return lambda: storage.MemoryRepository()
+    return lambda: storage.SQLiteRepository(str(tmp_path / "events.db"))
+
+
+def run(backend, scenario):
+    """Run scenario(repo) against a freshly connected repository."""
+    async def main():
+        repo = backend()
+        await repo.connect()
+        try:
+            return await scenario(repo)
+        finally:
+            await repo.close()
+    return asyncio.run(main())
+
+
+async def append(repo, count, event_type="viewing.created"):
+    return [await repo.append_viewing_event(AGENCY, event_type, {"id": i, "status": "pending"}) for i in range(count)]
+
+
+async def messages(repo, after, count, broker=None, heartbeat_seconds=0.01):
+    """The first count messages of a stream from after."""
+    async def connected():
+        return False
+    stream = stream_viewing_events(
+        repo, broker or ViewingEventBroker(repo), AGENCY, after, connected, heartbeat_seconds
+    )
+    received = []
+    try:
+        async for message in stream:
+            received.append(message)
+            if len(received) == count:
+                break
+    finally:
+        await stream.aclose()
+    return received
+
+
+def event(seq, viewing_id, event_type="viewing.created"):
+    return format_event({"seq": seq, "type": event_type, "viewing": {"id": viewing_id, "status": "pending"}})
+
+
+def test_format_event():
+    message = format_event({"seq": 7, "type": "viewing.confirmed", "viewing": {"id": 3, "confirmed_time": "14:00"}})
+    assert message == 'id: 7\nevent: viewing.confirmed\ndata: {"id": 3, "confirmed_time": "14:00"}\n\n'
+
+
+def test_format_reset():
+    assert format_reset(12) == 'id: 12\nevent: reset\ndata: {"seq": 12}\n\n'
+
+
+def test_resume_sends_events_after_the_cursor(backend):
+    async def scenario(repo):
+        await append(repo, 5)
+        return await messages(repo, 2, 5)
+    assert run(backend, scenario) == [RETRY, event(3, 2), event(4, 3), event(5, 4), KEEP_ALIVE]
+
+
+def test_resume_at_latest_sends_nothing_missed(backend):
+    async def scenario(repo):
+        await append(repo, 3)
+        return await messages(repo, 3, 2)
+    assert run(backend, scenario) == [RETRY, KEEP_ALIVE]
+
+
+def test_no_cursor_starts_from_now(backend):
+    async def scenario(repo):
+        await append(repo, 2)
+        broker = ViewingEventBroker(repo)
+
+        async def write():
+            await asyncio.sleep(0.05)
+            await repo.append_viewing_event(AGENCY, "viewing.updated", {"id": 9, "status": "pending"})
+            broker.notify(AGENCY)
+
+        received, _ = await asyncio.gather(messages(repo, None, 2, broker, heartbeat_seconds=5), write())
+        return received
+    assert run(backend, scenario) == [RETRY, event(3, 9, "viewing.updated")]
+
+
+def test_cursor_ahead_of_storage_is_reset(backend):
+    async def scenario(repo):
+        await append(repo, 2)
+        return await messages(repo, 40, 3)
+    assert run(backend, scenario) == [RETRY, format_reset(2), KEEP_ALIVE]
+
+
+def test_cursor_older_than_retained_events_is_reset(backend, monkeypatch):
+    monkeypatch.setattr(storage, "VIEWING_EVENT_RETENTION", 3)
+    monkeypatch.setattr(storage, "VIEWING_EVENT_TRIM_EVERY", 1)
+
+    async def scenario(repo):
+        await append(repo, 6)
+        return await messages(repo, 1, 3), await messages(repo, 3, 4)
+    expired, retained = run(backend, scenario)
+    assert expired == [RETRY, format_reset(6), KEEP_ALIVE]
+    # The oldest retained event follows the cursor, so nothing was missed
+    assert retained == [RETRY, event(4, 3), event(5, 4), event(6, 5)]
+
+
+def test_backlog_is_read_in_batches(backend, monkeypatch):
+    monkeypatch.setattr(viewing_events, "EVENT_BATCH", 2)
+
+    async def scenario(repo):
+        await append(repo, 5)
+        return await messages(repo, 0, 7)
+    assert run(backend, scenario) == [RETRY] + [event(seq, seq - 1) for seq in range(1, 6)] + [KEEP_ALIVE]
+
+
+def test_shared_storage_is_polled_for_other_workers_events(tmp_path):
+    async def scenario(repo):
+        broker = ViewingEventBroker(repo, poll_seconds=0.01)
+
+        async def other_worker():
+            # Written without broker.notify(), as by another process
+            await asyncio.sleep(0.05)
+            await repo.append_viewing_event(AGENCY, "viewing.created", {"id": 0, "status": "pending"})
+
+        received, _ = await asyncio.gather(messages(repo, None, 2, broker, heartbeat_seconds=5), other_worker())
+        assert not broker._watchers
+        return received
+    sqlite = lambda: storage.SQLiteRepository(str(tmp_path / "events.db"))
+    assert run(sqlite, scenario) == [RETRY, event(1, 0)]
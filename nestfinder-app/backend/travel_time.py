@@ -1,13 +1,33 @@
 """
-Travel time calculation and feasibility checking for viewing scheduling.
+Travel time calculation for viewing scheduling.
 Port of logic from scheduler.js
 """
+import argparse
 import math
+import sys
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import lru_cache
 from typing import Dict, List, Tuple, Optional
 
+import numpy as np
+
+try:
+    from .postcode_index import PostcodeIndex
+    from .postcodes import canonical_postcode, parse_postcode
+except ImportError:
+    from postcode_index import PostcodeIndex
+    from postcodes import canonical_postcode, parse_postcode
+
 # Constants
 VIEWING_DURATION = 20  # minutes
 TRAVEL_BUFFER = 10  # minutes
+TIGHT_TRAVEL_MINUTES = 20  # a slot is "tight" when travel from the previous viewing takes longer
+DEFAULT_TRAVEL_MINUTES = 30  # when either postcode can't be located
+TRAVEL_CACHE_SIZE = 4096  # postcode pairs kept in the LRU
+COORDS_CACHE_SIZE = 2048  # postcodes kept in the coordinate cache
+MATRIX_MAX_POSTCODES = 2000  # larger agencies skip the dense matrix
+MINUTES_PER_DAY = 24 * 60
 
 # Postcode coordinates for London areas (full postcodes)
 POSTCODE_COORDS: Dict[str, Tuple[float, float]] = {
@@ -63,18 +83,9 @@ POSTCODE_PREFIX_COORDS: Dict[str, Tuple[float, float]] = {
 
 
 def extract_postcode_prefix(postcode: str) -> str:
-    """Extract prefix from UK postcode (e.g., 'W2 4DX' -> 'W2')."""
-    # Remove spaces and take first part (before space or first 2-3 chars)
-    postcode_clean = postcode.strip().upper()
-    if ' ' in postcode_clean:
-        return postcode_clean.split(' ')[0]
-    # If no space, take first 2-3 characters (W2, SW1, etc.)
-    if len(postcode_clean) >= 2:
-        # Check if it's a 2-char prefix (W2) or 3-char (SW1)
-        if len(postcode_clean) >= 3 and postcode_clean[2].isdigit():
-            return postcode_clean[:2]
-        return postcode_clean[:2] if postcode_clean[1].isdigit() else postcode_clean[:3]
-    return postcode_clean
+    """Outward code of a UK postcode (e.g., 'W2 4DX' -> 'W2', 'EC2A3AR' -> 'EC2A')."""
+    parsed = parse_postcode(postcode)
+    return parsed.outward if parsed else normalise_postcode(postcode).split(" ")[0]
 
 
 def geocode_property(address: str, postcode: str, base_postcode: Optional[str] = None) -> Tuple[float, float]:
@@ -83,257 +94,555 @@ def geocode_property(address: str, postcode: str, base_postcode: Optional[str] =
     Returns (latitude, longitude) tuple.
     
     Strategy:
-    1. Check full postcode in POSTCODE_COORDS
-    2. Check postcode prefix in POSTCODE_PREFIX_COORDS
-    3. Fall back to base_postcode coordinates if provided
-    4. Default fallback: Central London (51.507, -0.127)
+    1. Resolve the postcode (resolve_postcode_coords)
+    2. Fall back to base_postcode coordinates if provided
+    3. Default fallback: Central London (51.507, -0.127)
     """
-    postcode_upper = postcode.strip().upper()
-    
-    # Try full postcode first
-    if postcode_upper in POSTCODE_COORDS:
-        return POSTCODE_COORDS[postcode_upper]
-    
-    # Try postcode prefix
-    prefix = extract_postcode_prefix(postcode_upper)
-    if prefix in POSTCODE_PREFIX_COORDS:
-        return POSTCODE_PREFIX_COORDS[prefix]
-    
-    # Fall back to base_postcode if provided
-    if base_postcode:
-        base_upper = base_postcode.strip().upper()
-        if base_upper in POSTCODE_COORDS:
-            return POSTCODE_COORDS[base_upper]
-        base_prefix = extract_postcode_prefix(base_upper)
-        if base_prefix in POSTCODE_PREFIX_COORDS:
-            return POSTCODE_PREFIX_COORDS[base_prefix]
+    for candidate in (postcode, base_postcode):
+        if candidate:
+            coords = resolve_postcode_coords(normalise_postcode(candidate))
+            if coords:
+                return coords
     
     # Default: Central London
     return (51.507, -0.127)
 
 
-def get_base_travel_time(from_postcode: str, to_postcode: str) -> int:
-    """Calculate base travel time between two postcodes using Haversine formula."""
-    if from_postcode == to_postcode:
-        return 0
-    
-    # Try full postcode first
-    from_coords = POSTCODE_COORDS.get(from_postcode)
-    to_coords = POSTCODE_COORDS.get(to_postcode)
-    
-    # If not found, try postcode prefix
-    if not from_coords:
-        from_prefix = extract_postcode_prefix(from_postcode)
-        from_coords = POSTCODE_PREFIX_COORDS.get(from_prefix)
-    
-    if not to_coords:
-        to_prefix = extract_postcode_prefix(to_postcode)
-        to_coords = POSTCODE_PREFIX_COORDS.get(to_prefix)
-    
-    if not from_coords or not to_coords:
-        return 30  # Default fallback
+def normalise_postcode(postcode: str) -> str:
+    """Canonical postcode used for lookups and cache keys ('sw1a1aa' -> 'SW1A 1AA')."""
+    return canonical_postcode(postcode)
+
+
+# Full UK coverage when an index built by postcode_index.py is loaded
+postcode_index: Optional[PostcodeIndex] = None
+
+
+def load_postcode_index(path: str) -> PostcodeIndex:
+    """Geocode from the postcode index file at path from now on."""
+    global postcode_index
+    postcode_index = PostcodeIndex(path)
+    resolve_postcode_coords.cache_clear()
+    return postcode_index
+
+
+@lru_cache(maxsize=COORDS_CACHE_SIZE)
+def resolve_postcode_coords(postcode: str) -> Optional[Tuple[float, float]]:
+    """
+    Coordinates for a normalised postcode, or None: from the postcode index
+    if one is loaded (full postcode, then sector, then district), else from
+    the built-in London tables (full match, then prefix).
+    """
+    if postcode_index is not None:
+        coords = postcode_index.lookup(postcode)
+        if coords:
+            return coords
+    coords = POSTCODE_COORDS.get(postcode)
+    if coords:
+        return coords
+    parsed = parse_postcode(postcode)
+    if parsed is None:
+        return POSTCODE_PREFIX_COORDS.get(extract_postcode_prefix(postcode))
+    # The prefix table is mostly by district: "EC2A" falls back to "EC2"
+    return POSTCODE_PREFIX_COORDS.get(parsed.outward) or POSTCODE_PREFIX_COORDS.get(parsed.district)
+
+
+def haversine_km_matrix(from_coords: np.ndarray, to_coords: np.ndarray) -> np.ndarray:
+    """(n, m) great-circle distances in km between (n, 2) and (m, 2) arrays of (latitude, longitude)."""
+    from_coords = np.asarray(from_coords, dtype=np.float64).reshape(-1, 2)
+    to_coords = np.asarray(to_coords, dtype=np.float64).reshape(-1, 2)
     
-    # Haversine formula
     R = 6371  # Earth radius in km
-    d_lat = math.radians(to_coords[0] - from_coords[0])
-    d_lon = math.radians(to_coords[1] - from_coords[1])
-    
-    a = (math.sin(d_lat / 2) ** 2 +
-         math.cos(math.radians(from_coords[0])) *
-         math.cos(math.radians(to_coords[0])) *
-         math.sin(d_lon / 2) ** 2)
+    lat1 = np.radians(from_coords[:, 0])[:, None]
+    lat2 = np.radians(to_coords[:, 0])[None, :]
+    d_lat = np.radians(to_coords[:, 0][None, :] - from_coords[:, 0][:, None])
+    d_lon = np.radians(to_coords[:, 1][None, :] - from_coords[:, 1][:, None])
     
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    distance = R * c
+    a = np.sin(d_lat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(d_lon / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return R * c
+
+
+def travel_minutes_matrix(from_coords: np.ndarray, to_coords: np.ndarray) -> np.ndarray:
+    """
+    Vectorised Haversine travel times.
+
+    Takes (n, 2) and (m, 2) arrays of (latitude, longitude) and returns an
+    (n, m) int array of minutes at 30 km/h + 5 min, rounded up to the next
+    5 minutes. Rows or columns with NaN coordinates get DEFAULT_TRAVEL_MINUTES.
+    """
+    distance = haversine_km_matrix(from_coords, to_coords)
     
     # Convert to minutes (assuming 30 km/h average speed + 5 min buffer)
     travel_time = (distance / 30) * 60 + 5
-    return int(math.ceil(travel_time / 5) * 5)
+    minutes = np.ceil(travel_time / 5) * 5
+    return np.where(np.isnan(minutes), DEFAULT_TRAVEL_MINUTES, minutes).astype(np.int32)
+
+
+def haversine_travel_minutes(from_coords: Tuple[float, float], to_coords: Tuple[float, float]) -> int:
+    """
+    Travel minutes between two coordinates, rounded up to the next 5 minutes.
+    Same formula as travel_minutes_matrix, in plain floats for single pairs.
+    """
+    R = 6371  # Earth radius in km
+    lat1 = math.radians(from_coords[0])
+    lat2 = math.radians(to_coords[0])
+    d_lat = math.radians(to_coords[0] - from_coords[0])
+    d_lon = math.radians(to_coords[1] - from_coords[1])
+    a = math.sin(d_lat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(d_lon / 2) ** 2
+    distance = R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return int(math.ceil(((distance / 30) * 60 + 5) / 5) * 5)
+
+
+def postcode_coords_array(postcodes: List[str]) -> np.ndarray:
+    """(n, 2) array of coordinates for postcodes, NaN where a postcode can't be located."""
+    coords = np.full((len(postcodes), 2), np.nan)
+    for i, postcode in enumerate(postcodes):
+        resolved = resolve_postcode_coords(normalise_postcode(postcode))
+        if resolved:
+            coords[i] = resolved
+    return coords
+
+
+def _zero_identical(minutes: np.ndarray, from_keys: List[str], to_keys: List[str]) -> None:
+    """Set minutes[i, j] to 0 wherever from_keys[i] and to_keys[j] are the same postcode."""
+    to_positions: Dict[str, List[int]] = {}
+    for j, key in enumerate(to_keys):
+        to_positions.setdefault(key, []).append(j)
+    for i, key in enumerate(from_keys):
+        for j in to_positions.get(key, ()):
+            minutes[i, j] = 0
+
+
+class TravelModel(ABC):
+    """
+    How travel minutes between postcodes are worked out.
+
+    A model prices a trip in one of its time-of-day bands, `bands` of
+    band_minutes each from midnight; models that ignore the time have one
+    band for the whole day. Trips leaving a viewing are priced at its end
+    and trips heading to one at its start; without a time, at
+    default_minute. Postcodes are normalised, identical postcodes are 0
+    minutes apart and ones that can't be located DEFAULT_TRAVEL_MINUTES.
+    """
+
+    name = "base"
+    band_minutes = MINUTES_PER_DAY
+    default_minute = 12 * 60
+
+    @property
+    def bands(self) -> int:
+        return -(-MINUTES_PER_DAY // self.band_minutes)
+
+    def band(self, minute):
+        """Band of a minute of the day, or an int array of bands for an array of minutes."""
+        if minute is None:
+            minute = self.default_minute
+        if isinstance(minute, int):
+            # The common case, and a fraction of np.ndim's cost
+            return min(max(minute // self.band_minutes, 0), self.bands - 1)
+        if np.ndim(minute):
+            return np.clip(np.asarray(minute) // self.band_minutes, 0, self.bands - 1)
+        return min(max(int(minute) // self.band_minutes, 0), self.bands - 1)
+
+    @abstractmethod
+    def matrix(self, from_postcodes: List[str], to_postcodes: List[str]) -> np.ndarray:
+        """(n, m, bands) int array of travel minutes between two lists of normalised postcodes."""
+
+    def minutes(self, from_postcode: str, to_postcode: str, band: int = 0) -> int:
+        """Travel minutes between two normalised postcodes in a band."""
+        return int(self.matrix([from_postcode], [to_postcode])[0, 0, band])
 
 
-def parse_time(time_str: str) -> int:
-    """Convert time string (HH:MM) to minutes since midnight."""
-    hours, minutes = map(int, time_str.split(':'))
-    return hours * 60 + minutes
+class HaversineModel(TravelModel):
+    """Straight-line distance at a flat 30 km/h + 5 minutes, whatever the time of day."""
 
+    name = "haversine"
 
-def format_time(minutes: int) -> str:
-    """Convert minutes since midnight to time string (HH:MM)."""
-    hours = minutes // 60
-    mins = minutes % 60
-    return f"{hours:02d}:{mins:02d}"
+    def matrix(self, from_postcodes, to_postcodes):
+        minutes = travel_minutes_matrix(postcode_coords_array(from_postcodes), postcode_coords_array(to_postcodes))
+        _zero_identical(minutes, from_postcodes, to_postcodes)
+        return minutes[:, :, None]
 
+    def minutes(self, from_postcode, to_postcode, band=0):
+        if from_postcode == to_postcode:
+            return 0
+        from_coords = resolve_postcode_coords(from_postcode)
+        to_coords = resolve_postcode_coords(to_postcode)
+        if not from_coords or not to_coords:
+            return DEFAULT_TRAVEL_MINUTES
+        return haversine_travel_minutes(from_coords, to_coords)
 
-def add_minutes(time_minutes: int, minutes: int) -> int:
-    """Add minutes to a time in minutes."""
-    return time_minutes + minutes
+
+# Effective straight-line speeds in km/h for each hour of the day, from
+# midnight. Trips to or from a central zone (CENTRAL_AREAS, CENTRAL_DISTRICTS)
+# use the central profile.
+SPEED_PROFILES: Dict[str, Tuple[int, ...]] = {
+    "central": (24, 24, 24, 24, 24, 22, 18, 13, 11, 12, 14, 15, 15, 15, 14, 13, 12, 11, 12, 15, 18, 20, 22, 24),
+    "outer": (34, 34, 34, 34, 34, 30, 24, 18, 16, 18, 22, 24, 24, 24, 22, 19, 17, 16, 18, 22, 26, 28, 30, 32),
+}
+CENTRAL_AREAS = {"EC", "WC"}
+CENTRAL_DISTRICTS = {"W1", "SW1", "SE1", "N1", "NW1", "E1"}
+TRIP_OVERHEAD_MINUTES = 5  # parking and walking, as in the flat model
+INTRA_ZONE_KM = 1.5  # typical distance between two postcodes in the same zone
 
 
-def get_time_slots(start_hour: int = 9, end_hour: int = 18) -> List[str]:
-    """Generate time slots between start and end hours (30-minute intervals)."""
-    slots = []
-    for hour in range(start_hour, end_hour):
-        slots.append(format_time(hour * 60))
-        slots.append(format_time(hour * 60 + 30))
-    return slots
+def is_central_zone(zone: str) -> bool:
+    parsed = parse_postcode(zone)
+    return bool(parsed) and (parsed.area in CENTRAL_AREAS or parsed.district in CENTRAL_DISTRICTS)
 
 
-def check_agent_slot_feasibility(
-    agent_id: int,
-    time: str,
-    property_id: int,
-    property_postcode: str,
-    confirmed_viewings: List[dict],
-    properties_db: dict
-) -> dict:
+def profile_minutes(distance_km: np.ndarray, central: np.ndarray) -> np.ndarray:
     """
-    Check if a time slot is feasible for an agent given their confirmed viewings.
-    
-    Returns:
-        dict with 'feasible' (bool) and optional 'reason' (str)
+    (..., 24) int minutes for distances in km under SPEED_PROFILES, central
+    marking which use the central profile, rounded up to the next 5 minutes.
+    NaN distances get DEFAULT_TRAVEL_MINUTES.
     """
-    time_minutes = parse_time(time)
-    viewing_end = add_minutes(time_minutes, VIEWING_DURATION)
-    
-    # Sort confirmed viewings by time
-    sorted_viewings = sorted(
-        [v for v in confirmed_viewings if v.get("status") == "confirmed" and v.get("agent_id") == agent_id],
-        key=lambda v: parse_time(v.get("confirmed_time", v.get("requested_time", "00:00")))
+    speeds = np.where(
+        np.asarray(central)[..., None],
+        np.array(SPEED_PROFILES["central"], dtype=np.float64),
+        np.array(SPEED_PROFILES["outer"], dtype=np.float64),
     )
-    
-    # Check for direct time overlap
-    for viewing in sorted_viewings:
-        viewing_time = viewing.get("confirmed_time") or viewing.get("requested_time")
-        if not viewing_time:
-            continue
-            
-        viewing_start = parse_time(viewing_time)
-        viewing_end_time = add_minutes(viewing_start, VIEWING_DURATION)
+    minutes = np.ceil((np.asarray(distance_km)[..., None] / speeds * 60 + TRIP_OVERHEAD_MINUTES) / 5) * 5
+    return np.where(np.isnan(minutes), DEFAULT_TRAVEL_MINUTES, minutes).astype(np.int32)
+
+
+class ZoneProfileModel(TravelModel):
+    """
+    Time-of-day speeds over a precomputed zone-pair table. Each postcode's
+    zone is its district ("SW1A 1AA" -> "SW1") and table[i, j, band] the
+    minutes from zone i to zone j in that hour, so a lookup is a dict get
+    and an array index. Postcodes outside the table's zones are priced from
+    their coordinates with the same speed profiles.
+
+    Tables are built from zone centroids (from_zone_coords), or saved with
+    save() and loaded with load(), e.g. one built from measured journey
+    times with the same layout.
+    """
+
+    name = "profile"
+
+    def __init__(self, zones: List[str], table: np.ndarray):
+        self.zones = list(zones)
+        self.zone_index = {zone: i for i, zone in enumerate(self.zones)}
+        self.table = np.ascontiguousarray(table, dtype=np.int16)
+        self.band_minutes = MINUTES_PER_DAY // self.table.shape[2]
+
+    @classmethod
+    def from_zone_coords(cls, zone_coords: Dict[str, Tuple[float, float]]) -> "ZoneProfileModel":
+        """Model over zones at the given centroids, by straight-line distance and SPEED_PROFILES."""
+        zones = sorted(zone_coords)
+        coords = np.array([zone_coords[zone] for zone in zones], dtype=np.float64).reshape(-1, 2)
+        distance = haversine_km_matrix(coords, coords)
+        np.fill_diagonal(distance, INTRA_ZONE_KM)
+        central = np.array([is_central_zone(zone) for zone in zones], dtype=bool)
+        return cls(zones, profile_minutes(distance, central[:, None] | central[None, :]))
+
+    @classmethod
+    def load(cls, path: str) -> "ZoneProfileModel":
+        with np.load(path) as data:
+            return cls([str(zone) for zone in data["zones"]], data["minutes"])
+
+    def save(self, path: str) -> None:
+        with open(path, "wb") as f:
+            np.savez(f, zones=np.array(self.zones), minutes=self.table)
+
+    def zone(self, postcode: str) -> int:
+        """Index of a postcode's zone in the table, or -1."""
+        parsed = parse_postcode(postcode)
+        return self.zone_index.get(parsed.district, -1) if parsed else -1
+
+    def matrix(self, from_postcodes, to_postcodes):
+        from_zones = np.array([self.zone(p) for p in from_postcodes], dtype=np.intp)
+        to_zones = np.array([self.zone(p) for p in to_postcodes], dtype=np.intp)
+        if self.zones:
+            minutes = self.table[from_zones[:, None], to_zones[None, :]].astype(np.int32)
+        else:
+            minutes = np.zeros((len(from_zones), len(to_zones), self.bands), dtype=np.int32)
+        outside = (from_zones < 0)[:, None] | (to_zones < 0)[None, :]
+        if outside.any():
+            distance = haversine_km_matrix(postcode_coords_array(from_postcodes), postcode_coords_array(to_postcodes))
+            central = (
+                np.array([is_central_zone(p) for p in from_postcodes], dtype=bool)[:, None]
+                | np.array([is_central_zone(p) for p in to_postcodes], dtype=bool)[None, :]
+            )
+            minutes[outside] = profile_minutes(distance, central)[outside]
+        _zero_identical(minutes, from_postcodes, to_postcodes)
+        return minutes
+
+    def minutes(self, from_postcode, to_postcode, band=0):
+        if from_postcode == to_postcode:
+            return 0
+        i, j = self.zone(from_postcode), self.zone(to_postcode)
+        if i >= 0 and j >= 0:
+            return int(self.table[i, j, band])
+        return super().minutes(from_postcode, to_postcode, band)
+
+
+def zone_coords_from_index(index: PostcodeIndex, areas: Optional[List[str]] = None) -> Dict[str, Tuple[float, float]]:
+    """Zone centroids from a postcode index: its outward codes averaged by district, optionally only in some areas."""
+    grouped: Dict[str, List[Tuple[float, float]]] = {}
+    for outward, coords in index.districts().items():
+        parsed = parse_postcode(outward)
+        if parsed and (not areas or parsed.area in areas):
+            grouped.setdefault(parsed.district, []).append(coords)
+    return {zone: tuple(np.mean(points, axis=0).tolist()) for zone, points in grouped.items()}
+
+
+def create_travel_model(name: str, zone_table: Optional[str] = None) -> TravelModel:
+    """
+    A model by name: "haversine", or "profile" over the zone table file at
+    zone_table, or by default over the built-in London districts.
+    """
+    if name == HaversineModel.name:
+        return HaversineModel()
+    if name == ZoneProfileModel.name:
+        if zone_table:
+            return ZoneProfileModel.load(zone_table)
+        return ZoneProfileModel.from_zone_coords(POSTCODE_PREFIX_COORDS)
+    raise ValueError(f"Unknown travel model {name!r}")
+
+
+# The model every travel lookup goes through
+travel_model: TravelModel = HaversineModel()
+
+
+def set_travel_model(model: TravelModel) -> TravelModel:
+    """Price travel with model from now on, dropping travel times cached under the old one."""
+    global travel_model
+    travel_model = model
+    travel_service.clear()
+    return model
+
+
+def batch_travel_times(from_postcodes: List[str], to_postcodes: List[str], at_minute: Optional[int] = None) -> np.ndarray:
+    """
+    Travel-minutes matrix between two lists of postcodes, with the same
+    rules as get_base_travel_time (identical postcodes are 0 minutes,
+    unknown postcodes fall back to DEFAULT_TRAVEL_MINUTES), priced at
+    at_minute (see TravelModel).
+
+    Use a one-element list on either side for one-to-many queries, e.g.
+    ranking every property against a base postcode.
+    """
+    from_keys = [normalise_postcode(p) for p in from_postcodes]
+    to_keys = [normalise_postcode(p) for p in to_postcodes]
+    return travel_model.matrix(from_keys, to_keys)[:, :, travel_model.band(at_minute)]
+
+
+def batch_travel_times_by_band(
+    from_postcodes: List[str],
+    to_postcodes: List[str],
+    agency_id: Optional[int] = None
+) -> np.ndarray:
+    """
+    (n, m, bands) travel minutes between two lists of postcodes in every
+    band of the travel model, through travel_service (see
+    TravelTimeService.get_travel_times_by_band).
+    """
+    return travel_service.get_travel_times_by_band(from_postcodes, to_postcodes, agency_id)
+
+
+def compute_travel_time(from_postcode: str, to_postcode: str, band: int = 0) -> int:
+    """Uncached travel time between two normalised postcodes in a band of the travel model."""
+    return travel_model.minutes(from_postcode, to_postcode, band)
+
+
+class TravelTimeMatrix:
+    """
+    Dense travel-minutes matrix over a set of postcodes.
+    Grows a row and column at a time as new postcodes are added.
+    """
+
+    def __init__(self, postcodes: Optional[List[str]] = None):
+        self.index: Dict[str, int] = {}
+        self.minutes = np.zeros((0, 0), dtype=np.int16)
+        if postcodes:
+            self.add_postcodes(postcodes)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def add_postcodes(self, postcodes: List[str]) -> None:
+        """Add any postcodes not already in the matrix."""
+        new = []
+        for postcode in postcodes:
+            key = normalise_postcode(postcode)
+            if key not in self.index and key not in new:
+                new.append(key)
+        if not new:
+            return
         
-        # Check for overlap
-        if ((time_minutes >= viewing_start and time_minutes < viewing_end_time) or
-            (viewing_start >= time_minutes and viewing_start < viewing_end)):
-            return {"feasible": False, "reason": "Agent has viewing at this time"}
-    
-    # Find previous and next viewings
-    prev_viewing = None
-    next_viewing = None
-    
-    for viewing in sorted_viewings:
-        viewing_time = viewing.get("confirmed_time") or viewing.get("requested_time")
-        if not viewing_time:
-            continue
-            
-        viewing_start = parse_time(viewing_time)
-        if viewing_start < time_minutes:
-            prev_viewing = viewing
-        elif viewing_start > time_minutes and not next_viewing:
-            next_viewing = viewing
-            break
-    
-    # Check travel time from previous viewing
-    if prev_viewing:
-        prev_property_id = prev_viewing.get("property_id")
-        prev_property = properties_db.get(prev_property_id)
+        old_size = len(self.index)
+        keys = list(self.index) + new
+        size = len(keys)
+        minutes = np.zeros((size, size), dtype=np.int16)
+        minutes[:old_size, :old_size] = self.minutes
+        # Only the new rows/columns need computing
+        block = batch_travel_times(new, keys).astype(np.int16)
+        minutes[old_size:, :] = block
+        minutes[:, old_size:] = block.T
+        self.minutes = minutes
+        for key in new:
+            self.index[key] = len(self.index)
+
+    def lookup(self, from_postcode: str, to_postcode: str) -> Optional[int]:
+        """Travel minutes between two normalised postcodes, or None if either is missing."""
+        i = self.index.get(from_postcode)
+        j = self.index.get(to_postcode)
+        if i is None or j is None:
+            return None
+        return int(self.minutes[i, j])
+
+    def block(self, from_postcodes: List[str], to_postcodes: List[str]) -> Optional[np.ndarray]:
+        """(n, m) int32 minutes between two lists of normalised postcodes, or None if any is missing."""
+        from_rows = [self.index.get(p) for p in from_postcodes]
+        to_cols = [self.index.get(p) for p in to_postcodes]
+        if None in from_rows or None in to_cols:
+            return None
+        return self.minutes[np.ix_(from_rows, to_cols)].astype(np.int32)
+
+
+class TravelTimeService:
+    """
+    Travel-time lookups through travel_model, backed by a bounded LRU of
+    (postcode pair, band) and, for single-band models, optional per-agency
+    matrices precomputed from their property postcodes. A lookup given an
+    agency_id reads that agency's matrix on an LRU miss; others go straight
+    to the model.
+
+    Batch lookups skip the LRU, whose per-pair gets would cost more than
+    the model's vectorised matrix(), but share its counters: each pair is a
+    hit when the agency's matrix answers it and a miss when the model does.
+    """
+
+    def __init__(self, cache_size: int = TRAVEL_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, str, int], int]" = OrderedDict()
+        self._matrices: Dict[int, TravelTimeMatrix] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_travel_time(
+        self,
+        from_postcode: str,
+        to_postcode: str,
+        at_minute: Optional[int] = None,
+        agency_id: Optional[int] = None
+    ) -> int:
+        model = travel_model
+        band = model.band(at_minute) if model.bands > 1 else 0
+        key = (normalise_postcode(from_postcode), normalise_postcode(to_postcode), band)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return cached
         
-        if prev_property:
-            prev_postcode = prev_property.get("postcode")
-            if prev_postcode:
-                travel_time = get_base_travel_time(prev_postcode, property_postcode)
-                prev_viewing_time = prev_viewing.get("confirmed_time") or prev_viewing.get("requested_time")
-                prev_viewing_end = add_minutes(parse_time(prev_viewing_time), VIEWING_DURATION)
-                min_next_time = add_minutes(prev_viewing_end, TRAVEL_BUFFER + travel_time)
-                
-                if time_minutes < min_next_time:
-                    return {
-                        "feasible": False,
-                        "reason": f"Insufficient travel time from {prev_postcode}"
-                    }
-    
-    # Check travel time to next viewing
-    if next_viewing:
-        next_property_id = next_viewing.get("property_id")
-        next_property = properties_db.get(next_property_id)
+        self.misses += 1
+        matrix = self._matrices.get(agency_id) if agency_id is not None else None
+        minutes = matrix.lookup(key[0], key[1]) if matrix is not None else None
+        if minutes is None:
+            minutes = compute_travel_time(*key)
         
-        if next_property:
-            next_postcode = next_property.get("postcode")
-            if next_postcode:
-                travel_to_next = get_base_travel_time(property_postcode, next_postcode)
-                this_viewing_end = add_minutes(time_minutes, VIEWING_DURATION)
-                min_next_start = add_minutes(this_viewing_end, TRAVEL_BUFFER + travel_to_next)
-                next_viewing_time = next_viewing.get("confirmed_time") or next_viewing.get("requested_time")
-                next_start = parse_time(next_viewing_time)
-                
-                if min_next_start > next_start:
-                    return {
-                        "feasible": False,
-                        "reason": "Insufficient time before next viewing"
-                    }
-    
-    return {"feasible": True}
+        self._cache[key] = minutes
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return minutes
+
+    def get_travel_times_by_band(
+        self,
+        from_postcodes: List[str],
+        to_postcodes: List[str],
+        agency_id: Optional[int] = None
+    ) -> np.ndarray:
+        """
+        (n, m, bands) travel minutes between two lists of postcodes in every
+        band of the travel model. Under a single-band model, pairs the agency's
+        precomputed matrix covers are read from it in one indexing step; the
+        rest comes from the model's own vectorised matrix().
+        """
+        model = travel_model
+        from_keys = [normalise_postcode(p) for p in from_postcodes]
+        to_keys = [normalise_postcode(p) for p in to_postcodes]
+        pairs = len(from_keys) * len(to_keys)
+        if model.bands == 1 and agency_id is not None:
+            matrix = self._matrices.get(agency_id)
+            block = matrix.block(from_keys, to_keys) if matrix is not None else None
+            if block is not None:
+                self.hits += pairs
+                return block[:, :, None]
+        self.misses += pairs
+        return model.matrix(from_keys, to_keys)
+
+    def precompute_matrix(self, agency_id: int, postcodes: List[str]) -> None:
+        """
+        Make sure the agency's matrix covers the given postcodes.
+        Agencies with more than MATRIX_MAX_POSTCODES distinct postcodes rely on the LRU alone,
+        as does every agency under a time-of-day model, whose own table answers directly.
+        """
+        if travel_model.bands > 1:
+            return
+        matrix = self._matrices.get(agency_id)
+        if matrix is None:
+            matrix = self._matrices[agency_id] = TravelTimeMatrix()
+        distinct = {normalise_postcode(p) for p in postcodes if p}
+        if len(distinct | set(matrix.index)) > MATRIX_MAX_POSTCODES:
+            return
+        matrix.add_postcodes(sorted(distinct))
+
+    def get_matrix(self, agency_id: int) -> Optional[TravelTimeMatrix]:
+        return self._matrices.get(agency_id)
+
+    def stats(self) -> Dict[str, int]:
+        """Cache counters (hits, misses, size) for monitoring."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._cache),
+            "max_size": self.cache_size,
+            "matrix_postcodes": sum(len(m) for m in self._matrices.values()),
+        }
 
+    def clear(self) -> None:
+        self._cache.clear()
+        self._matrices.clear()
+        self.hits = 0
+        self.misses = 0
 
-def get_available_time_slots(
-    property_id: int,
-    property_postcode: str,
-    agent_id: int,
-    availability_rules: List[dict],
-    confirmed_viewings: List[dict],
-    properties_db: dict
-) -> List[str]:
+
+travel_service = TravelTimeService()
+
+
+def get_base_travel_time(
+    from_postcode: str,
+    to_postcode: str,
+    at_minute: Optional[int] = None,
+    agency_id: Optional[int] = None
+) -> int:
     """
-    Get available time slots for a property, filtered by availability and feasibility.
-    
-    Args:
-        property_id: ID of the property
-        property_postcode: Postcode of the property
-        agent_id: ID of the agent
-        availability_rules: List of availability rules (day_of_week: 0-6, enabled: bool, start_time, end_time)
-        confirmed_viewings: List of confirmed viewings
-        properties_db: Dictionary of all properties
-    
-    Returns:
-        List of available time slot strings (HH:MM format)
+    Travel minutes between two postcodes under the travel model (cached),
+    priced at at_minute, minutes since midnight (see TravelModel). Pass the
+    agency_id whose properties they are to use its precomputed matrix.
     """
-    # Get today's day_of_week (0=Monday, 1=Tuesday, ..., 6=Sunday)
-    from datetime import datetime
-    today = datetime.now()
-    day_of_week = today.weekday()  # 0=Monday, 6=Sunday
-    
-    # Find availability rule for today
-    today_rule = None
-    for rule in availability_rules:
-        if rule.get("day_of_week") == day_of_week and rule.get("enabled"):
-            today_rule = rule
-            break
-    
-    # If no rule found or day is disabled, return empty list
-    if not today_rule:
-        return []
-    
-    # Get time window from rule
-    start_time = today_rule.get("start_time", "09:00")
-    end_time = today_rule.get("end_time", "18:00")
-    start_hour = parse_time(start_time) // 60
-    end_hour = parse_time(end_time) // 60
-    
-    # Generate all possible slots within availability window
-    all_slots = get_time_slots(start_hour, end_hour)
-    available_slots = []
-    
-    # Filter by feasibility
-    for slot in all_slots:
-        feasibility = check_agent_slot_feasibility(
-            agent_id=agent_id,
-            time=slot,
-            property_id=property_id,
-            property_postcode=property_postcode,
-            confirmed_viewings=confirmed_viewings,
-            properties_db=properties_db
-        )
-        
-        if feasibility.get("feasible"):
-            available_slots.append(slot)
-    
-    return available_slots
+    return travel_service.get_travel_time(from_postcode, to_postcode, at_minute, agency_id)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Build a zone-pair table for the time-of-day travel model")
+    parser.add_argument("table_path", help="where to write the table (.npz)")
+    parser.add_argument("--index", help="postcode index to take districts from (default: built-in London districts)")
+    parser.add_argument("--areas", nargs="+", help="postcode areas to include, e.g. E EC N NW SE SW W WC")
+    args = parser.parse_args()
+
+    if args.index:
+        zone_coords = zone_coords_from_index(PostcodeIndex(args.index), args.areas)
+    else:
+        zone_coords = POSTCODE_PREFIX_COORDS
+    model = ZoneProfileModel.from_zone_coords(zone_coords)
+    model.save(args.table_path)
+    print(f"Wrote {args.table_path}: {len(model.zones)} zones, {model.bands} bands")
+    return 0
+
 
+if __name__ == "__main__":
+    sys.exit(main())
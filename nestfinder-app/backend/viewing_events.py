@@ -0,0 +1,128 @@
+"""
+Server-sent event stream of viewing changes, so dashboards can follow an
+agency's viewings without re-fetching the whole list.
+
+Routes record each create/update/confirm with repo.append_viewing_event()
+and call ViewingEventBroker.notify(). Events carry a per-agency seq, sent
+as the SSE id: a client that reconnects (EventSource sends Last-Event-ID)
+or passes ?after= gets everything it missed, as long as it is still among
+the retained events; otherwise it is sent a "reset" event and should
+reload the list.
+
+Writes made by other workers don't reach this process's notify(), so with
+shared storage the broker polls the agency's latest seq (one query per
+agency and worker, however many streams are open).
+"""
+
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional
+
+EVENT_POLL_SECONDS = 1.0  # how often other workers' events are looked for
+EVENT_HEARTBEAT_SECONDS = 15.0  # comment lines keep idle connections open through proxies
+EVENT_BATCH = 100  # events read per query
+EVENT_RETRY_MS = 3000  # client reconnect delay
+
+
+def format_event(event: Dict) -> str:
+    """An event as an SSE message: id is the seq, event the type, data the viewing."""
+    return f"id: {event['seq']}\nevent: {event['type']}\ndata: {json.dumps(event['viewing'], default=str)}\n\n"
+
+
+def format_reset(seq: int) -> str:
+    """Tells the client it missed events: reload the list, then carry on from seq."""
+    return f"id: {seq}\nevent: reset\ndata: {json.dumps({'seq': seq})}\n\n"
+
+
+class ViewingEventBroker:
+    """Wakes this process's event streams when an agency has new viewing events."""
+
+    def __init__(self, repo, poll_seconds: float = EVENT_POLL_SECONDS):
+        self.repo = repo
+        self.poll_seconds = poll_seconds
+        self._wakeups: Dict[int, asyncio.Event] = {}
+        self._listeners: Dict[int, int] = {}
+        self._watchers: Dict[int, asyncio.Task] = {}
+
+    def notify(self, agency_id: int) -> None:
+        wakeup = self._wakeups.pop(agency_id, None)
+        if wakeup is not None:
+            wakeup.set()
+
+    def wakeup(self, agency_id: int) -> asyncio.Event:
+        """
+        Set by the next notify() for the agency. Take it before reading events
+        so one recorded in between still wakes the reader.
+        """
+        return self._wakeups.setdefault(agency_id, asyncio.Event())
+
+    @asynccontextmanager
+    async def listen(self, agency_id: int) -> AsyncIterator[None]:
+        """Held by each open stream; shared storage is polled while any are open."""
+        self._listeners[agency_id] = self._listeners.get(agency_id, 0) + 1
+        if self.repo.shared and agency_id not in self._watchers:
+            self._watchers[agency_id] = asyncio.create_task(self._watch(agency_id))
+        try:
+            yield
+        finally:
+            self._listeners[agency_id] -= 1
+            if not self._listeners[agency_id]:
+                del self._listeners[agency_id]
+                watcher = self._watchers.pop(agency_id, None)
+                if watcher is not None:
+                    watcher.cancel()
+
+    async def _watch(self, agency_id: int) -> None:
+        seen = None
+        while True:
+            try:
+                latest = await self.repo.get_viewing_event_seq(agency_id)
+            except Exception as e:
+                print(f"⚠️ Viewing event poll failed: {e}")
+            else:
+                if seen is not None and latest != seen:
+                    self.notify(agency_id)
+                seen = latest
+            await asyncio.sleep(self.poll_seconds)
+
+
+async def stream_viewing_events(
+    repo,
+    broker: ViewingEventBroker,
+    agency_id: int,
+    after: Optional[int],
+    is_disconnected: Callable[[], Awaitable[bool]],
+    heartbeat_seconds: float = EVENT_HEARTBEAT_SECONDS
+) -> AsyncIterator[str]:
+    """
+    SSE messages for the agency's viewing events after seq `after` (from
+    now if None), until the client disconnects.
+    """
+    async with broker.listen(agency_id):
+        yield f"retry: {EVENT_RETRY_MS}\n\n"
+        latest = await repo.get_viewing_event_seq(agency_id)
+        if after is None:
+            after = latest
+        elif after > latest:
+            # A cursor from before the storage was reset (e.g. a restart without a database)
+            yield format_reset(latest)
+            after = latest
+
+        while not await is_disconnected():
+            wakeup = broker.wakeup(agency_id)
+            events = await repo.get_viewing_events(agency_id, after, EVENT_BATCH)
+            if events and events[0]["seq"] > after + 1:
+                # The cursor is older than the retained events
+                after = await repo.get_viewing_event_seq(agency_id)
+                yield format_reset(after)
+                continue
+            for event in events:
+                yield format_event(event)
+                after = event["seq"]
+            if len(events) == EVENT_BATCH:
+                continue
+            try:
+                await asyncio.wait_for(wakeup.wait(), heartbeat_seconds)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
@@ -1,8 +1,9 @@
 'use client';
 
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import axios from 'axios';
 import SuggestTimeModal from './SuggestTimeModal';
+import useViewingEvents from './useViewingEvents';
 
 interface Viewing {
   id: number;
@@ -20,6 +21,7 @@ interface Viewing {
   rent_budget?: number;
   message?: string;
   suggested_time?: string;
+  feasibility?: FeasibilityStatus;
 }
 
 interface FeasibilityStatus {
@@ -35,57 +37,51 @@ interface ViewingRequestsScreenProps {
 }
 
 export default function ViewingRequestsScreen({ onToast }: ViewingRequestsScreenProps) {
-  const [viewings, setViewings] = useState<Viewing[]>([]);
-  const [loading, setLoading] = useState(true);
   const [suggestModalOpen, setSuggestModalOpen] = useState(false);
   const [selectedViewing, setSelectedViewing] = useState<Viewing | null>(null);
   const [feasibilityStatuses, setFeasibilityStatuses] = useState<Record<number, FeasibilityStatus>>({});
+  const refreshTimer = useRef<ReturnType<typeof setTimeout>>();
 
   const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000';
 
-  useEffect(() => {
-    loadViewings();
-    // Poll for new viewings every 10 seconds
-    const interval = setInterval(loadViewings, 10000);
-    return () => clearInterval(interval);
-  }, []);
-
-  const loadViewings = async () => {
-    try {
-      const response = await axios.get(`${API_URL}/api/viewings`);
-      setViewings(response.data);
-      
-      // Load feasibility statuses for pending viewings
-      const pendingViewings = response.data.filter((v: Viewing) => v.status === 'pending');
-      const statuses: Record<number, FeasibilityStatus> = {};
-      
-      for (const viewing of pendingViewings) {
-        try {
-          const feasibilityRes = await axios.get(`${API_URL}/api/viewings/${viewing.id}/feasibility`);
-          statuses[viewing.id] = feasibilityRes.data;
-        } catch (error) {
-          // If feasibility check fails, default to OK
-          statuses[viewing.id] = { status: 'ok', label: 'OK', color: '#4caf50' };
-        }
+  // Any confirmation can change other requests' feasibility; a burst of
+  // changes (e.g. auto-assign) is refreshed with one batch call
+  const refreshFeasibility = () => {
+    clearTimeout(refreshTimer.current);
+    refreshTimer.current = setTimeout(async () => {
+      try {
+        const response = await axios.post(`${API_URL}/api/viewings/feasibility:batch`, {});
+        setFeasibilityStatuses(response.data);
+      } catch (error) {
+        console.error('Failed to refresh feasibility:', error);
       }
-      
-      setFeasibilityStatuses(statuses);
-    } catch (error) {
-      console.error('Failed to load viewings:', error);
-    } finally {
-      setLoading(false);
-    }
+    }, 300);
   };
 
+  // Feasibility for pending viewings comes back with the list; the event
+  // stream keeps the list current
+  const { viewings, loading } = useViewingEvents<Viewing>('feasibility', refreshFeasibility);
+
+  useEffect(() => () => clearTimeout(refreshTimer.current), []);
+
+  // Latest batch result, else what came with the list; if feasibility
+  // couldn't be computed, default to OK
+  const feasibilityFor = (viewing: Viewing): FeasibilityStatus =>
+    feasibilityStatuses[viewing.id] || viewing.feasibility || { status: 'ok', label: 'OK', color: '#4caf50' };
+
   const handleConfirm = async (viewingId: number) => {
     try {
       await axios.patch(`${API_URL}/api/viewings/${viewingId}`, {
         status: 'confirmed',
       });
       onToast('Viewing confirmed ✅');
-      loadViewings();
     } catch (error) {
-      onToast('Failed to confirm viewing', 'error');
+      if (axios.isAxiosError(error) && error.response?.status === 409) {
+        // Slot was taken (or became unreachable) since the list was loaded
+        onToast(error.response.data?.detail || 'Viewing conflicts with the schedule', 'error');
+      } else {
+        onToast('Failed to confirm viewing', 'error');
+      }
     }
   };
 
@@ -100,7 +96,6 @@ export default function ViewingRequestsScreen({ onToast }: ViewingRequestsScreen
         status: 'declined',
       });
       onToast('Viewing declined');
-      loadViewings();
     } catch (error) {
       onToast('Failed to decline viewing', 'error');
     }
@@ -126,7 +121,6 @@ export default function ViewingRequestsScreen({ onToast }: ViewingRequestsScreen
       onToast('Alternative time suggested');
       setSuggestModalOpen(false);
       setSelectedViewing(null);
-      loadViewings();
     } catch (error) {
       onToast('Failed to suggest time', 'error');
     }
@@ -230,12 +224,12 @@ export default function ViewingRequestsScreen({ onToast }: ViewingRequestsScreen
                   <div className="mb-4">
                     <div className="flex items-center gap-2 mb-1">
                       <p className="text-sm font-medium text-slate-700">Requested Date & Time</p>
-                      {viewing.status === 'pending' && feasibilityStatuses[viewing.id] && (
+                      {viewing.status === 'pending' && (
                         <span
                           className="px-2 py-0.5 text-xs font-medium rounded-full text-white"
-                          style={{ backgroundColor: feasibilityStatuses[viewing.id].color }}
+                          style={{ backgroundColor: feasibilityFor(viewing).color }}
                         >
-                          {feasibilityStatuses[viewing.id].label}
+                          {feasibilityFor(viewing).label}
                         </span>
                       )}
                     </div>
@@ -256,10 +250,10 @@ export default function ViewingRequestsScreen({ onToast }: ViewingRequestsScreen
                       </p>
                     )}
                     {viewing.status === 'pending' && 
-                     feasibilityStatuses[viewing.id]?.status === 'tight' &&
-                     feasibilityStatuses[viewing.id]?.travel_time && (
+                     feasibilityFor(viewing).status === 'tight' &&
+                     feasibilityFor(viewing).travel_time && (
                       <p className="text-xs text-slate-500 mt-1">
-                        Travel time: {feasibilityStatuses[viewing.id].travel_time} min
+                        Travel time: {feasibilityFor(viewing).travel_time} min
                       </p>
                     )}
                   </div>
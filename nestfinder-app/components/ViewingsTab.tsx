@@ -1,7 +1,7 @@
 'use client';
 
-import { useState, useEffect } from 'react';
 import axios from 'axios';
+import useViewingEvents from './useViewingEvents';
 
 interface Viewing {
   id: number;
@@ -18,29 +18,11 @@ interface ViewingsTabProps {
 }
 
 export default function ViewingsTab({ onToast }: ViewingsTabProps) {
-  const [viewings, setViewings] = useState<Viewing[]>([]);
-  const [loading, setLoading] = useState(true);
+  // Kept up to date by the viewing event stream
+  const { viewings, loading } = useViewingEvents<Viewing>();
 
   const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000';
 
-  useEffect(() => {
-    loadViewings();
-    // Poll for new viewings
-    const interval = setInterval(loadViewings, 10000);
-    return () => clearInterval(interval);
-  }, []);
-
-  const loadViewings = async () => {
-    try {
-      const response = await axios.get(`${API_URL}/api/viewings`);
-      setViewings(response.data);
-    } catch (error) {
-      console.error('Failed to load viewings:', error);
-    } finally {
-      setLoading(false);
-    }
-  };
-
   const updateViewingStatus = async (
     viewingId: number,
     status: 'confirmed' | 'declined' | 'suggested',
@@ -59,7 +41,6 @@ export default function ViewingsTab({ onToast }: ViewingsTabProps) {
           ? 'Viewing declined'
           : 'Alternative time suggested'
       );
-      loadViewings();
     } catch (error) {
       onToast('Failed to update viewing', 'error');
     }
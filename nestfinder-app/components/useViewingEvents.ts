@@ -0,0 +1,114 @@
+'use client';
+
+import { useState, useEffect, useRef, useCallback } from 'react';
+import axios from 'axios';
+
+const EVENT_TYPES = ['viewing.created', 'viewing.updated', 'viewing.confirmed'];
+const SYNC_PAGE = 200;
+
+/**
+ * The agency's viewings, newest first, kept current from /api/viewings/events
+ * instead of polling. onChange runs after each change that arrives, and
+ * after catching up on changes the stream missed.
+ */
+export default function useViewingEvents<T extends { id: number }>(
+  include?: string,
+  onChange?: () => void
+) {
+  const [viewings, setViewings] = useState<T[]>([]);
+  const [loading, setLoading] = useState(true);
+  // Every change up to this seq is in the list
+  const lastSeq = useRef(0);
+  const onChangeRef = useRef(onChange);
+  onChangeRef.current = onChange;
+
+  const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000';
+
+  const upsert = (changed: T[]) => {
+    setViewings((current) => {
+      let next = current;
+      for (const viewing of changed) {
+        const index = next.findIndex((v) => v.id === viewing.id);
+        if (index === -1) {
+          next = [viewing, ...next];
+        } else {
+          next = next.slice();
+          next[index] = { ...next[index], ...viewing };
+        }
+      }
+      return next;
+    });
+  };
+
+  const loadViewings = useCallback(async () => {
+    try {
+      const response = await axios.get(`${API_URL}/api/viewings`, { params: { include } });
+      lastSeq.current = Number(response.headers['x-event-seq'] || 0);
+      setViewings(response.data);
+      return lastSeq.current;
+    } catch (error) {
+      console.error('Failed to load viewings:', error);
+      return null;
+    } finally {
+      setLoading(false);
+    }
+  }, [API_URL, include]);
+
+  // Fetch only what changed after lastSeq, a page at a time
+  const syncViewings = useCallback(async () => {
+    try {
+      for (;;) {
+        const response = await axios.get(`${API_URL}/api/viewings`, {
+          params: { include, since: lastSeq.current, limit: SYNC_PAGE },
+        });
+        upsert(response.data);
+        lastSeq.current = Number(response.headers['x-event-seq']);
+        if (response.data.length < SYNC_PAGE) return lastSeq.current;
+      }
+    } catch (error) {
+      console.error('Failed to sync viewings:', error);
+      return null;
+    }
+  }, [API_URL, include]);
+
+  useEffect(() => {
+    let source: EventSource | null = null;
+    let closed = false;
+
+    const handleEvent = (event: MessageEvent) => {
+      const seq = Number(event.lastEventId);
+      if (seq <= lastSeq.current) return;
+      lastSeq.current = seq;
+      upsert([JSON.parse(event.data) as T]);
+      onChangeRef.current?.();
+    };
+
+    const connect = async (sync: () => Promise<number | null>) => {
+      const seq = await sync();
+      if (closed) return;
+      if (seq === null) {
+        setTimeout(() => connect(loadViewings), 10000);
+        return;
+      }
+      // EventSource resumes from the last event id by itself after a dropped connection
+      source = new EventSource(`${API_URL}/api/viewings/events?after=${seq}`);
+      EVENT_TYPES.forEach((type) => source!.addEventListener(type, handleEvent));
+      source.addEventListener('reset', async (event) => {
+        source?.close();
+        // Behind the stream's retained events: catch up with ?since=. Ahead
+        // of the server's latest seq means its storage was reset: start over
+        const { seq: latest } = JSON.parse((event as MessageEvent).data);
+        await connect(latest < lastSeq.current ? loadViewings : syncViewings);
+        onChangeRef.current?.();
+      });
+    };
+
+    connect(loadViewings);
+    return () => {
+      closed = true;
+      source?.close();
+    };
+  }, [loadViewings, syncViewings]);
+
+  return { viewings, loading, reload: loadViewings };
+}
@@ -9,6 +9,8 @@ CREATE TABLE IF NOT EXISTS agencies (
     contact_phone VARCHAR(50),
     base_postcode VARCHAR(20) NOT NULL,
     default_duration INTEGER DEFAULT 20,
+    slot_version INTEGER NOT NULL DEFAULT 0, -- bumped whenever cached slots go stale (shared by all API workers)
+    event_seq INTEGER NOT NULL DEFAULT 0, -- seq of the agency's latest viewing event
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
@@ -16,8 +18,10 @@ CREATE TABLE IF NOT EXISTS agencies (
 -- Agents table
 CREATE TABLE IF NOT EXISTS agents (
     id SERIAL PRIMARY KEY,
+    name VARCHAR(255),
     email VARCHAR(255) UNIQUE NOT NULL,
     password_hash VARCHAR(255) NOT NULL,
+    base_postcode VARCHAR(20), -- where their day starts; defaults to the agency's base_postcode
     agency_id INTEGER REFERENCES agencies(id) ON DELETE SET NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
@@ -29,19 +33,29 @@ CREATE TABLE IF NOT EXISTS properties (
     title VARCHAR(255) NOT NULL,
     area VARCHAR(255) NOT NULL,
     address TEXT NOT NULL,
-    postcode VARCHAR(20) NOT NULL,
+    postcode VARCHAR(20) NOT NULL, -- canonical form, e.g. 'SW1A 1AA'
+    postcode_outward VARCHAR(4), -- 'SW1A', parsed when the property is saved
+    postcode_sector VARCHAR(6), -- 'SW1A 1'
     rent DECIMAL(10, 2),
     status VARCHAR(20) DEFAULT 'active',
     slug VARCHAR(100) UNIQUE,
     public_link TEXT,
     latitude DECIMAL(10, 8),
     longitude DECIMAL(11, 8),
+    geocode_status VARCHAR(20) DEFAULT 'done', -- 'pending' until coordinates are filled in; 'fallback' if the postcode wasn't found
     agency_id INTEGER NOT NULL REFERENCES agencies(id) ON DELETE CASCADE,
     source VARCHAR(50) DEFAULT 'manual',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Properties each agent covers (an agent with no rows covers all of their agency's properties)
+CREATE TABLE IF NOT EXISTS agent_properties (
+    agent_id INTEGER NOT NULL REFERENCES agents(id) ON DELETE CASCADE,
+    property_id INTEGER NOT NULL REFERENCES properties(id) ON DELETE CASCADE,
+    PRIMARY KEY (agent_id, property_id)
+);
+
 -- Viewings table
 CREATE TABLE IF NOT EXISTS viewings (
     id SERIAL PRIMARY KEY,
@@ -50,13 +64,18 @@ CREATE TABLE IF NOT EXISTS viewings (
     tenant_phone VARCHAR(50),
     property_id INTEGER NOT NULL REFERENCES properties(id) ON DELETE CASCADE,
     requested_time VARCHAR(10) NOT NULL,
+    requested_date DATE,
+    viewing_date DATE NOT NULL, -- requested_date, or the day the request was made
     status VARCHAR(20) DEFAULT 'pending',
     suggested_time VARCHAR(10),
+    confirmed_time VARCHAR(10),
     move_in_date DATE,
     occupants INTEGER,
     rent_budget DECIMAL(10, 2),
     message TEXT,
     agent_id INTEGER NOT NULL REFERENCES agents(id) ON DELETE CASCADE,
+    agency_id INTEGER NOT NULL REFERENCES agencies(id) ON DELETE CASCADE, -- the property's, for listing without the join
+    event_seq INTEGER NOT NULL DEFAULT 0, -- agency event seq of its latest change (GET /api/viewings?since=)
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
@@ -65,13 +84,36 @@ CREATE TABLE IF NOT EXISTS viewings (
 CREATE TABLE IF NOT EXISTS availability (
     id SERIAL PRIMARY KEY,
     agency_id INTEGER NOT NULL REFERENCES agencies(id) ON DELETE CASCADE,
-    day VARCHAR(20) NOT NULL,
+    agent_id INTEGER REFERENCES agents(id) ON DELETE CASCADE, -- NULL: the agency's template, used by agents without their own rules
+    day_of_week INTEGER NOT NULL, -- 0=Monday, ..., 6=Sunday
+    enabled BOOLEAN NOT NULL DEFAULT true,
     start_time VARCHAR(10) NOT NULL,
     end_time VARCHAR(10) NOT NULL,
-    active BOOLEAN DEFAULT true,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    UNIQUE(agency_id, day)
+    UNIQUE(agency_id, agent_id, day_of_week)
+);
+
+-- Blockouts table (specific unavailable days or time ranges)
+CREATE TABLE IF NOT EXISTS blockouts (
+    id SERIAL PRIMARY KEY,
+    agency_id INTEGER NOT NULL REFERENCES agencies(id) ON DELETE CASCADE,
+    agent_id INTEGER REFERENCES agents(id) ON DELETE CASCADE, -- NULL: applies to every agent
+    date DATE NOT NULL,
+    start_time VARCHAR(10),
+    end_time VARCHAR(10),
+    full_day BOOLEAN NOT NULL DEFAULT false,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Viewing changes streamed to dashboards (GET /api/viewings/events); only the latest are kept
+CREATE TABLE IF NOT EXISTS viewing_events (
+    agency_id INTEGER NOT NULL REFERENCES agencies(id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    type VARCHAR(30) NOT NULL,
+    payload JSONB NOT NULL, -- the viewing as listed by GET /api/viewings
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (agency_id, seq)
 );
 
 -- Indexes for performance
@@ -79,10 +121,23 @@ CREATE INDEX IF NOT EXISTS idx_agents_email ON agents(email);
 CREATE INDEX IF NOT EXISTS idx_agents_agency_id ON agents(agency_id);
 CREATE INDEX IF NOT EXISTS idx_properties_agency_id ON properties(agency_id);
 CREATE INDEX IF NOT EXISTS idx_properties_slug ON properties(slug);
+-- Public listing of an agency's active properties
+CREATE INDEX IF NOT EXISTS idx_properties_agency_status ON properties(agency_id, status);
 CREATE INDEX IF NOT EXISTS idx_viewings_property_id ON viewings(property_id);
 CREATE INDEX IF NOT EXISTS idx_viewings_agent_id ON viewings(agent_id);
 CREATE INDEX IF NOT EXISTS idx_viewings_status ON viewings(status);
 CREATE INDEX IF NOT EXISTS idx_availability_agency_id ON availability(agency_id);
+-- Scheduler lookups: an agent's confirmed viewings on a date range
+CREATE INDEX IF NOT EXISTS idx_viewings_agent_date_status ON viewings(agent_id, viewing_date, status);
+-- Dashboard listing, newest first in keyset pages, and changes since a cursor
+CREATE INDEX IF NOT EXISTS idx_viewings_agency_created ON viewings(agency_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_viewings_agency_event_seq ON viewings(agency_id, event_seq);
+CREATE INDEX IF NOT EXISTS idx_blockouts_agency_date ON blockouts(agency_id, date);
+
+-- Viewings with the property fields the dashboard lists them with
+CREATE OR REPLACE VIEW agency_viewings AS
+    SELECT v.*, p.title AS property_title, p.postcode AS property_postcode
+    FROM viewings v JOIN properties p ON p.id = v.property_id;
 
 -- Function to update updated_at timestamp
 CREATE OR REPLACE FUNCTION update_updated_at_column()